@@ -35,11 +35,16 @@ from pydantic import BaseModel
 import os
 import json
 import re
+import time
+import asyncio
 from typing import Dict, List, Optional, Tuple, Any
 from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification
 import torch
 import torch.nn.functional as F
 
+from model_reload import ModelSlot, ReloadInProgress
+from cascade import CascadeSwitch, normalize_hindi
+
 # ======================================================
 # GPU/CUDA CONFIGURATION
 # ======================================================
@@ -56,25 +61,15 @@ else:
 # Environment paths
 HF_MODEL_NAME = os.environ.get("HF_MODEL_NAME", "ai4bharat/IndicBERTv2-MLM-Back-TLM")
 INTENT_MODEL = os.environ.get("INTENT_MODEL", "/models/indicbert_active")
+# Calibrated n-gram first stage (cascade.json next to it); unset = transformer only
+INTENT_CASCADE_PATH = os.environ.get("INTENT_CASCADE_PATH")
 
 # ======================================================
 # TEXT NORMALIZATION
 # ======================================================
-HINDI_NORMALIZATIONS = {
-    r'\banndi\b': 'ande',
-    r'\bandi\b': 'ande',
-    r'\banda\b': 'anda',
-    r'\broti\b': 'roti',
-    r'\brotiya\b': 'roti',
-    r'\bchapati\b': 'roti',
-}
-
-def normalize_text(text: str) -> str:
-    """Normalize common Hindi misspellings."""
-    normalized = text.lower()
-    for pattern, replacement in HINDI_NORMALIZATIONS.items():
-        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
-    return normalized
+# Shared with the cascade so a student distilled with --normalize hindi sees
+# the same text as the intent model
+normalize_text = normalize_hindi
 
 # ======================================================
 # ENTITY EXTRACTION PATTERNS
@@ -296,20 +291,57 @@ def load_encoder_model(name: str):
         print(f"❌ Failed to load encoder: {e}")
         return None, None
 
-# Load models
-intent_tokenizer, intent_model, intent_id2label = load_intent_model(INTENT_MODEL)
+# Load models. The intent model sits in a ModelSlot so POST /admin/reload can
+# swap it while serving; bundle: (tokenizer, model, id2label)
+intent_slot = ModelSlot("intent")
+_intent_bundle = load_intent_model(INTENT_MODEL)
+if _intent_bundle[1] is not None:
+    intent_slot.set(_intent_bundle, version=INTENT_MODEL)
 encoder_tokenizer, encoder_model = load_encoder_model(HF_MODEL_NAME)
 
+# Cascade: the n-gram model answers when it clears its calibrated threshold,
+# everything else escalates to the intent model above. It is only used while
+# intent_slot serves the model it was calibrated for, and re-checked on swaps
+cascade_switch = CascadeSwitch(INTENT_CASCADE_PATH, normalization="hindi") if INTENT_CASCADE_PATH else None
+
+def active_cascade():
+    """The cascade if it was calibrated for the intent model being served right now"""
+    return cascade_switch.get(intent_slot.version) if cascade_switch else None
+
+if cascade_switch:
+    if active_cascade():
+        print(f"✅ Cascade first stage loaded: {INTENT_CASCADE_PATH}")
+    else:
+        print(f"❌ Cascade disabled, using the intent model only: {cascade_switch.reason}")
+
 # ======================================================
 # INTENT CLASSIFICATION
 # ======================================================
-def classify_intent(text: str) -> Tuple[str, float, Dict[str, float]]:
+def classify_intent(text: str, use_cascade: bool = True) -> Tuple[str, float, Dict[str, float]]:
     """
     Classify user intent using the trained model.
     Returns: (intent, confidence, all_scores)
+    all_scores is empty when the cascade's first stage answered.
     """
-    if not intent_model or not intent_tokenizer:
-        return "unknown", 0.0, {}
+    fast_ms = 0.0
+    cascade = active_cascade() if use_cascade else None
+    if cascade is not None:
+        intent, confidence, fast_ms, answered = cascade.first_stage(text)
+        if answered:
+            return intent, round(confidence, 4), {}
+    
+    start = time.perf_counter()
+    with intent_slot.acquire() as bundle:
+        if bundle is None:
+            return "unknown", 0.0, {}
+        result = run_intent_model(bundle, text)
+    if cascade is not None:
+        cascade.record("transformer", fast_ms + (time.perf_counter() - start) * 1000)
+    return result
+
+def run_intent_model(bundle, text: str) -> Tuple[str, float, Dict[str, float]]:
+    """classify_intent with one model bundle"""
+    intent_tokenizer, intent_model, intent_id2label = bundle
     
     # Normalize and tokenize
     normalized = normalize_text(text)
@@ -385,14 +417,25 @@ async def health():
     return {
         "status": "healthy",
         "gpu_enabled": USE_GPU,
-        "intent_model_loaded": intent_model is not None,
+        "intent_model_loaded": intent_slot.loaded,
+        "intent_model_version": intent_slot.version,
         "encoder_model_loaded": encoder_model is not None,
+        "cascade_enabled": active_cascade() is not None,
         "version": "2.0"
     }
 
+@app.get("/cascade")
+async def cascade_stats():
+    """Requests answered per cascade stage, next to what calibration expected."""
+    if cascade_switch is None:
+        return {"enabled": False}
+    active_cascade()  # picks up a swap no request has gone through yet
+    return cascade_switch.status()
+
 @app.get("/info")
 async def info():
     """Get service information."""
+    intent_bundle = intent_slot.bundle
     return {
         "service": "MangwaleAI NLU v2.0",
         "architecture": "Industry Standard (Dialogflow/Rasa-like)",
@@ -401,8 +444,8 @@ async def info():
             "Entity extraction (items, locations, quantities, contacts, time)",
             "Clean separation of concerns",
         ],
-        "intents": list(intent_id2label.values()) if intent_id2label else [],
-        "model": INTENT_MODEL,
+        "intents": list(intent_bundle[2].values()) if intent_bundle and intent_bundle[2] else [],
+        "model": intent_slot.version or INTENT_MODEL,
         "gpu": USE_GPU
     }
 
@@ -424,7 +467,8 @@ async def classify(req: NLURequest):
         normalized = normalize_text(req.text)
         
         # 1. Classify intent (model-based, no overrides!)
-        intent, confidence, all_scores = classify_intent(req.text)
+        # All scores only come from the transformer, so such requests skip the cascade
+        intent, confidence, all_scores = classify_intent(req.text, use_cascade=not req.include_all_scores)
         
         # 2. Extract entities
         entities = extract_entities(req.text)
@@ -476,7 +520,7 @@ async def debug_classification(req: NLURequest):
     Useful for understanding why a particular intent was chosen.
     """
     normalized = normalize_text(req.text)
-    intent, confidence, all_scores = classify_intent(req.text)
+    intent, confidence, all_scores = classify_intent(req.text, use_cascade=False)
     entities = extract_entities(req.text)
     
     # Sort scores descending
@@ -495,6 +539,48 @@ async def debug_classification(req: NLURequest):
         "note": "NO keyword overrides applied - this is pure model output"
     }
 
+# ======================================================
+# HOT RELOAD
+# ======================================================
+# Sample inputs run through a new model before it takes traffic
+WARMUP_TEXTS = ["hi", "2 biryani order karna hai", "parcel bhejna hai satpur se nashik road"]
+
+class ReloadRequest(BaseModel):
+    model_path: Optional[str] = None  # default: the path currently served
+    wait: bool = False  # block until the new model is serving (or the reload failed)
+
+def _load_or_raise(path: str):
+    bundle = load_intent_model(path)
+    if bundle[1] is None:
+        raise RuntimeError(f"could not load intent model from {path}")
+    return bundle
+
+def _warmup(bundle):
+    for text in WARMUP_TEXTS:
+        run_intent_model(bundle, text)
+
+@app.post("/admin/reload")
+async def reload_model(req: ReloadRequest):
+    """
+    Load an intent model version in the background, warm it up and swap
+    it in; requests already running finish on the old model.
+    """
+    path = req.model_path or intent_slot.version or INTENT_MODEL
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Model not found: {path}")
+    try:
+        result = intent_slot.reload(lambda: _load_or_raise(path), _warmup, version=path)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if req.wait:
+        result = await asyncio.to_thread(intent_slot.wait)
+    return result
+
+@app.get("/admin/reload")
+async def reload_status():
+    """Active model version, in-flight requests and recent reloads."""
+    return intent_slot.status()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=7010)
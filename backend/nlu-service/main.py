@@ -1,12 +1,14 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import os, json, re
+import os, json, re, asyncio
 from typing import Dict, List, Optional
 from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification, AutoModelForTokenClassification
 import torch
 import torch.nn.functional as F
 import numpy as np
 
+from model_reload import ModelSlot, ReloadInProgress
+
 # ======================================================
 # GPU/CUDA CONFIGURATION
 # ======================================================
@@ -324,9 +326,54 @@ def _load_tokcls_model(path: Optional[str]):
         print(f"   Failed to load token classification model {path}: {e}")
         return None, None, None
 
-intent_tok, intent_model, intent_id2label = _load_cls_model(INTENT_MODEL)
-tone_tok, tone_model, tone_id2label = _load_cls_model(TONE_MODEL)
-slots_tok, slots_model, slots_id2label = _load_tokcls_model(SLOTS_MODEL)
+def softmax_top(logits):
+    probs = F.softmax(logits, dim=-1)
+    conf, idx = torch.max(probs, dim=-1)
+    return conf.item(), idx.item()
+
+def _run_intent(bundle, text: str) -> tuple:
+    """(intent, confidence) from a trained intent classifier bundle"""
+    tok, model, id2label = bundle
+    x = tok(text, return_tensors="pt", truncation=True, max_length=128)
+    # Move to GPU if available
+    if USE_GPU:
+        x = {k: v.to(DEVICE) for k, v in x.items()}
+    with torch.no_grad():
+        out = model(**x)
+    conf, idx = softmax_top(out.logits[0])
+    return (id2label.get(idx, str(idx)) if id2label else str(idx)), conf
+
+def _run_tone(bundle, text: str) -> tuple:
+    tok, model, id2label = bundle
+    x = tok(text, return_tensors="pt", truncation=True, max_length=128)
+    if USE_GPU:
+        x = {k: v.to(DEVICE) for k, v in x.items()}
+    with torch.no_grad():
+        out = model(**x)
+    conf, idx = softmax_top(out.logits[0].cpu())
+    return (id2label.get(idx, str(idx)) if id2label else str(idx)), conf
+
+def _run_slots(bundle, text: str) -> Dict[str, str]:
+    tok, model, id2label = bundle
+    x = tok(text.split(), is_split_into_words=True, return_tensors="pt", truncation=True, max_length=128)
+    with torch.no_grad():
+        out = model(**x)
+    pred_ids = out.logits.argmax(-1)[0].tolist()
+    return decode_slots(text, x, pred_ids, id2label or {})
+
+# Trained models live in ModelSlots so POST /admin/reload can swap them while serving.
+# Bundle: (tokenizer, model, id2label)
+MODEL_PATHS = {"intent": INTENT_MODEL, "tone": TONE_MODEL, "slots": SLOTS_MODEL}
+MODEL_LOADERS = {"intent": _load_cls_model, "tone": _load_cls_model, "slots": _load_tokcls_model}
+MODEL_RUNNERS = {"intent": _run_intent, "tone": _run_tone, "slots": _run_slots}
+# Sample inputs run through a new model before it takes traffic
+WARMUP_TEXTS = ["hi", "mujhe 2 paneer tikka chahiye", "parcel bhejna hai satpur se nashik road"]
+
+model_slots = {kind: ModelSlot(kind) for kind in MODEL_PATHS}
+for _kind, _path in MODEL_PATHS.items():
+    _bundle = MODEL_LOADERS[_kind](_path)
+    if _bundle[1] is not None:
+        model_slots[_kind].set(_bundle, version=_path)
 
 # ============================================================================
 # EMBEDDING-BASED INTENT CLASSIFICATION (no training required!)
@@ -563,18 +610,14 @@ def healthz():
         "status": "ok",
         "encoder": encoder_source,
         "encoder_loaded": bool(encoder_model),
-        "intent_loaded": bool(intent_model),  # For trained model (if any)
+        "intent_loaded": model_slots["intent"].loaded,  # For trained model (if any)
         "intent_embedding_mode": len(intent_embeddings) > 0,  # NEW: embedding-based classification
         "intent_count": len(intent_embeddings),
-        "slots_loaded": bool(slots_model),
-        "tone_loaded": bool(tone_model),
+        "slots_loaded": model_slots["slots"].loaded,
+        "tone_loaded": model_slots["tone"].loaded,
+        "model_versions": {kind: slot.version for kind, slot in model_slots.items()},
     }
 
-def softmax_top(logits):
-    probs = F.softmax(logits, dim=-1)
-    conf, idx = torch.max(probs, dim=-1)
-    return conf.item(), idx.item()
-
 def decode_slots(text: str, tokens_enc, pred_ids: List[int], id2label: Dict[int, str]):
     # Map token-level BIO to word-level spans using tokenizer word_ids
     word_ids = tokens_enc.word_ids()
@@ -639,15 +682,9 @@ async def classify(req: ParseReq):
         embedding_intent, embedding_conf = None, 0.0
         
         # Try trained classifier first
-        if intent_model and intent_tok:
-            x = intent_tok(normalized_text, return_tensors="pt", truncation=True, max_length=128)
-            # Move to GPU if available
-            if USE_GPU:
-                x = {k: v.to(DEVICE) for k, v in x.items()}
-            with torch.no_grad():
-                out = intent_model(**x)
-            trained_conf, idx = softmax_top(out.logits[0])
-            trained_intent = intent_id2label.get(idx, str(idx)) if intent_id2label else str(idx)
+        with model_slots["intent"].acquire() as intent_bundle:
+            if intent_bundle:
+                trained_intent, trained_conf = _run_intent(intent_bundle, normalized_text)
         
         # Also get embedding-based classification (use normalized text)
         if intent_embeddings:
@@ -685,26 +722,17 @@ async def classify(req: ParseReq):
         result.update({"intent": final_intent, "intent_conf": float(final_conf), "method": method})
 
         # Tone (optional)
-        if tone_model and tone_tok:
-            x = tone_tok(req.text, return_tensors="pt", truncation=True, max_length=128)
-            if USE_GPU:
-                x = {k: v.to(DEVICE) for k, v in x.items()}
-            with torch.no_grad():
-                out = tone_model(**x)
-            conf, idx = softmax_top(out.logits[0].cpu())
-            label = tone_id2label.get(idx, str(idx)) if tone_id2label else str(idx)
-            result.update({"tone": label, "tone_conf": float(conf)})
+        with model_slots["tone"].acquire() as tone_bundle:
+            if tone_bundle:
+                label, conf = _run_tone(tone_bundle, req.text)
+                result.update({"tone": label, "tone_conf": float(conf)})
 
         # Slots
-        if slots_model and slots_tok:
-            x = slots_tok(req.text.split(), is_split_into_words=True, return_tensors="pt", truncation=True, max_length=128)
-            with torch.no_grad():
-                out = slots_model(**x)
-            pred_ids = out.logits.argmax(-1)[0].tolist()
-            slots = decode_slots(req.text, x, pred_ids, slots_id2label or {})
-            result.update({"slots": slots})
-        else:
-            result.setdefault("slots", {})
+        with model_slots["slots"].acquire() as slots_bundle:
+            if slots_bundle:
+                result.update({"slots": _run_slots(slots_bundle, req.text)})
+            else:
+                result.setdefault("slots", {})
 
         return result
     except Exception as e:
@@ -754,3 +782,43 @@ async def list_intents():
         intent: len(examples) 
         for intent, examples in INTENT_EXAMPLES.items()
     }
+
+# Hot reload: load + warm up in the background, swap, drain in-flight requests on the old model
+class ReloadReq(BaseModel):
+    model: str = "intent"  # intent | tone | slots
+    model_path: Optional[str] = None  # default: the path currently served
+    wait: bool = False  # block until the new model is serving (or the reload failed)
+
+def _load_or_raise(kind: str, path: str):
+    bundle = MODEL_LOADERS[kind](path)
+    if bundle[1] is None:
+        raise RuntimeError(f"could not load {kind} model from {path}")
+    return bundle
+
+def _warmup(kind: str):
+    def warmup(bundle):
+        for text in WARMUP_TEXTS:
+            MODEL_RUNNERS[kind](bundle, text)
+    return warmup
+
+@app.post("/admin/reload")
+async def reload_model(req: ReloadReq):
+    """Swap a trained model (intent, tone or slots) without dropping requests."""
+    if req.model not in model_slots:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {req.model} (use one of {list(model_slots)})")
+    slot = model_slots[req.model]
+    path = req.model_path or slot.version or MODEL_PATHS[req.model]
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Model not found: {path}")
+    try:
+        result = slot.reload(lambda: _load_or_raise(req.model, path), _warmup(req.model), version=path)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if req.wait:
+        result = await asyncio.to_thread(slot.wait)
+    return result
+
+@app.get("/admin/reload")
+async def reload_status():
+    """Active model versions, in-flight requests and recent reloads."""
+    return {kind: slot.status() for kind, slot in model_slots.items()}
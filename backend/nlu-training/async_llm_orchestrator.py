@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Async LLM Orchestrator - concurrent entity resolution
+======================================================
+Async variant of LLMOrchestrator built on one pooled httpx.AsyncClient.
+
+process_order_query():
+1. Extract intent/entities with vLLM (NLU/NER fallback run concurrently)
+2. Fan out every product lookup and the store lookup (food + ecom in
+   parallel) at once, bounded by a per-query deadline
+3. Lookups still running at the deadline are cancelled; the response
+   contains whatever finished (`partial: true`) plus per-lookup latency
+
+Parsing, cart building and training-data helpers are shared with
+LLMOrchestrator so both variants return the same response shape.
+"""
+
+import time
+import asyncio
+import os
+from typing import Optional, Dict, Any
+
+import httpx
+
+from llm_orchestrator import (
+    LLMOrchestrator, ExtractionResult,
+    VLLM_URL, SEARCH_URL, NLU_URL, NER_URL,
+)
+
+# Configuration
+LOOKUP_DEADLINE_S = float(os.getenv("LOOKUP_DEADLINE_S", "2.0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_S = float(os.getenv("LLM_RETRY_BACKOFF_S", "0.5"))
+
+# vLLM answers 429/503 when its queue is full; worth retrying before falling back
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class AsyncLLMOrchestrator(LLMOrchestrator):
+    """LLMOrchestrator whose I/O methods are coroutines sharing one client."""
+
+    def __init__(self):
+        super().__init__()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.llm_retries = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE
+                ),
+                timeout=httpx.Timeout(10.0)
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def extract_with_llm(self, text: str) -> ExtractionResult:
+        """Use vLLM to extract intent and entities from text (cached per normalized text)."""
+        # The extraction cache is SQLite: keep its reads and writes off the event loop
+        cached = await asyncio.to_thread(self._cached_extraction, text)
+        if cached:
+            return cached
+
+        try:
+            body = await self._post_llm(text)
+            content = body["choices"][0]["message"]["content"]
+            result = self._parse_llm_content(text, content)
+            result.usage = body.get("usage")
+            await asyncio.to_thread(self._cache_extraction, text, result, result.usage)
+            return result
+
+        except Exception as e:
+            print(f"LLM extraction error: {e}")
+            # Fallback to NLU/NER
+            return await self._fallback_extraction(text)
+
+    async def _post_llm(self, text: str) -> Dict:
+        """POST the extraction request, retrying transient failures with backoff."""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            retryable = attempt < LLM_MAX_RETRIES
+            try:
+                response = await self.client.post(VLLM_URL, json=self._llm_request(text), timeout=30)
+            except httpx.TransportError:
+                if not retryable:
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or not retryable:
+                    response.raise_for_status()
+                    return response.json()
+            self.llm_retries += 1
+            await asyncio.sleep(LLM_RETRY_BACKOFF_S * (2 ** attempt))
+
+    async def _get_json(self, method: str, url: str, **kwargs) -> Optional[Dict]:
+        """JSON body of a successful response, None on any failure."""
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            return response.json() if response.is_success else None
+        except Exception:
+            return None
+
+    async def _fallback_extraction(self, text: str) -> ExtractionResult:
+        """Fallback to NLU/NER services if LLM fails."""
+        return self._build_fallback_result(text, *await self._query_services(text))
+
+    async def _query_services(self, text: str):
+        """(NLU /classify, NER /extract) JSON bodies, called concurrently; None for a failed call."""
+        return await asyncio.gather(
+            self._get_json("POST", f"{NLU_URL}/classify", json={"text": text}),
+            self._get_json("POST", f"{NER_URL}/extract", json={"text": text}),
+        )
+
+    async def extract(self, text: str) -> ExtractionResult:
+        """Tiered extraction: rules, then NLU/NER, then the LLM when still unsure."""
+        if not self.router:
+            return await self.extract_with_llm(text)
+
+        reason = self.router.complexity(text)
+        if reason is None:
+            start = time.perf_counter()
+            result = self._rule_result(text)
+            self.router.record("rules", result is not None, (time.perf_counter() - start) * 1000)
+            if result:
+                return result
+
+            start = time.perf_counter()
+            result = self._ner_result(text, *await self._query_services(text))
+            self.router.record("ner", result is not None, (time.perf_counter() - start) * 1000)
+            if result:
+                return result
+            reason = "low_confidence"
+
+        self.router.record_escalation(reason)
+        start = time.perf_counter()
+        result = await self.extract_with_llm(text)
+        self.router.record("llm", True, (time.perf_counter() - start) * 1000)
+        return result
+
+    async def search_products(self, query: str, store: Optional[str] = None, limit: int = 5,
+                              zone_id: Optional[int] = None, veg: Optional[int] = None) -> Dict:
+        """Search for products (cached; concurrent identical lookups share one call)."""
+        key = self.search_cache.make_key("products", query, store, limit, zone_id, veg)
+        result = await self.search_cache.aget_or_load(
+            key, lambda: self._search_products_uncached(query, store, limit, zone_id, veg)
+        )
+        result["query"] = query
+        return result
+
+    async def _search_products_uncached(self, query: str, store: Optional[str], limit: int,
+                                        zone_id: Optional[int], veg: Optional[int]) -> Dict:
+        """Local ANN fast path, then the search API."""
+        if self.ann_index and self.ann_index.ready:
+            local = await asyncio.to_thread(self._search_local_ann, query, store, limit, zone_id, veg)
+            if local:
+                return local
+
+        try:
+            response = await self.client.get(
+                f"{SEARCH_URL}/search/food",
+                params=self._product_search_params(query, limit, zone_id, veg)
+            )
+            response.raise_for_status()
+            return self._product_results(query, store, limit, response.json())
+        except Exception as e:
+            print(f"Search error: {e}")
+            return {"query": query, "count": 0, "items": [], "error": str(e)}
+
+    async def search_stores(self, query: str, limit: int = 5) -> Dict:
+        """Search for stores (cached; concurrent identical lookups share one call)."""
+        key = self.search_cache.make_key("stores", query, None, limit)
+        result = await self.search_cache.aget_or_load(key, lambda: self._search_stores_uncached(query, limit))
+        result["query"] = query
+        return result
+
+    async def _search_stores_uncached(self, query: str, limit: int) -> Dict:
+        """Search food and ecom stores concurrently."""
+        params = {"q": query, "limit": limit}
+        try:
+            food_resp, ecom_data = await asyncio.gather(
+                self.client.get(f"{SEARCH_URL}/search/food/stores", params=params),
+                self._get_json("GET", f"{SEARCH_URL}/search/ecom/stores", params=params),
+            )
+            food_resp.raise_for_status()
+
+            stores = food_resp.json().get("stores", [])
+            # Ecom stores only fill up a short food result, as in the sync path
+            if len(stores) < limit and ecom_data:
+                stores.extend(ecom_data.get("stores", []))
+
+            return self._store_results(query, limit, stores)
+        except Exception as e:
+            print(f"Store search error: {e}")
+            return {"query": query, "count": 0, "stores": [], "error": str(e)}
+
+    async def _timed(self, kind: str, query: str, coro) -> Dict[str, Any]:
+        """Run a lookup and record its latency."""
+        start = time.perf_counter()
+        result = await coro
+        return {
+            "type": kind,
+            "query": query,
+            "result": result,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    async def process_order_query(self, text: str, deadline: float = LOOKUP_DEADLINE_S,
+                                  use_router: bool = True) -> Dict:
+        """
+        Complete pipeline: Extract -> concurrent Search -> Build Cart -> Generate Training Data
+
+        Args:
+            text: User query
+            deadline: Seconds allowed for the lookup fan-out after extraction
+            use_router: Try rules / NLU+NER before the LLM (False forces the LLM)
+        """
+        # Step 1: Extract (rules / NER / LLM)
+        extract_start = time.perf_counter()
+        extraction = await self.extract(text) if use_router else await self.extract_with_llm(text)
+        extract_ms = round((time.perf_counter() - extract_start) * 1000, 2)
+
+        # Step 2 + 3: Fan out all product lookups and the store lookup
+        tasks = {}
+        for idx, item in enumerate(extraction.cart_items):
+            tasks[("product", idx)] = asyncio.create_task(
+                self._timed("product", item.food, self.search_products(item.food, store=item.store))
+            )
+        store_query = self._store_query(extraction)
+        if store_query:
+            tasks[("store", 0)] = asyncio.create_task(
+                self._timed("store", store_query, self.search_stores(store_query, limit=3))
+            )
+
+        done = set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+            for task in pending:
+                task.cancel()
+
+        lookups = []
+        search_results = []
+        store_info = None
+        for (kind, idx), task in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                timed = task.result()
+                status = "error" if timed["result"].get("error") else "ok"
+                lookups.append({
+                    "type": kind,
+                    "query": timed["query"],
+                    "latency_ms": timed["latency_ms"],
+                    "status": status
+                })
+                if kind == "product":
+                    search_results.append(self._apply_product_match(extraction.cart_items[idx], timed["result"]))
+                else:
+                    store_info = timed["result"]
+            else:
+                query = extraction.cart_items[idx].food if kind == "product" else store_query
+                lookups.append({
+                    "type": kind,
+                    "query": query,
+                    "latency_ms": round(deadline * 1000, 2),
+                    "status": "timeout" if task not in done else "error"
+                })
+                if kind == "product":
+                    item = extraction.cart_items[idx]
+                    search_results.append({"query": item.food, "store_filter": item.store, "matches": []})
+
+        # Step 4: Generate training data
+        self._save_training_data(extraction)
+
+        response = self._build_response(text, extraction, search_results, store_info)
+        response["partial"] = any(l["status"] != "ok" for l in lookups)
+        response["timings"] = {"extraction_ms": extract_ms, "lookups": lookups}
+        return response
+
+
+async def test_scenarios():
+    """Run the sync test scenarios through the async pipeline."""
+    orchestrator = AsyncLLMOrchestrator()
+    scenarios = [
+        "add 3 butter chicken and 2 naan to my cart from the nearest location to my house and i need it quickly",
+        "inayat cafe egg rice + jeera rice from inayat we are two people",
+        "gulkand big size from dagu teli"
+    ]
+    try:
+        for query in scenarios:
+            result = await orchestrator.process_order_query(query)
+            print(f"\n📝 {query}")
+            print(f"🎯 {result['intent']} | partial={result['partial']} | extraction {result['timings']['extraction_ms']}ms")
+            for lookup in result["timings"]["lookups"]:
+                print(f"   {lookup['type']:<8} {lookup['query']:<25} {lookup['latency_ms']:>8}ms  {lookup['status']}")
+    finally:
+        await orchestrator.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_scenarios())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Batch Engine - concurrent /batch/generate jobs
+===============================================
+Runs a list of queries through AsyncLLMOrchestrator.process_order_query with
+bounded concurrency instead of one LLM round trip at a time.
+
+- Every batch is a job with an ID: poll its progress or stream results
+  as NDJSON in completion order
+- A semaphore caps in-flight queries per job (the vLLM endpoint itself
+  limits running sequences with --max-num-seqs)
+- Queries that raise are retried with backoff; transient LLM errors are
+  already retried inside the orchestrator
+- Throughput: queries/s and LLM tokens/s (fresh LLM calls only; cache hits
+  and NER fallbacks cost no tokens)
+
+CLI (point VLLM_URL at stub_llm_server.py to test without a GPU):
+    python batch_engine.py queries.txt --concurrency 16
+"""
+
+import time
+import json
+import uuid
+import asyncio
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Configuration
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "2"))
+BATCH_RETRY_BACKOFF_S = float(os.getenv("BATCH_RETRY_BACKOFF_S", "1.0"))
+BATCH_KEEP_JOBS = int(os.getenv("BATCH_KEEP_JOBS", "20"))
+
+
+@dataclass
+class BatchJob:
+    job_id: str
+    queries: List[str]
+    concurrency: int
+    status: str = "queued"  # queued | running | completed | cancelled | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    successful: int = 0
+    failed: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    sources: Dict[str, int] = field(default_factory=dict)
+    results: List[Optional[Dict]] = field(default_factory=list)
+    completion_order: List[int] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def __post_init__(self):
+        self.results = [None] * len(self.queries)
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def processed(self) -> int:
+        return len(self.completion_order)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "cancelled", "failed")
+
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = self.elapsed()
+        tokens = self.prompt_tokens + self.completion_tokens
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": len(self.queries),
+            "processed": self.processed,
+            "successful": self.successful,
+            "failed": self.failed,
+            "retries": self.retries,
+            "concurrency": self.concurrency,
+            "progress": round(self.processed / len(self.queries), 4) if self.queries else 1.0,
+            "elapsed_s": round(elapsed, 2),
+            "queries_per_s": round(self.processed / elapsed, 2) if elapsed else 0.0,
+            "llm_tokens": tokens,
+            "tokens_per_s": round(tokens / elapsed, 1) if elapsed else 0.0,
+            "extraction_sources": dict(self.sources),
+            "error": self.error,
+        }
+
+
+class BatchEngine:
+    def __init__(self, orchestrator, max_retries: int = BATCH_MAX_RETRIES, keep_jobs: int = BATCH_KEEP_JOBS):
+        self.orchestrator = orchestrator
+        self.max_retries = max_retries
+        self.keep_jobs = keep_jobs
+        self.jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+
+    def submit(self, queries: List[str], concurrency: Optional[int] = None) -> BatchJob:
+        """Create a job and start it in the background."""
+        concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+        job = BatchJob(job_id=uuid.uuid4().hex[:12], queries=list(queries), concurrency=concurrency)
+        self.jobs[job.job_id] = job
+        self._prune()
+        job._task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if not job or job.done:
+            return False
+        job._task.cancel()
+        return True
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_jobs."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.keep_jobs)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job: BatchJob):
+        job.status = "running"
+        job.started_at = time.time()
+        semaphore = asyncio.Semaphore(job.concurrency)
+        tasks = [
+            asyncio.create_task(self._process_one(job, idx, query, semaphore))
+            for idx, query in enumerate(job.queries)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            async with job._changed:
+                job._changed.notify_all()
+
+    async def _process_one(self, job: BatchJob, idx: int, query: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            for attempt in range(self.max_retries + 1):
+                try:
+                    # Batches exist to produce LLM-labelled training data: skip the router
+                    result = await self.orchestrator.process_order_query(query, use_router=False)
+                    usage = result.get("llm_usage") or {}
+                    source = result.get("extraction_source", "llm")
+                    job.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+                    job.completion_tokens += usage.get("completion_tokens", 0) or 0
+                    job.sources[source] = job.sources.get(source, 0) + 1
+                    job.successful += 1
+                    entry = {
+                        "query": query,
+                        "intent": result["intent"],
+                        "entities_count": len(result["entities"]),
+                        "extraction_source": source,
+                        "success": True
+                    }
+                    break
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        job.retries += 1
+                        await asyncio.sleep(BATCH_RETRY_BACKOFF_S * (2 ** attempt))
+                        continue
+                    job.failed += 1
+                    entry = {"query": query, "error": str(e), "success": False}
+
+            entry["index"] = idx
+            entry["attempts"] = attempt + 1
+            entry["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        job.results[idx] = entry
+        job.completion_order.append(idx)
+        async with job._changed:
+            job._changed.notify_all()
+
+    async def wait(self, job: BatchJob) -> BatchJob:
+        await asyncio.shield(job._task)
+        return job
+
+    async def stream(self, job: BatchJob) -> AsyncIterator[str]:
+        """NDJSON lines: one per finished query, then a final progress line."""
+        cursor = 0
+        while True:
+            async with job._changed:
+                await job._changed.wait_for(lambda: job.processed > cursor or job.done)
+            while cursor < job.processed:
+                yield json.dumps(job.results[job.completion_order[cursor]], ensure_ascii=False) + "\n"
+                cursor += 1
+            if job.done:
+                yield json.dumps({"summary": job.progress()}) + "\n"
+                return
+
+
+async def main():
+    import argparse
+    from async_llm_orchestrator import AsyncLLMOrchestrator
+
+    parser = argparse.ArgumentParser(description="Run a batch of queries through the orchestrator")
+    parser.add_argument("queries_file", help="Text file, one query per line")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args()
+
+    with open(args.queries_file) as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    orchestrator = AsyncLLMOrchestrator()
+    engine = BatchEngine(orchestrator)
+    try:
+        job = engine.submit(queries, concurrency=args.concurrency)
+        print(f"🚀 Job {job.job_id}: {len(queries)} queries, concurrency {job.concurrency}")
+        while not job.done:
+            await asyncio.sleep(1)
+            p = job.progress()
+            print(f"   {p['processed']}/{p['total']}  {p['queries_per_s']} q/s  {p['tokens_per_s']} tok/s  "
+                  f"retries={p['retries']}  failed={p['failed']}")
+        print(json.dumps(job.progress(), indent=2))
+    finally:
+        await orchestrator.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
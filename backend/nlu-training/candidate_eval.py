@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Candidate Evaluation - shadow and canary traffic for a second intent model
+==========================================================================
+The NLU server can hold a candidate model next to the primary one:
+
+    shadow  a sampled fraction of /classify requests is queued (put_nowait,
+            dropped when the queue is full) for a background thread that
+            runs the candidate; the response always comes from the primary
+    canary  a fraction of /classify requests is answered by the candidate
+
+Recorded per intent (the primary's intent for shadow, the served intent
+for canary): agreement rate and top disagreements (shadow), confidence
+histogram per model and latency per model / latency delta. With the
+confidence cascade on, only requests the primary transformer answered are
+recorded, so fast-stage answers never count as the primary's.
+
+Primary latency is also recorded split by whether the shadow worker was
+busy at the time, next to the cost of the enqueue itself - the evidence
+that shadowing stays off the request path (on CPU the worker still
+competes for cores, which the split makes visible).
+"""
+
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "shadow", "canary")
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", "256"))
+LATENCY_SAMPLES = 2000
+CONFIDENCE_BUCKETS = 10
+
+# candidate bundle, text -> (intent, confidence, latency_ms)
+Classify = Callable[[Any, str], Tuple[str, float, float]]
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)], 2)
+
+
+def _bucket(confidence: float) -> int:
+    return min(int(confidence * CONFIDENCE_BUCKETS), CONFIDENCE_BUCKETS - 1)
+
+
+class _Arm:
+    """Confidence histogram and latency of one model on one intent"""
+
+    def __init__(self):
+        self.n = 0
+        self.confidence_sum = 0.0
+        self.histogram = [0] * CONFIDENCE_BUCKETS
+        self.latency_sum = 0.0
+
+    def add(self, confidence: float, latency_ms: float):
+        self.n += 1
+        self.confidence_sum += confidence
+        self.histogram[_bucket(confidence)] += 1
+        self.latency_sum += latency_ms
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "n": self.n,
+            "mean_confidence": round(self.confidence_sum / self.n, 4) if self.n else None,
+            "confidence_histogram": list(self.histogram),
+            "mean_latency_ms": round(self.latency_sum / self.n, 2) if self.n else None,
+        }
+
+
+class _IntentStats:
+    def __init__(self):
+        self.primary = _Arm()
+        self.candidate = _Arm()
+        self.agree = 0
+        self.disagreements: Dict[str, int] = {}
+
+    def summary(self, shadow: bool) -> Dict[str, Any]:
+        out = {"primary": self.primary.summary(), "candidate": self.candidate.summary()}
+        if shadow:
+            n = self.candidate.n
+            out["agreement"] = round(self.agree / n, 4) if n else None
+            out["latency_delta_ms"] = (round((self.candidate.latency_sum - self.primary.latency_sum) / n, 2)
+                                       if n else None)
+            out["top_disagreements"] = dict(sorted(self.disagreements.items(), key=lambda kv: -kv[1])[:3])
+        return out
+
+
+class CandidateEvaluator:
+    def __init__(self, classify: Classify, slot, queue_size: int = SHADOW_QUEUE_SIZE):
+        """slot: the ModelSlot holding the candidate; classify runs one text through a bundle"""
+        self.classify = classify
+        self.slot = slot
+        self.mode = "off"
+        self.fraction = 0.0
+
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, str, float, float]]" = queue.Queue(maxsize=queue_size)
+        self._busy = False
+        self._worker: Optional[threading.Thread] = None
+        self.reset()
+
+    def configure(self, mode: Optional[str] = None, fraction: Optional[float] = None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"mode must be one of {MODES}")
+            self.mode = mode
+        if fraction is not None:
+            if not 0.0 <= fraction <= 1.0:
+                raise ValueError("fraction must be between 0 and 1")
+            self.fraction = fraction
+        if self.mode == "shadow" and self._worker is None:
+            self._worker = threading.Thread(target=self._run_shadow, name="shadow-candidate", daemon=True)
+            self._worker.start()
+        logger.info(f"Candidate {self.slot.version}: {self.mode} at {self.fraction:.0%}")
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.shadow: Dict[str, _IntentStats] = {}
+            self.canary: Dict[str, _IntentStats] = {}
+            self.shadowed = 0
+            self.dropped = 0
+            self.failed = 0
+            self.primary_ms: Dict[str, Deque[float]] = {
+                "shadow_idle": deque(maxlen=LATENCY_SAMPLES),
+                "shadow_busy": deque(maxlen=LATENCY_SAMPLES),
+            }
+            self.enqueue_us: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off" and self.fraction > 0 and self.slot.loaded
+
+    # ------------------------------------------------------------------
+    # Request path
+    # ------------------------------------------------------------------
+    def use_canary(self) -> bool:
+        """Whether this request should be answered by the candidate"""
+        return self.mode == "canary" and self.active and random.random() < self.fraction
+
+    def after_primary(self, text: str, intent: str, confidence: float, latency_ms: float):
+        """Called after the primary answered: latency bookkeeping and (maybe) a shadow enqueue"""
+        if self.mode != "shadow" or not self.active:
+            return
+        self.primary_ms["shadow_busy" if self._busy else "shadow_idle"].append(latency_ms)
+        if random.random() >= self.fraction:
+            return
+        start = time.perf_counter()
+        try:
+            self._queue.put_nowait((text, intent, confidence, latency_ms))
+        except queue.Full:
+            self.dropped += 1
+        self.enqueue_us.append((time.perf_counter() - start) * 1e6)
+
+    def record_canary(self, variant: str, intent: str, confidence: float, latency_ms: float):
+        with self._lock:
+            stats = self.canary.setdefault(intent, _IntentStats())
+            getattr(stats, variant).add(confidence, latency_ms)
+
+    # ------------------------------------------------------------------
+    # Shadow worker
+    # ------------------------------------------------------------------
+    def _run_shadow(self):
+        while True:
+            text, intent, confidence, latency_ms = self._queue.get()
+            self._busy = True
+            try:
+                with self.slot.acquire() as candidate:
+                    if candidate is None:
+                        continue
+                    shadow_intent, shadow_confidence, shadow_ms = self.classify(candidate, text)
+                with self._lock:
+                    stats = self.shadow.setdefault(intent, _IntentStats())
+                    stats.primary.add(confidence, latency_ms)
+                    stats.candidate.add(shadow_confidence, shadow_ms)
+                    if shadow_intent == intent:
+                        stats.agree += 1
+                    else:
+                        stats.disagreements[shadow_intent] = stats.disagreements.get(shadow_intent, 0) + 1
+                    self.shadowed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Shadow classification failed: {e}")
+            finally:
+                self._busy = self._queue.qsize() > 0
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            shadow = {intent: s.summary(shadow=True) for intent, s in sorted(self.shadow.items())}
+            canary = {intent: s.summary(shadow=False) for intent, s in sorted(self.canary.items())}
+            n = sum(s.candidate.n for s in self.shadow.values())
+            agree = sum(s.agree for s in self.shadow.values())
+            primary_ms = {k: list(v) for k, v in self.primary_ms.items()}
+            enqueue_us = list(self.enqueue_us)
+        return {
+            "mode": self.mode,
+            "fraction": self.fraction,
+            "candidate": self.slot.version,
+            "since": self.started_at,
+            "shadow": {
+                "classified": self.shadowed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "queued": self._queue.qsize(),
+                "agreement": round(agree / n, 4) if n else None,
+                "per_intent": shadow,
+            },
+            "canary": {
+                "served": {variant: sum(getattr(s, variant).n for s in self.canary.values())
+                           for variant in ("primary", "candidate")},
+                "per_intent": canary,
+            },
+            "primary_path": {
+                **{f"{state}_p50_ms": _percentile(v, 50) for state, v in primary_ms.items()},
+                **{f"{state}_p99_ms": _percentile(v, 99) for state, v in primary_ms.items()},
+                "enqueue_p99_us": _percentile(enqueue_us, 99),
+            },
+        }
+
+    def prometheus_text(self) -> str:
+        report = self.report()
+        shadow, primary_path = report["shadow"], report["primary_path"]
+        lines = [
+            "# HELP nlu_candidate_mode Candidate mode (1 for the active one)",
+            "# TYPE nlu_candidate_mode gauge",
+        ]
+        lines += [f'nlu_candidate_mode{{mode="{m}"}} {int(m == self.mode)}' for m in MODES]
+        lines += [
+            "# HELP nlu_candidate_fraction Share of traffic mirrored or routed to the candidate",
+            "# TYPE nlu_candidate_fraction gauge",
+            f"nlu_candidate_fraction {self.fraction}",
+            "# HELP nlu_shadow_requests_total Shadow classifications by outcome",
+            "# TYPE nlu_shadow_requests_total counter",
+            f'nlu_shadow_requests_total{{outcome="classified"}} {shadow["classified"]}',
+            f'nlu_shadow_requests_total{{outcome="dropped"}} {shadow["dropped"]}',
+            f'nlu_shadow_requests_total{{outcome="failed"}} {shadow["failed"]}',
+            "# HELP nlu_shadow_agreement Share of shadowed requests where the candidate chose the primary's intent",
+            "# TYPE nlu_shadow_agreement gauge",
+        ]
+        if shadow["agreement"] is not None:
+            lines.append(f"nlu_shadow_agreement {shadow['agreement']}")
+        for intent, s in shadow["per_intent"].items():
+            if s["agreement"] is not None:
+                lines.append(f'nlu_shadow_agreement{{intent="{intent}"}} {s["agreement"]}')
+        lines += [
+            "# HELP nlu_shadow_latency_delta_ms Mean candidate minus primary inference latency",
+            "# TYPE nlu_shadow_latency_delta_ms gauge",
+        ]
+        lines += [f'nlu_shadow_latency_delta_ms{{intent="{intent}"}} {s["latency_delta_ms"]}'
+                  for intent, s in shadow["per_intent"].items() if s["latency_delta_ms"] is not None]
+        lines += [
+            "# HELP nlu_primary_latency_ms Primary inference latency while the shadow worker is idle or busy",
+            "# TYPE nlu_primary_latency_ms gauge",
+        ]
+        for key, value in primary_path.items():
+            if key.startswith("shadow_") and value is not None:
+                state, quantile = key[len("shadow_"):].split("_")[:2]
+                lines.append(f'nlu_primary_latency_ms{{shadow="{state}",quantile="0.{quantile[1:]}"}} {value}')
+        return "\n".join(lines) + "\n"
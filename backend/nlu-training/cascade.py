@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Intent Cascade - cheap first stage, transformer only when uncertain
+===================================================================
+The first stage (an NgramIntentClassifier, see distill_intent.py) answers
+a message on its own when its confidence clears the calibrated threshold
+for the intent it predicted; otherwise the message escalates to the
+transformer. Greetings, "cart", "track" and the like never reach it.
+
+Thresholds live in cascade.json next to the first-stage model and are
+calibrated offline on one half of a held-out set; `expected` is measured
+on the other half (distill_intent.py --calibrate):
+
+    threshold    global: the lowest confidence at which the cascade's
+                 accuracy stays within `tolerance` of the transformer's
+    per_intent   intents with enough held-out support get their own:
+                 the lowest confidence at which the first stage is as
+                 accurate as the transformer on those messages (1.01 =
+                 always escalate)
+
+cascade.json also records the transformer the thresholds were calibrated
+against and the text normalization the student was distilled with.
+CascadeSwitch keeps a cascade on only while the server's primary model is
+that transformer, re-reading cascade.json whenever the primary changes
+(/admin/reload, /deploy, promotions); otherwise everything goes to the
+transformer.
+
+Cascade keeps per-stage counts and latency for the server's metrics.
+
+nlu-service-v2/ is a separate build context and carries a copy of this
+file and ngram_classifier.py; tests/test_shared_copies.py fails when they differ.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ngram_classifier import NgramIntentClassifier
+
+CONFIG_FILE = "cascade.json"
+NEVER = 1.01
+THRESHOLD_GRID = tuple(round(0.30 + 0.01 * i, 2) for i in range(70))  # 0.30 .. 0.99
+TOLERANCE = 0.005
+MIN_SUPPORT = 20
+STAGES = ("fast", "transformer")
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+# nlu-service-v2 feeds its transformer normalize_hindi(text); a student for it
+# is distilled with --normalize hindi so both stages see the same text
+HINDI_NORMALIZATIONS = {
+    r'\banndi\b': 'ande',
+    r'\bandi\b': 'ande',
+    r'\banda\b': 'anda',
+    r'\broti\b': 'roti',
+    r'\brotiya\b': 'roti',
+    r'\bchapati\b': 'roti',
+}
+
+
+def normalize_hindi(text: str) -> str:
+    """Normalize common Hindi misspellings."""
+    normalized = text.lower()
+    for pattern, replacement in HINDI_NORMALIZATIONS.items():
+        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
+    return normalized
+
+
+def _unchanged(text: str) -> str:
+    return text
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {"none": _unchanged, "hindi": normalize_hindi}
+
+
+def same_model(a: Optional[str], b: Optional[str]) -> bool:
+    """Same model directory, after resolving symlinks (e.g. indicbert_active); compared by name across mounts"""
+    if not a or not b:
+        return False
+    return os.path.basename(os.path.realpath(a.rstrip("/"))) == os.path.basename(os.path.realpath(b.rstrip("/")))
+
+
+# ============================================================================
+# CALIBRATION
+# ============================================================================
+
+
+def calibrate_thresholds(fast_pred: np.ndarray, fast_conf: np.ndarray, transformer_pred: np.ndarray,
+                         gold: np.ndarray, labels: Sequence[str], tolerance: float = TOLERANCE,
+                         min_support: int = MIN_SUPPORT) -> Dict[str, Any]:
+    """cascade.json contents from held-out predictions of both stages (class ids)"""
+    transformer_accuracy = float((transformer_pred == gold).mean())
+    fast_correct = fast_pred == gold
+    transformer_correct = transformer_pred == gold
+
+    def evaluate(thresholds: np.ndarray) -> Tuple[float, float]:
+        confident = fast_conf >= thresholds
+        return float(confident.mean()), float(np.where(confident, fast_correct, transformer_correct).mean())
+
+    threshold = NEVER
+    for t in THRESHOLD_GRID:
+        if evaluate(np.full(len(gold), t))[1] >= transformer_accuracy - tolerance:
+            threshold = t
+            break
+
+    per_intent: Dict[str, float] = {}
+    for class_id, label in enumerate(labels):
+        predicted = fast_pred == class_id
+        if predicted.sum() < min_support:
+            continue
+        per_intent[label] = NEVER
+        for t in THRESHOLD_GRID:
+            chosen = predicted & (fast_conf >= t)
+            if not chosen.any():
+                break
+            if fast_correct[chosen].mean() >= transformer_correct[chosen].mean() - tolerance:
+                per_intent[label] = t
+                break
+
+    row_thresholds = np.array([per_intent.get(labels[p], threshold) for p in fast_pred])
+    if evaluate(row_thresholds)[1] < transformer_accuracy - tolerance:
+        # Per-intent choices can add up past the tolerance; the global threshold alone holds it
+        per_intent = {}
+
+    config = {"threshold": threshold, "per_intent": per_intent, "tolerance": tolerance}
+    config["expected"] = expected_metrics(config, fast_pred, fast_conf, transformer_pred, gold, labels)
+    config["held_out"] = int(len(gold))
+    return config
+
+
+def expected_metrics(config: Dict[str, Any], fast_pred: np.ndarray, fast_conf: np.ndarray,
+                     transformer_pred: np.ndarray, gold: np.ndarray, labels: Sequence[str]) -> Dict[str, float]:
+    """Share answered by the first stage and cascade accuracy of a config on these predictions"""
+    thresholds = np.array([config["per_intent"].get(labels[p], config["threshold"]) for p in fast_pred])
+    confident = fast_conf >= thresholds
+    fast_correct = fast_pred == gold
+    transformer_correct = transformer_pred == gold
+    return {
+        "fast_share": round(float(confident.mean()), 4),
+        "accuracy": round(float(np.where(confident, fast_correct, transformer_correct).mean()), 4),
+        "transformer_accuracy": round(float(transformer_correct.mean()), 4),
+        "fast_only_accuracy": round(float(fast_correct.mean()), 4),
+    }
+
+
+# ============================================================================
+# SERVING
+# ============================================================================
+class Cascade:
+    def __init__(self, model: NgramIntentClassifier, config: Dict[str, Any], version: Optional[str] = None):
+        self.model = model
+        self.config = config
+        self.version = version
+        self.threshold = config["threshold"]
+        self.per_intent: Dict[str, float] = config.get("per_intent", {})
+        self.transformer: Optional[str] = config.get("transformer")
+        self.normalization = config.get("normalization", "none")
+        self._normalize = NORMALIZERS[self.normalization]
+
+        self._lock = threading.Lock()
+        self.counts = {stage: 0 for stage in STAGES}
+        self.latency_ms = {stage: 0.0 for stage in STAGES}
+
+    @classmethod
+    def load(cls, model_dir: str) -> "Cascade":
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            config = json.load(f)
+        return cls(NgramIntentClassifier.load(model_dir), config, version=model_dir)
+
+    def threshold_for(self, intent: str) -> float:
+        return self.per_intent.get(intent, self.threshold)
+
+    def first_stage(self, text: str) -> Tuple[str, float, float, bool]:
+        """(intent, confidence, latency_ms, answered); answered=False means escalate"""
+        start = time.perf_counter()
+        intent, confidence = self.model.predict([self._normalize(text)])[0]
+        elapsed = (time.perf_counter() - start) * 1000
+        answered = confidence >= self.threshold_for(intent)
+        if answered:
+            self.record("fast", elapsed)
+        return intent, confidence, elapsed, answered
+
+    def record(self, stage: str, latency_ms: float):
+        """Count a message against the stage that answered it (latency: all stages it went through)"""
+        with self._lock:
+            self.counts[stage] += 1
+            self.latency_ms[stage] += latency_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, latency = dict(self.counts), dict(self.latency_ms)
+        total = sum(counts.values())
+        return {
+            "version": self.version,
+            "transformer": self.transformer,
+            "normalization": self.normalization,
+            "threshold": self.threshold,
+            "per_intent_thresholds": len(self.per_intent),
+            "expected": self.config.get("expected"),
+            "requests": total,
+            "stages": {
+                stage: {
+                    "answered": counts[stage],
+                    "fraction": round(counts[stage] / total, 4) if total else None,
+                    "mean_latency_ms": round(latency[stage] / counts[stage], 3) if counts[stage] else None,
+                }
+                for stage in STAGES
+            },
+        }
+
+    def prometheus_text(self, prefix: str = "nlu") -> str:
+        stats = self.stats()
+        lines = [
+            f"# HELP {prefix}_cascade_requests_total Messages answered by each cascade stage",
+            f"# TYPE {prefix}_cascade_requests_total counter",
+        ]
+        lines += [f'{prefix}_cascade_requests_total{{stage="{stage}"}} {s["answered"]}'
+                  for stage, s in stats["stages"].items()]
+        lines += [
+            f"# HELP {prefix}_cascade_fraction Share of messages answered by each cascade stage",
+            f"# TYPE {prefix}_cascade_fraction gauge",
+        ]
+        lines += [f'{prefix}_cascade_fraction{{stage="{stage}"}} {s["fraction"]}'
+                  for stage, s in stats["stages"].items() if s["fraction"] is not None]
+        return "\n".join(lines) + "\n"
+
+
+class CascadeSwitch:
+    """
+    The cascade in `path`, used only while the primary transformer is the
+    one it was calibrated for and normalizes text the same way. get() is
+    called per request with the primary's version and reloads cascade.json
+    when that version (or where its symlink points) or the file changes.
+    """
+
+    def __init__(self, path: str, normalization: str = "none"):
+        self.path = path
+        self.normalization = normalization
+        self.cascade: Optional[Cascade] = None
+        self.reason = "no primary model loaded yet"
+        self._checked: Optional[Tuple[Optional[str], float]] = None
+        self._lock = threading.Lock()
+
+    def _key(self, transformer_version: Optional[str]) -> Tuple[Optional[str], float]:
+        try:
+            mtime = os.stat(os.path.join(self.path, CONFIG_FILE)).st_mtime
+        except OSError:
+            mtime = 0.0
+        return (os.path.realpath(transformer_version) if transformer_version else None), mtime
+
+    def get(self, transformer_version: Optional[str]) -> Optional[Cascade]:
+        key = self._key(transformer_version)
+        if key != self._checked:
+            with self._lock:
+                if key != self._checked:
+                    self._checked = key
+                    self._refresh(transformer_version)
+        return self.cascade
+
+    def _refresh(self, transformer_version: Optional[str]):
+        self.cascade = None
+        if transformer_version is None:
+            self.reason = "no primary model loaded"
+            return
+        try:
+            cascade = Cascade.load(self.path)
+        except Exception as e:
+            self.reason = f"failed to load {self.path}: {e}"
+            logger.error(f"Cascade disabled, {self.reason}")
+            return
+        if not same_model(cascade.transformer, transformer_version):
+            self.reason = (f"calibrated for {cascade.transformer}, primary is {transformer_version}; "
+                           f"re-run distill_intent.py --calibrate")
+        elif cascade.normalization != self.normalization:
+            self.reason = (f"distilled with '{cascade.normalization}' normalization, "
+                           f"the server uses '{self.normalization}'")
+        else:
+            self.cascade = cascade
+            self.reason = None
+            logger.info(f"Cascade first stage loaded from {self.path} for {transformer_version} "
+                        f"(threshold {cascade.threshold}, {len(cascade.per_intent)} per-intent)")
+            return
+        logger.warning(f"Cascade disabled: {self.reason}")
+
+    def status(self) -> Dict[str, Any]:
+        if self.cascade is None:
+            return {"enabled": False, "path": self.path, "reason": self.reason}
+        return {"enabled": True, **self.cascade.stats()}
@@ -6,8 +6,17 @@ NLU/NER Data Cleanup and Merge Script
 This script:
 1. Merges all NLU training data files
 2. Removes duplicates
-3. Normalizes intents to a standard set
-4. Creates clean, deduplicated training data
+3. Removes near-duplicate paraphrases (MinHash/LSH, see near_dedup.py)
+4. Normalizes intents to a standard set
+5. Creates clean, deduplicated training data
+
+NEAR_DUP_THRESHOLD (default 0.85, 0 disables) sets how similar two sentences
+must be to count as near-duplicates; NEAR_DUP_PER_CLUSTER how many paraphrases
+of one cluster are kept.
+
+Inputs are streamed (streaming_merge.py): files are parsed in parallel worker
+processes and deduplicated against an on-disk hash set, so memory does not
+grow with the number or size of input files. MERGE_WORKERS sets the pool size.
 
 According to NLU_ARCHITECTURE_REDESIGN.md:
 - NLU should extract GENERIC slots (food_reference, store_reference, location_reference)
@@ -15,12 +24,17 @@ According to NLU_ARCHITECTURE_REDESIGN.md:
 - Entity resolution happens in a separate layer
 """
 
-import json
 import os
 import re
 from collections import Counter, defaultdict
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Iterator, List, Tuple
+
+from near_dedup import format_report
+from streaming_merge import MERGE_WORKERS, iter_jsonl, merge_stream
+
+NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', '0.85'))
+NEAR_DUP_PER_CLUSTER = int(os.environ.get('NEAR_DUP_PER_CLUSTER', '1'))
 
 # ============================================================
 # STANDARD INTENT DEFINITIONS (from docs)
@@ -183,99 +197,52 @@ def normalize_entity_label(label: str) -> str:
     return NER_ENTITY_MAPPING.get(label, label.upper())
 
 
-def load_nlu_file(filepath: str) -> List[dict]:
-    """Load NLU training file"""
-    samples = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                data = json.loads(line.strip())
-                if 'text' in data and 'intent' in data:
-                    samples.append(data)
-            except:
-                continue
-    return samples
-
-
-def load_ner_file(filepath: str) -> List[dict]:
-    """Load NER training file"""
-    samples = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                data = json.loads(line.strip())
-                if 'text' in data and 'entities' in data:
-                    samples.append(data)
-            except:
-                continue
-    return samples
+def load_nlu_file(filepath: str) -> Iterator[dict]:
+    """Stream NLU training file"""
+    return (data for data in iter_jsonl(filepath) if 'text' in data and 'intent' in data)
+
+
+def load_ner_file(filepath: str) -> Iterator[dict]:
+    """Stream NER training file"""
+    return (data for data in iter_jsonl(filepath) if 'text' in data and 'entities' in data)
+
+
+def _print_merge(name: str, stats: dict):
+    for filename, count in stats['files'].items():
+        print(f"  Loaded {count} from {filename}")
+    if stats['invalid']:
+        print(f"  Skipped {stats['invalid']} invalid lines")
+    if stats['near_dedup']:
+        print(format_report(f"  {name} near-dedup", stats['near_dedup']))
+    print(f"  Streamed in {stats['elapsed_s']}s")
 
 
 def merge_nlu_data(files: List[str], output_path: str) -> Tuple[int, int, dict]:
     """Merge NLU training files, deduplicate, normalize"""
-    all_samples = []
-    for f in files:
-        if os.path.exists(f):
-            samples = load_nlu_file(f)
-            print(f"  Loaded {len(samples)} from {os.path.basename(f)}")
-            all_samples.extend(samples)
-    
-    # Deduplicate
-    seen = set()
-    unique_samples = []
-    for sample in all_samples:
-        key = (normalize_text(sample['text']), normalize_intent(sample['intent']))
-        if key not in seen:
-            seen.add(key)
-            # Normalize the sample
-            sample['text'] = sample['text'].strip()
-            sample['intent'] = normalize_intent(sample['intent'])
-            unique_samples.append(sample)
-    
-    # Count intents
-    intent_counts = Counter(s['intent'] for s in unique_samples)
-    
-    # Write output
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for sample in unique_samples:
-            f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-    
-    return len(all_samples), len(unique_samples), dict(intent_counts)
+    # Near-duplicates: one representative per paraphrase cluster per intent
+    stats = merge_stream(
+        files, output_path, 'nlu',
+        normalize_intent=normalize_intent,
+        workers=MERGE_WORKERS,
+        near_dup_threshold=NEAR_DUP_THRESHOLD,
+        near_dup_per_cluster=NEAR_DUP_PER_CLUSTER,
+    )
+    _print_merge("NLU", stats)
+    return stats['total'], stats['unique'], stats['counts']
 
 
 def merge_ner_data(files: List[str], output_path: str) -> Tuple[int, int, dict]:
     """Merge NER training files, deduplicate, normalize"""
-    all_samples = []
-    for f in files:
-        if os.path.exists(f):
-            samples = load_ner_file(f)
-            print(f"  Loaded {len(samples)} from {os.path.basename(f)}")
-            all_samples.extend(samples)
-    
-    # Deduplicate by text
-    seen = set()
-    unique_samples = []
-    for sample in all_samples:
-        key = normalize_text(sample['text'])
-        if key not in seen:
-            seen.add(key)
-            # Normalize entity labels
-            for ent in sample.get('entities', []):
-                ent['label'] = normalize_entity_label(ent['label'])
-            unique_samples.append(sample)
-    
-    # Count entities
-    entity_counts = Counter()
-    for sample in unique_samples:
-        for ent in sample.get('entities', []):
-            entity_counts[ent['label']] += 1
-    
-    # Write output
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for sample in unique_samples:
-            f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-    
-    return len(all_samples), len(unique_samples), dict(entity_counts)
+    # Dedup by text; near-duplicates are clustered per entity label set
+    stats = merge_stream(
+        files, output_path, 'ner',
+        normalize_label=normalize_entity_label,
+        workers=MERGE_WORKERS,
+        near_dup_threshold=NEAR_DUP_THRESHOLD,
+        near_dup_per_cluster=NEAR_DUP_PER_CLUSTER,
+    )
+    _print_merge("NER", stats)
+    return stats['total'], stats['unique'], stats['counts']
 
 
 def validate_data(nlu_path: str, ner_path: str):
@@ -283,9 +250,10 @@ def validate_data(nlu_path: str, ner_path: str):
     print("\n=== VALIDATION ===")
     
     # NLU validation
-    nlu_samples = load_nlu_file(nlu_path)
+    intent_counts = Counter()
     unknown_intents = set()
-    for s in nlu_samples:
+    for s in load_nlu_file(nlu_path):
+        intent_counts[s['intent']] += 1
         if s['intent'] not in STANDARD_INTENTS:
             unknown_intents.add(s['intent'])
     
@@ -295,9 +263,8 @@ def validate_data(nlu_path: str, ner_path: str):
         print("✅ All NLU intents are standard")
     
     # NER validation
-    ner_samples = load_ner_file(ner_path)
     unknown_entities = set()
-    for s in ner_samples:
+    for s in load_ner_file(ner_path):
         for ent in s.get('entities', []):
             if ent['label'] not in STANDARD_ENTITIES:
                 unknown_entities.add(ent['label'])
@@ -308,7 +275,6 @@ def validate_data(nlu_path: str, ner_path: str):
         print("✅ All NER entity labels are standard")
     
     # Check balance
-    intent_counts = Counter(s['intent'] for s in nlu_samples)
     min_count = min(intent_counts.values())
     max_count = max(intent_counts.values())
     
@@ -346,7 +312,7 @@ def main():
     # Merge NLU
     print("\n=== MERGING NLU DATA ===")
     total, unique, intents = merge_nlu_data(nlu_files, nlu_output)
-    print(f"\nNLU: {total} total → {unique} unique ({total - unique} duplicates removed)")
+    print(f"\nNLU: {total} total → {unique} unique ({total - unique} exact and near duplicates removed)")
     print(f"Intents: {len(intents)}")
     for intent, count in sorted(intents.items(), key=lambda x: -x[1])[:15]:
         print(f"  {intent}: {count}")
@@ -354,7 +320,7 @@ def main():
     # Merge NER
     print("\n=== MERGING NER DATA ===")
     total, unique, entities = merge_ner_data(ner_files, ner_output)
-    print(f"\nNER: {total} total → {unique} unique ({total - unique} duplicates removed)")
+    print(f"\nNER: {total} total → {unique} unique ({total - unique} exact and near duplicates removed)")
     print(f"Entity types: {len(entities)}")
     for entity, count in sorted(entities.items(), key=lambda x: -x[1]):
         print(f"  {entity}: {count}")
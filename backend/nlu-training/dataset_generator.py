@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Dataset Generator - concurrent, resumable LLM training-data generation
+=======================================================================
+Engine behind the generate_v1x dataset scripts. The scripts supply the
+prompt (build_payload) and the acceptance filter (accept); the engine does:
+
+- N concurrent requests to an OpenAI-compatible endpoint (vLLM batches
+  them; one request at a time leaves the GPU mostly idle)
+- Quota scheduling: every free slot goes to the intent with the lowest
+  fill ratio, counting samples already requested, so under-filled
+  intents are served first and no intent overshoots its target
+- Retries with backoff on 429/5xx/transport errors; an intent is parked
+  after too many consecutive failures or attempts
+- Checkpointing: accepted samples are appended + fsynced, then
+  <output>.ckpt.json records the output size, per-intent attempts and
+  token totals. On restart the output is truncated to the checkpointed
+  size (dropping a half-written batch), the accept filter is re-seeded
+  from it and generation continues where it stopped
+- A dashboard line every few seconds: accepted samples/s, tokens/s,
+  requests, errors, in-flight, least-filled intent
+
+Test without a GPU against stub_llm_server.py:
+    python stub_llm_server.py &
+    VLLM_URL=http://localhost:8002/v1/chat/completions python ../training/generate_v17_universal.py
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# Configuration
+GEN_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "8"))
+GEN_MAX_RETRIES = int(os.getenv("GEN_MAX_RETRIES", "3"))
+GEN_RETRY_BACKOFF_S = float(os.getenv("GEN_RETRY_BACKOFF_S", "1.0"))
+GEN_TIMEOUT_S = float(os.getenv("GEN_TIMEOUT_S", "90"))
+GEN_DASHBOARD_INTERVAL_S = float(os.getenv("GEN_DASHBOARD_INTERVAL_S", "5"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+CHECKPOINT_VERSION = 1
+
+
+def parse_json_array(content: str) -> List[str]:
+    """Strings from a (possibly markdown-wrapped) JSON array in an LLM reply"""
+    content = content.replace("```json", "").replace("```", "").strip()
+    match = re.search(r'\[.*\]', content, re.DOTALL)
+    if match:
+        content = match.group()
+    return [m.strip() for m in json.loads(content) if isinstance(m, str)]
+
+
+class QuotaScheduler:
+    """Hands out (intent, count) requests, least-filled intent first."""
+
+    def __init__(self, targets: Dict[str, int], counts: Dict[str, int], batch_size: int = 30,
+                 min_batch: int = 10, max_attempts: int = 100, max_consecutive_failures: int = 5):
+        self.targets = dict(targets)
+        self.counts = {intent: counts.get(intent, 0) for intent in targets}
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_attempts = max_attempts
+        self.max_consecutive_failures = max_consecutive_failures
+        self.requested = {intent: 0 for intent in targets}  # samples asked for by requests in flight
+        self.attempts = {intent: 0 for intent in targets}
+        self.failures = {intent: 0 for intent in targets}   # consecutive
+
+    def _open(self, intent: str) -> bool:
+        return (self.counts[intent] < self.targets[intent]
+                and self.attempts[intent] < self.max_attempts
+                and self.failures[intent] <= self.max_consecutive_failures)
+
+    def fill(self, intent: str) -> float:
+        return (self.counts[intent] + self.requested[intent]) / max(1, self.targets[intent])
+
+    def next(self) -> Optional[Tuple[str, int]]:
+        """Next request, or None if every open intent is covered by requests in flight"""
+        candidates = [
+            intent for intent in self.targets
+            if self._open(intent) and self.counts[intent] + self.requested[intent] < self.targets[intent]
+        ]
+        if not candidates:
+            return None
+        intent = min(candidates, key=self.fill)
+        needed = self.targets[intent] - self.counts[intent] - self.requested[intent]
+        count = min(self.batch_size, max(self.min_batch, needed))
+        self.requested[intent] += count
+        self.attempts[intent] += 1
+        return intent, count
+
+    def complete(self, intent: str, requested: int, accepted: int, ok: bool):
+        self.requested[intent] -= requested
+        self.counts[intent] += accepted
+        self.failures[intent] = 0 if ok and accepted else self.failures[intent] + 1
+
+    def room(self, intent: str) -> int:
+        return max(0, self.targets[intent] - self.counts[intent])
+
+    @property
+    def exhausted(self) -> bool:
+        """Nothing left to schedule now or later"""
+        return not any(self._open(intent) for intent in self.targets)
+
+    def parked(self) -> List[str]:
+        return [i for i in self.targets if self.counts[i] < self.targets[i] and not self._open(i)]
+
+
+class GenerationEngine:
+    def __init__(
+        self,
+        url: str,
+        build_payload: Callable[[str, int], Dict],
+        targets: Dict[str, int],
+        output_file: str,
+        accept: Callable[[str, str], bool],
+        checkpoint_file: Optional[str] = None,
+        concurrency: int = GEN_CONCURRENCY,
+        batch_size: int = 30,
+        min_batch: int = 10,
+        max_attempts: int = 100,
+        max_consecutive_failures: int = 5,
+        parse: Callable[[str], List[str]] = parse_json_array,
+        client: Optional[httpx.AsyncClient] = None,
+        dashboard_interval: float = GEN_DASHBOARD_INTERVAL_S,
+    ):
+        """
+        build_payload(intent, count) -> chat completion request body.
+        accept(text, intent) -> keep the generated text? It is also called for
+        every sample already in output_file on resume, so it can rebuild its
+        dedup state; its return value is ignored there.
+        """
+        self.url = url
+        self.build_payload = build_payload
+        self.targets = targets
+        self.output_file = output_file
+        self.checkpoint_file = checkpoint_file or f"{output_file}.ckpt.json"
+        self.accept = accept
+        self.concurrency = max(1, concurrency)
+        self.parse = parse
+        self._client = client
+        self.dashboard_interval = dashboard_interval
+        self._scheduler_args = dict(batch_size=batch_size, min_batch=min_batch, max_attempts=max_attempts,
+                                    max_consecutive_failures=max_consecutive_failures)
+
+        self.scheduler: Optional[QuotaScheduler] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.resumed_from = 0
+        self._restore_attempts: Dict[str, int] = {}
+        self._tokens_before = 0
+        self._elapsed_before = 0.0
+        self._started = 0.0
+        self._out = None
+        self._changed: Optional[asyncio.Condition] = None
+
+    # ------------------------------------------------------------------
+    # Checkpoint / resume
+    # ------------------------------------------------------------------
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        with open(self.checkpoint_file) as f:
+            checkpoint = json.load(f)
+        return checkpoint if checkpoint.get("version") == CHECKPOINT_VERSION else {}
+
+    def _resume(self) -> Dict[str, int]:
+        """Restore totals, cut the output back to the last checkpoint and count it"""
+        checkpoint = self._load_checkpoint()
+        counts = {intent: 0 for intent in self.targets}
+        if not os.path.exists(self.output_file):
+            return counts
+
+        size = checkpoint.get("output_bytes")
+        if size is not None and os.path.getsize(self.output_file) > size:
+            # Lines written after the last checkpoint belong to a batch that never completed
+            with open(self.output_file, "r+b") as f:
+                f.truncate(size)
+
+        with open(self.output_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                text, intent = data.get("text", ""), data.get("intent", "")
+                self.accept(text, intent)
+                if intent in counts:
+                    counts[intent] += 1
+                    self.resumed_from += 1
+
+        self.prompt_tokens = checkpoint.get("prompt_tokens", 0)
+        self.completion_tokens = checkpoint.get("completion_tokens", 0)
+        self.requests = checkpoint.get("requests", 0)
+        self.errors = checkpoint.get("errors", 0)
+        self.retries = checkpoint.get("retries", 0)
+        self.accepted = checkpoint.get("accepted", 0)
+        self.rejected = checkpoint.get("rejected", 0)
+        self._tokens_before = self.prompt_tokens + self.completion_tokens
+        self._elapsed_before = checkpoint.get("elapsed_s", 0.0)
+        self._restore_attempts = checkpoint.get("attempts", {})
+        return counts
+
+    def _write_checkpoint(self):
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "output_bytes": self._out.tell(),
+            "updated_at": time.time(),
+            "elapsed_s": round(self.elapsed(), 2),
+            "counts": self.scheduler.counts,
+            "attempts": self.scheduler.attempts,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        }
+        tmp = f"{self.checkpoint_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp, self.checkpoint_file)
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+    async def _post(self, payload: Dict) -> Optional[Dict]:
+        """POST with retries on transient errors; None once they are used up"""
+        for attempt in range(GEN_MAX_RETRIES + 1):
+            retryable = attempt < GEN_MAX_RETRIES
+            try:
+                response = await self._client.post(self.url, json=payload, timeout=GEN_TIMEOUT_S)
+                if response.status_code == 200:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        return None
+                if response.status_code not in RETRYABLE_STATUS:
+                    print(f"  HTTP {response.status_code}: {response.text[:200]}")
+                    return None
+            except httpx.TransportError as e:
+                if not retryable:
+                    print(f"  Request failed: {e}")
+            if retryable:
+                self.retries += 1
+                await asyncio.sleep(GEN_RETRY_BACKOFF_S * (2 ** attempt))
+        return None
+
+    async def _generate(self, intent: str, count: int):
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            data = await self._post(self.build_payload(intent, count))
+        finally:
+            self.in_flight -= 1
+
+        kept: List[str] = []
+        if data is None:
+            self.errors += 1
+        else:
+            usage = data.get("usage") or {}
+            self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+            self.completion_tokens += usage.get("completion_tokens", 0) or 0
+            try:
+                messages = self.parse(data["choices"][0]["message"]["content"])
+            except (KeyError, IndexError, TypeError, ValueError):
+                messages = []
+                self.errors += 1
+            room = self.scheduler.room(intent)
+            for text in messages:
+                if len(kept) >= room:
+                    break
+                if self.accept(text, intent):
+                    kept.append(text)
+                else:
+                    self.rejected += 1
+
+        # Single writer: the event loop runs one completion at a time
+        for text in kept:
+            self._out.write(json.dumps({"text": text, "intent": intent}, ensure_ascii=False) + "\n")
+        if kept:
+            self._out.flush()
+            os.fsync(self._out.fileno())
+        self.accepted += len(kept)
+        self.scheduler.complete(intent, count, len(kept), ok=data is not None)
+        self._write_checkpoint()
+
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                while (job := self.scheduler.next()) is None:
+                    if self.scheduler.exhausted:
+                        return
+                    await self._changed.wait()
+            try:
+                await self._generate(*job)
+            finally:
+                async with self._changed:
+                    self._changed.notify_all()
+
+    # ------------------------------------------------------------------
+    # Progress
+    # ------------------------------------------------------------------
+    def elapsed(self) -> float:
+        return self._elapsed_before + (time.time() - self._started if self._started else 0.0)
+
+    def progress(self) -> Dict[str, Any]:
+        session = max(time.time() - self._started, 1e-9)
+        tokens = self.prompt_tokens + self.completion_tokens
+        lowest = min(self.targets, key=lambda i: self.scheduler.counts[i] / max(1, self.targets[i]))
+        return {
+            "samples": sum(self.scheduler.counts.values()),
+            "target": sum(self.targets.values()),
+            "accepted_per_s": round((sum(self.scheduler.counts.values()) - self.resumed_from) / session, 2),
+            "tokens": tokens,
+            "tokens_per_s": round((tokens - self._tokens_before) / session, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "lowest": {"intent": lowest, "count": self.scheduler.counts[lowest], "target": self.targets[lowest]},
+            "parked": self.scheduler.parked(),
+            "elapsed_s": round(self.elapsed(), 1),
+        }
+
+    def dashboard_line(self) -> str:
+        p = self.progress()
+        low = p["lowest"]
+        return (f"[{p['elapsed_s']:7.1f}s] {p['samples']}/{p['target']} samples  "
+                f"{p['accepted_per_s']:.1f} accepted/s  {p['tokens_per_s']:,.0f} tok/s  "
+                f"req {p['requests']} (err {p['errors']}, retry {p['retries']}, in flight {p['in_flight']})  "
+                f"rejected {p['rejected']}  lowest {low['intent']} {low['count']}/{low['target']}")
+
+    async def _dashboard(self):
+        while True:
+            await asyncio.sleep(self.dashboard_interval)
+            print(self.dashboard_line(), flush=True)
+
+    # ------------------------------------------------------------------
+    async def run(self) -> Dict[str, Any]:
+        """Generate until every intent reaches its target or is parked"""
+        counts = self._resume()
+        self.scheduler = QuotaScheduler(self.targets, counts, **self._scheduler_args)
+        for intent, attempts in self._restore_attempts.items():
+            if intent in self.scheduler.attempts:
+                self.scheduler.attempts[intent] = attempts
+        if self.resumed_from:
+            print(f"Resuming: {self.resumed_from} samples already in {self.output_file}")
+
+        self._changed = asyncio.Condition()
+        self._started = time.time()
+        own_client = self._client is None
+        if own_client:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                timeout=httpx.Timeout(GEN_TIMEOUT_S)
+            )
+        dashboard = asyncio.create_task(self._dashboard())
+        try:
+            with open(self.output_file, "a", encoding="utf-8") as self._out:
+                workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    # One worker failing (or Ctrl-C) stops the rest; the checkpoint is always consistent
+                    for worker in workers:
+                        worker.cancel()
+                self._write_checkpoint()
+        finally:
+            dashboard.cancel()
+            if own_client:
+                await self._client.aclose()
+                self._client = None
+
+        print(self.dashboard_line(), flush=True)
+        return self.progress()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Intent Distillation - train a small CPU student from the IndicBERT teacher
+==========================================================================
+The teacher (any saved intent model: train.py, train_indicbert_v3*.py)
+labels the corpus with its logits; the student learns from the softened
+teacher distribution plus the gold labels:
+
+    loss = alpha * T^2 * KL(student/T || teacher/T) + (1 - alpha) * CE(student, gold)
+
+Students:
+    ngram      fastText-style hashed n-gram model (ngram_classifier.py)
+    layers:N   the teacher cut to its first N transformer layers
+               (initialised from the teacher's weights)
+
+The student is saved with the teacher's label map (labels.json and
+label_mapping.json) and a distill_report.json comparing teacher and
+student on the held-out split: accuracy, F1, CPU latency (batch 1), size,
+and the cascade table - per confidence threshold, the share the student
+answers alone, the accuracy when the teacher takes the rest and the
+expected mean latency.
+
+The held-out split is train.py's validation split (same filter, 15%,
+stratified, seed 42), so a train.py teacher is scored on data it did not
+train on.
+
+ngram students also get cascade.json: confidence thresholds calibrated on
+half of the held-out split so the cascade (cascade.py) stays within
+tolerance of the teacher's accuracy, with the expected accuracy and
+coverage measured on the other half. cascade.json names the teacher
+(resolved path); servers only use the cascade while they serve that model.
+--calibrate recomputes it for an existing student (e.g. after a new teacher).
+
+--normalize must match what the target server feeds its transformer:
+"hindi" for nlu-service-v2 (normalize_text), "none" for nlu_server_v3.
+Teacher and student are both run on the normalized text.
+
+Usage:
+    python distill_intent.py --teacher /models/indicbert_active \\
+        --data nlu_v8_final.jsonl --output /models/intent_student_ngram --student ngram
+    python distill_intent.py --teacher /models/indicbert_active \\
+        --data nlu_v8_final.jsonl --output /models/intent_student_l4 --student layers:4
+    python distill_intent.py --teacher /models/indicbert_v8 \\
+        --data nlu_v8_final.jsonl --output /models/intent_student_ngram --calibrate
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+from cascade import CONFIG_FILE as CASCADE_FILE, NORMALIZERS, TOLERANCE, calibrate_thresholds, expected_metrics
+from ngram_classifier import NgramIntentClassifier
+from train import analyze_data, load_label_map, load_training_data
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+MAX_LENGTH = 64
+TEMPERATURE = 2.0
+ALPHA = 0.7
+# Per student type: epochs, batch size, learning rate
+STUDENT_DEFAULTS = {
+    "ngram": (30, 64, 5e-3),
+    "layers": (6, 32, 5e-5),
+}
+CASCADE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+LATENCY_SAMPLES = 200
+
+# texts -> logits, in train or eval mode as the caller set it
+LogitsFn = Callable[[Sequence[str]], torch.Tensor]
+
+
+# ============================================================================
+# TEACHER
+# ============================================================================
+def load_teacher(model_dir: str, device: torch.device):
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_dir, trust_remote_code=True, torch_dtype=torch.float32).to(device).eval()
+    return tokenizer, model
+
+
+def transformer_logits_fn(tokenizer, model) -> LogitsFn:
+    def logits(texts: Sequence[str]) -> torch.Tensor:
+        inputs = tokenizer(list(texts), padding=True, truncation=True, max_length=MAX_LENGTH,
+                           return_tensors="pt").to(model.device)
+        return model(**inputs).logits.float()
+    return logits
+
+
+@torch.no_grad()
+def batched_logits(logits_fn: LogitsFn, texts: Sequence[str], batch_size: int = 64) -> torch.Tensor:
+    return torch.cat([logits_fn(texts[i:i + batch_size]).cpu() for i in range(0, len(texts), batch_size)])
+
+
+# ============================================================================
+# STUDENT
+# ============================================================================
+def build_student(spec: str, teacher_dir: str, labels: List[str], device: torch.device):
+    """(student module, logits_fn, tokenizer or None) for 'ngram' or 'layers:N'"""
+    if spec == "ngram":
+        student = NgramIntentClassifier(labels).to(device)
+        return student, student.logits, None
+    if spec.startswith("layers:"):
+        layers = int(spec.split(":", 1)[1])
+        config = AutoConfig.from_pretrained(teacher_dir, trust_remote_code=True)
+        logger.info(f"   Student: first {layers} of {config.num_hidden_layers} teacher layers")
+        config.num_hidden_layers = layers
+        # Weights of layers >= N are skipped when loading
+        student = AutoModelForSequenceClassification.from_pretrained(
+            teacher_dir, config=config, trust_remote_code=True, torch_dtype=torch.float32).to(device)
+        tokenizer = AutoTokenizer.from_pretrained(teacher_dir, trust_remote_code=True)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return student, transformer_logits_fn(tokenizer, student), tokenizer
+    raise ValueError(f"Unknown student: {spec} (use 'ngram' or 'layers:N')")
+
+
+def distillation_loss(student_logits: torch.Tensor, teacher_logits: torch.Tensor, labels: torch.Tensor,
+                      temperature: float = TEMPERATURE, alpha: float = ALPHA) -> torch.Tensor:
+    soft = F.kl_div(F.log_softmax(student_logits / temperature, dim=-1),
+                    F.softmax(teacher_logits / temperature, dim=-1),
+                    reduction="batchmean") * temperature ** 2
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def train_student(student: torch.nn.Module, logits_fn: LogitsFn, texts: List[str], teacher: torch.Tensor,
+                  gold: torch.Tensor, epochs: int, batch_size: int, learning_rate: float,
+                  temperature: float = TEMPERATURE, alpha: float = ALPHA, seed: int = 42):
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate, weight_decay=0.01)
+    steps = epochs * ((len(texts) + batch_size - 1) // batch_size)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda step: max(0.0, 1 - step / max(steps, 1)))
+    device = next(student.parameters()).device
+    generator = torch.Generator().manual_seed(seed)
+
+    student.train()
+    for epoch in range(epochs):
+        start = time.time()
+        order = torch.randperm(len(texts), generator=generator).tolist()
+        total = 0.0
+        for i in range(0, len(order), batch_size):
+            batch = order[i:i + batch_size]
+            logits = logits_fn([texts[j] for j in batch])
+            loss = distillation_loss(logits, teacher[batch].to(device), gold[batch].to(device), temperature, alpha)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            total += loss.item() * len(batch)
+        logger.info(f"   Epoch {epoch + 1}/{epochs}: loss {total / len(texts):.4f} ({time.time() - start:.1f}s)")
+    student.eval()
+
+
+# ============================================================================
+# EVALUATION
+# ============================================================================
+def scores(logits: torch.Tensor) -> Tuple[np.ndarray, np.ndarray]:
+    """(predicted class, confidence) per row"""
+    confidence, predicted = torch.softmax(logits, dim=-1).max(dim=-1)
+    return predicted.numpy(), confidence.numpy()
+
+
+@torch.no_grad()
+def measure_latency(logits_fn: LogitsFn, texts: Sequence[str], warmup: int = 10) -> Dict[str, float]:
+    """Single-message latency, the way /classify calls the model"""
+    for text in texts[:warmup]:
+        logits_fn([text])
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        logits_fn([text])
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(float(np.mean(timings)), 3),
+    }
+
+
+def dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / 1024 ** 2, 1)
+
+
+def cascade_table(student_pred: np.ndarray, student_conf: np.ndarray, teacher_pred: np.ndarray,
+                  gold: np.ndarray, student_ms: float, teacher_ms: float,
+                  thresholds: Sequence[float] = CASCADE_THRESHOLDS) -> List[Dict[str, float]]:
+    """Student answers at confidence >= threshold, the teacher answers the rest"""
+    rows = []
+    for threshold in thresholds:
+        confident = student_conf >= threshold
+        cascade = np.where(confident, student_pred, teacher_pred)
+        share = float(confident.mean())
+        rows.append({
+            "threshold": threshold,
+            "student_share": round(share, 4),
+            "student_accuracy_when_confident": round(float((student_pred == gold)[confident].mean()), 4)
+            if confident.any() else None,
+            "accuracy": round(float((cascade == gold).mean()), 4),
+            # Escalated messages pay for both models
+            "mean_latency_ms": round(student_ms + (1 - share) * teacher_ms, 3),
+        })
+    return rows
+
+
+# ============================================================================
+# DISTILL
+# ============================================================================
+def held_out_split(data: List[Dict], label2id: Dict[str, int]) -> Tuple[List[Dict], List[Dict]]:
+    """train.py's filter and validation split, restricted to intents the teacher knows"""
+    data, _, _, _ = analyze_data(data, min_samples=3)
+    train_data, test_data = train_test_split(
+        data, test_size=0.15, random_state=42, stratify=[d['intent'] for d in data])
+    unknown = sum(d['intent'] not in label2id for d in data)
+    if unknown:
+        logger.warning(f"⚠️ Dropping {unknown} samples with intents the teacher does not know")
+    return ([d for d in train_data if d['intent'] in label2id],
+            [d for d in test_data if d['intent'] in label2id])
+
+
+def calibration_split(gold: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Held-out row indices halved: (calibration, evaluation), stratified when every class allows it"""
+    rows = np.arange(len(gold))
+    stratify = gold if min(Counter(gold.tolist()).values()) >= 2 else None
+    calibration, evaluation = train_test_split(rows, test_size=0.5, random_state=42, stratify=stratify)
+    return np.sort(calibration), np.sort(evaluation)
+
+
+def write_cascade_config(output_dir: str, student_pred: np.ndarray, student_conf: np.ndarray,
+                         teacher_pred: np.ndarray, gold: np.ndarray, labels: List[str],
+                         teacher_dir: str, normalization: str = "none", tolerance: float = TOLERANCE) -> Dict:
+    """Thresholds from one half of the held-out predictions, expected numbers from the other"""
+    cal, ev = calibration_split(gold)
+    config = calibrate_thresholds(student_pred[cal], student_conf[cal], teacher_pred[cal], gold[cal],
+                                  labels, tolerance)
+    config["calibration_expected"] = config.pop("expected")
+    config["expected"] = expected_metrics(config, student_pred[ev], student_conf[ev], teacher_pred[ev],
+                                          gold[ev], labels)
+    config["held_out"] = {"calibration": int(len(cal)), "evaluation": int(len(ev))}
+    config["transformer"] = os.path.realpath(teacher_dir)
+    config["normalization"] = normalization
+    config["calibrated_at"] = datetime.now().isoformat()
+    with open(os.path.join(output_dir, CASCADE_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    expected = config["expected"]
+    logger.info(f"🎚️ Cascade threshold {config['threshold']} ({len(config['per_intent'])} per-intent): "
+                f"{expected['fast_share']:.1%} answered by the student, accuracy {expected['accuracy']:.4f} "
+                f"vs teacher {expected['transformer_accuracy']:.4f}")
+    return config
+
+
+def calibrate(teacher_dir: str, student_dir: str, data: List[Dict], normalization: str = "none",
+              tolerance: float = TOLERANCE) -> Dict:
+    """Recompute cascade.json for a saved ngram student"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    labels = load_label_map(teacher_dir)
+    label2id = {label: i for i, label in enumerate(labels)}
+    student = NgramIntentClassifier.load(student_dir)
+    if student.labels != labels:
+        raise ValueError(f"Student {student_dir} was not distilled with the label map of {teacher_dir}")
+
+    _, test_data = held_out_split(data, label2id)
+    texts = [NORMALIZERS[normalization](d['text']) for d in test_data]
+    gold = np.array([label2id[d['intent']] for d in test_data])
+    teacher_tokenizer, teacher = load_teacher(teacher_dir, device)
+    teacher_pred, _ = scores(batched_logits(transformer_logits_fn(teacher_tokenizer, teacher), texts))
+    student_pred, student_conf = scores(batched_logits(student.logits, texts))
+    return write_cascade_config(student_dir, student_pred, student_conf, teacher_pred, gold, labels,
+                                teacher_dir, normalization, tolerance)
+
+
+def distill(teacher_dir: str, data: List[Dict], output_dir: str, student_spec: str = "ngram",
+            epochs: Optional[int] = None, batch_size: Optional[int] = None,
+            learning_rate: Optional[float] = None, temperature: float = TEMPERATURE,
+            alpha: float = ALPHA, latency_threads: int = 1, normalization: str = "none") -> Dict:
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    default_epochs, default_batch, default_lr = STUDENT_DEFAULTS[student_spec.split(":")[0]]
+    epochs = epochs or default_epochs
+    batch_size = batch_size or default_batch
+    learning_rate = learning_rate or default_lr
+
+    labels = load_label_map(teacher_dir)
+    label2id = {label: i for i, label in enumerate(labels)}
+
+    train_data, test_data = held_out_split(data, label2id)
+    normalize = NORMALIZERS[normalization]
+    train_texts = [normalize(d['text']) for d in train_data]
+    test_texts = [normalize(d['text']) for d in test_data]
+    train_gold = torch.tensor([label2id[d['intent']] for d in train_data])
+    test_gold = np.array([label2id[d['intent']] for d in test_data])
+    logger.info(f"📂 Train={len(train_texts)}, Held-out={len(test_texts)}, Labels={len(labels)}")
+
+    logger.info(f"🎓 Teacher: {teacher_dir}")
+    teacher_tokenizer, teacher = load_teacher(teacher_dir, device)
+    teacher_fn = transformer_logits_fn(teacher_tokenizer, teacher)
+    train_teacher_logits = batched_logits(teacher_fn, train_texts)
+    test_teacher_logits = batched_logits(teacher_fn, test_texts)
+    teacher_pred, _ = scores(test_teacher_logits)
+    logger.info(f"   Teacher held-out accuracy: {accuracy_score(test_gold, teacher_pred):.4f}")
+
+    logger.info(f"🧒 Student: {student_spec} (epochs={epochs}, batch={batch_size}, lr={learning_rate}, "
+                f"T={temperature}, alpha={alpha})")
+    student, student_fn, student_tokenizer = build_student(student_spec, teacher_dir, labels, device)
+    train_student(student, student_fn, train_texts, train_teacher_logits, train_gold,
+                  epochs, batch_size, learning_rate, temperature, alpha)
+    student_pred, student_conf = scores(batched_logits(student_fn, test_texts))
+
+    # Save with the teacher's label map
+    os.makedirs(output_dir, exist_ok=True)
+    if isinstance(student, NgramIntentClassifier):
+        student.save(output_dir)
+        write_cascade_config(output_dir, student_pred, student_conf, teacher_pred, test_gold, labels,
+                             teacher_dir, normalization)
+    else:
+        student.save_pretrained(output_dir)
+        student_tokenizer.save_pretrained(output_dir)
+        with open(os.path.join(output_dir, "labels.json"), "w") as f:
+            json.dump(labels, f, indent=2)
+        with open(os.path.join(output_dir, "label_mapping.json"), "w") as f:
+            json.dump({"label2id": label2id, "id2label": {str(i): l for i, l in enumerate(labels)}}, f, indent=2)
+
+    # CPU latency, batch 1
+    logger.info(f"⏱️ Measuring CPU latency ({latency_threads} thread(s))")
+    torch.set_num_threads(latency_threads)
+    student.to("cpu")
+    teacher.to("cpu")
+    sample = test_texts[:LATENCY_SAMPLES]
+    student_latency = measure_latency(student_fn, sample)
+    teacher_latency = measure_latency(teacher_fn, sample)
+
+    def summary(pred: np.ndarray, latency: Dict, size_mb: float) -> Dict:
+        return {
+            "accuracy": round(accuracy_score(test_gold, pred), 4),
+            "f1_weighted": round(f1_score(test_gold, pred, average="weighted", zero_division=0), 4),
+            "latency": latency,
+            "size_mb": size_mb,
+        }
+
+    report = {
+        "teacher": {"path": teacher_dir, **summary(teacher_pred, teacher_latency, dir_size_mb(teacher_dir))},
+        "student": {"path": output_dir, "type": student_spec,
+                    **summary(student_pred, student_latency, dir_size_mb(output_dir)),
+                    "agreement_with_teacher": round(float((student_pred == teacher_pred).mean()), 4)},
+        "speedup_p50": round(teacher_latency["p50_ms"] / max(student_latency["p50_ms"], 1e-6), 1),
+        "cascade": cascade_table(student_pred, student_conf, teacher_pred, test_gold,
+                                 student_latency["mean_ms"], teacher_latency["mean_ms"]),
+        "config": {"epochs": epochs, "batch_size": batch_size, "learning_rate": learning_rate,
+                   "temperature": temperature, "alpha": alpha, "latency_threads": latency_threads,
+                   "normalization": normalization,
+                   "train_samples": len(train_texts), "held_out_samples": len(test_texts)},
+        "num_labels": len(labels),
+        "distilled_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(output_dir, "distill_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill an intent model into a small CPU student')
+    parser.add_argument('--teacher', required=True, help='Saved teacher intent model directory')
+    parser.add_argument('--data', required=True, help='Training data (JSONL with text + intent)')
+    parser.add_argument('--output', required=True, help='Student output directory')
+    parser.add_argument('--student', default='ngram', help="'ngram' or 'layers:N'")
+    parser.add_argument('--epochs', type=int, help='Default depends on the student type')
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--lr', type=float)
+    parser.add_argument('--temperature', type=float, default=TEMPERATURE)
+    parser.add_argument('--alpha', type=float, default=ALPHA, help='Weight of the teacher (soft) loss')
+    parser.add_argument('--threads', type=int, default=1, help='torch threads for the latency measurement')
+    parser.add_argument('--normalize', choices=sorted(NORMALIZERS), default='none',
+                        help="Text normalization of the target server ('hindi' for nlu-service-v2)")
+    parser.add_argument('--calibrate', action='store_true',
+                        help='Only recompute cascade.json for the ngram student in --output')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='Accuracy the cascade may lose against the teacher (--calibrate)')
+    args = parser.parse_args()
+
+    data = load_training_data(args.data)
+    if len(data) < 50:
+        logger.error(f"Not enough training data: {len(data)} samples (need at least 50)")
+        sys.exit(1)
+
+    if args.calibrate:
+        config = calibrate(args.teacher, args.output, data, args.normalize, args.tolerance)
+        print(json.dumps(config, indent=2))
+        return
+
+    report = distill(args.teacher, data, args.output, args.student, args.epochs, args.batch_size,
+                     args.lr, args.temperature, args.alpha, args.threads, args.normalize)
+
+    teacher, student = report["teacher"], report["student"]
+    print("\n" + "=" * 72)
+    print("DISTILLATION SUMMARY")
+    print("=" * 72)
+    print(f"{'model':<10} {'accuracy':>9} {'F1':>7} {'p50 ms':>8} {'p95 ms':>8} {'size MB':>8}")
+    for name, r in (("teacher", teacher), ("student", student)):
+        print(f"{name:<10} {r['accuracy']:>9.2%} {r['f1_weighted']:>7.2%} {r['latency']['p50_ms']:>8.2f} "
+              f"{r['latency']['p95_ms']:>8.2f} {r['size_mb']:>8.1f}")
+    print(f"Agreement with teacher: {student['agreement_with_teacher']:.2%}, "
+          f"p50 speedup {report['speedup_p50']}x")
+    print("\nCascade (student first, teacher below the threshold):")
+    print(f"{'threshold':>9} {'student share':>14} {'accuracy':>9} {'mean ms':>8}")
+    for row in report["cascade"]:
+        print(f"{row['threshold']:>9.2f} {row['student_share']:>14.1%} {row['accuracy']:>9.2%} "
+              f"{row['mean_latency_ms']:>8.2f}")
+    print(f"\nStudent + report saved to {args.output}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
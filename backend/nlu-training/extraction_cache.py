@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Extraction Cache - persistent LLM extraction results
+=====================================================
+SQLite store of (prompt version, model, normalized text) -> parsed extraction,
+so a text the orchestrator has already extracted never goes back to vLLM.
+
+- The prompt version is a hash of the system prompt: editing the prompt or
+  switching models starts a fresh keyspace, old rows are simply never hit
+- Rows keep the LLM usage of the original call, so every hit reports the
+  prompt + completion tokens it saved
+- Usage of real LLM calls is tracked too, including the prompt tokens the
+  server answered from its prefix cache (usage.prompt_tokens_details.cached_tokens)
+
+Usage:
+    cache = ExtractionCache("cache/extraction_cache.db", prompt_version, model)
+    data = cache.get(text)           # dict or None
+    cache.put(text, data, usage)     # after a successful LLM call
+    cache.stats()
+"""
+
+import json
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, trim and collapse whitespace."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def prompt_version(prompt: str) -> str:
+    """Short stable hash identifying a system prompt."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class ExtractionCache:
+    def __init__(self, path: str, prompt_version: str, model: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.prompt_version = prompt_version
+        self.model = model
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                result TEXT NOT NULL,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                hits INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_hit_at REAL
+            )
+        """)
+        self.conn.commit()
+
+        # Session counters
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prefix_cached_tokens = 0
+
+    def key(self, text: str) -> str:
+        raw = f"{self.prompt_version}\x00{self.model}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[Dict]:
+        key = self.key(text)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT result, prompt_tokens, completion_tokens FROM extractions WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE extractions SET hits = hits + 1, last_hit_at = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self.conn.commit()
+            self.hits += 1
+            self.tokens_saved += row[1] + row[2]
+        return json.loads(row[0])
+
+    def record_usage(self, usage: Optional[Dict]):
+        """Account for a real LLM call (OpenAI-style usage block)."""
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details") or {}
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+            self.completion_tokens += usage.get("completion_tokens", 0) or 0
+            self.prefix_cached_tokens += details.get("cached_tokens", 0) or 0
+
+    def put(self, text: str, result: Dict, usage: Optional[Dict] = None):
+        usage = usage or {}
+        with self._lock:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO extractions
+                   (key, prompt_version, model, text, result, prompt_tokens, completion_tokens, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    self.key(text), self.prompt_version, self.model, normalize_text(text),
+                    json.dumps(result, ensure_ascii=False),
+                    usage.get("prompt_tokens", 0) or 0,
+                    usage.get("completion_tokens", 0) or 0,
+                    time.time()
+                )
+            )
+            self.conn.commit()
+
+    def clear(self, current_only: bool = False):
+        """Drop cached rows (all, or only rows of the current prompt/model)."""
+        with self._lock:
+            if current_only:
+                self.conn.execute(
+                    "DELETE FROM extractions WHERE prompt_version = ? AND model = ?",
+                    (self.prompt_version, self.model)
+                )
+            else:
+                self.conn.execute("DELETE FROM extractions")
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, lifetime_hits, lifetime_saved = self.conn.execute(
+                """SELECT COUNT(*), COALESCE(SUM(hits), 0),
+                          COALESCE(SUM(hits * (prompt_tokens + completion_tokens)), 0)
+                   FROM extractions WHERE prompt_version = ? AND model = ?""",
+                (self.prompt_version, self.model)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "prompt_version": self.prompt_version,
+            "model": self.model,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "lifetime_hits": lifetime_hits,
+            "lifetime_tokens_saved": lifetime_saved,
+            "llm_calls": self.llm_calls,
+            "llm_prompt_tokens": self.prompt_tokens,
+            "llm_completion_tokens": self.completion_tokens,
+            "prefix_cached_prompt_tokens": self.prefix_cached_tokens,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
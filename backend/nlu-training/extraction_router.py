@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Extraction Router - cheap extractors first, LLM only when needed
+=================================================================
+Tiers, in order:
+1. rules - regex extraction for short, fully-covered orders
+           ("2 samosa", "Tushar se misal", "do vada pav aur ek chai")
+           and one-word intents (hi, checkout, track my order)
+2. ner   - NLU /classify + NER /extract services, accepted when both are
+           confident and there is something to order
+3. llm   - vLLM extraction (cached), for everything else
+
+A rule match only counts as an order when every FOOD span is in the food
+lexicon (FOOD spans harvested from the NER training data); anything else
+("ek baat batao", "give me 2 coupons") gets a low confidence and falls
+through to the NER tier, where the NER model has to agree it is food.
+
+Texts with complex structure (several stores, preferences, locations, long
+sentences) skip straight to the LLM. Every tier records attempts, accepted
+results and latency; stats() is exposed on the orchestrator's /stats.
+
+Only pure logic lives here; the orchestrators do the I/O for each tier.
+"""
+
+import glob
+import json
+import re
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+TIERS = ("rules", "ner", "llm")
+
+QTY_WORDS = {
+    "ek": 1, "do": 2, "teen": 3, "char": 4, "paanch": 5,
+    "chhe": 6, "saat": 7, "aath": 8, "nau": 9, "das": 10,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+QTY = r"(?:\d{1,3}|%s)" % "|".join(QTY_WORDS)
+
+# Order verbs / fillers stripped from the edges before matching
+FILLER = (r"(?:please|plz|pls|add|order|mangwao|mangao|bhejo|chahiye|de do|dedo|"
+          r"to|in|my|me|cart|to my cart|in my cart|i want|want|get|give me)")
+
+# Any of these means preferences, locations or store comparisons -> LLM
+COMPLEX_MARKERS = re.compile(
+    r"\b(?:jaldi|quick|quickly|fast|urgent|less|extra|spicy|teekha|without|bina|"
+    r"big|small|large|medium|size|half|full|near|nearest|road|nagar|house|ghar|address|"
+    r"cheap|cheapest|best|or|ya|instead|but|lekin|people|log)\b"
+)
+
+SIMPLE_INTENTS = {
+    "greeting": re.compile(r"^(?:hi+|hello|hey|namaste|namaskar)[\s!.]*$"),
+    "help": re.compile(r"^(?:help|madad|help me)[\s!.?]*$"),
+    "view_cart": re.compile(r"^(?:show |view |check )?(?:my )?cart(?: dikhao| dikhana)?[\s!.?]*$"),
+    "checkout": re.compile(r"^(?:checkout|check out|place (?:my |the )?order|order place karo)[\s!.]*$"),
+    "track_order": re.compile(r"^(?:track (?:my )?order|where is my order|mera order kaha hai)[\s!.?]*$"),
+}
+
+FOOD = r"[a-z][a-z]*(?: [a-z]+){0,2}"
+ITEM = re.compile(rf"^(?:(?P<qty>{QTY}) )?(?P<food>{FOOD})$")
+STORE = r"[a-z][a-z']*(?: [a-z']+){0,2}"
+# "<items> from <store>" / "<store> se <items>"
+STORE_AFTER = re.compile(rf"^(?P<items>.+?) from (?P<store>{STORE})$")
+STORE_BEFORE = re.compile(rf"^(?P<store>{STORE}) se (?P<items>.+)$")
+ITEM_SEPARATOR = re.compile(r" (?:and|aur|n) |, ?| ?\+ ?")
+
+FOOD_STOPWORDS = set(QTY_WORDS) | {
+    "and", "aur", "from", "se", "the", "a", "an", "is", "for", "with", "of", "ka", "ki", "ke",
+    "add", "order", "cart", "my", "me", "i", "want", "please", "what", "how", "kya", "hai"
+}
+
+LATENCY_WINDOW = 1000
+
+# Rule matches whose food is not in the lexicon stay below rule_min_confidence
+UNKNOWN_FOOD_CONFIDENCE = 0.4
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower().strip().rstrip("!.?"))
+
+
+def load_food_lexicon(patterns: Iterable[str]) -> Set[str]:
+    """FOOD spans from NER training files (JSONL with text + entity offsets), normalized."""
+    foods: Set[str] = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    text = record.get("text", "")
+                    for entity in record.get("entities", []):
+                        if entity.get("label") == "FOOD":
+                            food = _normalize(text[entity["start"]:entity["end"]])
+                            if food:
+                                foods.add(food)
+    return foods
+
+
+class ExtractionRouter:
+    def __init__(self, rule_min_confidence: float = 0.8, ner_min_confidence: float = 0.85,
+                 max_words: int = 12, food_lexicon: Optional[Iterable[str]] = None):
+        self.rule_min_confidence = rule_min_confidence
+        self.ner_min_confidence = ner_min_confidence
+        self.max_words = max_words
+        self.food_lexicon = {_normalize(food) for food in food_lexicon or ()}
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.escalations: Dict[str, int] = {}
+        self.tiers = {
+            tier: {"attempts": 0, "accepted": 0, "latencies": deque(maxlen=LATENCY_WINDOW)}
+            for tier in TIERS
+        }
+
+    # ------------------------------------------------------------------
+    # Routing decisions
+    # ------------------------------------------------------------------
+    def complexity(self, text: str) -> Optional[str]:
+        """Reason the text needs the LLM straight away, or None if it is simple."""
+        normalized = _normalize(text)
+        if len(normalized.split()) > self.max_words:
+            return "long_text"
+        if COMPLEX_MARKERS.search(normalized):
+            return "preferences_or_location"
+        if len(re.findall(r"\b(?:from|se)\b", normalized)) > 1:
+            return "multiple_stores"
+        return None
+
+    def is_known_food(self, food: str) -> bool:
+        """Lexicon lookup, tolerating simple plurals ("samosas", "dosas")."""
+        food = _normalize(food)
+        candidates = {food, re.sub(r"s$", "", food), re.sub(r"es$", "", food)}
+        return any(c in self.food_lexicon for c in candidates)
+
+    def rule_extract(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Regex extraction. Returns {intent, confidence, entities, cart_items}
+        with character offsets into text, or None when the text does not fit.
+        Foods missing from the lexicon get UNKNOWN_FOOD_CONFIDENCE.
+        """
+        lower = text.lower()
+        normalized = _normalize(text)
+
+        for intent, pattern in SIMPLE_INTENTS.items():
+            if pattern.match(normalized):
+                return {"intent": intent, "confidence": 0.95, "entities": [], "cart_items": []}
+
+        core = normalized
+        for _ in range(3):
+            core = re.sub(rf"^{FILLER} | {FILLER}$", "", core).strip()
+
+        store = None
+        items_text = core
+        match = STORE_AFTER.match(core) or STORE_BEFORE.match(core)
+        if match:
+            store = match.group("store").strip()
+            items_text = match.group("items").strip()
+
+        segments = [s for s in ITEM_SEPARATOR.split(items_text) if s]
+        if not segments:
+            return None
+
+        parsed = []
+        for segment in segments:
+            item = ITEM.match(segment.strip())
+            if not item:
+                return None
+            food_words = item.group("food").split()
+            if any(w in FOOD_STOPWORDS for w in food_words):
+                return None
+            parsed.append((item.group("qty"), item.group("food")))
+
+        entities: List[Dict] = []
+        cursor = 0
+
+        def locate(fragment: str, label: str) -> bool:
+            nonlocal cursor
+            found = re.search(r"\b" + r"\s+".join(map(re.escape, fragment.split())) + r"\b", lower[cursor:])
+            if not found:
+                return False
+            start, end = cursor + found.start(), cursor + found.end()
+            entities.append({"text": text[start:end], "label": label, "start": start, "end": end})
+            cursor = end
+            return True
+
+        # Store text may come before or after the items; locate it first, then items in order
+        if store:
+            found = re.search(r"\b" + r"\s+".join(map(re.escape, store.split())) + r"\b", lower)
+            if not found:
+                return None
+            store = text[found.start():found.end()]
+            entities.append({"text": store, "label": "STORE", "start": found.start(), "end": found.end()})
+            if match.re is STORE_BEFORE:
+                cursor = found.end()
+
+        cart_items = []
+        for qty_text, food in parsed:
+            if qty_text and not locate(qty_text, "QTY"):
+                return None
+            if not locate(food, "FOOD"):
+                return None
+            qty = int(qty_text) if qty_text and qty_text.isdigit() else QTY_WORDS.get(qty_text or "", 1)
+            cart_items.append({"food": entities[-1]["text"], "qty": qty, "store": store})
+
+        # Full coverage of a short pattern; multi-item lists are slightly less certain
+        confidence = 0.9 if len(parsed) == 1 else 0.85
+        if not any(qty for qty, _ in parsed) and not store:
+            # A bare noun ("samosa") could just as well be a search
+            confidence = 0.7
+        if not all(self.is_known_food(food) for _, food in parsed):
+            # "ek baat batao", "give me 2 coupons": the shape fits, the words are not food
+            confidence = min(confidence, UNKNOWN_FOOD_CONFIDENCE)
+        intent = "add_to_cart" if re.search(r"\b(?:add|cart)\b", normalized) else "order_food"
+
+        return {"intent": intent, "confidence": confidence, "entities": entities, "cart_items": cart_items}
+
+    def score_services(self, nlu_data: Optional[Dict], ner_data: Optional[Dict]) -> float:
+        """Confidence of an NLU + NER extraction: the weakest of intent and entities."""
+        if not nlu_data or not ner_data:
+            return 0.0
+        entities = ner_data.get("entities", [])
+        if not any(e.get("label") == "FOOD" for e in entities):
+            return 0.0
+        scores = [nlu_data.get("confidence", 0.0)] + [e.get("confidence", 0.0) for e in entities]
+        return min(scores)
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+    def record(self, tier: str, accepted: bool, latency_ms: float):
+        with self._lock:
+            stats = self.tiers[tier]
+            stats["attempts"] += 1
+            stats["latencies"].append(latency_ms)
+            if accepted:
+                stats["accepted"] += 1
+                self.requests += 1
+
+    def record_escalation(self, reason: str):
+        with self._lock:
+            self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {}
+            for tier, stats in self.tiers.items():
+                latencies = sorted(stats["latencies"])
+                tiers[tier] = {
+                    "attempts": stats["attempts"],
+                    "accepted": stats["accepted"],
+                    "hit_rate": round(stats["accepted"] / stats["attempts"], 4) if stats["attempts"] else 0.0,
+                    "share": round(stats["accepted"] / self.requests, 4) if self.requests else 0.0,
+                    "avg_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                    "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else 0.0,
+                }
+            return {
+                "requests": self.requests,
+                "llm_avoided": round(1 - tiers["llm"]["accepted"] / self.requests, 4) if self.requests else 0.0,
+                "escalations": dict(self.escalations),
+                "tiers": tiers,
+            }
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Job Queue - durable training jobs run in separate worker processes
+===================================================================
+Training jobs used to live in a dict inside the API process and ran on its
+threads, so a restart lost every job, a crashing run could take the API
+down and CPU-bound training starved request handling.
+
+- JobStore      SQLite (WAL) table of jobs: status, priority, resource
+                class, progress, results. Shared by the API and workers,
+                so /jobs and /status read the same rows after a restart
+- JobScheduler  dispatcher thread in the API process. Claims queued jobs
+                (highest priority first, then oldest) while its resource
+                class has a free slot - e.g. one GPU job and two CPU jobs -
+                and runs each in its own spawned process. Cancellation
+                terminates the process; a worker that dies without
+                finishing marks its job failed
+- run_job       worker process entry point: imports the runner
+                ("module:function"), calls runner(job_id, request, report)
+                and stores the result. report(metrics=...) appends to the
+                job's metrics history (job_metrics) and keeps the latest
+                record on the job row
+
+On start the scheduler re-adopts workers that outlived an API restart and
+requeues jobs whose worker is gone (up to max_attempts runs per job).
+
+Usage:
+    store = JobStore("/models/training_jobs.db")
+    scheduler = JobScheduler(store, {"nlu": "server:run_training_job"}, {"gpu": 1, "cpu": 2})
+    scheduler.start()
+    store.create("nlu", {...}, resource="gpu", priority=5)
+"""
+
+import os
+import json
+import time
+import signal
+import sqlite3
+import logging
+import importlib
+import threading
+import traceback
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+ACTIVE_STATUSES = ("queued", "running")
+RESOURCES = ("gpu", "cpu")
+
+JOB_GPU_SLOTS = int(os.environ.get("JOB_GPU_SLOTS", "1"))
+JOB_CPU_SLOTS = int(os.environ.get("JOB_CPU_SLOTS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "2"))
+JOB_CANCEL_GRACE_S = float(os.environ.get("JOB_CANCEL_GRACE_S", "10"))
+
+_JSON_FIELDS = ("request", "results", "metrics")
+
+# runner(job_id, request, report) -> results; report(progress=None, message=None, metrics=None)
+Runner = Callable[[str, Dict[str, Any], Callable[..., None]], Dict[str, Any]]
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+class JobStore:
+    def __init__(self, path: str):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                resource TEXT NOT NULL,
+                request TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                results TEXT,
+                metrics TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker_pid INTEGER,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                completed_at TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, resource, priority, created_at)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "metrics" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN metrics TEXT")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_metrics (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_job_metrics ON job_metrics (job_id, seq)")
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        for field in _JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, job_id: str, job_type: str, request: Dict[str, Any], resource: str,
+               priority: int = 0, message: str = "Job queued") -> Dict[str, Any]:
+        if resource not in RESOURCES:
+            raise ValueError(f"resource must be one of {RESOURCES}")
+        with self._lock:
+            self.conn.execute(
+                """INSERT INTO jobs (job_id, type, status, priority, resource, request, message, created_at)
+                   VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)""",
+                (job_id, job_type, priority, resource, json.dumps(request), message, datetime.now().isoformat()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job(row)
+
+    def list(self, limit: int = 10, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query, args = "SELECT * FROM jobs", []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self.conn.execute(query, args).fetchall()
+        return [self._job(row) for row in rows]
+
+    def with_status(self, status: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE status = ?", (status,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs of the same resource class, None if not queued"""
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return None
+        with self._lock:
+            ahead = self.conn.execute(
+                """SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND resource = ?
+                   AND (priority > ? OR (priority = ? AND created_at < ?))""",
+                (job["resource"], job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()[0]
+        return ahead + 1
+
+    def update(self, job_id: str, **fields):
+        for field in _JSON_FIELDS:
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field], default=str)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def finish(self, job_id: str, status: str, **fields) -> bool:
+        """Move a running job to a final status; False if it is no longer running"""
+        fields.update(status=status, completed_at=datetime.now().isoformat(), worker_pid=None)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        for field in _JSON_FIELDS:
+            if fields.get(field) is not None:
+                fields[field] = json.dumps(fields[field], default=str)
+        with self._lock:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET {columns} WHERE job_id = ? AND status = 'running'", (*fields.values(), job_id)
+            )
+        return cursor.rowcount == 1
+
+    def add_metrics(self, job_id: str, record: Dict[str, Any]) -> int:
+        """Append a metrics record to the job's history and make it the job's latest"""
+        data = json.dumps(record, default=str)
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                seq = self.conn.execute(
+                    "INSERT INTO job_metrics (job_id, data) VALUES (?, ?)", (job_id, data)
+                ).lastrowid
+                self.conn.execute("UPDATE jobs SET metrics = ? WHERE job_id = ?", (data, job_id))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def metrics(self, job_id: str, after: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Metrics history of a job after sequence number `after`, oldest first"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, data FROM job_metrics WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+        return [{"seq": seq, **json.loads(data)} for seq, data in rows]
+
+    def set_worker(self, job_id: str, pid: int):
+        with self._lock:
+            self.conn.execute("UPDATE jobs SET worker_pid = ? WHERE job_id = ? AND status = 'running'", (pid, job_id))
+
+    def claim_next(self, resource: str) -> Optional[Dict[str, Any]]:
+        """Atomically mark the next queued job of this resource class running"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    """SELECT job_id FROM jobs WHERE status = 'queued' AND resource = ?
+                       ORDER BY priority DESC, created_at ASC LIMIT 1""",
+                    (resource,),
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        """UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1,
+                           message = 'Starting worker...' WHERE job_id = ?""",
+                        (datetime.now().isoformat(), row[0]),
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued job now, flag a running one for the scheduler. Returns the job's status"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.conn.execute(
+                """UPDATE jobs SET status = 'cancelled', message = 'Cancelled before start', completed_at = ?
+                   WHERE job_id = ? AND status = 'queued'""",
+                (now, job_id),
+            )
+            self.conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, message = 'Cancelling...' WHERE job_id = ? AND status = 'running'",
+                (job_id,),
+            )
+            row = self.conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+def run_job(db_path: str, job_id: str, runner_path: str, cpu_threads: int = 0):
+    """Entry point of a worker process"""
+    if cpu_threads:
+        # Before the runner imports torch / tokenizers
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(cpu_threads)
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - [job {job_id}] %(levelname)s - %(message)s")
+
+    store = JobStore(db_path)
+    job = store.get(job_id)
+
+    def report(progress: Optional[float] = None, message: Optional[str] = None,
+               metrics: Optional[Dict[str, Any]] = None):
+        if metrics is not None:
+            store.add_metrics(job_id, metrics)
+        fields = {}
+        if progress is not None:
+            fields["progress"] = progress
+        if message is not None:
+            fields["message"] = message
+        if fields:
+            store.update(job_id, **fields)
+
+    try:
+        module_name, func_name = runner_path.split(":")
+        runner: Runner = getattr(importlib.import_module(module_name), func_name)
+        report(message="Running")
+        results = runner(job_id, job["request"], report)
+        store.finish(job_id, "completed", progress=100, results=results)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}\n{traceback.format_exc()}")
+        store.finish(job_id, "failed", error=str(e), message=f"Training failed: {str(e)[:100]}")
+    finally:
+        store.close()
+
+
+class _AdoptedWorker:
+    """A worker process started by an earlier API process, tracked by pid"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exitcode = None
+
+    def is_alive(self) -> bool:
+        return _pid_alive(self.pid)
+
+    def terminate(self):
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def join(self, timeout: Optional[float] = None):
+        deadline = time.time() + (timeout or 0)
+        while self.is_alive() and time.time() < deadline:
+            time.sleep(0.2)
+
+    def _signal(self, sig):
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+class JobScheduler:
+    def __init__(self, store: JobStore, runners: Dict[str, str], slots: Optional[Dict[str, int]] = None,
+                 poll_interval: float = 1.0, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.store = store
+        self.runners = runners
+        self.slots = slots or {"gpu": JOB_GPU_SLOTS, "cpu": JOB_CPU_SLOTS}
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        # Workers import torch; spawn keeps CUDA state out of the fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: Dict[str, Any] = {}
+        self._resources: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    def start(self):
+        self.recover()
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Job scheduler started (slots: {self.slots})")
+
+    def stop(self, requeue: bool = True):
+        """Stop dispatching; running workers are terminated and their jobs requeued"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval * 5)
+        for job_id, worker in list(self._workers.items()):
+            self._terminate(worker)
+            if requeue:
+                self.store.update(job_id, status="queued", worker_pid=None, message="Requeued after server shutdown")
+            else:
+                self.store.finish(job_id, "failed", error="Server shut down", message="Stopped with the server")
+        self._workers.clear()
+        self._resources.clear()
+
+    def recover(self):
+        """Adopt workers that survived an API restart; cancel, requeue or fail jobs whose worker is gone"""
+        for job in self.store.with_status("running"):
+            if _pid_alive(job["worker_pid"]):
+                self._workers[job["job_id"]] = _AdoptedWorker(job["worker_pid"])
+                self._resources[job["job_id"]] = job["resource"]
+                logger.info(f"Re-adopted worker {job['worker_pid']} for job {job['job_id']}")
+            elif job["cancel_requested"]:
+                self.store.finish(job["job_id"], "cancelled", message="Cancelled")
+                logger.info(f"Job {job['job_id']} cancelled (worker gone after server restart)")
+            elif job["attempts"] < self.max_attempts:
+                self.store.update(job["job_id"], status="queued", worker_pid=None, progress=0,
+                                  message="Requeued after server restart")
+            else:
+                self.store.finish(job["job_id"], "failed", error="Worker lost in server restart",
+                                  message="Interrupted by server restart")
+
+    # ------------------------------------------------------------------
+    def busy(self, resource: str) -> int:
+        return sum(1 for r in self._resources.values() if r == resource)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Job scheduler error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def poll(self):
+        # Reap finished workers
+        for job_id, worker in list(self._workers.items()):
+            if worker.is_alive():
+                continue
+            self._forget(job_id)
+            if self.store.finish(job_id, "failed", error=f"Worker exited with code {worker.exitcode}",
+                                 message="Worker process died"):
+                logger.error(f"Worker for job {job_id} died (exit code {worker.exitcode})")
+
+        # Cancellations
+        for job_id, worker in list(self._workers.items()):
+            job = self.store.get(job_id)
+            if job and job["cancel_requested"]:
+                self._terminate(worker)
+                self._forget(job_id)
+                self.store.finish(job_id, "cancelled", message="Cancelled")
+                logger.info(f"Job {job_id} cancelled")
+
+        # Dispatch
+        for resource, limit in self.slots.items():
+            while self.busy(resource) < limit:
+                job = self.store.claim_next(resource)
+                if job is None:
+                    break
+                self._spawn(job)
+
+    def _spawn(self, job: Dict[str, Any]):
+        runner = self.runners.get(job["type"])
+        if runner is None:
+            self.store.finish(job["job_id"], "failed", error=f"No runner for job type {job['type']}")
+            return
+        cpu_threads = 0
+        if job["resource"] == "cpu":
+            cpu_threads = max(1, (os.cpu_count() or 1) // max(self.slots.get("cpu", 1), 1))
+        worker = self._ctx.Process(
+            target=run_job, args=(self.store.path, job["job_id"], runner, cpu_threads),
+            name=f"job-{job['job_id']}",
+        )
+        worker.start()
+        self._workers[job["job_id"]] = worker
+        self._resources[job["job_id"]] = job["resource"]
+        self.store.set_worker(job["job_id"], worker.pid)
+        logger.info(f"Job {job['job_id']} ({job['type']}, {job['resource']}) started in process {worker.pid}")
+
+    def _terminate(self, worker):
+        worker.terminate()
+        worker.join(JOB_CANCEL_GRACE_S)
+        if worker.is_alive():
+            worker.kill()
+            worker.join(5)
+
+    def _forget(self, job_id: str):
+        self._workers.pop(job_id, None)
+        self._resources.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "busy": {resource: self.busy(resource) for resource in self.slots},
+            "workers": {job_id: worker.pid for job_id, worker in self._workers.items()},
+        }
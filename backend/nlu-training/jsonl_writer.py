@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+JSONL Writer - buffered, rotating append-only training data files
+==================================================================
+Used by LLMOrchestrator._save_training_data instead of opening the target
+file for every record.
+
+- Keeps the current segment open; records are buffered and written when the
+  buffer reaches flush_bytes or is older than flush_interval seconds
+  (a daemon thread flushes idle buffers)
+- Thread-safe: one lock per writer, so concurrent requests never interleave
+  partial lines
+- Rotation by date (<stem>_YYYYMMDD.jsonl) and/or size
+  (<stem>_YYYYMMDD_001.jsonl, ...); max_bytes counts uncompressed bytes
+- Optional gzip or zstd segments (.jsonl.gz / .jsonl.zst); every flush ends a
+  compressed block. The active segment has no end-of-stream marker yet, so
+  iter_records / count_records decode incrementally and stop at the last
+  complete line instead of raising on the truncated stream
+
+Usage:
+    writer = shared_writer("generated_training_data/ner_training_llm.jsonl", rotate_daily=True)
+    writer.write({"text": ..., "entities": [...]})
+
+Reading back any mix of plain / compressed segments:
+    for record in iter_records(segments(base_path)): ...
+
+Benchmark against open-per-write:
+    python jsonl_writer.py bench --records 20000 --rate 1000 --threads 8
+"""
+
+import gzip
+import json
+import re
+import threading
+import time
+import atexit
+import weakref
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+COMPRESSION_SUFFIX = {None: "", "gzip": ".gz", "zstd": ".zst"}
+READ_CHUNK = 256 * 1024
+
+_open_writers: "weakref.WeakSet[JSONLWriter]" = weakref.WeakSet()
+_shared_writers: Dict[str, "JSONLWriter"] = {}
+_shared_lock = threading.Lock()
+
+
+class JSONLWriter:
+    def __init__(self, base_path, rotate_daily: bool = False, max_bytes: int = 0,
+                 compression: Optional[str] = None, flush_bytes: int = 64 * 1024,
+                 flush_interval: float = 1.0):
+        """
+        Args:
+            base_path: e.g. generated_training_data/ner_training_llm.jsonl
+            rotate_daily: put the date in the segment name, new segment each day
+            max_bytes: start a new segment past this many bytes (0 = never)
+            compression: None, "gzip" or "zstd"
+            flush_bytes: write the buffer once it holds this many bytes
+            flush_interval: max seconds a record waits in the buffer
+        """
+        if compression not in COMPRESSION_SUFFIX:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            raise ImportError("zstd compression needs: pip install zstandard")
+
+        base_path = Path(base_path)
+        self.directory = base_path.parent
+        self.stem = base_path.name.split(".")[0]
+        self.rotate_daily = rotate_daily
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._oldest: Optional[float] = None
+        self._fh = None
+        self._raw = None
+        self._segment: Optional[Path] = None
+        self._segment_index = 0
+        self._segment_date: Optional[str] = None
+        self._segment_bytes = 0
+        self._closed = False
+
+        self.records = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self.segments_opened = 0
+
+        self._stop = threading.Event()
+        # The thread only holds a weak reference, so unused writers can be collected
+        self._flusher = threading.Thread(
+            target=_flush_loop, args=(weakref.ref(self), self._stop, flush_interval), daemon=True
+        )
+        self._flusher.start()
+        _open_writers.add(self)
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+    def _segment_name(self, date: Optional[str], index: int) -> Path:
+        name = self.stem
+        if date:
+            name += f"_{date}"
+        if index:
+            name += f"_{index:03d}"
+        return self.directory / f"{name}.jsonl{COMPRESSION_SUFFIX[self.compression]}"
+
+    def _open_segment(self, date: Optional[str], index: int = 0):
+        """Open the newest segment for date from index on, skipping full ones."""
+        self._close_segment()
+        while True:
+            path = self._segment_name(date, index)
+            size = path.stat().st_size if path.exists() else 0
+            next_exists = self._segment_name(date, index + 1).exists()
+            if not next_exists and (not self.max_bytes or size < self.max_bytes):
+                break
+            index += 1
+
+        self._raw = open(path, "ab")
+        if self.compression == "gzip":
+            # A new gzip member per open; multi-member files read back as one stream
+            self._fh = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        elif self.compression == "zstd":
+            self._fh = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._fh = self._raw
+        self._segment = path
+        self._segment_index = index
+        self._segment_date = date
+        self._segment_bytes = size
+        self.segments_opened += 1
+
+    def _close_segment(self):
+        if self._fh is None:
+            return
+        if self._fh is not self._raw:
+            self._fh.close()
+        self._raw.close()
+        self._fh = self._raw = None
+
+    def _flush_compressed(self):
+        if self.compression == "gzip":
+            self._fh.flush()  # Z_SYNC_FLUSH
+        elif self.compression == "zstd":
+            self._fh.flush(zstandard.FLUSH_BLOCK)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def write(self, record: Dict[str, Any]):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._closed:
+                raise ValueError("write to closed JSONLWriter")
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            self.records += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._buffered_bytes >= self.flush_bytes:
+                self._flush_locked()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        date = datetime.now().strftime("%Y%m%d") if self.rotate_daily else None
+        if self._fh is None or date != self._segment_date:
+            self._open_segment(date)
+        elif self.max_bytes and self._segment_bytes >= self.max_bytes:
+            # Compressed files are smaller on disk than max_bytes: always move on
+            self._open_segment(date, self._segment_index + 1)
+
+        data = b"".join(self._buffer)
+        self._fh.write(data)
+        self._flush_compressed()
+        self._raw.flush()
+
+        self._segment_bytes += len(data)
+        self.bytes_written += len(data)
+        self.flushes += 1
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        self._oldest = None
+
+    def _flush_idle(self):
+        with self._lock:
+            if self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval:
+                self._flush_locked()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._close_segment()
+            self._closed = True
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+    @property
+    def current_segment(self) -> Optional[Path]:
+        return self._segment
+
+    def segments(self) -> List[Path]:
+        return segments(self.directory / f"{self.stem}.jsonl")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "current_segment": str(self._segment) if self._segment else None,
+            "records": self.records,
+            "bytes_written": self.bytes_written,
+            "buffered_bytes": self._buffered_bytes,
+            "flushes": self.flushes,
+            "segments_opened": self.segments_opened,
+            "compression": self.compression,
+        }
+
+
+def _flush_loop(ref, stop: threading.Event, interval: float):
+    while not stop.wait(interval / 2):
+        writer = ref()
+        if writer is None:
+            return
+        writer._flush_idle()
+        del writer
+
+
+def shared_writer(base_path, **kwargs) -> JSONLWriter:
+    """One writer per base path per process, so every component appends through it."""
+    key = str(Path(base_path).resolve())
+    with _shared_lock:
+        writer = _shared_writers.get(key)
+        if writer is None or writer._closed:
+            writer = JSONLWriter(base_path, **kwargs)
+            _shared_writers[key] = writer
+        return writer
+
+
+@atexit.register
+def _close_all():
+    for writer in list(_open_writers):
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+# ============================================================================
+# READING
+# ============================================================================
+def segments(base_path) -> List[Path]:
+    """All segments written for base_path (plain and compressed), in name order."""
+    base_path = Path(base_path)
+    stem = base_path.name.split(".")[0]
+    pattern = re.compile(rf"^{re.escape(stem)}(_\d{{8}})?(_\d{{3}})?\.jsonl(\.gz|\.zst)?$")
+    if not base_path.parent.exists():
+        return []
+    return sorted(p for p in base_path.parent.iterdir() if pattern.match(p.name))
+
+
+def open_segment(path):
+    """Text-mode reader for a closed plain, .gz or .zst segment (see iter_lines for the active one)."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.suffix == ".zst":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("Reading .zst segments needs: pip install zstandard")
+        import io
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _gzip_chunks(raw) -> Iterator[bytes]:
+    """Decompressed data of every gzip member; a member without its trailer just ends."""
+    decompressor = zlib.decompressobj(wbits=31)
+    while True:
+        data = raw.read(READ_CHUNK)
+        if not data:
+            return
+        while data:
+            yield decompressor.decompress(data)
+            if not decompressor.eof:
+                break
+            data = decompressor.unused_data
+            decompressor = zlib.decompressobj(wbits=31)
+
+
+def _zstd_chunks(raw) -> Iterator[bytes]:
+    reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    try:
+        while True:
+            data = reader.read(READ_CHUNK)
+            if not data:
+                return
+            yield data
+    except zstandard.ZstdError:
+        return  # Frame still being written
+
+
+def iter_lines(path) -> Iterator[bytes]:
+    """Complete lines of a segment, including the active one; a trailing partial line is dropped."""
+    path = Path(path)
+    with open(path, "rb") as raw:
+        if path.suffix == ".gz":
+            chunks = _gzip_chunks(raw)
+        elif path.suffix == ".zst":
+            if not ZSTD_AVAILABLE:
+                raise ImportError("Reading .zst segments needs: pip install zstandard")
+            chunks = _zstd_chunks(raw)
+        else:
+            chunks = iter(lambda: raw.read(READ_CHUNK), b"")
+
+        pending = b""
+        for chunk in chunks:
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+
+
+def iter_records(paths: Iterable) -> Iterator[Dict]:
+    """Parsed records from segments; skips blank and malformed lines."""
+    for path in paths:
+        for line in iter_lines(path):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
+
+def count_records(paths: Iterable) -> int:
+    return sum(1 for path in paths for line in iter_lines(path) if line.strip())
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def _bench_record(i: int) -> Dict:
+    return {
+        "text": f"add {i % 9 + 1} butter chicken and 2 naan from inayat cafe",
+        "entities": [
+            {"start": 4, "end": 5, "label": "QTY", "text": str(i % 9 + 1)},
+            {"start": 6, "end": 20, "label": "FOOD", "text": "butter chicken"},
+        ],
+        "source": "llm_extraction",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def _run_bench(name: str, write, records: int, threads: int, rate: float) -> Dict:
+    latencies: List[float] = []
+    lat_lock = threading.Lock()
+    per_thread = records // threads
+    interval = threads / rate if rate else 0.0
+
+    def worker(offset: int):
+        local = []
+        next_at = time.perf_counter()
+        for i in range(per_thread):
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.perf_counter()
+            write(_bench_record(offset + i))
+            local.append(time.perf_counter() - start)
+        with lat_lock:
+            latencies.extend(local)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "writer": name,
+        "records": n,
+        "elapsed_s": round(elapsed, 3),
+        "writes_per_s": round(n / elapsed, 1),
+        "cpu_s": round(cpu, 3),
+        "p50_us": round(latencies[n // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(n * 0.99) - 1] * 1e6, 1),
+    }
+
+
+def benchmark(records: int = 20000, threads: int = 8, rate: float = 0.0,
+              compression: Optional[str] = None, directory: Optional[str] = None) -> List[Dict]:
+    import tempfile
+    import shutil
+
+    tmp = Path(directory or tempfile.mkdtemp(prefix="jsonl_bench_"))
+    results = []
+    try:
+        # Baseline: what _save_training_data / NERDataCollector did
+        path = tmp / "open_per_write.jsonl"
+        lock = threading.Lock()
+
+        def open_per_write(record):
+            with lock:
+                with open(path, "a") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        results.append(_run_bench("open_per_write", open_per_write, records, threads, rate))
+
+        writer = JSONLWriter(tmp / "buffered.jsonl", compression=compression)
+        result = _run_bench(f"buffered{'_' + compression if compression else ''}", writer.write, records, threads, rate)
+        close_start = time.perf_counter()
+        writer.close()
+        result["close_ms"] = round((time.perf_counter() - close_start) * 1000, 2)
+        result["bytes_on_disk"] = sum(p.stat().st_size for p in writer.segments())
+        results.append(result)
+
+        written = count_records(writer.segments())
+        assert written == result["records"], f"lost records: {written} != {result['records']}"
+    finally:
+        if not directory:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Buffered JSONL writer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("bench", help="Compare with open-per-write appends")
+    bench.add_argument("--records", type=int, default=20000)
+    bench.add_argument("--threads", type=int, default=8)
+    bench.add_argument("--rate", type=float, default=0.0, help="Total writes/s (0 = as fast as possible)")
+    bench.add_argument("--compression", choices=["gzip", "zstd"], default=None)
+
+    count = sub.add_parser("count", help="Count records across all segments of a base path")
+    count.add_argument("base_path")
+
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        rows = benchmark(args.records, args.threads, args.rate, args.compression)
+        print(f"{'writer':<20} {'writes/s':>10} {'cpu_s':>8} {'p50_us':>9} {'p99_us':>9}")
+        for row in rows:
+            print(f"{row['writer']:<20} {row['writes_per_s']:>10} {row['cpu_s']:>8} {row['p50_us']:>9} {row['p99_us']:>9}")
+    elif args.command == "count":
+        paths = segments(args.base_path)
+        print(f"{count_records(paths)} records in {len(paths)} segments")
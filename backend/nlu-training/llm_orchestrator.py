@@ -8,9 +8,11 @@ Features:
 2. Search integration for products and stores
 3. Auto-generation of NER/NLU training data
 4. Cart building and order understanding
+5. Optional in-process ANN fast path for product lookup (local_ann_index.py)
 """
 
 import json
+import time
 import requests
 import os
 import re
@@ -19,6 +21,17 @@ from typing import Optional, Dict, List, Any
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from search_cache import SearchResultCache
+from extraction_cache import ExtractionCache, prompt_version
+from extraction_router import ExtractionRouter, load_food_lexicon
+from jsonl_writer import shared_writer
+
+try:
+    from local_ann_index import LocalANNIndex
+    LOCAL_ANN_AVAILABLE = True
+except ImportError:
+    LOCAL_ANN_AVAILABLE = False
+
 # Configuration
 VLLM_URL = os.getenv("VLLM_URL", "http://localhost:8002/v1/chat/completions")
 VLLM_MODEL = os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-7B-Instruct-AWQ")
@@ -26,12 +39,35 @@ SEARCH_URL = os.getenv("SEARCH_URL", "http://localhost:3100")
 NLU_URL = os.getenv("NLU_URL", "http://192.168.0.151:7012")
 NER_URL = os.getenv("NER_URL", "http://192.168.0.151:7011")
 
+# Local ANN fast path (enabled when a snapshot directory is configured)
+LOCAL_ANN_DIR = os.getenv("ANN_SNAPSHOT_DIR")
+LOCAL_ANN_MIN_SCORE = float(os.getenv("LOCAL_ANN_MIN_SCORE", "0.6"))
+
+# Short-TTL search result cache (size 0 or TTL 0 disables it)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", "60"))
+
+# Tiered extraction: rules -> NLU/NER -> LLM (EXTRACTION_ROUTER=0 always uses the LLM)
+ROUTER_ENABLED = os.getenv("EXTRACTION_ROUTER", "1") == "1"
+ROUTER_RULE_MIN_CONF = float(os.getenv("ROUTER_RULE_MIN_CONF", "0.8"))
+ROUTER_NER_MIN_CONF = float(os.getenv("ROUTER_NER_MIN_CONF", "0.85"))
+# Comma-separated globs of NER JSONL files whose FOOD spans the rule tier trusts
+ROUTER_FOOD_LEXICON = os.getenv("ROUTER_FOOD_LEXICON", str(Path(__file__).parent / "ner*.jsonl"))
+
+# Persistent extraction cache (empty path disables it)
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH", str(Path(__file__).parent / "cache" / "extraction_cache.db")
+)
+
 # Training data output paths
 TRAINING_DATA_DIR = Path(__file__).parent / "generated_training_data"
 TRAINING_DATA_DIR.mkdir(exist_ok=True)
 
-NER_TRAINING_FILE = TRAINING_DATA_DIR / f"ner_training_llm_{datetime.now().strftime('%Y%m%d')}.jsonl"
-NLU_TRAINING_FILE = TRAINING_DATA_DIR / f"nlu_training_llm_{datetime.now().strftime('%Y%m%d')}.jsonl"
+# Base paths; segments are <stem>_YYYYMMDD[_NNN].jsonl[.gz|.zst]
+NER_TRAINING_FILE = TRAINING_DATA_DIR / "ner_training_llm.jsonl"
+NLU_TRAINING_FILE = TRAINING_DATA_DIR / "nlu_training_llm.jsonl"
+TRAINING_MAX_BYTES = int(os.getenv("TRAINING_MAX_BYTES", str(256 * 1024 * 1024)))
+TRAINING_COMPRESSION = os.getenv("TRAINING_COMPRESSION") or None  # gzip | zstd
 
 
 # System prompt for entity extraction
@@ -66,6 +102,9 @@ Important:
 - For Hindi numbers: ek=1, do=2, teen=3, char=4, paanch=5, chhe=6, saat=7, aath=8, nau=9, das=10
 """
 
+# Keys the extraction cache; changes whenever the prompt text changes
+PROMPT_VERSION = prompt_version(EXTRACTION_SYSTEM_PROMPT)
+
 
 @dataclass
 class Entity:
@@ -93,6 +132,8 @@ class ExtractionResult:
     cart_items: List[CartItem]
     search_results: Optional[Dict] = None
     raw_text: str = ""
+    source: str = "llm"  # llm | cache | fallback
+    usage: Optional[Dict] = None  # LLM token usage, only for fresh LLM calls
 
 
 class LLMOrchestrator:
@@ -100,83 +141,227 @@ class LLMOrchestrator:
         self.session = requests.Session()
         self.extraction_count = 0
         
+        self.ann_index = None
+        if LOCAL_ANN_AVAILABLE and LOCAL_ANN_DIR and Path(LOCAL_ANN_DIR).exists():
+            self.ann_index = LocalANNIndex(LOCAL_ANN_DIR)
+        
+        self.search_cache = SearchResultCache(max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL_S)
+        
+        self.extraction_cache = None
+        if EXTRACTION_CACHE_PATH:
+            self.extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, PROMPT_VERSION, VLLM_MODEL)
+        
+        writer_options = dict(rotate_daily=True, max_bytes=TRAINING_MAX_BYTES, compression=TRAINING_COMPRESSION)
+        self.ner_writer = shared_writer(NER_TRAINING_FILE, **writer_options)
+        self.nlu_writer = shared_writer(NLU_TRAINING_FILE, **writer_options)
+        
+        self.router = None
+        if ROUTER_ENABLED:
+            self.router = ExtractionRouter(
+                rule_min_confidence=ROUTER_RULE_MIN_CONF,
+                ner_min_confidence=ROUTER_NER_MIN_CONF,
+                food_lexicon=load_food_lexicon(p for p in ROUTER_FOOD_LEXICON.split(",") if p)
+            )
+        
+    def extract(self, text: str) -> ExtractionResult:
+        """Tiered extraction: rules, then NLU/NER, then the LLM when still unsure."""
+        if not self.router:
+            return self.extract_with_llm(text)
+        
+        reason = self.router.complexity(text)
+        if reason is None:
+            start = time.perf_counter()
+            result = self._rule_result(text)
+            self.router.record("rules", result is not None, (time.perf_counter() - start) * 1000)
+            if result:
+                return result
+            
+            start = time.perf_counter()
+            result = self._ner_result(text, *self._query_services(text))
+            self.router.record("ner", result is not None, (time.perf_counter() - start) * 1000)
+            if result:
+                return result
+            reason = "low_confidence"
+        
+        self.router.record_escalation(reason)
+        start = time.perf_counter()
+        result = self.extract_with_llm(text)
+        self.router.record("llm", True, (time.perf_counter() - start) * 1000)
+        return result
+    
     def extract_with_llm(self, text: str) -> ExtractionResult:
-        """Use vLLM to extract intent and entities from text."""
+        """Use vLLM to extract intent and entities from text (cached per normalized text)."""
+        cached = self._cached_extraction(text)
+        if cached:
+            return cached
+        
         try:
             response = self.session.post(
                 VLLM_URL,
-                json={
-                    "model": VLLM_MODEL,
-                    "messages": [
-                        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
-                        {"role": "user", "content": text}
-                    ],
-                    "temperature": 0.1,
-                    "max_tokens": 800
-                },
+                json=self._llm_request(text),
                 timeout=30
             )
             response.raise_for_status()
             
-            content = response.json()["choices"][0]["message"]["content"]
-            
-            # Parse JSON response
-            # Handle potential markdown code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            # Clean up common issues
-            content = content.strip()
-            
-            # Find the first { and last } to extract just the JSON
-            start_idx = content.find('{')
-            end_idx = content.rfind('}')
-            if start_idx != -1 and end_idx != -1:
-                content = content[start_idx:end_idx+1]
-            
-            data = json.loads(content)
-            
-            # Build result
-            entities = []
-            for e in data.get("entities", []):
-                # Calculate positions if not provided
-                start = e.get("start", text.lower().find(e["text"].lower()))
-                end = e.get("end", start + len(e["text"]) if start >= 0 else 0)
-                entities.append(Entity(
-                    text=e["text"],
-                    label=e["label"],
-                    start=start,
-                    end=end,
-                    confidence=e.get("confidence", 0.95)
-                ))
-            
-            cart_items = []
-            for item in data.get("cart_items", []):
-                cart_items.append(CartItem(
-                    food=item.get("food", ""),
-                    qty=item.get("qty", 1),
-                    store=item.get("store")
-                ))
-            
-            # If no cart_items but we have FOOD entities, build cart from entities
-            if not cart_items and entities:
-                cart_items = self._build_cart_from_entities(entities)
-            
-            return ExtractionResult(
-                intent=data.get("intent", "unknown"),
-                confidence=data.get("confidence", 0.9),
-                entities=entities,
-                cart_items=cart_items,
-                raw_text=text
-            )
+            body = response.json()
+            content = body["choices"][0]["message"]["content"]
+            result = self._parse_llm_content(text, content)
+            result.usage = body.get("usage")
+            self._cache_extraction(text, result, result.usage)
+            return result
             
         except Exception as e:
             print(f"LLM extraction error: {e}")
             # Fallback to NLU/NER
             return self._fallback_extraction(text)
     
+    def _llm_request(self, text: str) -> Dict:
+        """
+        Chat completion payload for entity extraction.
+        
+        The system message is the constant EXTRACTION_SYSTEM_PROMPT and comes
+        first, so every request shares a byte-identical prefix and vLLM can
+        serve it from its prefix cache; only the user message varies.
+        """
+        return {
+            "model": VLLM_MODEL,
+            "messages": [
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+                {"role": "user", "content": text}
+            ],
+            "temperature": 0.1,
+            "max_tokens": 800
+        }
+    
+    def _parse_llm_content(self, text: str, content: str) -> ExtractionResult:
+        """Parse the LLM's JSON answer into an ExtractionResult."""
+        # Parse JSON response
+        # Handle potential markdown code blocks
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0]
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0]
+        
+        # Clean up common issues
+        content = content.strip()
+        
+        # Find the first { and last } to extract just the JSON
+        start_idx = content.find('{')
+        end_idx = content.rfind('}')
+        if start_idx != -1 and end_idx != -1:
+            content = content[start_idx:end_idx+1]
+        
+        data = json.loads(content)
+        
+        # Build result
+        entities = []
+        for e in data.get("entities", []):
+            # Calculate positions if not provided
+            start = e.get("start", text.lower().find(e["text"].lower()))
+            end = e.get("end", start + len(e["text"]) if start >= 0 else 0)
+            entities.append(Entity(
+                text=e["text"],
+                label=e["label"],
+                start=start,
+                end=end,
+                confidence=e.get("confidence", 0.95)
+            ))
+        
+        cart_items = []
+        for item in data.get("cart_items", []):
+            cart_items.append(CartItem(
+                food=item.get("food", ""),
+                qty=item.get("qty", 1),
+                store=item.get("store")
+            ))
+        
+        # If no cart_items but we have FOOD entities, build cart from entities
+        if not cart_items and entities:
+            cart_items = self._build_cart_from_entities(entities)
+        
+        return ExtractionResult(
+            intent=data.get("intent", "unknown"),
+            confidence=data.get("confidence", 0.9),
+            entities=entities,
+            cart_items=cart_items,
+            raw_text=text
+        )
+    
+    def _cached_extraction(self, text: str) -> Optional[ExtractionResult]:
+        """Cached extraction for text, with entity offsets re-aligned to this text."""
+        if not self.extraction_cache:
+            return None
+        try:
+            data = self.extraction_cache.get(text)
+        except Exception as e:
+            print(f"Extraction cache error: {e}")
+            return None
+        if data is None:
+            return None
+        # The key ignores case and whitespace, so offsets may not match this text
+        return self._result_from_dict(text, data, source="cache")
+    
+    def _result_from_dict(self, text: str, data: Dict, source: str) -> ExtractionResult:
+        """ExtractionResult from a plain dict, entity offsets re-aligned to text."""
+        text_lower = text.lower()
+        entities = []
+        for e in data.get("entities", []):
+            start, end = e.get("start", 0), e.get("end", 0)
+            entity_text = e["text"]
+            if text_lower[start:end] != entity_text.lower():
+                start = text_lower.find(entity_text.lower())
+                end = start + len(entity_text) if start >= 0 else 0
+            if start >= 0:
+                entity_text = text[start:end] or entity_text
+            entities.append(Entity(
+                text=entity_text,
+                label=e["label"],
+                start=start,
+                end=end,
+                confidence=e.get("confidence", data.get("confidence", 0.95))
+            ))
+        
+        return ExtractionResult(
+            intent=data.get("intent", "unknown"),
+            confidence=data.get("confidence", 0.9),
+            entities=entities,
+            cart_items=[CartItem(**item) for item in data.get("cart_items", [])],
+            raw_text=text,
+            source=source
+        )
+    
+    def _rule_result(self, text: str) -> Optional[ExtractionResult]:
+        """Regex tier; None unless confident."""
+        data = self.router.rule_extract(text)
+        if not data or data["confidence"] < self.router.rule_min_confidence:
+            return None
+        return self._result_from_dict(text, data, source="rules")
+    
+    def _ner_result(self, text: str, nlu_data: Optional[Dict], ner_data: Optional[Dict]) -> Optional[ExtractionResult]:
+        """NLU + NER tier; None unless both are confident."""
+        score = self.router.score_services(nlu_data, ner_data)
+        if score < self.router.ner_min_confidence:
+            return None
+        result = self._build_fallback_result(text, nlu_data, ner_data)
+        result.source = "ner"
+        result.confidence = score
+        return result
+    
+    def _cache_extraction(self, text: str, result: ExtractionResult, usage: Optional[Dict]):
+        """Store a successful LLM extraction and account for its token usage."""
+        if not self.extraction_cache:
+            return
+        try:
+            self.extraction_cache.record_usage(usage)
+            self.extraction_cache.put(text, {
+                "intent": result.intent,
+                "confidence": result.confidence,
+                "entities": [asdict(e) for e in result.entities],
+                "cart_items": [asdict(item) for item in result.cart_items]
+            }, usage)
+        except Exception as e:
+            print(f"Extraction cache error: {e}")
+    
     def _build_cart_from_entities(self, entities: List[Entity]) -> List[CartItem]:
         """Build cart items from extracted entities."""
         cart_items = []
@@ -220,8 +405,12 @@ class LLMOrchestrator:
     
     def _fallback_extraction(self, text: str) -> ExtractionResult:
         """Fallback to NLU/NER services if LLM fails."""
-        intent = "unknown"
-        entities = []
+        return self._build_fallback_result(text, *self._query_services(text))
+    
+    def _query_services(self, text: str):
+        """(NLU /classify, NER /extract) JSON bodies; None for a failed call."""
+        nlu_data = None
+        ner_data = None
         
         try:
             # Get intent from NLU
@@ -232,7 +421,6 @@ class LLMOrchestrator:
             )
             if nlu_resp.ok:
                 nlu_data = nlu_resp.json()
-                intent = nlu_data.get("intent", "unknown")
         except:
             pass
         
@@ -245,57 +433,119 @@ class LLMOrchestrator:
             )
             if ner_resp.ok:
                 ner_data = ner_resp.json()
-                for e in ner_data.get("entities", []):
-                    entities.append(Entity(
-                        text=e["text"],
-                        label=e["label"],
-                        start=e.get("start", 0),
-                        end=e.get("end", 0),
-                        confidence=e.get("confidence", 0.5)
-                    ))
         except:
             pass
         
+        return nlu_data, ner_data
+    
+    def _build_fallback_result(self, text: str, nlu_data: Optional[Dict], ner_data: Optional[Dict]) -> ExtractionResult:
+        """Combine NLU intent and NER entities into an ExtractionResult."""
+        intent = (nlu_data or {}).get("intent", "unknown")
+        entities = []
+        for e in (ner_data or {}).get("entities", []):
+            entities.append(Entity(
+                text=e["text"],
+                label=e["label"],
+                start=e.get("start", 0),
+                end=e.get("end", 0),
+                confidence=e.get("confidence", 0.5)
+            ))
+        
         return ExtractionResult(
             intent=intent,
             confidence=0.5,
             entities=entities,
             cart_items=self._build_cart_from_entities(entities),
-            raw_text=text
+            raw_text=text,
+            source="fallback"
         )
     
-    def search_products(self, query: str, store: Optional[str] = None, limit: int = 5) -> Dict:
-        """Search for products in the search API."""
+    def search_products(self, query: str, store: Optional[str] = None, limit: int = 5,
+                        zone_id: Optional[int] = None, veg: Optional[int] = None) -> Dict:
+        """Search for products (cached; concurrent identical lookups share one call)."""
+        key = self.search_cache.make_key("products", query, store, limit, zone_id, veg)
+        result = self.search_cache.get_or_load(
+            key, lambda: self._search_products_uncached(query, store, limit, zone_id, veg)
+        )
+        result["query"] = query
+        return result
+    
+    def _search_products_uncached(self, query: str, store: Optional[str], limit: int,
+                                  zone_id: Optional[int], veg: Optional[int]) -> Dict:
+        """Local ANN fast path, then the search API."""
+        local = self._search_local_ann(query, store, limit, zone_id, veg)
+        if local:
+            return local
+        
         try:
             url = f"{SEARCH_URL}/search/food"
-            params = {"q": query, "limit": limit}
+            params = self._product_search_params(query, limit, zone_id, veg)
             
             response = self.session.get(url, params=params, timeout=10)
             response.raise_for_status()
             
-            data = response.json()
-            items = data.get("items", [])
-            
-            # Filter by store if specified
-            if store:
-                store_lower = store.lower()
-                items = [
-                    item for item in items 
-                    if store_lower in item.get("store_name", "").lower()
-                ]
-            
-            return {
-                "query": query,
-                "store_filter": store,
-                "count": len(items),
-                "items": items[:limit]
-            }
+            return self._product_results(query, store, limit, response.json())
         except Exception as e:
             print(f"Search error: {e}")
             return {"query": query, "count": 0, "items": [], "error": str(e)}
     
+    def _product_search_params(self, query: str, limit: int, zone_id: Optional[int], veg: Optional[int]) -> Dict:
+        """Query params for /search/food."""
+        params = {"q": query, "limit": limit}
+        if zone_id is not None:
+            params["zone_id"] = zone_id
+        if veg is not None:
+            params["veg"] = veg
+        return params
+    
+    def _product_results(self, query: str, store: Optional[str], limit: int, data: Dict) -> Dict:
+        """Filter search API items by store and shape the result."""
+        items = data.get("items", [])
+        
+        # Filter by store if specified
+        if store:
+            store_lower = store.lower()
+            items = [
+                item for item in items 
+                if store_lower in item.get("store_name", "").lower()
+            ]
+        
+        return {
+            "query": query,
+            "store_filter": store,
+            "count": len(items),
+            "items": items[:limit]
+        }
+    
+    def _search_local_ann(self, query: str, store: Optional[str], limit: int,
+                          zone_id: Optional[int], veg: Optional[int]) -> Optional[Dict]:
+        """Local ANN lookup; None when unavailable or the best match is weak."""
+        if not (self.ann_index and self.ann_index.ready):
+            return None
+        try:
+            items = self.ann_index.search(query, k=limit, zone_id=zone_id, veg=veg, store=store)
+            # Weak semantic matches fall through to the full search API
+            if items and items[0]["score"] >= LOCAL_ANN_MIN_SCORE:
+                return {
+                    "query": query,
+                    "store_filter": store,
+                    "count": len(items),
+                    "items": items,
+                    "source": "local_ann"
+                }
+        except Exception as e:
+            print(f"Local ANN error: {e}")
+        return None
+    
     def search_stores(self, query: str, limit: int = 5) -> Dict:
-        """Search for stores."""
+        """Search for stores (cached; concurrent identical lookups share one call)."""
+        key = self.search_cache.make_key("stores", query, None, limit)
+        result = self.search_cache.get_or_load(key, lambda: self._search_stores_uncached(query, limit))
+        result["query"] = query
+        return result
+    
+    def _search_stores_uncached(self, query: str, limit: int) -> Dict:
+        """Food stores first, ecom stores fill up a short result."""
         try:
             # Try food stores first
             url = f"{SEARCH_URL}/search/food/stores"
@@ -315,52 +565,72 @@ class LLMOrchestrator:
                     ecom_stores = ecom_resp.json().get("stores", [])
                     stores.extend(ecom_stores)
             
-            return {
-                "query": query,
-                "count": len(stores),
-                "stores": stores[:limit]
-            }
+            return self._store_results(query, limit, stores)
         except Exception as e:
             print(f"Store search error: {e}")
             return {"query": query, "count": 0, "stores": [], "error": str(e)}
     
-    def process_order_query(self, text: str) -> Dict:
+    def _store_results(self, query: str, limit: int, stores: List[Dict]) -> Dict:
+        """Shape merged food + ecom store results."""
+        return {
+            "query": query,
+            "count": len(stores),
+            "stores": stores[:limit]
+        }
+    
+    def process_order_query(self, text: str, use_router: bool = True) -> Dict:
         """
         Complete pipeline: Extract -> Search -> Build Cart -> Generate Training Data
+        
+        Args:
+            text: User query
+            use_router: Try rules / NLU+NER before the LLM (False forces the LLM)
         """
-        # Step 1: Extract with LLM
-        extraction = self.extract_with_llm(text)
+        # Step 1: Extract (rules / NER / LLM)
+        extraction = self.extract(text) if use_router else self.extract_with_llm(text)
         
         # Step 2: Search for each cart item
         search_results = []
         for item in extraction.cart_items:
             # Search for the food item
             products = self.search_products(item.food, store=item.store)
-            
-            if products["items"]:
-                # Update cart item with first matching product
-                best_match = products["items"][0]
-                item.product_id = best_match.get("id")
-                item.price = best_match.get("price")
-                if not item.store:
-                    item.store = best_match.get("store_name")
-            
-            search_results.append({
-                "query": item.food,
-                "store_filter": item.store,
-                "matches": products["items"][:3]
-            })
+            search_results.append(self._apply_product_match(item, products))
         
         # Step 3: Search for store if specified
         store_info = None
-        store_entities = [e for e in extraction.entities if e.label == "STORE"]
-        if store_entities:
-            store_info = self.search_stores(store_entities[0].text, limit=3)
+        store_query = self._store_query(extraction)
+        if store_query:
+            store_info = self.search_stores(store_query, limit=3)
         
         # Step 4: Generate training data
         self._save_training_data(extraction)
         
-        # Build response
+        return self._build_response(text, extraction, search_results, store_info)
+    
+    def _apply_product_match(self, item: CartItem, products: Dict) -> Dict:
+        """Update a cart item from its best product match; returns its search_results entry."""
+        if products["items"]:
+            # Update cart item with first matching product
+            best_match = products["items"][0]
+            item.product_id = best_match.get("id")
+            item.price = best_match.get("price")
+            if not item.store:
+                item.store = best_match.get("store_name")
+        
+        return {
+            "query": item.food,
+            "store_filter": item.store,
+            "matches": products["items"][:3]
+        }
+    
+    def _store_query(self, extraction: ExtractionResult) -> Optional[str]:
+        """First STORE entity text, if any."""
+        store_entities = [e for e in extraction.entities if e.label == "STORE"]
+        return store_entities[0].text if store_entities else None
+    
+    def _build_response(self, text: str, extraction: ExtractionResult,
+                        search_results: List[Dict], store_info: Optional[Dict]) -> Dict:
+        """Build the process_order_query response."""
         return {
             "intent": extraction.intent,
             "confidence": extraction.confidence,
@@ -374,13 +644,19 @@ class LLMOrchestrator:
             },
             "search_results": search_results,
             "store_info": store_info,
-            "raw_text": text
+            "raw_text": text,
+            "extraction_source": extraction.source,
+            "llm_usage": extraction.usage
         }
     
     def _save_training_data(self, extraction: ExtractionResult):
         """Save extraction as training data for NER and NLU."""
         if not extraction.entities:
             return
+        # Rule / NER tier output is what the current models already produce;
+        # cache hits were saved when the LLM first extracted them
+        if extraction.source in ("rules", "ner", "cache"):
+            return
         
         self.extraction_count += 1
         
@@ -400,8 +676,7 @@ class LLMOrchestrator:
             "timestamp": datetime.now().isoformat()
         }
         
-        with open(NER_TRAINING_FILE, "a") as f:
-            f.write(json.dumps(ner_sample, ensure_ascii=False) + "\n")
+        self.ner_writer.write(ner_sample)
         
         # Save NLU training data
         nlu_sample = {
@@ -419,8 +694,7 @@ class LLMOrchestrator:
             "timestamp": datetime.now().isoformat()
         }
         
-        with open(NLU_TRAINING_FILE, "a") as f:
-            f.write(json.dumps(nlu_sample, ensure_ascii=False) + "\n")
+        self.nlu_writer.write(nlu_sample)
         
         if self.extraction_count % 10 == 0:
             print(f"📊 Generated {self.extraction_count} training samples")
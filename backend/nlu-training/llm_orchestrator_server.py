@@ -7,11 +7,16 @@ and continuously generates training data.
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import uvicorn
+import asyncio
 import os
-from llm_orchestrator import LLMOrchestrator, TRAINING_DATA_DIR
+from llm_orchestrator import TRAINING_DATA_DIR, NER_TRAINING_FILE, NLU_TRAINING_FILE
+from async_llm_orchestrator import AsyncLLMOrchestrator
+from batch_engine import BatchEngine
+from jsonl_writer import segments, count_records
 
 app = FastAPI(
     title="Mangwale LLM Orchestrator",
@@ -27,8 +32,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global orchestrator instance
-orchestrator = LLMOrchestrator()
+# Global orchestrator instance (one pooled async HTTP client)
+orchestrator = AsyncLLMOrchestrator()
+batch_engine = BatchEngine(orchestrator)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await orchestrator.aclose()
 
 
 class QueryRequest(BaseModel):
@@ -56,6 +67,8 @@ class ProcessResponse(BaseModel):
     store_info: Optional[Dict[str, Any]]
     raw_text: str
     training_sample_saved: bool = True
+    partial: bool = False
+    timings: Optional[Dict[str, Any]] = None
 
 
 @app.get("/")
@@ -68,7 +81,9 @@ async def root():
             "process": "/process (POST)",
             "extract": "/extract (POST)",
             "search": "/search?q=...",
-            "stats": "/stats"
+            "stats": "/stats",
+            "batch": "/batch/generate (POST)",
+            "batch_jobs": "/batch/jobs/{job_id}"
         }
     }
 
@@ -79,7 +94,8 @@ async def health():
         "status": "healthy",
         "model": os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-7B-Instruct-AWQ"),
         "training_samples_generated": orchestrator.extraction_count,
-        "training_data_dir": str(TRAINING_DATA_DIR)
+        "training_data_dir": str(TRAINING_DATA_DIR),
+        "local_ann_version": orchestrator.ann_index.version if orchestrator.ann_index else None
     }
 
 
@@ -88,13 +104,14 @@ async def process_query(request: QueryRequest):
     """
     Main endpoint: Process a natural language order query.
     
-    - Extracts intent and entities using vLLM
-    - Searches for matching products
+    - Extracts intent and entities (rules / NLU+NER first, vLLM when unsure)
+    - Searches for matching products and stores concurrently
+      (partial results if lookups exceed the deadline)
     - Builds cart with prices
     - Saves training data
     """
     try:
-        result = orchestrator.process_order_query(request.text)
+        result = await orchestrator.process_order_query(request.text)
         return ProcessResponse(
             intent=result["intent"],
             confidence=result["confidence"],
@@ -103,7 +120,9 @@ async def process_query(request: QueryRequest):
             search_results=result["search_results"],
             store_info=result.get("store_info"),
             raw_text=result["raw_text"],
-            training_sample_saved=True
+            training_sample_saved=True,
+            partial=result["partial"],
+            timings=result["timings"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -116,10 +135,11 @@ async def extract_entities(request: QueryRequest):
     Useful for quick entity extraction.
     """
     try:
-        extraction = orchestrator.extract_with_llm(request.text)
+        extraction = await orchestrator.extract(request.text)
         return {
             "intent": extraction.intent,
             "confidence": extraction.confidence,
+            "source": extraction.source,
             "entities": [
                 {
                     "text": e.text,
@@ -140,10 +160,11 @@ async def extract_entities(request: QueryRequest):
 
 
 @app.get("/search")
-async def search(q: str, store: Optional[str] = None, limit: int = 10):
+async def search(q: str, store: Optional[str] = None, limit: int = 10,
+                 zone_id: Optional[int] = None, veg: Optional[int] = None):
     """Search for products."""
     try:
-        return orchestrator.search_products(q, store=store, limit=limit)
+        return await orchestrator.search_products(q, store=store, limit=limit, zone_id=zone_id, veg=veg)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -152,7 +173,7 @@ async def search(q: str, store: Optional[str] = None, limit: int = 10):
 async def search_stores(q: str, limit: int = 5):
     """Search for stores."""
     try:
-        return orchestrator.search_stores(q, limit=limit)
+        return await orchestrator.search_stores(q, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -160,61 +181,91 @@ async def search_stores(q: str, limit: int = 5):
 @app.get("/stats")
 async def get_stats():
     """Get training data generation statistics."""
-    import glob
-    
-    ner_files = glob.glob(str(TRAINING_DATA_DIR / "ner_training_llm_*.jsonl"))
-    nlu_files = glob.glob(str(TRAINING_DATA_DIR / "nlu_training_llm_*.jsonl"))
+    # Buffered records count too
+    orchestrator.ner_writer.flush()
+    orchestrator.nlu_writer.flush()
     
-    total_ner = 0
-    total_nlu = 0
-    
-    for f in ner_files:
-        with open(f) as file:
-            total_ner += sum(1 for _ in file)
-    
-    for f in nlu_files:
-        with open(f) as file:
-            total_nlu += sum(1 for _ in file)
+    ner_files = segments(NER_TRAINING_FILE)
+    nlu_files = segments(NLU_TRAINING_FILE)
+    total_ner, total_nlu = await asyncio.gather(
+        asyncio.to_thread(count_records, ner_files),
+        asyncio.to_thread(count_records, nlu_files),
+    )
     
     return {
         "session_extractions": orchestrator.extraction_count,
         "total_ner_samples": total_ner,
         "total_nlu_samples": total_nlu,
         "training_data_dir": str(TRAINING_DATA_DIR),
-        "ner_files": ner_files,
-        "nlu_files": nlu_files
+        "ner_files": [str(f) for f in ner_files],
+        "nlu_files": [str(f) for f in nlu_files],
+        "writers": {"ner": orchestrator.ner_writer.stats(), "nlu": orchestrator.nlu_writer.stats()},
+        "search_cache": orchestrator.search_cache.stats(),
+        "extraction_cache": orchestrator.extraction_cache.stats() if orchestrator.extraction_cache else None,
+        "llm_retries": orchestrator.llm_retries,
+        "router": orchestrator.router.stats() if orchestrator.router else None
     }
 
 
 @app.post("/batch/generate")
-async def batch_generate(queries: List[str]):
+async def batch_generate(queries: List[str], concurrency: Optional[int] = None,
+                         wait: bool = True, stream: bool = False):
     """
-    Process multiple queries in batch to generate training data quickly.
+    Process multiple queries concurrently to generate training data quickly.
+    
+    - wait=true (default): block until done, return all results + throughput
+    - wait=false: return the job ID at once, poll /batch/jobs/{job_id}
+    - stream=true: NDJSON, one line per finished query, then a summary line
     """
-    results = []
-    for query in queries:
-        try:
-            result = orchestrator.process_order_query(query)
-            results.append({
-                "query": query,
-                "intent": result["intent"],
-                "entities_count": len(result["entities"]),
-                "success": True
-            })
-        except Exception as e:
-            results.append({
-                "query": query,
-                "error": str(e),
-                "success": False
-            })
+    job = batch_engine.submit(queries, concurrency=concurrency)
+    
+    if stream:
+        return StreamingResponse(batch_engine.stream(job), media_type="application/x-ndjson")
+    if not wait:
+        return job.progress()
     
+    await batch_engine.wait(job)
     return {
-        "processed": len(results),
-        "successful": sum(1 for r in results if r["success"]),
-        "results": results
+        **job.progress(),
+        "results": job.results
     }
 
 
+@app.get("/batch/jobs")
+async def list_batch_jobs():
+    """Progress of recent batch jobs."""
+    return {"jobs": [job.progress() for job in batch_engine.jobs.values()]}
+
+
+@app.get("/batch/jobs/{job_id}")
+async def get_batch_job(job_id: str, results: bool = False):
+    """Progress of a batch job (results=true adds finished results)."""
+    job = batch_engine.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    response = job.progress()
+    if results:
+        response["results"] = [r for r in job.results if r is not None]
+    return response
+
+
+@app.get("/batch/jobs/{job_id}/stream")
+async def stream_batch_job(job_id: str):
+    """NDJSON stream of a batch job's results (already finished ones first)."""
+    job = batch_engine.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return StreamingResponse(batch_engine.stream(job), media_type="application/x-ndjson")
+
+
+@app.delete("/batch/jobs/{job_id}")
+async def cancel_batch_job(job_id: str):
+    """Cancel a running batch job."""
+    if not batch_engine.cancel(job_id):
+        raise HTTPException(status_code=404, detail=f"No running job {job_id}")
+    return {"job_id": job_id, "status": "cancelling"}
+
+
 if __name__ == "__main__":
     port = int(os.getenv("ORCHESTRATOR_PORT", "7020"))
     print(f"🚀 Starting LLM Orchestrator API on port {port}")
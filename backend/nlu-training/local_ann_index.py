@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Local ANN Index - In-process semantic item lookup
+==================================================
+Sub-millisecond candidate generator for entity resolution, built from a
+catalog snapshot of the food vector index (food_items_v4.item_vector).
+
+Layout (one directory per published version):
+    ANN_SNAPSHOT_DIR/
+        CURRENT                         - name of the active version
+        v20260301_120000/
+            manifest.json               - source index, counts, dimension
+            zone_<id>/vectors.npy       - float32 [n, dim], L2-normalized
+            zone_<id>/meta.json         - ids, names, store ids/names, veg, price
+            zone_<id>/hnsw.bin          - hnswlib graph (large zones only)
+
+Search:
+    - Zones up to BRUTE_FORCE_MAX items: NumPy dot product over the
+      memory-mapped vectors (exact)
+    - Larger zones: hnswlib HNSW graph when hnswlib is installed
+    - Filters: zone_id, veg, store_id, store name substring. A filter that
+      leaves at most BRUTE_FORCE_MAX items is searched exactly over those;
+      when the filtered graph search cannot fill k it falls back to the same
+    - Query embedding: the food model in-process when sentence-transformers
+      is installed (ANN_LOCAL_ENCODER=auto), else the embedding service
+
+Hot reload:
+    `build` writes a new version directory and atomically replaces CURRENT.
+    Running indexes poll CURRENT every RELOAD_INTERVAL seconds and swap in the
+    new version without blocking searches. search/scripts/sync-mysql-with-vectors.py
+    runs `build` after every sync when ANN_SNAPSHOT_DIR is set.
+
+Usage:
+    python local_ann_index.py build --index food_items_v4
+    python local_ann_index.py search "paneer tikka" --zone 4 --veg 1
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+try:
+    import sentence_transformers  # noqa: F401
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+# Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+ANN_SNAPSHOT_DIR = os.environ.get('ANN_SNAPSHOT_DIR', '/data/ann_snapshots')
+OPENSEARCH_URL = os.environ.get('OPENSEARCH_URL', 'http://localhost:9200')
+EMBEDDING_SERVICE_URL = os.environ.get('EMBEDDING_SERVICE_URL', 'http://localhost:3101')
+# Embed queries in-process (true), via the embedding service (false), or in-process when possible (auto)
+_ANN_LOCAL_ENCODER = os.environ.get('ANN_LOCAL_ENCODER', 'auto').lower()
+ANN_LOCAL_ENCODER = _ANN_LOCAL_ENCODER == 'true' or (_ANN_LOCAL_ENCODER == 'auto' and SENTENCE_TRANSFORMERS_AVAILABLE)
+FOOD_EMBEDDING_MODEL = 'jonny9f/food_embeddings'
+
+SOURCE_INDEX = 'food_items_v4'
+VECTOR_FIELD = 'item_vector'
+BRUTE_FORCE_MAX = 20000
+RELOAD_INTERVAL = 30
+KEEP_VERSIONS = 3
+SCROLL_SIZE = 500
+
+META_FIELDS = ['id', 'name', 'store_id', 'store_name', 'zone_id', 'veg', 'price']
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# ============================================================================
+# SNAPSHOT BUILD / PUBLISH
+# ============================================================================
+def scroll_catalog(index: str = SOURCE_INDEX, field: str = VECTOR_FIELD):
+    """Yield (meta, vector) for every document with a vector"""
+    response = requests.post(
+        f"{OPENSEARCH_URL}/{index}/_search?scroll=5m",
+        json={
+            "size": SCROLL_SIZE,
+            "query": {"exists": {"field": field}},
+            "_source": META_FIELDS + [field]
+        },
+        timeout=60
+    )
+    response.raise_for_status()
+    data = response.json()
+    scroll_id = data.get('_scroll_id')
+    hits = data.get('hits', {}).get('hits', [])
+
+    while hits:
+        for hit in hits:
+            source = hit.get('_source', {})
+            vector = source.pop(field, None)
+            if vector and any(vector):
+                yield source, vector
+        response = requests.post(
+            f"{OPENSEARCH_URL}/_search/scroll",
+            json={"scroll": "5m", "scroll_id": scroll_id},
+            timeout=60
+        )
+        if not response.ok:
+            break
+        data = response.json()
+        scroll_id = data.get('_scroll_id')
+        hits = data.get('hits', {}).get('hits', [])
+
+    if scroll_id:
+        requests.delete(f"{OPENSEARCH_URL}/_search/scroll", json={"scroll_id": scroll_id}, timeout=10)
+
+
+def build_snapshot(index: str = SOURCE_INDEX, field: str = VECTOR_FIELD,
+                   snapshot_dir: str = ANN_SNAPSHOT_DIR) -> str:
+    """
+    Build a per-zone snapshot from the vector index and publish it.
+
+    Returns:
+        The new version name
+    """
+    snapshot_root = Path(snapshot_dir)
+    version = datetime.now().strftime('v%Y%m%d_%H%M%S')
+    version_dir = snapshot_root / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+
+    zones: Dict[int, Dict[str, list]] = {}
+    for meta, vector in scroll_catalog(index, field):
+        zone_id = int(meta.get('zone_id') or 0)
+        zone = zones.setdefault(zone_id, {'meta': [], 'vectors': []})
+        zone['meta'].append(meta)
+        zone['vectors'].append(vector)
+
+    manifest = {
+        'version': version,
+        'source_index': index,
+        'field': field,
+        'created_at': datetime.now().isoformat(),
+        'zones': {}
+    }
+
+    for zone_id, zone in zones.items():
+        zone_dir = version_dir / f"zone_{zone_id}"
+        zone_dir.mkdir(exist_ok=True)
+
+        vectors = _normalize(np.asarray(zone['vectors'], dtype=np.float32))
+        np.save(zone_dir / 'vectors.npy', vectors)
+
+        metas = zone['meta']
+        with open(zone_dir / 'meta.json', 'w') as f:
+            json.dump({
+                'ids': [m.get('id') for m in metas],
+                'names': [m.get('name') or '' for m in metas],
+                'store_ids': [int(m.get('store_id') or 0) for m in metas],
+                'store_names': [m.get('store_name') or '' for m in metas],
+                'veg': [int(m.get('veg') or 0) for m in metas],
+                'prices': [float(m.get('price') or 0) for m in metas],
+            }, f, ensure_ascii=False)
+
+        has_graph = False
+        if HNSWLIB_AVAILABLE and len(metas) > BRUTE_FORCE_MAX:
+            graph = hnswlib.Index(space='ip', dim=vectors.shape[1])
+            graph.init_index(max_elements=len(metas), ef_construction=128, M=16)
+            graph.add_items(vectors, np.arange(len(metas)))
+            graph.save_index(str(zone_dir / 'hnsw.bin'))
+            has_graph = True
+
+        manifest['zones'][str(zone_id)] = {
+            'count': len(metas),
+            'dimension': int(vectors.shape[1]),
+            'hnsw': has_graph
+        }
+        logger.info(f"📦 Zone {zone_id}: {len(metas):,} items{' (hnsw)' if has_graph else ''}")
+
+    with open(version_dir / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_version(version, snapshot_dir)
+    return version
+
+
+def publish_version(version: str, snapshot_dir: str = ANN_SNAPSHOT_DIR):
+    """Atomically point CURRENT at a version and prune old versions"""
+    snapshot_root = Path(snapshot_dir)
+    tmp_file = snapshot_root / 'CURRENT.tmp'
+    tmp_file.write_text(version)
+    os.replace(tmp_file, snapshot_root / 'CURRENT')
+    logger.info(f"✅ Published ANN snapshot {version}")
+
+    versions = sorted(p.name for p in snapshot_root.iterdir() if p.is_dir() and p.name.startswith('v'))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(snapshot_root / old, ignore_errors=True)
+
+
+# ============================================================================
+# ZONE INDEX
+# ============================================================================
+class ZoneIndex:
+    """Vectors + metadata for one zone, memory-mapped from disk"""
+
+    def __init__(self, zone_dir: Path):
+        self.vectors = np.load(zone_dir / 'vectors.npy', mmap_mode='r')
+        with open(zone_dir / 'meta.json') as f:
+            meta = json.load(f)
+        self.ids = meta['ids']
+        self.names = meta['names']
+        self.store_names = meta['store_names']
+        self.store_ids = np.asarray(meta['store_ids'], dtype=np.int64)
+        self.veg = np.asarray(meta['veg'], dtype=np.int8)
+        self.prices = meta['prices']
+        self.store_names_lower = [s.lower() for s in self.store_names]
+
+        self.graph = None
+        graph_path = zone_dir / 'hnsw.bin'
+        if HNSWLIB_AVAILABLE and graph_path.exists():
+            self.graph = hnswlib.Index(space='ip', dim=self.vectors.shape[1])
+            self.graph.load_index(str(graph_path), max_elements=len(self.ids))
+            self.graph.set_ef(64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _mask(self, veg: Optional[int], store_id: Optional[int], store: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+        if veg is not None:
+            mask = self.veg == veg
+        if store_id is not None:
+            m = self.store_ids == store_id
+            mask = m if mask is None else mask & m
+        if store:
+            store_lower = store.lower()
+            m = np.fromiter((store_lower in s for s in self.store_names_lower), dtype=bool, count=len(self))
+            mask = m if mask is None else mask & m
+        return mask
+
+    def search(self, query: np.ndarray, k: int, veg: Optional[int] = None,
+               store_id: Optional[int] = None, store: Optional[str] = None) -> List[Dict]:
+        if not len(self):
+            return []
+        mask = self._mask(veg, store_id, store)
+        if mask is not None and not mask.any():
+            return []
+
+        positions = None
+        allowed = len(self) if mask is None else int(mask.sum())
+        if self.graph is not None and allowed > BRUTE_FORCE_MAX:
+            k = min(k, allowed)
+            kwargs = {'filter': lambda label: bool(mask[label])} if mask is not None else {}
+            try:
+                labels, distances = self.graph.knn_query(query, k=k, **kwargs)
+                positions = labels[0].tolist()
+                scores = (1.0 - distances[0]).tolist()
+            except RuntimeError:
+                # The filtered graph walk found fewer than k matches (ef too small for the filter)
+                logger.debug(f"Filtered HNSW search could not fill k={k}; exact search over {allowed:,} items")
+        if positions is None:
+            positions, scores = self._exact(query, k, mask)
+
+        return [
+            {
+                'id': self.ids[p],
+                'name': self.names[p],
+                'store_id': int(self.store_ids[p]),
+                'store_name': self.store_names[p],
+                'veg': int(self.veg[p]),
+                'price': self.prices[p],
+                'score': round(score, 4)
+            }
+            for p, score in zip(positions, scores)
+        ]
+
+    def _exact(self, query: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        """Exact top-k over the whole zone or over the filtered items only"""
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        scores_all = (self.vectors[candidates] if candidates is not None else self.vectors) @ query
+        k = min(k, len(scores_all))
+        top = np.argpartition(-scores_all, k - 1)[:k]
+        top = top[np.argsort(-scores_all[top])]
+        positions = candidates[top] if candidates is not None else top
+        return positions.tolist(), [float(scores_all[t]) for t in top]
+
+
+# ============================================================================
+# LOCAL ANN INDEX
+# ============================================================================
+class LocalANNIndex:
+    """Per-zone in-process ANN index with hot reload"""
+
+    def __init__(self, snapshot_dir: str = ANN_SNAPSHOT_DIR, reload_interval: int = RELOAD_INTERVAL):
+        self.snapshot_root = Path(snapshot_dir)
+        self.reload_interval = reload_interval
+        self.version: Optional[str] = None
+        self.zones: Dict[int, ZoneIndex] = {}
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self._session = requests.Session()
+        self.maybe_reload(force=True)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.zones)
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            return (self.snapshot_root / 'CURRENT').read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """Swap in a newly published version; returns True if reloaded"""
+        now = time.time()
+        if not force and now - self._last_check < self.reload_interval:
+            return False
+        # Only one caller loads; others keep serving the current version
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = now
+            version = self._current_version()
+            if not version or version == self.version:
+                return False
+
+            version_dir = self.snapshot_root / version
+            zones = {}
+            for zone_dir in version_dir.glob('zone_*'):
+                zones[int(zone_dir.name.split('_', 1)[1])] = ZoneIndex(zone_dir)
+
+            # Single reference swap - in-flight searches finish on the old zones
+            self.zones, self.version = zones, version
+            total = sum(len(z) for z in zones.values())
+            logger.info(f"✅ Loaded ANN snapshot {version}: {len(zones)} zones, {total:,} items")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load ANN snapshot: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a query with the food model (in-process or embedding service)"""
+        if ANN_LOCAL_ENCODER:
+            if self._encoder is None:
+                with self._encoder_lock:
+                    if self._encoder is None:
+                        from sentence_transformers import SentenceTransformer
+                        self._encoder = SentenceTransformer(FOOD_EMBEDDING_MODEL)
+            vector = self._encoder.encode([text], normalize_embeddings=True)[0]
+        else:
+            response = self._session.post(
+                f"{EMBEDDING_SERVICE_URL}/embed",
+                json={"texts": [text], "model_type": "food"},
+                timeout=5
+            )
+            response.raise_for_status()
+            vector = response.json()["embeddings"][0]
+        return _normalize(np.asarray(vector, dtype=np.float32))
+
+    def search_vector(self, vector: np.ndarray, k: int = 5, zone_id: Optional[int] = None,
+                      veg: Optional[int] = None, store_id: Optional[int] = None,
+                      store: Optional[str] = None) -> List[Dict]:
+        """Top-k items for a query vector, optionally filtered"""
+        self.maybe_reload()
+        zones = self.zones
+        if zone_id is not None:
+            candidates = [zones[zone_id]] if zone_id in zones else []
+        else:
+            candidates = list(zones.values())
+
+        results = []
+        for zone in candidates:
+            results.extend(zone.search(vector, k, veg=veg, store_id=store_id, store=store))
+        results.sort(key=lambda r: r['score'], reverse=True)
+        return results[:k]
+
+    def search(self, text: str, k: int = 5, **filters) -> List[Dict]:
+        """Top-k items for a text query"""
+        if not self.ready:
+            return []
+        return self.search_vector(self.embed(text), k=k, **filters)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local ANN index for semantic item lookup")
+    parser.add_argument('command', choices=['build', 'search', 'stats'])
+    parser.add_argument('query', nargs='?', help='Query text (search)')
+    parser.add_argument('--index', default=SOURCE_INDEX, help='Source vector index')
+    parser.add_argument('--field', default=VECTOR_FIELD, help='Source vector field')
+    parser.add_argument('--snapshot-dir', default=ANN_SNAPSHOT_DIR, help='Snapshot directory')
+    parser.add_argument('--zone', type=int, default=None, help='Zone filter')
+    parser.add_argument('--veg', type=int, choices=[0, 1], default=None, help='Veg filter')
+    parser.add_argument('--store', default=None, help='Store name filter')
+    parser.add_argument('--k', type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        version = build_snapshot(args.index, args.field, args.snapshot_dir)
+        print(f"Published {version} to {args.snapshot_dir}")
+
+    elif args.command == 'stats':
+        ann = LocalANNIndex(args.snapshot_dir)
+        print(json.dumps({
+            'version': ann.version,
+            'hnswlib': HNSWLIB_AVAILABLE,
+            'local_encoder': ANN_LOCAL_ENCODER,
+            'zones': {str(z): len(idx) for z, idx in ann.zones.items()}
+        }, indent=2))
+
+    elif args.command == 'search':
+        if not args.query:
+            parser.error("search requires a query")
+        ann = LocalANNIndex(args.snapshot_dir)
+        vector = ann.embed(args.query)
+        start = time.perf_counter()
+        results = ann.search_vector(vector, k=args.k, zone_id=args.zone, veg=args.veg, store=args.store)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for r in results:
+            print(f"{r['score']:.4f}  {r['name']} @ {r['store_name']} (₹{r['price']})")
+        print(f"\n{len(results)} results in {elapsed_ms:.2f}ms (search only, excluding embedding)")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Model Benchmark - standard CPU inference numbers for a saved model
+==================================================================
+Trainers pick their best checkpoint by F1 alone. After saving it they now
+also benchmark it and write benchmark.json next to the model, and
+server.py's GET /models lists it so a deploy can weigh speed and size as
+well as accuracy:
+
+    variants.fp32   the saved model as is
+    variants.int8   torch dynamic quantization of its Linear layers, what a
+                    CPU server would load
+        batch_1     p50/p95/mean ms per message, the way /classify calls it
+        batch_32    p50/p95/mean ms per batch of 32, messages_per_s
+        peak_rss_mb   peak RSS of the benchmark process
+        model_rss_mb  peak RSS minus the process before loading the model
+        size_mb       on disk (int8: the saved quantized state dict)
+
+Each variant runs in a fresh spawned process on CPU (CUDA hidden) with
+BENCHMARK_THREADS torch threads, so neither timings nor RSS carry over from
+the training run. int8 is quantized in a process of its own and saved as a
+whole module; its benchmark process loads only that, so the fp32 weights
+never count towards its RSS. The texts are a sample of the run's
+validation messages.
+
+    benchmark_saved_model(output_dir, [d['text'] for d in val_data], head="sequence")
+
+CLI (re-benchmark an existing model):
+    python model_benchmark.py /models/indicbert_latest --data nlu_v8_final.jsonl
+
+TRAIN_BENCHMARK=0 skips the benchmark at the end of training.
+"""
+
+import os
+import sys
+import json
+import random
+import logging
+import platform
+import tempfile
+import multiprocessing
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_FILE = "benchmark.json"
+BENCHMARK_THREADS = int(os.environ.get("BENCHMARK_THREADS", "1"))
+BENCHMARK_TIMEOUT_S = float(os.environ.get("BENCHMARK_TIMEOUT_S", "900"))
+TRAIN_BENCHMARK = os.environ.get("TRAIN_BENCHMARK", "1") != "0"
+VARIANTS = ("fp32", "int8")
+BATCH_SIZES = (1, 32)
+SAMPLES = 200
+MIN_BATCHES = 5
+WARMUP_BATCHES = 3
+MAX_LENGTH = 128
+# Trainer output that is not part of the served model
+SKIPPED_DIRS = ("checkpoint", "logs", "runs")
+
+# Used by the CLI when no --data is given
+DEFAULT_TEXTS = [
+    "hi",
+    "mujhe 2 paneer tikka chahiye",
+    "track my order",
+    "parcel bhejna hai satpur se nashik road tak, pickup kal subah 10 baje",
+    "cart mein kya hai",
+    "tushar misal se 3 plate misal pav",
+]
+
+
+def model_size_mb(model_dir: str) -> float:
+    """Size of the files a server loads: checkpoints and logs excluded"""
+    total = 0
+    for root, dirs, files in os.walk(model_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(SKIPPED_DIRS)]
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files if f != BENCHMARK_FILE)
+    return round(total / 1024 ** 2, 1)
+
+
+def detect_head(model_dir: str) -> str:
+    """'token' for NER models (label_config.json or *ForTokenClassification), else 'sequence'"""
+    if os.path.exists(os.path.join(model_dir, "label_config.json")):
+        return "token"
+    config_path = os.path.join(model_dir, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            architectures = json.load(f).get("architectures") or []
+        if any(a.endswith("ForTokenClassification") for a in architectures):
+            return "token"
+    return "sequence"
+
+
+# ============================================================================
+# BENCHMARK PROCESS
+# ============================================================================
+def _rss_mb() -> float:
+    import resource
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _cpu_only(threads: int):
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def _load_fp32(model_dir: str, head: str):
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoModelForTokenClassification
+
+    model_class = AutoModelForTokenClassification if head == "token" else AutoModelForSequenceClassification
+    return model_class.from_pretrained(model_dir, trust_remote_code=True, torch_dtype=torch.float32).eval()
+
+
+def _quantize(model_dir: str, head: str, path: str, threads: int, conn):
+    """Entry point of the int8 preparation process: quantized module saved whole to path"""
+    _cpu_only(threads)
+    try:
+        import torch
+
+        model = torch.ao.quantization.quantize_dynamic(_load_fp32(model_dir, head), {torch.nn.Linear},
+                                                       dtype=torch.qint8)
+        torch.save(model, path)
+        state_path = f"{path}.state"
+        torch.save(model.state_dict(), state_path)
+        conn.send({"size_mb": round(os.path.getsize(state_path) / 1024 ** 2, 1)})
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def _run_variant(model_dir: str, head: str, texts: List[str], variant: str, threads: int,
+                 max_length: int, conn, quantized_path: Optional[str] = None):
+    """Entry point of a benchmark process: one variant, results sent over conn"""
+    _cpu_only(threads)
+    try:
+        import time
+        import numpy as np
+        import torch
+        from transformers import AutoTokenizer
+
+        torch.set_num_threads(threads)
+        baseline_rss = _rss_mb()
+
+        tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        result: Dict[str, Any] = {}
+        if variant == "int8":
+            # Only the quantized module is ever in this process
+            model = torch.load(quantized_path, weights_only=False).eval()
+        else:
+            model = _load_fp32(model_dir, head)
+            result["size_mb"] = model_size_mb(model_dir)
+
+        @torch.inference_mode()
+        def run(batch: List[str]):
+            inputs = tokenizer(batch, padding=True, truncation=True, max_length=max_length, return_tensors="pt")
+            model(**inputs)
+
+        for batch_size in BATCH_SIZES:
+            count = max(len(texts) // batch_size, MIN_BATCHES)
+            batches = [[texts[(i * batch_size + j) % len(texts)] for j in range(batch_size)] for i in range(count)]
+            for batch in batches[:WARMUP_BATCHES]:
+                run(batch)
+            timings = []
+            for batch in batches:
+                start = time.perf_counter()
+                run(batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            mean = float(np.mean(timings))
+            result[f"batch_{batch_size}"] = {
+                "p50_ms": round(float(np.percentile(timings, 50)), 2),
+                "p95_ms": round(float(np.percentile(timings, 95)), 2),
+                "mean_ms": round(mean, 2),
+                "messages_per_s": round(batch_size * 1000 / mean, 1),
+                "batches": len(timings),
+            }
+
+        result["peak_rss_mb"] = _rss_mb()
+        result["model_rss_mb"] = round(result["peak_rss_mb"] - baseline_rss, 1)
+        conn.send(result)
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def _in_process(target, name: str, timeout_s: float, *args, **kwargs) -> Dict[str, Any]:
+    """Run target(*args, conn, **kwargs) in a fresh spawned process; the dict it sends back"""
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=target, name=name, args=(*args, child), kwargs=kwargs)
+    process.start()
+    child.close()
+    try:
+        if parent.poll(timeout_s):
+            result = parent.recv()
+        else:
+            result = {"error": f"timed out after {timeout_s:.0f}s"}
+    except EOFError:
+        result = {"error": f"{name} process died"}
+    process.join(10)
+    if process.is_alive():
+        process.terminate()
+        process.join(5)
+    parent.close()
+    return result
+
+
+def benchmark_model(model_dir: str, texts: Sequence[str], head: Optional[str] = None,
+                    threads: int = BENCHMARK_THREADS, variants: Sequence[str] = VARIANTS,
+                    samples: int = SAMPLES, max_length: int = MAX_LENGTH,
+                    timeout_s: float = BENCHMARK_TIMEOUT_S, write: bool = True) -> Dict[str, Any]:
+    """Benchmark every variant in its own process; writes benchmark.json next to the model"""
+    head = head or detect_head(model_dir)
+    texts = [t for t in texts if t and t.strip()] or list(DEFAULT_TEXTS)
+    texts = random.Random(42).sample(texts, min(samples, len(texts)))
+
+    benchmark: Dict[str, Any] = {
+        "model_dir": model_dir,
+        "head": head,
+        "device": "cpu",
+        "threads": threads,
+        "samples": len(texts),
+        "max_length": max_length,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "created_at": datetime.now().isoformat(),
+        "variants": {},
+    }
+
+    for variant in variants:
+        if variant == "int8":
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "int8.pt")
+                result = _in_process(_quantize, f"quantize-{variant}", timeout_s,
+                                     model_dir, head, path, threads)
+                if "error" not in result:
+                    size_mb = result["size_mb"]
+                    result = _in_process(_run_variant, f"benchmark-{variant}", timeout_s,
+                                         model_dir, head, texts, variant, threads, max_length,
+                                         quantized_path=path)
+                    result.setdefault("size_mb", size_mb)
+        else:
+            result = _in_process(_run_variant, f"benchmark-{variant}", timeout_s,
+                                 model_dir, head, texts, variant, threads, max_length)
+
+        benchmark["variants"][variant] = result
+        if "error" in result:
+            logger.warning(f"   Benchmark {variant}: {result['error']}")
+        else:
+            logger.info(f"   Benchmark {variant}: batch 1 p50 {result['batch_1']['p50_ms']}ms "
+                        f"p95 {result['batch_1']['p95_ms']}ms, batch 32 p50 {result['batch_32']['p50_ms']}ms, "
+                        f"{result['size_mb']}MB on disk, peak RSS {result['peak_rss_mb']}MB")
+
+    if write:
+        with open(os.path.join(model_dir, BENCHMARK_FILE), "w") as f:
+            json.dump(benchmark, f, indent=2)
+    return benchmark
+
+
+def benchmark_saved_model(model_dir: str, texts: Sequence[str], head: str) -> Optional[Dict[str, Any]]:
+    """End-of-training hook: never fails the run, respects TRAIN_BENCHMARK"""
+    if not TRAIN_BENCHMARK:
+        return None
+    logger.info(f"\n⏱️ Benchmarking {model_dir} on CPU ({BENCHMARK_THREADS} threads)")
+    try:
+        return benchmark_model(model_dir, texts, head)
+    except Exception as e:
+        logger.warning(f"⚠️ Benchmark failed, no {BENCHMARK_FILE} written: {e}")
+        return None
+
+
+def load_benchmark(model_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(model_dir, BENCHMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Unreadable {path}: {e}")
+        return None
+
+
+def summary(benchmark: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Headline numbers per variant: batch 1 / 32 latency, size and RSS"""
+    out = {}
+    for variant, result in benchmark.get("variants", {}).items():
+        if "error" in result:
+            out[variant] = {"error": result["error"]}
+            continue
+        out[variant] = {
+            "batch_1_p50_ms": result["batch_1"]["p50_ms"],
+            "batch_1_p95_ms": result["batch_1"]["p95_ms"],
+            "batch_32_p50_ms": result["batch_32"]["p50_ms"],
+            "batch_32_messages_per_s": result["batch_32"]["messages_per_s"],
+            "size_mb": result["size_mb"],
+            "peak_rss_mb": result["peak_rss_mb"],
+        }
+    return out
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark a saved model on CPU (fp32 and int8)")
+    parser.add_argument("model_dir")
+    parser.add_argument("--data", help="JSONL with a 'text' field per line (default: built-in sample)")
+    parser.add_argument("--head", choices=["sequence", "token"], help="Default: detected from the model")
+    parser.add_argument("--threads", type=int, default=BENCHMARK_THREADS)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--no-int8", action="store_true", help="Only benchmark the fp32 model")
+    parser.add_argument("--no-write", action="store_true", help=f"Print only, do not write {BENCHMARK_FILE}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    texts = []
+    if args.data:
+        with open(args.data, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    texts.append(json.loads(line)["text"])
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+    benchmark = benchmark_model(args.model_dir, texts, args.head, args.threads,
+                                ("fp32",) if args.no_int8 else VARIANTS, args.samples,
+                                write=not args.no_write)
+    print(json.dumps(summary(benchmark), indent=2))
+    if any("error" in r for r in benchmark["variants"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
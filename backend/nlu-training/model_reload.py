@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Model Reload - swap a served model without dropping requests
+============================================================
+ModelSlot holds the model a server answers with (a "bundle": whatever
+inference needs - model, tokenizer, label maps) and replaces it while
+requests keep flowing:
+
+    slot = ModelSlot("ner")
+    slot.set(load(path), version=path)              # startup
+
+    with slot.acquire() as bundle:                  # per request (None if nothing loaded)
+        ...
+
+    slot.reload(lambda: load(new_path), warmup, version=new_path)
+
+reload() runs in a background thread:
+    load     build the new bundle next to the active one
+    warmup   run sample inputs through it (CUDA kernels, allocator, caches)
+    swap     one reference assignment under a lock; requests that start
+             afterwards get the new bundle, running ones keep the old
+    drain    wait (up to RELOAD_DRAIN_TIMEOUT_S) for those to finish
+    release  drop the old bundle and empty the CUDA cache
+
+A failed load or warmup leaves the active model untouched. Both models
+are in memory between load and release, so a GPU needs room for two.
+
+Clients that read GET /admin/reload use active_version(): nlu-service
+answers with one status per slot ({"intent": ..., "tone": ..., "slots": ...}),
+nlu_server_v3 and nlu-service-v2 with a single slot's status().
+
+nlu-service/ and nlu-service-v2/ are separate build contexts and carry a
+copy of this file; tests/test_shared_copies.py fails when the copies differ.
+"""
+
+import gc
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RELOAD_DRAIN_TIMEOUT_S = float(os.environ.get('RELOAD_DRAIN_TIMEOUT_S', '30'))
+RELOAD_HISTORY = 10
+
+
+class ReloadInProgress(RuntimeError):
+    """A reload is already running for this slot"""
+
+
+class _Generation:
+    def __init__(self, bundle: Any, version: Optional[str]):
+        self.bundle = bundle
+        self.version = version
+        self.loaded_at = time.time()
+        self.inflight = 0
+        self.served = 0
+
+
+class ModelSlot:
+    def __init__(self, name: str, drain_timeout_s: float = RELOAD_DRAIN_TIMEOUT_S):
+        self.name = name
+        self.drain_timeout_s = drain_timeout_s
+        self.history: List[Dict[str, Any]] = []
+
+        self._cond = threading.Condition()
+        self._active: Optional[_Generation] = None
+        self._reloading = threading.Lock()
+        self._reload: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._active is not None
+
+    @property
+    def bundle(self) -> Any:
+        active = self._active
+        return active.bundle if active else None
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active.version if active else None
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """The active bundle, kept alive (and counted as in flight) until the block exits"""
+        with self._cond:
+            generation = self._active
+            if generation is not None:
+                generation.inflight += 1
+                generation.served += 1
+        if generation is None:
+            yield None
+            return
+        try:
+            yield generation.bundle
+        finally:
+            with self._cond:
+                generation.inflight -= 1
+                if generation.inflight == 0:
+                    self._cond.notify_all()
+
+    def set(self, bundle: Any, version: Optional[str] = None):
+        """Install a bundle synchronously (startup); a previous one is drained and released"""
+        previous = self._swap(_Generation(bundle, version))
+        if previous is not None:
+            self._drain(previous)
+            self._release(previous)
+
+    def clear(self):
+        """Unload: new requests get None, running ones finish on the old bundle"""
+        previous = self._swap(None)
+        if previous is not None:
+            self._drain(previous)
+            self._release(previous)
+
+    # ------------------------------------------------------------------
+    # Reload
+    # ------------------------------------------------------------------
+    def reload(self, load: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None,
+               version: Optional[str] = None, wait: bool = False) -> Dict[str, Any]:
+        """
+        Start load -> warmup -> swap -> drain -> release in a background
+        thread and return its record; wait=True blocks until it is done.
+        Raises ReloadInProgress if one is already running.
+        """
+        if not self._reloading.acquire(blocking=False):
+            raise ReloadInProgress(f"{self.name} reload already running ({self._reload['status']})")
+        record = {"version": version, "status": "loading", "requested_at": time.time()}
+        self._reload = record
+        self._thread = threading.Thread(target=self._run_reload, args=(load, warmup, record),
+                                        name=f"reload-{self.name}", daemon=True)
+        self._thread.start()
+        if wait:
+            self._thread.join()
+        return dict(record)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until the current reload is done; returns its record"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return dict(self._reload) if self._reload else None
+
+    def _run_reload(self, load: Callable[[], Any], warmup: Optional[Callable[[Any], None]],
+                    record: Dict[str, Any]):
+        try:
+            start = time.time()
+            bundle = load()
+            if bundle is None:
+                raise RuntimeError("loader returned no model")
+            record["load_s"] = round(time.time() - start, 2)
+
+            if warmup is not None:
+                record["status"] = "warming"
+                start = time.time()
+                warmup(bundle)
+                record["warmup_s"] = round(time.time() - start, 2)
+
+            record["status"] = "draining"
+            previous = self._swap(_Generation(bundle, record["version"]))
+            record["swapped_at"] = time.time()
+            if previous is not None:
+                record["previous_version"] = previous.version
+                start = time.time()
+                record["drained"] = self._drain(previous)
+                record["drain_s"] = round(time.time() - start, 2)
+                self._release(previous)
+            record["status"] = "completed"
+            logger.info(f"{self.name}: now serving {record['version']} "
+                        f"(load {record['load_s']}s, warmup {record.get('warmup_s', 0)}s, "
+                        f"drain {record.get('drain_s', 0)}s)")
+        except Exception as e:
+            logger.error(f"{self.name}: reload of {record['version']} failed, keeping "
+                         f"{self.version}: {e}")
+            record.update(status="failed", error=str(e))
+        finally:
+            record["finished_at"] = time.time()
+            self.history.append(dict(record))
+            del self.history[:-RELOAD_HISTORY]
+            self._reloading.release()
+
+    def _swap(self, generation: Optional[_Generation]) -> Optional[_Generation]:
+        with self._cond:
+            previous, self._active = self._active, generation
+        return previous
+
+    def _drain(self, generation: _Generation) -> bool:
+        with self._cond:
+            drained = self._cond.wait_for(lambda: generation.inflight == 0, timeout=self.drain_timeout_s)
+        if not drained:
+            logger.warning(f"{self.name}: {generation.inflight} requests still on {generation.version} "
+                           f"after {self.drain_timeout_s}s; releasing it when they finish")
+        return drained
+
+    def _release(self, generation: _Generation):
+        # Requests still running hold their own reference; memory goes when they finish
+        generation.bundle = None
+        gc.collect()
+        if TORCH_AVAILABLE and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            active = self._active
+            current = {
+                "version": active.version,
+                "loaded_at": active.loaded_at,
+                "inflight": active.inflight,
+                "served": active.served,
+            } if active else None
+        return {
+            "name": self.name,
+            "loaded": active is not None,
+            "active": current,
+            "reload": dict(self._reload) if self._reload else None,
+            "history": list(self.history),
+        }
+
+
+def active_version(status: Dict[str, Any], slot: str = "intent") -> Optional[str]:
+    """
+    Version a GET /admin/reload response says is serving: `slot`'s entry of a
+    per-slot response (nlu-service), else the flat single-slot status.
+    """
+    if isinstance(status.get(slot), dict):
+        status = status[slot]
+    return (status.get("active") or {}).get("version")
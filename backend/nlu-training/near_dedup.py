@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection - MinHash / LSH over training sentences
+=================================================================
+Exact dedup after normalization keeps LLM paraphrases like
+"pizza chahiye bhai" / "pizza chahiye bhai plz" / "bhai pizza chahiye".
+This finds them in a single streaming pass:
+
+- MinHash signature over character n-grams of the normalized text
+- LSH banding finds candidate pairs; candidates are verified by the
+  fraction of agreeing MinHash values (estimated Jaccard >= threshold)
+- Each kept sentence not close to anything before it starts a cluster;
+  up to max_per_cluster members of a cluster are kept, the rest dropped
+- Clusters are scoped (per intent for NLU, per entity label set for NER),
+  so near-identical texts with different labels are never merged
+
+Memory per kept cluster is one packed signature plus one bucket entry per
+band, so millions of lines fit in a few hundred MB. numpy is used for
+signatures when installed (same values as the pure-Python path).
+
+CLI:
+    python near_dedup.py nlu_final_v1.jsonl -o nlu_final_v1_neardedup.jsonl --scope intent
+    python near_dedup.py ner_final_v1.jsonl -o ner_dedup.jsonl --scope labels --threshold 0.9
+"""
+
+import re
+import json
+import time
+import zlib
+import random
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+MASK64 = (1 << 64) - 1
+
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_NUM_PERM = 64
+DEFAULT_NGRAM = 4
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str, n: int = DEFAULT_NGRAM) -> List[str]:
+    """Character n-grams of the padded normalized text (whole text if shorter)"""
+    padded = f" {normalize_text(text)} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) for the LSH index. The banding threshold (1/b)^(1/r) is put
+    about 0.1 below the verification threshold: candidates are cheap to verify,
+    missed pairs are lost for good.
+    """
+    target = max(threshold - 0.1, 0.3)
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands < 2 or (1 / bands) ** (1 / rows) > target:
+            break
+        best = (bands, rows)
+    return best
+
+
+class NearDupIndex:
+    """
+    Streaming near-duplicate filter.
+
+        index = NearDupIndex(threshold=0.85)
+        for sample in samples:
+            if index.add(sample['text'], scope=sample['intent']):
+                keep(sample)
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                 ngram: int = DEFAULT_NGRAM, max_per_cluster: int = 1, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.max_per_cluster = max(1, max_per_cluster)
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+
+        # Multiply-shift hash family: h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32, a_i odd
+        rng = random.Random(seed)
+        self._a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+        self._b = [rng.getrandbits(64) for _ in range(num_perm)]
+        if NUMPY_AVAILABLE:
+            self._np_a = np.array(self._a, dtype=np.uint64)[:, None]
+            self._np_b = np.array(self._b, dtype=np.uint64)[:, None]
+
+        self._signatures = array("I")            # packed signatures of cluster representatives
+        self._cluster_kept: List[int] = []       # kept members per cluster
+        self._buckets: Dict[int, int] = {}       # band key -> first cluster in that bucket
+        self._exact: set = set()
+
+        self.seen = 0
+        self.kept = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.removed_by_scope: Counter = Counter()
+
+    # ------------------------------------------------------------------
+    def signature(self, text: str) -> List[int]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.ngram)]
+        if NUMPY_AVAILABLE:
+            x = np.array(hashes, dtype=np.uint64)[None, :]
+            # uint64 arithmetic wraps, i.e. mod 2^64
+            return ((self._np_a * x + self._np_b) >> np.uint64(32)).min(axis=1).tolist()
+        return [
+            min(((a * h + b) & MASK64) >> 32 for h in hashes)
+            for a, b in zip(self._a, self._b)
+        ]
+
+    def _band_keys(self, signature: List[int], scope: Any) -> List[int]:
+        r = self.rows
+        return [hash((scope, band, tuple(signature[band * r:(band + 1) * r]))) for band in range(self.bands)]
+
+    def similarity(self, signature: List[int], cluster: int) -> float:
+        k = self.num_perm
+        rep = self._signatures[cluster * k:(cluster + 1) * k]
+        return sum(1 for x, y in zip(signature, rep) if x == y) / k
+
+    def find(self, signature: List[int], scope: Any = None) -> Optional[int]:
+        """Cluster whose representative is within threshold of the signature, if any"""
+        checked = set()
+        for key in self._band_keys(signature, scope):
+            cluster = self._buckets.get(key)
+            if cluster is None or cluster in checked:
+                continue
+            checked.add(cluster)
+            if self.similarity(signature, cluster) >= self.threshold:
+                return cluster
+        return None
+
+    def add(self, text: str, scope: Any = None) -> bool:
+        """Record text; True if it should be kept, False if it is a (near-)duplicate"""
+        self.seen += 1
+
+        exact_key = hash((scope, normalize_text(text)))
+        if exact_key in self._exact:
+            self.exact_duplicates += 1
+            self.removed_by_scope[str(scope)] += 1
+            return False
+
+        signature = self.signature(text)
+        cluster = self.find(signature, scope)
+        if cluster is not None:
+            if self._cluster_kept[cluster] >= self.max_per_cluster:
+                self.near_duplicates += 1
+                self.removed_by_scope[str(scope)] += 1
+                return False
+            self._cluster_kept[cluster] += 1
+        else:
+            cluster = len(self._cluster_kept)
+            self._signatures.extend(signature)
+            self._cluster_kept.append(1)
+            for key in self._band_keys(signature, scope):
+                self._buckets.setdefault(key, cluster)
+
+        self._exact.add(exact_key)
+        self.kept += 1
+        return True
+
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        removed = self.seen - self.kept
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "rows": self.rows,
+            "seen": self.seen,
+            "kept": self.kept,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "clusters": len(self._cluster_kept),
+            "shrink": round(removed / self.seen, 4) if self.seen else 0.0,
+            "removed_by_scope": dict(self.removed_by_scope.most_common()),
+        }
+
+
+# ============================================================================
+# STREAMING HELPERS
+# ============================================================================
+def intent_scope(sample: Dict) -> str:
+    return sample.get("intent", "")
+
+
+def label_scope(sample: Dict) -> Tuple[str, ...]:
+    """NER scope: the sorted entity labels, so "2 pizza" and "pizza" never merge"""
+    return tuple(sorted(e["label"] for e in sample.get("entities", [])))
+
+
+SCOPES: Dict[str, Optional[Callable[[Dict], Any]]] = {
+    "intent": intent_scope,
+    "labels": label_scope,
+    "none": None,
+}
+
+
+def dedup_stream(samples: Iterable[Dict], index: NearDupIndex,
+                 scope: Optional[Callable[[Dict], Any]] = None) -> Iterator[Dict]:
+    """Yield the samples the index keeps"""
+    for sample in samples:
+        if index.add(sample["text"], scope(sample) if scope else None):
+            yield sample
+
+
+def format_report(name: str, stats: Dict[str, Any], elapsed: Optional[float] = None) -> str:
+    """Shrinkage and the resulting cut in per-epoch training work (steps scale with examples)"""
+    lines = [
+        f"{name}: {stats['seen']} → {stats['kept']} "
+        f"({stats['exact_duplicates']} exact + {stats['near_duplicates']} near duplicates removed, "
+        f"{stats['shrink']:.1%} smaller)",
+        f"  clusters: {stats['clusters']}, threshold {stats['threshold']} "
+        f"({stats['bands']} bands x {stats['rows']} rows)",
+        f"  training time per epoch: ~{stats['shrink']:.1%} less "
+        f"({stats['seen']} → {stats['kept']} examples per epoch)",
+    ]
+    if elapsed is not None and stats["seen"]:
+        lines.append(f"  dedup pass: {elapsed:.1f}s ({stats['seen'] / max(elapsed, 1e-9):,.0f} lines/s)")
+    top = list(stats["removed_by_scope"].items())[:10]
+    if top:
+        lines.append("  most removed: " + ", ".join(f"{scope}={count}" for scope, count in top))
+    return "\n".join(lines)
+
+
+def _read_jsonl(paths: Iterable[str]) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    sample = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "text" in sample:
+                    yield sample
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Remove near-duplicate training sentences (MinHash/LSH)")
+    parser.add_argument("inputs", nargs="+", help="JSONL files with a 'text' field")
+    parser.add_argument("-o", "--output", help="Write kept samples here (omit for a dry run)")
+    parser.add_argument("--scope", choices=list(SCOPES), default="intent",
+                        help="Cluster within: intent (NLU), labels (NER entity label set), none")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--ngram", type=int, default=DEFAULT_NGRAM)
+    parser.add_argument("--max-per-cluster", type=int, default=1,
+                        help="Paraphrases kept per cluster")
+    args = parser.parse_args()
+
+    index = NearDupIndex(args.threshold, args.num_perm, args.ngram, args.max_per_cluster)
+    start = time.time()
+    kept = dedup_stream(_read_jsonl(args.inputs), index, SCOPES[args.scope])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for sample in kept:
+                f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+    else:
+        for _ in kept:
+            pass
+
+    print(format_report(", ".join(args.inputs), index.stats(), time.time() - start))
+    if args.output:
+        print(f"  written: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
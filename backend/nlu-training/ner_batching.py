@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+NER Batching - pad to the longest example, group similar lengths together
+=========================================================================
+Chat messages are short (most NER examples are 6-15 tokens), so padding
+every example to max_length spends most of each batch on [PAD]. Shared by
+the NER trainers:
+
+- PadToLongestCollator  pads input_ids / attention_mask / labels (-100) to
+                        the longest example in the batch
+- LengthGroupedSampler  shuffles, cuts the order into megabatches of
+                        50 batches and sorts each by length, so a batch
+                        holds similar lengths and little padding is left
+- LengthGroupedTrainer  Trainer using the sampler when
+                        TrainingArguments(group_by_length=True), and
+                        printing epoch time, tokens/s and padding share
+
+Benchmark (CPU forward + backward, before vs after):
+    python ner_batching.py --data ner_final_v4.jsonl --model google/muril-base-cased --steps 20
+"""
+
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import torch
+from torch.utils.data import IterableDataset, Sampler, Subset
+from transformers import Trainer, TrainerCallback
+
+MEGABATCH_BATCHES = 50
+
+
+# ============================================================================
+# COLLATOR
+# ============================================================================
+class PadToLongestCollator:
+    """Features are unpadded lists or tensors; labels are per-token ids"""
+
+    def __init__(self, tokenizer=None, pad_token_id: Optional[int] = None,
+                 label_pad_token_id: int = -100, pad_to_multiple_of: Optional[int] = None):
+        if pad_token_id is None:
+            pad_token_id = tokenizer.pad_token_id if tokenizer is not None else 0
+        self.pad_token_id = pad_token_id
+        self.label_pad_token_id = label_pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        lengths = [len(f["input_ids"]) for f in features]
+        width = max(lengths)
+        if self.pad_to_multiple_of:
+            width = math.ceil(width / self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), width), dtype=torch.long)
+        labels = torch.full((len(features), width), self.label_pad_token_id, dtype=torch.long)
+        for row, (feature, n) in enumerate(zip(features, lengths)):
+            input_ids[row, :n] = torch.as_tensor(feature["input_ids"], dtype=torch.long)
+            mask = feature.get("attention_mask")
+            attention_mask[row, :n] = torch.as_tensor(mask, dtype=torch.long) if mask is not None else 1
+            if "labels" in feature:
+                labels[row, :n] = torch.as_tensor(feature["labels"], dtype=torch.long)[:n]
+
+        batch = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "labels" in features[0]:
+            batch["labels"] = labels
+        return batch
+
+
+# ============================================================================
+# SAMPLER
+# ============================================================================
+def dataset_lengths(dataset) -> List[int]:
+    """Tokens per example: TokenizedDataset.lengths, through Subsets, else by reading every item"""
+    if hasattr(dataset, "lengths"):
+        return [int(n) for n in dataset.lengths]
+    if isinstance(dataset, Subset):
+        parent = dataset_lengths(dataset.dataset)
+        return [parent[i] for i in dataset.indices]
+    return [len(dataset[i]["input_ids"]) for i in range(len(dataset))]
+
+
+class LengthGroupedSampler(Sampler):
+    """
+    Random order, but batch_size * MEGABATCH_BATCHES consecutive indices are
+    sorted by length (longest first) before being cut into batches. The
+    megabatch with the longest example goes first so memory problems show
+    up on step one.
+    """
+
+    def __init__(self, lengths: Sequence[int], batch_size: int,
+                 megabatch_batches: int = MEGABATCH_BATCHES, seed: int = 42):
+        self.lengths = list(lengths)
+        self.megabatch_size = max(batch_size * megabatch_batches, 1)
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+
+        order = torch.randperm(len(self.lengths), generator=generator).tolist()
+        megabatches = [
+            sorted(order[i:i + self.megabatch_size], key=lambda idx: -self.lengths[idx])
+            for i in range(0, len(order), self.megabatch_size)
+        ]
+        if megabatches:
+            longest = max(range(len(megabatches)), key=lambda m: self.lengths[megabatches[m][0]])
+            megabatches[0], megabatches[longest] = megabatches[longest], megabatches[0]
+        for megabatch in megabatches:
+            yield from megabatch
+
+
+# ============================================================================
+# TRAINER
+# ============================================================================
+class ThroughputCallback(TrainerCallback):
+    """Epoch time, real (non-pad) tokens/s and padding share, from the counts the trainer keeps"""
+
+    def __init__(self, trainer: "LengthGroupedTrainer"):
+        self.trainer = trainer
+        self.epochs: List[Dict[str, float]] = []
+        self._start = 0.0
+        self._tokens = 0
+        self._padded = 0
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._start = time.time()
+        self._tokens, self._padded = self.trainer.tokens_seen, self.trainer.padded_tokens_seen
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        elapsed = time.time() - self._start
+        tokens = self.trainer.tokens_seen - self._tokens
+        padded = self.trainer.padded_tokens_seen - self._padded
+        if not padded:
+            return
+        epoch = {
+            "epoch": round(state.epoch or 0, 2),
+            "seconds": round(elapsed, 1),
+            "tokens_per_s": round(tokens / max(elapsed, 1e-9)),
+            "padding": round(1 - tokens / padded, 3),
+        }
+        self.epochs.append(epoch)
+        print(f"Epoch {epoch['epoch']}: {epoch['seconds']}s, {epoch['tokens_per_s']:,} tokens/s, "
+              f"{epoch['padding']:.0%} of batch positions padding")
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.epochs:
+            seconds = sum(e["seconds"] for e in self.epochs) / len(self.epochs)
+            rate = sum(e["tokens_per_s"] for e in self.epochs) / len(self.epochs)
+            print(f"Average epoch: {seconds:.1f}s at {rate:,.0f} tokens/s")
+
+
+class LengthGroupedTrainer(Trainer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tokens_seen = 0
+        self.padded_tokens_seen = 0
+        self.throughput = ThroughputCallback(self)
+        self.add_callback(self.throughput)
+
+    def _get_train_sampler(self, *args, **kwargs):
+        dataset = self.train_dataset
+        if not self.args.group_by_length or dataset is None or isinstance(dataset, IterableDataset):
+            return super()._get_train_sampler(*args, **kwargs)
+        return LengthGroupedSampler(dataset_lengths(dataset), self.args.train_batch_size, seed=self.args.seed)
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        mask = inputs.get("attention_mask")
+        if mask is not None:
+            self.tokens_seen += int(mask.sum())
+            self.padded_tokens_seen += mask.numel()
+        return super().training_step(model, inputs, *args, **kwargs)
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def benchmark(dataset, model, collator: PadToLongestCollator, batch_size: int,
+              max_length: int, steps: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Train steps/s and tokens/s for each padding + ordering setup, with the epoch time they imply"""
+    lengths = dataset_lengths(dataset)
+    steps_per_epoch = math.ceil(len(lengths) / batch_size)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-5)
+    model.train()
+
+    setups = [
+        ("max_length, random order", False, False),
+        ("longest in batch, random order", True, False),
+        ("longest in batch, length-grouped", True, True),
+    ]
+    # max_length padding is the collator padding to a multiple of max_length
+    static = PadToLongestCollator(pad_token_id=collator.pad_token_id, pad_to_multiple_of=max_length)
+    results = []
+    for name, dynamic, grouped in setups:
+        if grouped:
+            order = list(LengthGroupedSampler(lengths, batch_size, seed=seed))
+        else:
+            order = torch.randperm(len(lengths), generator=torch.Generator().manual_seed(seed)).tolist()
+        batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+        # Spread the timed steps over the epoch (length-grouped batches are sorted within megabatches)
+        stride = max(len(batches) // steps, 1)
+        timed = batches[::stride][:steps]
+
+        tokens = positions = 0
+        start = time.time()
+        for batch_indices in timed:
+            features = [dataset[i] for i in batch_indices]
+            batch = (collator if dynamic else static)(features)
+            tokens += int(batch["attention_mask"].sum())
+            positions += batch["attention_mask"].numel()
+            loss = model(**batch).loss
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+        elapsed = time.time() - start
+        results.append({
+            "setup": name,
+            "steps": len(timed),
+            "tokens_per_s": round(tokens / elapsed),
+            "padding": round(1 - tokens / positions, 3),
+            "epoch_s_estimate": round(elapsed / len(timed) * steps_per_epoch, 1),
+        })
+    return results
+
+
+def main():
+    import argparse
+    import json
+
+    from transformers import AutoModelForTokenClassification, AutoTokenizer
+    from tokenized_cache import load_or_build, per_example
+    from train_ner_production import ENTITY_LABELS, encode_example
+
+    parser = argparse.ArgumentParser(description="CPU tokens/s and epoch time: max_length padding vs dynamic padding")
+    parser.add_argument("--data", required=True, help="NER JSONL (text + entities)")
+    parser.add_argument("--model", default="google/muril-base-cased")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--steps", type=int, default=20, help="Train steps timed per setup")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = torch default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    label2id = {label: i for i, label in enumerate(ENTITY_LABELS)}
+    with open(args.data, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    samples = [s for s in samples if "text" in s and "entities" in s]
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    dataset = load_or_build(
+        "ner-benchmark", tokenizer, args.max_length, samples,
+        per_example(lambda s: encode_example(s, tokenizer, args.max_length, label2id)),
+        extra={"label2id": label2id},
+    )
+    print(dataset.summary())
+    model = AutoModelForTokenClassification.from_pretrained(args.model, num_labels=len(ENTITY_LABELS))
+
+    results = benchmark(dataset, model, PadToLongestCollator(tokenizer), args.batch_size,
+                        args.max_length, args.steps)
+    print(f"\n{'setup':<34} {'tokens/s':>10} {'padding':>8} {'epoch (est.)':>13}")
+    for r in results:
+        print(f"{r['setup']:<34} {r['tokens_per_s']:>10,} {r['padding']:>8.0%} {r['epoch_s_estimate']:>12.1f}s")
+    base = results[0]["epoch_s_estimate"]
+    for r in results[1:]:
+        print(f"{r['setup']}: {base / r['epoch_s_estimate']:.2f}x faster per epoch than max_length padding")
+
+
+if __name__ == "__main__":
+    main()
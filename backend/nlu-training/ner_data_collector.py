@@ -9,8 +9,16 @@ Sources:
 2. Manual annotations from admin dashboard
 3. Conversation logs with corrections
 
-Output Format:
-    JSONL file with each line:
+Storage:
+    SQLite (WAL) in DATA_DIR/ner_collection.db, deduplicated by hash
+
+Exports additionally drop near-duplicate paraphrases with the same entity
+labels (MinHash/LSH, see near_dedup.py; NEAR_DUP_THRESHOLD, 0 disables).
+The CLI uses NEAR_DUP_THRESHOLD; the API exports only dedup when the caller
+passes near_dup_threshold > 0.
+
+Export Format:
+    Each example:
     {
         "text": "tushar misal hai",
         "entities": [
@@ -20,15 +28,21 @@ Output Format:
     }
 """
 
+import asyncio
 import os
 import sys
 import json
 import re
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 import hashlib
+import sqlite3
+import threading
+
+from near_dedup import NearDupIndex, format_report, label_scope
+from ner_shards import export_shards
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -41,6 +55,7 @@ DATA_DIR = os.environ.get('NER_DATA_DIR', '/data/ner_training')
 RAW_DATA_FILE = f"{DATA_DIR}/raw_examples.jsonl"
 VALIDATED_DATA_FILE = f"{DATA_DIR}/validated_training.jsonl"
 STATS_FILE = f"{DATA_DIR}/collection_stats.json"
+NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', '0.85'))
 
 
 # ============================================================================
@@ -194,7 +209,18 @@ def deduplicate_hash(text: str, entities: List[Dict]) -> str:
 # DATA COLLECTION
 # ============================================================================
 class NERDataCollector:
-    """Collects and manages NER training data"""
+    """
+    Collects and manages NER training data
+    
+    Storage: SQLite (WAL) at <data_dir>/ner_collection.db
+        examples  - one row per unique example (UNIQUE dedup hash),
+                    status 'raw' (LLM, pending) or 'validated'
+        counters  - status / label / source counts, updated in the same
+                    transaction as the rows, so get_stats() never scans
+    
+    Existing raw_examples.jsonl / validated_training.jsonl files are imported
+    once when the database is created (or via `import_jsonl`).
+    """
     
     def __init__(self, data_dir: str = DATA_DIR):
         self.data_dir = Path(data_dir)
@@ -203,23 +229,94 @@ class NERDataCollector:
         self.raw_file = self.data_dir / "raw_examples.jsonl"
         self.validated_file = self.data_dir / "validated_training.jsonl"
         self.stats_file = self.data_dir / "collection_stats.json"
+        self.db_file = self.data_dir / "ner_collection.db"
+        
+        is_new = not self.db_file.exists()
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
         
-        self.seen_hashes = set()
-        self._load_seen_hashes()
-        
-    def _load_seen_hashes(self):
-        """Load hashes of existing examples for deduplication"""
-        if self.validated_file.exists():
-            with open(self.validated_file, 'r') as f:
-                for line in f:
-                    try:
-                        example = json.loads(line.strip())
-                        h = deduplicate_hash(example['text'], example['entities'])
-                        self.seen_hashes.add(h)
-                    except:
-                        pass
-        logger.info(f"Loaded {len(self.seen_hashes)} existing examples for deduplication")
+        if is_new and (self.raw_file.exists() or self.validated_file.exists()):
+            self.import_jsonl()
+        
+        self.last_export_dedup: Optional[Dict] = None
+        
+        logger.info(f"Loaded {self.count('status', 'validated')} validated examples for deduplication")
+    
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS examples (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hash TEXT NOT NULL UNIQUE,
+                    text TEXT NOT NULL,
+                    entities TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    confidence REAL NOT NULL DEFAULT 1.0,
+                    timestamp TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_examples_status ON examples(status, id)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS counters (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+    
+    # ------------------------------------------------------------------
+    # Counters (call inside a transaction)
+    # ------------------------------------------------------------------
+    def _bump(self, kind: str, key: str, delta: int = 1):
+        self.conn.execute(
+            """INSERT INTO counters (kind, key, value) VALUES (?, ?, ?)
+               ON CONFLICT(kind, key) DO UPDATE SET value = value + excluded.value""",
+            (kind, key, delta)
+        )
     
+    def _count_validated(self, entities: List[Dict], source: str, delta: int = 1):
+        """Label / source counters only cover the validated set."""
+        for entity in entities:
+            self._bump('label', entity.get('label', 'UNKNOWN'), delta)
+        self._bump('source', source, delta)
+    
+    def count(self, kind: str, key: str) -> int:
+        row = self.conn.execute(
+            "SELECT value FROM counters WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return row[0] if row else 0
+    
+    def _insert(self, example: Dict, status: str) -> bool:
+        """Insert unless the dedup hash exists; updates counters. Call inside a transaction."""
+        h = deduplicate_hash(example['text'], example['entities'])
+        cursor = self.conn.execute(
+            """INSERT OR IGNORE INTO examples (hash, text, entities, source, status, confidence, timestamp)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                h, example['text'], json.dumps(example['entities'], ensure_ascii=False),
+                example.get('source', 'unknown'), status, example.get('confidence', 1.0),
+                example.get('timestamp')
+            )
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._bump('status', status)
+        if status == 'validated':
+            self._count_validated(example['entities'], example.get('source', 'unknown'))
+        return True
+    
+    def is_duplicate(self, text: str, entities: List[Dict]) -> bool:
+        h = deduplicate_hash(text, entities)
+        return self.conn.execute("SELECT 1 FROM examples WHERE hash = ?", (h,)).fetchone() is not None
+    
+    # ------------------------------------------------------------------
+    # Collection
+    # ------------------------------------------------------------------
     def add_from_llm(self, text: str, llm_output: Dict, source: str = "llm") -> bool:
         """
         Add training example from LLM extraction output
@@ -245,6 +342,8 @@ class NERDataCollector:
             'source': source,
             'timestamp': datetime.now().isoformat()
         }
+        if 'confidence' in llm_output:
+            example['confidence'] = llm_output['confidence']
         
         # Validate
         is_valid, reason = validate_example(example)
@@ -252,18 +351,12 @@ class NERDataCollector:
             logger.debug(f"Invalid example ({reason}): {text}")
             return False
         
-        # Deduplication
-        h = deduplicate_hash(text, entities)
-        if h in self.seen_hashes:
+        # Save raw example (unique hash index deduplicates)
+        with self._lock, self.conn:
+            added = self._insert(example, 'raw')
+        if not added:
             logger.debug(f"Duplicate example: {text}")
-            return False
-        
-        # Save raw example
-        with open(self.raw_file, 'a') as f:
-            f.write(json.dumps(example, ensure_ascii=False) + '\n')
-        
-        self.seen_hashes.add(h)
-        return True
+        return added
     
     def add_validated(self, text: str, entities: List[Dict], source: str = "manual") -> bool:
         """Add a manually validated example"""
@@ -279,19 +372,12 @@ class NERDataCollector:
         if not is_valid:
             raise ValueError(f"Invalid example: {reason}")
         
-        h = deduplicate_hash(text, entities)
-        if h in self.seen_hashes:
-            return False
-        
-        with open(self.validated_file, 'a') as f:
-            f.write(json.dumps(example, ensure_ascii=False) + '\n')
-        
-        self.seen_hashes.add(h)
-        return True
+        with self._lock, self.conn:
+            return self._insert(example, 'validated')
     
     def validate_and_migrate_raw(self, min_confidence: float = 0.8) -> Dict:
         """
-        Move high-confidence raw examples to validated set
+        Move high-confidence raw examples to validated set (one transaction)
         
         Args:
             min_confidence: Minimum required entity detection confidence
@@ -301,113 +387,161 @@ class NERDataCollector:
         """
         stats = {'migrated': 0, 'skipped': 0, 'total': 0}
         
-        if not self.raw_file.exists():
-            return stats
-        
-        # Read all raw examples
-        raw_examples = []
-        with open(self.raw_file, 'r') as f:
-            for line in f:
-                try:
-                    raw_examples.append(json.loads(line.strip()))
-                except:
-                    pass
-        
-        stats['total'] = len(raw_examples)
-        
-        # Migrate high-confidence ones
-        for example in raw_examples:
-            # Check confidence if available
-            confidence = example.get('confidence', 1.0)
-            if confidence < min_confidence:
-                stats['skipped'] += 1
-                continue
-            
-            # Re-validate
-            is_valid, _ = validate_example(example)
-            if not is_valid:
-                stats['skipped'] += 1
-                continue
+        with self._lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT id, text, entities, source, confidence FROM examples WHERE status = 'raw'"
+            )
+            promote = []
+            for row_id, text, entities_json, source, confidence in rows:
+                stats['total'] += 1
+                entities = json.loads(entities_json)
+                # Check confidence, re-validate
+                if confidence < min_confidence or not validate_example({'text': text, 'entities': entities})[0]:
+                    stats['skipped'] += 1
+                    continue
+                promote.append((row_id, entities, source))
             
-            h = deduplicate_hash(example['text'], example['entities'])
-            if h in self.seen_hashes:
-                stats['skipped'] += 1
-                continue
-            
-            with open(self.validated_file, 'a') as f:
-                f.write(json.dumps(example, ensure_ascii=False) + '\n')
-            
-            self.seen_hashes.add(h)
-            stats['migrated'] += 1
+            for row_id, entities, source in promote:
+                self.conn.execute("UPDATE examples SET status = 'validated' WHERE id = ?", (row_id,))
+                self._count_validated(entities, source)
+            if promote:
+                self._bump('status', 'raw', -len(promote))
+                self._bump('status', 'validated', len(promote))
+            stats['migrated'] = len(promote)
         
         logger.info(f"Migrated {stats['migrated']} examples, skipped {stats['skipped']}")
         return stats
     
     def get_stats(self) -> Dict:
-        """Get collection statistics"""
-        raw_count = 0
-        validated_count = 0
-        label_counts = {}
-        sources = {}
-        
-        if self.raw_file.exists():
-            with open(self.raw_file, 'r') as f:
-                raw_count = sum(1 for _ in f)
-        
-        if self.validated_file.exists():
-            with open(self.validated_file, 'r') as f:
-                for line in f:
-                    try:
-                        example = json.loads(line.strip())
-                        validated_count += 1
-                        
-                        # Count labels
-                        for entity in example.get('entities', []):
-                            label = entity.get('label', 'UNKNOWN')
-                            label_counts[label] = label_counts.get(label, 0) + 1
-                        
-                        # Count sources
-                        source = example.get('source', 'unknown')
-                        sources[source] = sources.get(source, 0) + 1
-                    except:
-                        pass
-        
+        """Get collection statistics (read from counters, no scans)"""
+        counters: Dict[str, Dict[str, int]] = {'status': {}, 'label': {}, 'source': {}}
+        for kind, key, value in self.conn.execute("SELECT kind, key, value FROM counters"):
+            if value:
+                counters.setdefault(kind, {})[key] = value
+        
+        raw_count = counters['status'].get('raw', 0)
+        validated_count = counters['status'].get('validated', 0)
         return {
             'raw_examples': raw_count,
             'validated_examples': validated_count,
-            'unique_examples': len(self.seen_hashes),
-            'label_counts': label_counts,
-            'sources': sources
+            'unique_examples': raw_count + validated_count,
+            'label_counts': counters['label'],
+            'sources': counters['source']
         }
     
-    def export_for_training(self, output_file: str = None) -> str:
-        """Export validated data in training format"""
+    def iter_examples(self, status: str = 'validated', batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream examples in insertion order without loading the table."""
+        last_id = 0
+        while True:
+            rows = self.conn.execute(
+                """SELECT id, text, entities, source, timestamp FROM examples
+                   WHERE status = ? AND id > ? ORDER BY id LIMIT ?""",
+                (status, last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row_id, text, entities_json, source, timestamp in rows:
+                yield {
+                    'text': text,
+                    'entities': json.loads(entities_json),
+                    'source': source,
+                    'timestamp': timestamp
+                }
+            last_id = rows[-1][0]
+    
+    def iter_training_examples(self, near_dup_threshold: float = NEAR_DUP_THRESHOLD) -> Iterator[Dict]:
+        """
+        Validated examples minus near-duplicates (one per paraphrase cluster and
+        entity label set). Stats of the pass end up in last_export_dedup.
+        """
+        if near_dup_threshold <= 0:
+            self.last_export_dedup = None
+            yield from self.iter_examples('validated')
+            return
+        
+        index = NearDupIndex(near_dup_threshold)
+        for example in self.iter_examples('validated'):
+            if index.add(example['text'], label_scope(example)):
+                yield example
+        self.last_export_dedup = index.stats()
+        logger.info(format_report("Near-dedup", self.last_export_dedup))
+    
+    def export_for_training(self, output_file: str = None,
+                            near_dup_threshold: float = NEAR_DUP_THRESHOLD) -> str:
+        """Export validated data in training format (streamed JSON array)"""
         
         if output_file is None:
             output_file = str(self.data_dir / "training_data.json")
         
-        examples = []
-        
-        if self.validated_file.exists():
-            with open(self.validated_file, 'r') as f:
-                for line in f:
-                    try:
-                        example = json.loads(line.strip())
-                        examples.append({
-                            'text': example['text'],
-                            'entities': [
-                                {'start': e['start'], 'end': e['end'], 'label': e['label']}
-                                for e in example['entities']
-                            ]
-                        })
-                    except:
-                        pass
-        
+        count = 0
         with open(output_file, 'w') as f:
-            json.dump(examples, f, indent=2, ensure_ascii=False)
-        
-        logger.info(f"Exported {len(examples)} examples to {output_file}")
+            f.write('[\n')
+            for example in self.iter_training_examples(near_dup_threshold):
+                record = {
+                    'text': example['text'],
+                    'entities': [
+                        {'start': e['start'], 'end': e['end'], 'label': e['label']}
+                        for e in example['entities']
+                    ]
+                }
+                f.write((',\n' if count else '') + json.dumps(record, ensure_ascii=False))
+                count += 1
+            f.write('\n]\n')
+        
+        logger.info(f"Exported {count} examples to {output_file}")
         return output_file
+    
+    def export_shards(self, output_dir: str = None, shard_size: int = 10000,
+                      val_fraction: float = 0.0, near_dup_threshold: float = NEAR_DUP_THRESHOLD) -> Dict:
+        """Stream validated data into JSONL shards + manifest (see ner_shards.py)"""
+        
+        if output_dir is None:
+            output_dir = str(self.data_dir / "export")
+        
+        manifest = export_shards(self.iter_training_examples(near_dup_threshold), output_dir,
+                                 shard_size, val_fraction)
+        splits = {split: info['examples'] for split, info in manifest['splits'].items()}
+        logger.info(f"Exported {manifest['total_examples']} examples to {output_dir} {splits}")
+        return manifest
+    
+    # ------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------
+    def import_jsonl(self, raw_file: Optional[str] = None, validated_file: Optional[str] = None) -> Dict:
+        """
+        One-shot import of JSONL collections (default: the legacy files in data_dir).
+        Validated first, so raw duplicates of validated examples are dropped.
+        """
+        sources = [
+            (Path(validated_file) if validated_file else self.validated_file, 'validated'),
+            (Path(raw_file) if raw_file else self.raw_file, 'raw'),
+        ]
+        stats = {'validated': 0, 'raw': 0, 'duplicates': 0, 'invalid': 0}
+        
+        with self._lock, self.conn:
+            for path, status in sources:
+                if not path.exists():
+                    continue
+                with open(path, 'r') as f:
+                    for line in f:
+                        try:
+                            example = json.loads(line.strip())
+                            example['entities']
+                        except (json.JSONDecodeError, KeyError, TypeError):
+                            stats['invalid'] += 1
+                            continue
+                        if self._insert(example, status):
+                            stats[status] += 1
+                        else:
+                            stats['duplicates'] += 1
+        
+        logger.info(f"Imported {stats['validated']} validated / {stats['raw']} raw examples "
+                    f"({stats['duplicates']} duplicates, {stats['invalid']} invalid lines)")
+        return stats
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
 
 
 # ============================================================================
@@ -661,6 +795,12 @@ def create_api():
     )
 
     api_collector = NERDataCollector()
+    # One export at a time: last_export_dedup belongs to the export that just ran
+    export_lock = threading.Lock()
+
+    def run_export(export, **kwargs):
+        with export_lock:
+            return export(**kwargs), api_collector.last_export_dedup
 
     class LLMExtractionInput(PydanticModel):
         text: str
@@ -698,13 +838,31 @@ def create_api():
         return stats
 
     @api.post("/export")
-    async def export_training_data():
-        """Export validated data for training"""
-        output_file = api_collector.export_for_training()
+    async def export_training_data(near_dup_threshold: float = 0.0):
+        """Export validated data for training (near-dedup only when near_dup_threshold > 0)"""
+        # Off the event loop: a full-table export must not stall /collect/*
+        output_file, dedup = await asyncio.to_thread(
+            run_export, api_collector.export_for_training, near_dup_threshold=near_dup_threshold)
         stats = api_collector.get_stats()
         return {
             "output_file": output_file,
-            "examples": stats['validated_examples']
+            "examples": dedup['kept'] if dedup else stats['validated_examples'],
+            "near_dedup": dedup
+        }
+
+    @api.post("/export/shards")
+    async def export_training_shards(shard_size: int = 10000, val_fraction: float = 0.0,
+                                     near_dup_threshold: float = 0.0):
+        """Export validated data as JSONL shards with a manifest (near-dedup only when near_dup_threshold > 0)"""
+        manifest, dedup = await asyncio.to_thread(
+            run_export, api_collector.export_shards, shard_size=shard_size, val_fraction=val_fraction,
+            near_dup_threshold=near_dup_threshold)
+        return {
+            "output_dir": str(api_collector.data_dir / "export"),
+            "examples": manifest['total_examples'],
+            "splits": {split: info['examples'] for split, info in manifest['splits'].items()},
+            "label_counts": manifest['label_counts'],
+            "near_dedup": dedup
         }
 
     @api.post("/bootstrap")
@@ -727,9 +885,16 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="NER Training Data Collector")
-    parser.add_argument('command', choices=['stats', 'bootstrap', 'export', 'migrate', 'serve'])
+    parser.add_argument('command', choices=['stats', 'bootstrap', 'export', 'export-shards', 'migrate', 'import', 'serve'])
     parser.add_argument('--port', type=int, default=7012, help='API server port')
     parser.add_argument('--data-dir', type=str, default=DATA_DIR, help='Data directory')
+    parser.add_argument('--raw-file', type=str, help='import: raw JSONL file (default: <data-dir>/raw_examples.jsonl)')
+    parser.add_argument('--validated-file', type=str, help='import: validated JSONL file')
+    parser.add_argument('--output-dir', type=str, help='export-shards: output directory (default: <data-dir>/export)')
+    parser.add_argument('--shard-size', type=int, default=10000, help='export-shards: examples per shard')
+    parser.add_argument('--val-fraction', type=float, default=0.0, help='export-shards: validation split by text hash')
+    parser.add_argument('--near-dup-threshold', type=float, default=NEAR_DUP_THRESHOLD,
+                        help='export / export-shards: near-duplicate similarity (0 disables)')
     
     args = parser.parse_args()
     
@@ -748,13 +913,22 @@ if __name__ == "__main__":
         print(f"Added {added}/{len(examples)} bootstrap examples")
         
     elif args.command == 'export':
-        output_file = collector.export_for_training()
+        output_file = collector.export_for_training(near_dup_threshold=args.near_dup_threshold)
         print(f"Exported to: {output_file}")
         
+    elif args.command == 'export-shards':
+        manifest = collector.export_shards(args.output_dir, args.shard_size, args.val_fraction,
+                                           args.near_dup_threshold)
+        print(json.dumps({k: v for k, v in manifest.items() if not k.startswith('_')}, indent=2))
+        
     elif args.command == 'migrate':
         stats = collector.validate_and_migrate_raw()
         print(json.dumps(stats, indent=2))
         
+    elif args.command == 'import':
+        stats = collector.import_jsonl(args.raw_file, args.validated_file)
+        print(json.dumps(stats, indent=2))
+        
     elif args.command == 'serve':
         import uvicorn
         api = create_api()
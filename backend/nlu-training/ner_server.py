@@ -9,17 +9,22 @@ Endpoints:
     POST /extract         - Extract entities from text
     POST /extract/batch   - Batch extraction
     GET  /labels          - List supported labels
+    POST /admin/reload    - Load a model version and swap it in
+    GET  /admin/reload    - Active model and reload history
 
 Performance:
     - Model loaded in memory (no cold start)
     - GPU inference (~5-10ms per request)
     - Batching support for throughput
+    - Hot reload: the new model loads and warms up in the background,
+      in-flight requests finish on the old one
 """
 
 import os
 import sys
 import json
 import time
+import asyncio
 import logging
 from typing import Dict, List, Optional
 from pathlib import Path
@@ -29,6 +34,8 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 
+from model_reload import ModelSlot, ReloadInProgress
+
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -40,50 +47,54 @@ MODEL_PATH = os.environ.get('NER_MODEL_PATH', '/models/ner_v1')
 MAX_LENGTH = 128
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Sample inputs run through a new model before it takes traffic
+WARMUP_TEXTS = [
+    "2 paneer tikka",
+    "domino's se 3 pizza aur 2 coke bhej do",
+    "satpur se nashik road tak parcel",
+]
+
 # ============================================================================
-# GLOBAL MODEL (loaded once at startup)
+# GLOBAL MODEL (loaded at startup, swapped by /admin/reload)
 # ============================================================================
-tokenizer = None
-model = None
-label_config = None
+# Bundle: {"tokenizer", "model", "label_config"}
+ner_slot = ModelSlot("ner")
 
 
-def load_model():
-    """Load NER model at startup"""
-    global tokenizer, model, label_config
+def load_model(model_path: str = MODEL_PATH) -> Dict:
+    """Load an NER model bundle; raises if the model is missing or broken"""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"NER model not found at {model_path}")
     
-    if not os.path.exists(MODEL_PATH):
-        logger.warning(f"⚠️ NER model not found at {MODEL_PATH}")
-        return False
+    logger.info(f"🔧 Loading NER model from: {model_path}")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForTokenClassification.from_pretrained(model_path)
+    model.to(DEVICE)
+    model.eval()
     
-    try:
-        logger.info(f"🔧 Loading NER model from: {MODEL_PATH}")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-        model = AutoModelForTokenClassification.from_pretrained(MODEL_PATH)
-        model.to(DEVICE)
-        model.eval()
-        
-        # Load label config
-        config_path = f"{MODEL_PATH}/label_config.json"
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                label_config = json.load(f)
-        else:
-            # Default labels
-            label_config = {
-                'labels': ["O", "B-FOOD", "I-FOOD", "B-STORE", "I-STORE", 
-                          "B-QTY", "I-QTY", "B-LOC", "I-LOC", "B-PREF", "I-PREF"],
-                'id2label': {str(i): l for i, l in enumerate(["O", "B-FOOD", "I-FOOD", 
-                            "B-STORE", "I-STORE", "B-QTY", "I-QTY", "B-LOC", "I-LOC", "B-PREF", "I-PREF"])}
-            }
-        
-        logger.info(f"✅ NER model loaded on {DEVICE}")
-        logger.info(f"   Labels: {label_config['labels']}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Failed to load NER model: {e}")
-        return False
+    # Load label config
+    config_path = f"{model_path}/label_config.json"
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            label_config = json.load(f)
+    else:
+        # Default labels
+        label_config = {
+            'labels': ["O", "B-FOOD", "I-FOOD", "B-STORE", "I-STORE", 
+                      "B-QTY", "I-QTY", "B-LOC", "I-LOC", "B-PREF", "I-PREF"],
+            'id2label': {str(i): l for i, l in enumerate(["O", "B-FOOD", "I-FOOD", 
+                        "B-STORE", "I-STORE", "B-QTY", "I-QTY", "B-LOC", "I-LOC", "B-PREF", "I-PREF"])}
+        }
+    
+    logger.info(f"✅ NER model loaded on {DEVICE}")
+    logger.info(f"   Labels: {label_config['labels']}")
+    return {"tokenizer": tokenizer, "model": model, "label_config": label_config}
+
+
+def warmup_model(bundle: Dict):
+    """Run the sample inputs through a freshly loaded bundle"""
+    for text in WARMUP_TEXTS:
+        run_extraction(bundle, text)
 
 
 # ============================================================================
@@ -136,6 +147,11 @@ class BatchExtractRequest(BaseModel):
     texts: List[str]
 
 
+class ReloadRequest(BaseModel):
+    model_path: Optional[str] = None  # default: the path currently served
+    wait: bool = False  # block until the new model is serving (or the reload failed)
+
+
 class BatchExtractResponse(BaseModel):
     results: List[ExtractResponse]
     total_processing_time_ms: float
@@ -219,10 +235,16 @@ def pair_qty_food(entities: List[Entity]) -> List[FoodItem]:
 # INFERENCE LOGIC
 # ============================================================================
 def extract_entities(text: str, return_tokens: bool = False) -> ExtractResponse:
-    """Extract entities from text using NER model"""
-    
-    if model is None:
-        raise HTTPException(status_code=503, detail="NER model not loaded")
+    """Extract entities from text using the active NER model"""
+    with ner_slot.acquire() as bundle:
+        if bundle is None:
+            raise HTTPException(status_code=503, detail="NER model not loaded")
+        return run_extraction(bundle, text, return_tokens)
+
+
+def run_extraction(bundle: Dict, text: str, return_tokens: bool = False) -> ExtractResponse:
+    """Extract entities from text with one model bundle"""
+    tokenizer, model, label_config = bundle["tokenizer"], bundle["model"], bundle["label_config"]
     
     start_time = time.time()
     
@@ -344,27 +366,32 @@ def extract_entities(text: str, return_tokens: bool = False) -> ExtractResponse:
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
-    load_model()
+    try:
+        ner_slot.set(load_model(MODEL_PATH), version=MODEL_PATH)
+    except Exception as e:
+        logger.error(f"❌ Failed to load NER model: {e}")
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    bundle = ner_slot.bundle
     return {
-        "status": "healthy" if model is not None else "degraded",
-        "model_loaded": model is not None,
-        "model_path": MODEL_PATH,
+        "status": "healthy" if bundle is not None else "degraded",
+        "model_loaded": bundle is not None,
+        "model_path": ner_slot.version or MODEL_PATH,
         "device": DEVICE,
-        "labels": label_config['labels'] if label_config else []
+        "labels": bundle["label_config"]['labels'] if bundle else []
     }
 
 
 @app.get("/labels")
 async def get_labels():
     """Get supported entity labels"""
-    if label_config is None:
+    bundle = ner_slot.bundle
+    if bundle is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
-    return label_config
+    return bundle["label_config"]
 
 
 @app.post("/extract", response_model=ExtractResponse)
@@ -391,6 +418,27 @@ async def batch_extract(request: BatchExtractRequest):
     )
 
 
+@app.post("/admin/reload")
+async def reload_model(request: ReloadRequest):
+    """Load a model version in the background, warm it up and swap it in"""
+    model_path = request.model_path or ner_slot.version or MODEL_PATH
+    if not os.path.exists(model_path):
+        raise HTTPException(status_code=404, detail=f"Model not found: {model_path}")
+    try:
+        result = ner_slot.reload(lambda: load_model(model_path), warmup_model, version=model_path)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if request.wait:
+        result = await asyncio.to_thread(ner_slot.wait)
+    return result
+
+
+@app.get("/admin/reload")
+async def reload_status():
+    """Active model version, in-flight requests and recent reloads"""
+    return ner_slot.status()
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
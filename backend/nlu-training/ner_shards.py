@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+NER Shards - streaming export / reading of sharded NER training data
+=====================================================================
+Layout of an export directory:
+    manifest.json
+    train-00000.jsonl, train-00001.jsonl, ...
+    val-00000.jsonl, ...
+
+Each line: {"text": "...", "entities": [{"start": 0, "end": 6, "label": "STORE"}]}
+
+The train/val split is decided by a hash of the normalized text, so the same
+sentence always lands in the same split across exports and never in both.
+
+manifest.json:
+    {
+      "format": "jsonl",
+      "created_at": "...",
+      "shard_size": 10000,
+      "val_fraction": 0.1,
+      "total_examples": 12345,
+      "label_counts": {"FOOD": ..., ...},
+      "splits": {
+        "train": {"examples": N, "label_counts": {...}, "shards": [{"file": "train-00000.jsonl", "examples": n}]},
+        "val": {...}
+      }
+    }
+
+Trainers point TRAINING_DATA / --training-file at the directory (or its
+manifest.json) and read one shard at a time.
+"""
+
+import json
+import hashlib
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+MANIFEST = "manifest.json"
+SPLITS = ("train", "val")
+
+
+def split_for(text: str, val_fraction: float) -> str:
+    """Deterministic split of a text by hash."""
+    if val_fraction <= 0:
+        return "train"
+    digest = hashlib.md5(text.lower().strip().encode("utf-8")).hexdigest()
+    return "val" if int(digest[:8], 16) / 0xFFFFFFFF < val_fraction else "train"
+
+
+class _SplitWriter:
+    """Writes one split as fixed-size JSONL shards."""
+
+    def __init__(self, output_dir: Path, split: str, shard_size: int):
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.shards: List[Dict] = []
+        self.examples = 0
+        self.label_counts: Dict[str, int] = {}
+        self._fh = None
+        self._in_shard = 0
+
+    def write(self, record: Dict):
+        if self._fh is None or self._in_shard >= self.shard_size:
+            self._next_shard()
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._in_shard += 1
+        self.shards[-1]["examples"] += 1
+        self.examples += 1
+        for entity in record["entities"]:
+            self.label_counts[entity["label"]] = self.label_counts.get(entity["label"], 0) + 1
+
+    def _next_shard(self):
+        self.close()
+        name = f"{self.split}-{len(self.shards):05d}.jsonl"
+        self._fh = open(self.output_dir / name, "w", encoding="utf-8")
+        self._in_shard = 0
+        self.shards.append({"file": name, "examples": 0})
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def manifest(self) -> Dict:
+        return {"examples": self.examples, "label_counts": self.label_counts, "shards": self.shards}
+
+
+def export_shards(examples: Iterable[Dict], output_dir, shard_size: int = 10000,
+                  val_fraction: float = 0.0) -> Dict:
+    """
+    Stream examples into JSONL shards and write manifest.json.
+    Only text and entity start/end/label are kept. Returns the manifest.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Stale shards from a previous export would not be in the manifest, but remove them anyway
+    for old in output_dir.glob("*-[0-9][0-9][0-9][0-9][0-9].jsonl"):
+        old.unlink()
+
+    writers = {split: _SplitWriter(output_dir, split, shard_size) for split in SPLITS}
+    try:
+        for example in examples:
+            record = {
+                "text": example["text"],
+                "entities": [
+                    {"start": e["start"], "end": e["end"], "label": e["label"]}
+                    for e in example["entities"]
+                ]
+            }
+            writers[split_for(record["text"], val_fraction)].write(record)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    label_counts: Dict[str, int] = {}
+    for writer in writers.values():
+        for label, count in writer.label_counts.items():
+            label_counts[label] = label_counts.get(label, 0) + count
+
+    manifest = {
+        "format": "jsonl",
+        "created_at": datetime.now().isoformat(),
+        "shard_size": shard_size,
+        "val_fraction": val_fraction,
+        "total_examples": sum(w.examples for w in writers.values()),
+        "label_counts": label_counts,
+        "splits": {split: w.manifest() for split, w in writers.items() if w.examples},
+    }
+    # Manifest last: readers only see complete exports
+    tmp = output_dir / f"{MANIFEST}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(output_dir / MANIFEST)
+    return manifest
+
+
+# ============================================================================
+# READING
+# ============================================================================
+def is_shard_dir(path) -> bool:
+    """True for an export directory or its manifest.json."""
+    path = Path(path)
+    return (path.is_dir() and (path / MANIFEST).exists()) or path.name == MANIFEST
+
+
+def load_manifest(path) -> Dict:
+    path = Path(path)
+    manifest_path = path if path.name == MANIFEST else path / MANIFEST
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["_dir"] = str(manifest_path.parent)
+    return manifest
+
+
+def shard_files(manifest: Dict, split: str) -> List[Path]:
+    base = Path(manifest["_dir"])
+    return [base / shard["file"] for shard in manifest["splits"].get(split, {}).get("shards", [])]
+
+
+def iter_files(files: Iterable) -> Iterator[Dict]:
+    """Stream examples from shard files, one line at a time."""
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def iter_split(path, split: str = "train") -> Iterator[Dict]:
+    return iter_files(shard_files(load_manifest(path), split))
+
+
+def split_size(path, split: str = "train") -> int:
+    return load_manifest(path)["splits"].get(split, {}).get("examples", 0)
+
+
+class ShardStream:
+    """
+    Re-iterable, shuffled stream over a split: shard order is reshuffled each
+    pass and examples go through a bounded shuffle buffer. num_shards /
+    shard_index let DataLoader workers read disjoint shards.
+    """
+
+    def __init__(self, path, split: str = "train", shuffle: bool = True,
+                 buffer_size: int = 10000, seed: int = 42):
+        self.files = shard_files(load_manifest(path), split)
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+
+    def iterate(self, num_shards: int = 1, shard_index: int = 0) -> Iterator[Dict]:
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        files = list(self.files)
+        if self.shuffle:
+            rng.shuffle(files)
+        files = files[shard_index::num_shards]
+
+        if not self.shuffle:
+            yield from iter_files(files)
+            return
+
+        buffer: List[Dict] = []
+        for example in iter_files(files):
+            if len(buffer) < self.buffer_size:
+                buffer.append(example)
+                continue
+            idx = rng.randrange(len(buffer))
+            yield buffer[idx]
+            buffer[idx] = example
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iterate()
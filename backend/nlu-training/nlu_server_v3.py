@@ -10,18 +10,37 @@ Key Features:
 2. Entity extraction using MuRIL NER (~40ms)
 3. Automatic model version detection
 4. Health checks and metrics
+5. Hot model reload (load + warm up in the background, atomic swap,
+   in-flight requests drain on the old model)
+6. Candidate model evaluation: shadow (mirror sampled traffic off the
+   request path) or canary (serve a share of traffic), see candidate_eval.py
+7. Confidence cascade: a distilled n-gram model answers when it is
+   confident, the transformer only sees the rest, see cascade.py
 
 Endpoints:
 - POST /classify - Intent classification
 - POST /classify/batch - Batch classification
 - GET /health - Health check
 - GET /metrics - Prometheus metrics
+- POST /admin/reload - Load a model version and swap it in
+- GET /admin/reload - Active model and reload history
+- POST /admin/candidate - Load a candidate model, set shadow/canary mode
+- GET /admin/candidate - Agreement, confidence and latency per intent
+- DELETE /admin/candidate - Stop and unload the candidate
+- POST /admin/candidate/promote - Swap the candidate in as primary
+- GET /cascade - Share of requests answered by each cascade stage
 
 Environment Variables:
 - NLU_MODEL_PATH: Path to NLU model (auto-detects v2 vs v3)
 - NLU_PORT: Server port (default: 7010)
 - NER_URL: URL to NER server (default: http://localhost:7011)
 - DEVICE: cuda or cpu (default: auto)
+- NLU_CANDIDATE_PATH: Candidate model loaded at startup (optional)
+- NLU_CANDIDATE_MODE: off, shadow or canary (default: shadow)
+- NLU_CANDIDATE_FRACTION: Share of traffic mirrored/routed (default: 0.1)
+- NLU_CASCADE_PATH: Calibrated first-stage model (distill_intent.py --student ngram);
+  unset serves every request with the transformer. Only used while the
+  primary model is the transformer it was calibrated for
 
 Usage:
     NLU_MODEL_PATH=/path/to/model NLU_PORT=7010 python nlu_server_v3.py
@@ -30,6 +49,7 @@ Usage:
 import os
 import sys
 import time
+import asyncio
 import json
 import logging
 import traceback
@@ -49,6 +69,10 @@ from transformers import (
 )
 import httpx
 
+from model_reload import ModelSlot, ReloadInProgress
+from candidate_eval import MODES, CandidateEvaluator
+from cascade import CascadeSwitch
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -61,6 +85,10 @@ MODEL_PATH = os.environ.get("NLU_MODEL_PATH", "/home/ubuntu/mangwale-ai/models/i
 NER_URL = os.environ.get("NER_URL", "http://localhost:7011")
 PORT = int(os.environ.get("NLU_PORT", "7010"))
 DEVICE = os.environ.get("DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+CANDIDATE_PATH = os.environ.get("NLU_CANDIDATE_PATH")
+CANDIDATE_MODE = os.environ.get("NLU_CANDIDATE_MODE", "shadow")
+CANDIDATE_FRACTION = float(os.environ.get("NLU_CANDIDATE_FRACTION", "0.1"))
+CASCADE_PATH = os.environ.get("NLU_CASCADE_PATH")
 
 # FastAPI app
 app = FastAPI(
@@ -103,6 +131,8 @@ class ClassifyResponse(BaseModel):
     language: str
     model_version: str
     processing_time_ms: float
+    model_variant: str = "primary"  # "candidate" when answered by the canary
+    cascade_stage: Optional[str] = None  # "fast" or "transformer" when the cascade is on
     
 class HealthResponse(BaseModel):
     status: str
@@ -112,6 +142,16 @@ class HealthResponse(BaseModel):
     device: str
     gpu_memory_mb: Optional[float] = None
 
+class ReloadRequest(BaseModel):
+    model_path: Optional[str] = None  # default: the path currently served
+    wait: bool = False  # block until the new model is serving (or the reload failed)
+
+class CandidateRequest(BaseModel):
+    model_path: Optional[str] = None  # load (or replace) the candidate; omit to only change mode/fraction
+    mode: Optional[str] = None  # off | shadow | canary
+    fraction: Optional[float] = None  # 0-1 share of /classify traffic
+    wait: bool = False
+
 
 # Global model holder
 class NLUModel:
@@ -273,18 +313,66 @@ class NERClient:
             return {"entities": [], "food_items": [], "store_reference": None}
 
 
+# Sample inputs run through a new model before it takes traffic
+WARMUP_TEXTS = [
+    "hi",
+    "mujhe 2 paneer tikka chahiye",
+    "track my order",
+    "parcel bhejna hai satpur se nashik road tak, pickup kal subah 10 baje",
+]
+
+
+def load_nlu_model(model_path: str) -> NLUModel:
+    model = NLUModel()
+    model.load(model_path)
+    return model
+
+
+def warmup_nlu_model(model: NLUModel):
+    for text in WARMUP_TEXTS:
+        model.classify(text)
+    model.classify_batch(WARMUP_TEXTS)
+
+
+def classify_with(model: NLUModel, text: str) -> tuple:
+    return model.classify(text)
+
+
 # Initialize global instances
-nlu_model = NLUModel()
+nlu_slot = ModelSlot("nlu")
+candidate_slot = ModelSlot("candidate")
+candidate = CandidateEvaluator(classify_with, candidate_slot)
+# Raw text reaches the transformer here, so the student must not be normalized either
+cascade_switch = CascadeSwitch(CASCADE_PATH, normalization="none") if CASCADE_PATH else None
 ner_client = NERClient(NER_URL)
 
 
+def active_cascade():
+    """The cascade if it was calibrated for the primary model being served right now"""
+    return cascade_switch.get(nlu_slot.version) if cascade_switch else None
+
+
 @app.on_event("startup")
 async def startup():
     """Load model on startup."""
     try:
-        nlu_model.load(MODEL_PATH)
+        nlu_slot.set(load_nlu_model(MODEL_PATH), version=MODEL_PATH)
     except Exception as e:
         logger.error(f"Failed to load model on startup: {e}")
+    if CANDIDATE_PATH:
+        try:
+            candidate_slot.set(load_nlu_model(CANDIDATE_PATH), version=CANDIDATE_PATH)
+            candidate.configure(CANDIDATE_MODE, CANDIDATE_FRACTION)
+        except Exception as e:
+            logger.error(f"Failed to load candidate model: {e}")
+    active_cascade()
+
+
+def classify_or_503(nlu_model: Optional[NLUModel], request: ClassifyRequest) -> tuple:
+    if nlu_model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    intent, confidence, nlu_time = nlu_model.classify(request.text, request.language)
+    return intent, confidence, nlu_time, nlu_model.model_version
 
 
 @app.post("/classify", response_model=ClassifyResponse)
@@ -292,11 +380,33 @@ async def classify(request: ClassifyRequest):
     """Classify user intent and optionally extract entities."""
     start_time = time.time()
     
-    if not nlu_model.loaded:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    variant = "candidate" if candidate.use_canary() else "primary"
+    stage = None
+    fast_time = 0.0
+    cascade = active_cascade() if variant == "primary" else None
+    if cascade is not None:
+        intent, confidence, fast_time, answered = cascade.first_stage(request.text)
+        if answered:
+            stage, nlu_time, model_version = "fast", fast_time, cascade.version
     
-    # Classify intent
-    intent, confidence, nlu_time = nlu_model.classify(request.text, request.language)
+    if stage is None:
+        with (candidate_slot if variant == "candidate" else nlu_slot).acquire() as nlu_model:
+            if nlu_model is None and variant == "candidate":
+                # Candidate unloaded since the routing decision
+                variant = "primary"
+                with nlu_slot.acquire() as nlu_model:
+                    intent, confidence, nlu_time, model_version = classify_or_503(nlu_model, request)
+            else:
+                intent, confidence, nlu_time, model_version = classify_or_503(nlu_model, request)
+        if variant == "primary" and cascade is not None:
+            stage = "transformer"
+            cascade.record(stage, fast_time + nlu_time)
+    
+    # Only transformer answers are compared; fast-stage answers would skew agreement and latency
+    if stage != "fast" and candidate.mode == "canary":
+        candidate.record_canary(variant, intent, confidence, nlu_time)
+    elif stage != "fast":
+        candidate.after_primary(request.text, intent, confidence, nlu_time)
     
     # Extract entities if requested
     entities = {}
@@ -319,20 +429,23 @@ async def classify(request: ClassifyRequest):
         confidence=confidence,
         entities=entities,
         language=request.language or "auto",
-        model_version=nlu_model.model_version,
+        model_version=model_version,
         processing_time_ms=total_time,
+        model_variant=variant,
+        cascade_stage=stage,
     )
 
 
 @app.post("/classify/batch")
 async def classify_batch(request: ClassifyBatchRequest):
     """Batch classification for multiple texts."""
-    if not nlu_model.loaded:
-        raise HTTPException(status_code=503, detail="Model not loaded")
-    
     start_time = time.time()
     
-    results = nlu_model.classify_batch(request.texts, request.language)
+    with nlu_slot.acquire() as nlu_model:
+        if nlu_model is None:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        results = nlu_model.classify_batch(request.texts, request.language)
+        model_version = nlu_model.model_version
     
     responses = []
     for i, (intent, confidence) in enumerate(results):
@@ -357,23 +470,24 @@ async def classify_batch(request: ClassifyBatchRequest):
         "results": responses,
         "count": len(responses),
         "processing_time_ms": total_time,
-        "model_version": nlu_model.model_version,
+        "model_version": model_version,
     }
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health():
     """Health check endpoint."""
+    nlu_model = nlu_slot.bundle
     gpu_memory = None
     if torch.cuda.is_available():
         gpu_memory = torch.cuda.memory_allocated() / 1024 / 1024
     
     return HealthResponse(
-        status="healthy" if nlu_model.loaded else "unhealthy",
-        model_loaded=nlu_model.loaded,
-        model_version=nlu_model.model_version,
-        model_path=MODEL_PATH,
-        device=nlu_model.device,
+        status="healthy" if nlu_model else "unhealthy",
+        model_loaded=nlu_model is not None,
+        model_version=nlu_model.model_version if nlu_model else "unknown",
+        model_path=nlu_slot.version or MODEL_PATH,
+        device=DEVICE,
         gpu_memory_mb=gpu_memory,
     )
 
@@ -381,6 +495,9 @@ async def health():
 @app.get("/metrics")
 async def metrics():
     """Prometheus-compatible metrics."""
+    nlu_model = nlu_slot.bundle
+    reloads = nlu_slot.history
+    cascade = active_cascade()
     gpu_memory = 0
     gpu_utilization = 0
     
@@ -398,7 +515,12 @@ async def metrics():
     
     metrics_text = f"""# HELP nlu_model_loaded Whether the NLU model is loaded
 # TYPE nlu_model_loaded gauge
-nlu_model_loaded {1 if nlu_model.loaded else 0}
+nlu_model_loaded {1 if nlu_model else 0}
+
+# HELP nlu_model_reloads_total Model reloads by outcome since start
+# TYPE nlu_model_reloads_total counter
+nlu_model_reloads_total{{status="completed"}} {sum(r['status'] == 'completed' for r in reloads)}
+nlu_model_reloads_total{{status="failed"}} {sum(r['status'] == 'failed' for r in reloads)}
 
 # HELP nlu_gpu_memory_mb GPU memory usage in MB
 # TYPE nlu_gpu_memory_mb gauge
@@ -410,14 +532,25 @@ nlu_gpu_utilization_percent {gpu_utilization}
 
 # HELP nlu_label_count Number of intent labels
 # TYPE nlu_label_count gauge
-nlu_label_count {len(nlu_model.id2label)}
-"""
+nlu_label_count {len(nlu_model.id2label) if nlu_model else 0}
+
+""" + candidate.prometheus_text() + (cascade.prometheus_text() if cascade else "")
     return metrics_text
 
 
+@app.get("/cascade")
+async def cascade_stats():
+    """Requests answered per cascade stage, next to what calibration expected."""
+    if cascade_switch is None:
+        return {"enabled": False}
+    active_cascade()  # picks up a swap no request has gone through yet
+    return cascade_switch.status()
+
+
 @app.get("/labels")
 async def get_labels():
     """Get all available intent labels."""
+    nlu_model = nlu_slot.bundle or NLUModel()
     return {
         "labels": list(nlu_model.id2label.values()),
         "label2id": nlu_model.label2id,
@@ -426,20 +559,113 @@ async def get_labels():
     }
 
 
+@app.post("/admin/reload")
+async def reload_model(request: ReloadRequest):
+    """
+    Load a model version in the background, warm it up and swap it in;
+    requests already running finish on the old model.
+    """
+    model_path = request.model_path or nlu_slot.version or MODEL_PATH
+    if not os.path.exists(model_path):
+        raise HTTPException(status_code=404, detail=f"Model not found: {model_path}")
+    try:
+        result = nlu_slot.reload(lambda: load_nlu_model(model_path), warmup_nlu_model, version=model_path)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if request.wait:
+        result = await asyncio.to_thread(nlu_slot.wait)
+    return result
+
+
+@app.get("/admin/reload")
+async def reload_status():
+    """Active model version, in-flight requests and recent reloads."""
+    return nlu_slot.status()
+
+
+@app.post("/admin/candidate")
+async def configure_candidate(request: CandidateRequest):
+    """
+    Load a candidate model (background load + warmup, like /admin/reload)
+    and/or set shadow or canary mode and the traffic fraction. Stats reset
+    when the candidate model changes.
+    """
+    if request.mode is not None and request.mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {MODES}")
+    if request.fraction is not None and not 0.0 <= request.fraction <= 1.0:
+        raise HTTPException(status_code=400, detail="fraction must be between 0 and 1")
+    
+    result = None
+    if request.model_path:
+        if not os.path.exists(request.model_path):
+            raise HTTPException(status_code=404, detail=f"Model not found: {request.model_path}")
+        model_path = request.model_path
+        try:
+            result = candidate_slot.reload(lambda: load_nlu_model(model_path), warmup_nlu_model,
+                                           version=model_path)
+        except ReloadInProgress as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        candidate.reset()
+        if request.wait:
+            result = await asyncio.to_thread(candidate_slot.wait)
+    candidate.configure(request.mode, request.fraction)
+    return {"mode": candidate.mode, "fraction": candidate.fraction, "reload": result}
+
+
+@app.get("/admin/candidate")
+async def candidate_report():
+    """Shadow agreement, canary split, confidence and latency per intent, primary-path latency."""
+    return candidate.report()
+
+
+@app.delete("/admin/candidate")
+async def remove_candidate():
+    """Stop shadow/canary traffic and unload the candidate (final report returned)."""
+    candidate.configure(mode="off")
+    report = candidate.report()
+    await asyncio.to_thread(candidate_slot.clear)
+    return report
+
+
+@app.post("/admin/candidate/promote")
+async def promote_candidate(wait: bool = False):
+    """
+    Make the candidate the primary model: the loaded, warmed candidate is
+    swapped in (no second load) and shadow/canary traffic stops.
+    """
+    model = candidate_slot.bundle
+    if model is None:
+        raise HTTPException(status_code=404, detail="No candidate loaded")
+    try:
+        result = nlu_slot.reload(lambda: model, version=candidate_slot.version)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    candidate.configure(mode="off")
+    if wait:
+        result = await asyncio.to_thread(nlu_slot.wait)
+    # The model lives on in nlu_slot; this only empties the candidate slot
+    await asyncio.to_thread(candidate_slot.clear)
+    return result
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API info."""
+    nlu_model = nlu_slot.bundle
     return {
         "name": "NLU Server v3",
         "version": "3.0.0",
-        "model_version": nlu_model.model_version,
-        "model_loaded": nlu_model.loaded,
+        "model_version": nlu_model.model_version if nlu_model else "unknown",
+        "model_loaded": nlu_model is not None,
         "endpoints": {
             "classify": "POST /classify",
             "batch": "POST /classify/batch",
             "health": "GET /health",
             "metrics": "GET /metrics",
             "labels": "GET /labels",
+            "reload": "POST /admin/reload",
+            "candidate": "GET|POST|DELETE /admin/candidate",
+            "cascade": "GET /cascade",
         }
     }
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Reload Load Test - no dropped requests, bounded latency during a hot swap
+=========================================================================
+Keeps --concurrency clients posting to an inference endpoint, triggers
+POST /admin/reload (wait=true) after --reload-after seconds and reports
+errors and latency before, during and after the swap. Exits non-zero if
+any request failed or p99 latency during the reload exceeded --max-p99-ms.
+
+    python reload_loadtest.py --url http://localhost:7011 --endpoint /extract \\
+        --body '{"text": "2 paneer tikka"}' --model-path /models/ner_muril_v2
+
+    python reload_loadtest.py --url http://localhost:7010 --endpoint /classify \\
+        --body '{"text": "track my order", "extract_entities": false}'
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [s["ms"] for s in samples if s["ok"]]
+    return {
+        "requests": len(samples),
+        "errors": sum(not s["ok"] for s in samples),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+def run(url: str, endpoint: str, body: Dict[str, Any], concurrency: int, duration: float,
+        reload_after: float, model_path: Optional[str], timeout: float) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client():
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.time()
+            try:
+                response = session.post(f"{url}{endpoint}", json=body, timeout=timeout)
+                ok, error = response.ok, None if response.ok else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                ok, error = False, str(e)
+            sample = {"start": start, "ms": (time.time() - start) * 1000, "ok": ok, "error": error}
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    began = time.time()
+    for thread in threads:
+        thread.start()
+
+    time.sleep(reload_after)
+    reload_start = time.time()
+    payload = {"wait": True}
+    if model_path:
+        payload["model_path"] = model_path
+    reload = requests.post(f"{url}/admin/reload", json=payload, timeout=600).json()
+    reload_end = time.time()
+
+    time.sleep(max(duration - (reload_end - began), reload_after))
+    stop.set()
+    for thread in threads:
+        thread.join(timeout + 1)
+
+    windows = {
+        "before": [s for s in samples if s["start"] < reload_start],
+        "during": [s for s in samples if reload_start <= s["start"] < reload_end],
+        "after": [s for s in samples if s["start"] >= reload_end],
+    }
+    errors = sorted({s["error"] for s in samples if not s["ok"]})
+    return {
+        "reload": reload,
+        "reload_s": round(reload_end - reload_start, 2),
+        "windows": {name: summarize(window) for name, window in windows.items()},
+        "total": summarize(samples),
+        "error_kinds": errors[:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test an inference server across POST /admin/reload")
+    parser.add_argument("--url", required=True, help="Server base URL, e.g. http://localhost:7011")
+    parser.add_argument("--endpoint", default="/extract", help="Inference endpoint to load")
+    parser.add_argument("--body", default='{"text": "2 paneer tikka aur 1 coke"}', help="JSON request body")
+    parser.add_argument("--model-path", help="Model to reload to (default: reload the served path)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0, help="Total seconds of load")
+    parser.add_argument("--reload-after", type=float, default=10.0, help="Seconds of load before the reload")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout (s)")
+    parser.add_argument("--max-p99-ms", type=float, default=1000.0, help="Fail if p99 during the reload is above this")
+    args = parser.parse_args()
+
+    result = run(args.url, args.endpoint, json.loads(args.body), args.concurrency, args.duration,
+                 args.reload_after, args.model_path, args.timeout)
+
+    print(f"Reload: {result['reload'].get('status')} in {result['reload_s']}s "
+          f"({result['reload'].get('previous_version')} -> {result['reload'].get('version')})")
+    print(f"\n{'window':<8} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, w in list(result["windows"].items()) + [("total", result["total"])]:
+        cells = [f"{w[k]:>8.1f}" if w[k] is not None else f"{'-':>8}" for k in ("p50_ms", "p99_ms", "max_ms")]
+        print(f"{name:<8} {w['requests']:>9} {w['errors']:>7} {' '.join(cells)}")
+    for error in result["error_kinds"]:
+        print(f"  error: {error}")
+
+    during = result["windows"]["during"]
+    failed = result["total"]["errors"] > 0 or result["reload"].get("status") != "completed"
+    if during["p99_ms"] is not None and during["p99_ms"] > args.max_p99_ms:
+        print(f"p99 during reload {during['p99_ms']:.1f}ms > {args.max_p99_ms:.0f}ms")
+        failed = True
+    print("\nFAIL" if failed else "\nPASS: no dropped requests")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,13 @@
 # 3. Run this script:
 #    bash retrain_nlu_v5.sh
 #
+# Incremental mode (a few hundred new examples from the collector):
+#    NEW_DATA=~/nlu-training/collected_new.jsonl bash retrain_nlu_v5.sh
+# warm-starts from the deployed model in FINAL_MODEL_DIR and trains on the
+# new examples plus a per-intent replay sample of TRAINING_DATA
+# (train_incremental.py). It fails if accuracy on the old intents drops by
+# more than MAX_REGRESSION (default 0.01).
+#
 # Dataset: 4587 samples, 33 canonical intents
 # Expected accuracy: 85-90% (up from 74.4% with 1028/19)
 # ============================================================
@@ -28,6 +35,12 @@ export TRAINING_DATA="${SCRIPT_DIR}/nlu_final_v5_merged.jsonl"
 export OUTPUT_DIR="${HOME}/nlu-training/models/nlu_indicbert_v5"
 export FINAL_MODEL_DIR="${HOME}/mangwale-ai/models/nlu_production"
 
+# Incremental mode
+NEW_DATA="${NEW_DATA:-}"
+INCREMENTAL_OUTPUT_DIR="${HOME}/nlu-training/models/nlu_indicbert_v5_incremental"
+REPLAY_PER_INTENT="${REPLAY_PER_INTENT:-50}"
+MAX_REGRESSION="${MAX_REGRESSION:-0.01}"
+
 # Use GPU if available
 export USE_GPU=auto
 
@@ -63,6 +76,46 @@ print(f'  Max per intent: {max(counts.values())}')
 print(f'  Avg per intent: {sum(counts.values()) / len(counts):.0f}')
 "
 
+if [ -n "${NEW_DATA}" ]; then
+    if [ ! -f "${NEW_DATA}" ]; then
+        echo "ERROR: New data not found at ${NEW_DATA}"
+        exit 1
+    fi
+    if [ ! -f "${FINAL_MODEL_DIR}/config.json" ]; then
+        echo "ERROR: No deployed model in ${FINAL_MODEL_DIR} to start from - run a full retrain"
+        exit 1
+    fi
+
+    echo ""
+    echo "Starting incremental training from ${FINAL_MODEL_DIR}..."
+    echo "New data: ${NEW_DATA} ($(wc -l < "${NEW_DATA}") lines)"
+    echo ""
+
+    python3 "${SCRIPT_DIR}/train_incremental.py" \
+        --base "${FINAL_MODEL_DIR}" \
+        --data "${NEW_DATA}" \
+        --replay-data "${TRAINING_DATA}" \
+        --output "${INCREMENTAL_OUTPUT_DIR}" \
+        --replay-per-intent "${REPLAY_PER_INTENT}" \
+        --max-regression "${MAX_REGRESSION}"
+
+    echo ""
+    echo "============================================"
+    echo "Incremental training complete!"
+    echo "============================================"
+    echo ""
+    echo "Next steps:"
+    echo "1. Deploy the model (the regression check passed):"
+    echo "   rsync -a --exclude 'checkpoint-*' --exclude logs ${INCREMENTAL_OUTPUT_DIR}/ ${FINAL_MODEL_DIR}/"
+    echo "2. Add the new examples to the corpus so the next replay includes them:"
+    echo "   cat ${NEW_DATA} >> ${TRAINING_DATA}"
+    echo "3. Restart the NLU server:"
+    echo "   sudo systemctl restart nlu-server"
+    echo "   # OR if using Docker:"
+    echo "   docker restart mercury-nlu"
+    exit 0
+fi
+
 echo ""
 echo "Starting training..."
 echo ""
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Search Result Cache - bounded LRU + TTL with request coalescing
+================================================================
+Used by LLMOrchestrator for search_products / search_stores so popular
+terms ("biryani", "pizza", "Tushar") hit the search service once per TTL.
+
+- LRU eviction once max_size entries are stored
+- Entries expire ttl seconds after they were loaded
+- Concurrent identical lookups share one in-flight call:
+  get_or_load() for threads, aget_or_load() for asyncio tasks
+- Loader results with an "error" key are returned but never cached
+"""
+
+import re
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Lowercase, trim and collapse whitespace."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class SearchResultCache:
+    def __init__(self, max_size: int = 2048, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._ainflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(endpoint: str, query: str, store: Optional[str] = None, limit: int = 5, *extra) -> Tuple:
+        """(endpoint, normalized query, normalized store filter, limit, *extra filters)"""
+        return (endpoint, normalize_query(query), normalize_query(store) or None, limit, *extra)
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Lookup under the lock; counts hits and expirations, not misses."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def _put(self, key: Hashable, value: Any):
+        if isinstance(value, dict) and value.get("error"):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        # Callers get their own top-level dict; nested items are treated as read-only
+        return dict(value) if isinstance(value, dict) else value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------------------------------------------------
+    # Thread-safe loading
+    # ------------------------------------------------------------------
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                return self._copy(value)
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            return self._copy(future.result())
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._put(key, value)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return self._copy(value)
+
+    # ------------------------------------------------------------------
+    # asyncio loading (single event loop)
+    # ------------------------------------------------------------------
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        The loader runs in its own task that every caller awaits through
+        asyncio.shield, so a caller that is cancelled (e.g. at its lookup
+        deadline) leaves the load and the other waiters alone. A load whose
+        callers are all gone still finishes and fills the cache.
+        """
+        if not self.enabled:
+            return await loader()
+
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                return self._copy(value)
+            task = self._ainflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+
+        if task is None:
+            task = asyncio.ensure_future(self._aload(key, loader))
+            # Retrieve the outcome so a failure nobody awaited is not logged
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._ainflight[key] = task
+        return self._copy(await asyncio.shield(task))
+
+    async def _aload(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            with self._lock:
+                self._put(key, value)
+            return value
+        finally:
+            self._ainflight.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
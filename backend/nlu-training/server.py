@@ -7,11 +7,18 @@ FastAPI server that allows triggering training from the admin dashboard.
 Endpoints:
     GET  /health          - Health check
     GET  /status          - Training status and GPU info
-    POST /train           - Start training job
+    POST /train           - Start training job (full, or incremental from the deployed model)
     GET  /jobs            - List training jobs
     GET  /jobs/{id}       - Get job status
-    POST /deploy/{model}  - Deploy model to NLU service
-    GET  /models          - List available models
+    GET  /jobs/{id}/stream - Follow a job's step metrics (NDJSON)
+    POST /jobs/{id}/cancel - Cancel a queued or running job
+    POST /deploy/{model}  - Hot-swap a trained model into the NLU or NER server
+    GET  /models          - List available models with their CPU benchmark
+    GET  /metrics         - Job progress and step metrics as Prometheus gauges
+
+Jobs are kept in an SQLite store (JOB_DB_PATH) and run in separate worker
+processes by job_queue.JobScheduler: JOB_GPU_SLOTS GPU jobs and
+JOB_CPU_SLOTS CPU jobs at a time, highest priority first.
 """
 
 import os
@@ -23,17 +30,24 @@ import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
 import torch
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import requests
 
 # Import training functions
-from train import train_model, load_training_data, setup_device
+from train import EPOCHS, LEARNING_RATE, train_model, load_training_data, setup_device
+from train_incremental import (
+    EPOCHS as INCREMENTAL_EPOCHS, LEARNING_RATE as INCREMENTAL_LEARNING_RATE, train_incremental
+)
 from train_ner import train_ner_model, load_ner_training_data
+from job_queue import ACTIVE_STATUSES, JobScheduler, JobStore, RESOURCES
+from model_benchmark import load_benchmark, summary
+from model_reload import active_version
+from training_progress import prometheus_text
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -45,11 +59,22 @@ logger = logging.getLogger(__name__)
 TRAINING_DATA_DIR = os.environ.get('TRAINING_DATA_DIR', '/training-data')
 MODELS_DIR = os.environ.get('MODELS_DIR', '/models')
 NLU_SERVICE_URL = os.environ.get('NLU_SERVICE_URL', 'http://mangwale_nlu:7010')
+NER_SERVICE_URL = os.environ.get('NER_SERVICE_URL', 'http://mangwale_ner:7011')
+# MODELS_DIR as mounted in the inference containers
+DEPLOY_MODELS_DIR = os.environ.get('DEPLOY_MODELS_DIR', MODELS_DIR)
+DEPLOY_TIMEOUT_S = int(os.environ.get('DEPLOY_TIMEOUT_S', '600'))
 BACKEND_URL = os.environ.get('BACKEND_URL', 'http://mangwale_backend:3001')
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(MODELS_DIR, 'training_jobs.db'))
+
+# Job type -> runner imported by the worker process
+JOB_RUNNERS = {
+    "nlu": "server:run_training_job",
+    "ner": "server:run_ner_training_job",
+}
 
-# In-memory job tracking (in production, use Redis/DB)
-training_jobs: Dict[str, Dict] = {}
-executor = ThreadPoolExecutor(max_workers=1)  # Only 1 training at a time
+# Created on startup
+job_store: Optional[JobStore] = None
+scheduler: Optional[JobScheduler] = None
 
 app = FastAPI(
     title="NLU Training Server",
@@ -62,14 +87,22 @@ app = FastAPI(
 # MODELS
 # ============================================================================
 class TrainRequest(BaseModel):
-    data_file: Optional[str] = None  # Training data file in TRAINING_DATA_DIR
+    data_file: Optional[str] = None  # Training data file in TRAINING_DATA_DIR (incremental: the new examples)
     model_name: str = "ai4bharat/IndicBERTv2-MLM-Back-TLM"
     output_name: str = "indicbert_latest"
-    epochs: int = 5
+    epochs: Optional[int] = None  # Default: 5 (full), 2 (incremental)
     batch_size: int = 16
-    learning_rate: float = 3e-5
+    learning_rate: Optional[float] = None  # Default: 3e-5 (full), 2e-5 (incremental)
+    # "incremental": warm start from base_model on data_file + a replay sample (train_incremental.py)
+    mode: str = "full"
+    base_model: Optional[str] = None  # Model in MODELS_DIR (default: the one the NLU service serves)
+    replay_data_file: Optional[str] = None  # Corpus to replay from (default: nlu_training_data.jsonl)
+    replay_per_intent: int = 50
+    max_regression: float = 0.01  # Accuracy the old intents may lose
     triggered_by: Optional[str] = "admin"
     notes: Optional[str] = None
+    priority: int = 0  # Higher runs first
+    resource: Optional[str] = None  # gpu / cpu (default: gpu when available)
 
 
 class DeployRequest(BaseModel):
@@ -85,11 +118,13 @@ class NERTrainRequest(BaseModel):
     learning_rate: float = 5e-5
     triggered_by: Optional[str] = "admin"
     notes: Optional[str] = None
+    priority: int = 0
+    resource: Optional[str] = None
 
 
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # queued, running, completed, failed
+    status: str  # queued, running, completed, failed, cancelled
     progress: float  # 0-100
     message: str
     started_at: Optional[str]
@@ -99,123 +134,188 @@ class JobStatus(BaseModel):
 
 
 # ============================================================================
-# TRAINING EXECUTION
+# TRAINING EXECUTION (job_queue worker processes)
 # ============================================================================
-def run_training_job(job_id: str, request: TrainRequest):
-    """Execute training in background thread"""
+def run_training_job(job_id: str, request: Dict, report: Callable) -> Dict:
+    """Train an NLU model; errors propagate and fail the job"""
+    request = TrainRequest(**request)
+    if request.mode == 'incremental':
+        return run_incremental_training_job(job_id, request, report)
+    report(message='Loading training data...')
+    
+    # Determine data file
+    if request.data_file:
+        data_path = os.path.join(TRAINING_DATA_DIR, request.data_file)
+    else:
+        # Use latest training data
+        data_path = os.path.join(TRAINING_DATA_DIR, 'nlu_training_data.jsonl')
+    
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"Training data not found: {data_path}")
+    
+    # Load data
+    data = load_training_data(data_path)
+    report(progress=10, message=f'Loaded {len(data)} samples. Starting training...')
+    
+    # Output directory
+    output_dir = os.path.join(MODELS_DIR, request.output_name)
+    
+    # Run training
+    result = train_model(
+        data=data,
+        output_dir=output_dir,
+        model_name=request.model_name,
+        epochs=request.epochs or EPOCHS,
+        batch_size=request.batch_size,
+        learning_rate=request.learning_rate or LEARNING_RATE,
+        report=report
+    )
+    report(message=f"Training complete! Accuracy: {result['results']['accuracy']:.2%}")
+    notify_training_complete(job_id, output_dir, result)
+    return result
+
+
+def run_incremental_training_job(job_id: str, request: TrainRequest, report: Callable) -> Dict:
+    """
+    Warm-start the deployed intent model on new examples plus a per-intent
+    replay of the corpus. A failed regression check fails the job.
+    """
+    report(message='Loading new examples and replay corpus...')
+    new_path = os.path.join(TRAINING_DATA_DIR, request.data_file)
+    replay_path = os.path.join(TRAINING_DATA_DIR, request.replay_data_file or 'nlu_training_data.jsonl')
+    base_dir = os.path.join(MODELS_DIR, request.base_model)
+    for path in (new_path, replay_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Training data not found: {path}")
+    if not os.path.exists(base_dir):
+        raise FileNotFoundError(f"Base model not found: {base_dir}")
+    
+    new_data = load_training_data(new_path)
+    replay_data = load_training_data(replay_path)
+    report(progress=10, message=f'{len(new_data)} new samples, warm start from {request.base_model}')
+    
+    output_dir = os.path.join(MODELS_DIR, request.output_name)
+    result = train_incremental(
+        new_data=new_data,
+        replay_data=replay_data,
+        base_model_dir=base_dir,
+        output_dir=output_dir,
+        replay_per_intent=request.replay_per_intent,
+        epochs=request.epochs or INCREMENTAL_EPOCHS,
+        batch_size=request.batch_size,
+        learning_rate=request.learning_rate or INCREMENTAL_LEARNING_RATE,
+        max_regression=request.max_regression,
+        report=report
+    )
+    check = result['incremental']['regression_check']
+    report(message=f"Incremental training complete in {result['incremental']['duration_s']:.0f}s! "
+                   f"Old intents {check['base_accuracy']:.2%} -> {check['accuracy']:.2%}")
+    notify_training_complete(job_id, output_dir, result)
+    return result
+
+
+def notify_training_complete(job_id: str, model_path: str, result: Dict):
     try:
-        training_jobs[job_id]['status'] = 'running'
-        training_jobs[job_id]['started_at'] = datetime.now().isoformat()
-        training_jobs[job_id]['message'] = 'Loading training data...'
-        
-        # Determine data file
-        if request.data_file:
-            data_path = os.path.join(TRAINING_DATA_DIR, request.data_file)
-        else:
-            # Use latest training data
-            data_path = os.path.join(TRAINING_DATA_DIR, 'nlu_training_data.jsonl')
-        
-        if not os.path.exists(data_path):
-            raise FileNotFoundError(f"Training data not found: {data_path}")
-        
-        # Load data
-        data = load_training_data(data_path)
-        training_jobs[job_id]['message'] = f'Loaded {len(data)} samples. Starting training...'
-        training_jobs[job_id]['progress'] = 10
-        
-        # Output directory
-        output_dir = os.path.join(MODELS_DIR, request.output_name)
-        
-        # Run training
-        result = train_model(
-            data=data,
-            output_dir=output_dir,
-            model_name=request.model_name,
-            epochs=request.epochs,
-            batch_size=request.batch_size,
-            learning_rate=request.learning_rate
-        )
-        
-        # Success
-        training_jobs[job_id]['status'] = 'completed'
-        training_jobs[job_id]['progress'] = 100
-        training_jobs[job_id]['message'] = f"Training complete! Accuracy: {result['results']['accuracy']:.2%}"
-        training_jobs[job_id]['completed_at'] = datetime.now().isoformat()
-        training_jobs[job_id]['results'] = result
-        
-        # Notify backend
-        try:
-            requests.post(f"{BACKEND_URL}/api/admin/learning/training-complete", json={
-                "job_id": job_id,
-                "model_path": output_dir,
-                "results": result
-            }, timeout=5)
-        except Exception as e:
-            logger.warning(f"Failed to notify backend: {e}")
-            
+        requests.post(f"{BACKEND_URL}/api/admin/learning/training-complete", json={
+            "job_id": job_id,
+            "model_path": model_path,
+            "results": result
+        }, timeout=5)
     except Exception as e:
-        logger.error(f"Training failed: {e}")
-        training_jobs[job_id]['status'] = 'failed'
-        training_jobs[job_id]['error'] = str(e)
-        training_jobs[job_id]['message'] = f"Training failed: {str(e)[:100]}"
-        training_jobs[job_id]['completed_at'] = datetime.now().isoformat()
+        logger.warning(f"Failed to notify backend: {e}")
 
 
-def run_ner_training_job(job_id: str, request: NERTrainRequest):
-    """Execute NER training in background thread"""
+def deployed_model_name() -> Optional[str]:
+    """The model in MODELS_DIR the NLU service serves as its intent model, from its GET /admin/reload"""
     try:
-        training_jobs[job_id]['status'] = 'running'
-        training_jobs[job_id]['started_at'] = datetime.now().isoformat()
-        training_jobs[job_id]['message'] = 'Loading NER training data...'
-        
-        # Determine data file
-        if request.data_file:
-            data_path = request.data_file
-        else:
-            # Use default NER training data
-            data_path = os.path.join(TRAINING_DATA_DIR, 'ner', 'training_data.json')
-        
-        if not os.path.exists(data_path):
-            raise FileNotFoundError(f"NER training data not found: {data_path}")
-        
-        # Output directory
-        output_dir = os.path.join(MODELS_DIR, request.output_name)
-        
-        training_jobs[job_id]['message'] = 'Starting NER model training...'
-        training_jobs[job_id]['progress'] = 10
-        
-        # Run NER training
-        result = train_ner_model(
-            data_path=data_path,
-            output_dir=output_dir,
-            epochs=request.epochs,
-            batch_size=request.batch_size,
-            learning_rate=request.learning_rate
-        )
-        
-        # Success
-        training_jobs[job_id]['status'] = 'completed'
-        training_jobs[job_id]['progress'] = 100
-        training_jobs[job_id]['message'] = f"NER Training complete! F1: {result.get('f1', 'N/A')}"
-        training_jobs[job_id]['completed_at'] = datetime.now().isoformat()
-        training_jobs[job_id]['results'] = result
-        
-        # Notify backend
-        try:
-            requests.post(f"{BACKEND_URL}/api/admin/learning/ner-training-complete", json={
-                "job_id": job_id,
-                "model_path": output_dir,
-                "results": result
-            }, timeout=5)
-        except Exception as e:
-            logger.warning(f"Failed to notify backend: {e}")
-            
+        response = requests.get(f"{NLU_SERVICE_URL}/admin/reload", timeout=5)
+        response.raise_for_status()
+        version = active_version(response.json()) or ""
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Could not ask the NLU service for its model: {e}")
+        return None
+    relative = os.path.relpath(version, DEPLOY_MODELS_DIR) if os.path.isabs(version) else ""
+    if not relative or relative.startswith(".."):
+        return None
+    return relative
+
+
+def run_ner_training_job(job_id: str, request: Dict, report: Callable) -> Dict:
+    """Train an NER model; errors propagate and fail the job"""
+    request = NERTrainRequest(**request)
+    report(message='Loading NER training data...')
+    
+    # Determine data file
+    if request.data_file:
+        data_path = request.data_file
+    else:
+        # Use default NER training data
+        data_path = os.path.join(TRAINING_DATA_DIR, 'ner', 'training_data.json')
+    
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"NER training data not found: {data_path}")
+    
+    # Output directory
+    output_dir = os.path.join(MODELS_DIR, request.output_name)
+    
+    report(progress=10, message='Starting NER model training...')
+    
+    # Run NER training
+    result = train_ner_model(
+        data_path=data_path,
+        output_dir=output_dir,
+        epochs=request.epochs,
+        batch_size=request.batch_size,
+        learning_rate=request.learning_rate,
+        report=report
+    )
+    report(message=f"NER Training complete! F1: {result.get('f1', 'N/A')}")
+    
+    # Notify backend
+    try:
+        requests.post(f"{BACKEND_URL}/api/admin/learning/ner-training-complete", json={
+            "job_id": job_id,
+            "model_path": output_dir,
+            "results": result
+        }, timeout=5)
     except Exception as e:
-        logger.error(f"NER Training failed: {e}")
-        training_jobs[job_id]['status'] = 'failed'
-        training_jobs[job_id]['error'] = str(e)
-        training_jobs[job_id]['message'] = f"NER Training failed: {str(e)[:100]}"
-        training_jobs[job_id]['completed_at'] = datetime.now().isoformat()
+        logger.warning(f"Failed to notify backend: {e}")
+    
+    return result
+
+
+def queue_job(job_id: str, job_type: str, request, label: str) -> Dict:
+    """Store a queued job; the scheduler starts it when a slot of its resource class frees up"""
+    resource = request.resource or ('gpu' if torch.cuda.is_available() else 'cpu')
+    if resource not in RESOURCES:
+        raise HTTPException(400, f"resource must be one of {list(RESOURCES)}")
+    
+    job_store.create(job_id, job_type, request.dict(), resource, request.priority, f"{label} job queued")
+    position = job_store.queue_position(job_id)
+    logger.info(f"{label} job {job_id} queued ({resource}, priority {request.priority}, position {position})")
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "resource": resource,
+        "queue_position": position,
+        "message": f"{label} job created successfully"
+    }
+
+
+@app.on_event("startup")
+def start_job_scheduler():
+    global job_store, scheduler
+    job_store = JobStore(JOB_DB_PATH)
+    scheduler = JobScheduler(job_store, JOB_RUNNERS)
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_job_scheduler():
+    # Running jobs are stopped and requeued for the next start
+    if scheduler:
+        scheduler.stop()
 
 
 # ============================================================================
@@ -239,113 +339,118 @@ def get_status():
             "cuda_version": torch.version.cuda
         }
     
-    # Count active jobs
-    active_jobs = sum(1 for j in training_jobs.values() if j['status'] in ['queued', 'running'])
+    # Job counts from the store
+    counts = job_store.counts()
     
     return {
         "status": "ok",
         "gpu_available": torch.cuda.is_available(),
         "gpu_info": gpu_info,
         "pytorch_version": torch.__version__,
-        "active_training_jobs": active_jobs,
-        "total_jobs": len(training_jobs),
+        "active_training_jobs": counts['queued'] + counts['running'],
+        "total_jobs": sum(counts.values()),
+        "jobs": counts,
+        "scheduler": scheduler.stats(),
         "models_dir": MODELS_DIR,
         "training_data_dir": TRAINING_DATA_DIR
     }
 
 
 @app.post("/train")
-async def start_training(request: TrainRequest, background_tasks: BackgroundTasks):
-    """Start a new training job"""
-    
-    # Check if another job is running
-    for job in training_jobs.values():
-        if job['status'] in ['queued', 'running']:
-            raise HTTPException(400, f"Another training job is already {job['status']}: {job['job_id']}")
-    
-    # Create job
-    job_id = str(uuid.uuid4())[:8]
-    training_jobs[job_id] = {
-        "job_id": job_id,
-        "status": "queued",
-        "progress": 0,
-        "message": "Training job queued",
-        "request": request.dict(),
-        "created_at": datetime.now().isoformat(),
-        "started_at": None,
-        "completed_at": None,
-        "results": None,
-        "error": None
-    }
-    
-    # Submit to thread pool
-    executor.submit(run_training_job, job_id, request)
-    
-    logger.info(f"Training job {job_id} queued")
-    
-    return {
-        "job_id": job_id,
-        "status": "queued",
-        "message": "Training job created successfully"
-    }
+async def start_training(request: TrainRequest):
+    """Queue a new training job"""
+    if request.mode not in ("full", "incremental"):
+        raise HTTPException(400, "mode must be 'full' or 'incremental'")
+    if request.mode == "incremental":
+        if not request.data_file:
+            raise HTTPException(400, "Incremental training needs data_file (the new examples)")
+        # Resolved now so the job records which model it started from
+        request.base_model = request.base_model or await asyncio.to_thread(deployed_model_name)
+        if not request.base_model:
+            raise HTTPException(400, "Could not tell which model the NLU service serves; pass base_model")
+        if not os.path.isdir(os.path.join(MODELS_DIR, request.base_model)):
+            raise HTTPException(404, f"Base model not found: {request.base_model}")
+    return queue_job(str(uuid.uuid4())[:8], "nlu", request, "Training")
 
 
 @app.post("/train/ner")
-async def start_ner_training(request: NERTrainRequest, background_tasks: BackgroundTasks):
-    """Start a new NER training job"""
-    
-    # Check if another job is running
-    for job in training_jobs.values():
-        if job['status'] in ['queued', 'running']:
-            raise HTTPException(400, f"Another training job is already {job['status']}: {job['job_id']}")
-    
-    # Create job
-    job_id = f"ner-{str(uuid.uuid4())[:8]}"
-    training_jobs[job_id] = {
-        "job_id": job_id,
-        "type": "ner",
-        "status": "queued",
-        "progress": 0,
-        "message": "NER training job queued",
-        "request": request.dict(),
-        "created_at": datetime.now().isoformat(),
-        "started_at": None,
-        "completed_at": None,
-        "results": None,
-        "error": None
-    }
-    
-    # Submit to thread pool
-    executor.submit(run_ner_training_job, job_id, request)
-    
-    logger.info(f"NER Training job {job_id} queued")
-    
-    return {
-        "job_id": job_id,
-        "status": "queued",
-        "message": "NER training job created successfully"
-    }
+async def start_ner_training(request: NERTrainRequest):
+    """Queue a new NER training job"""
+    return queue_job(f"ner-{str(uuid.uuid4())[:8]}", "ner", request, "NER training")
 
 
 @app.get("/jobs")
-def list_jobs(limit: int = 10):
-    """List training jobs"""
-    jobs = list(training_jobs.values())
-    jobs.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    return {"jobs": jobs[:limit], "total": len(jobs)}
+def list_jobs(limit: int = 10, status: Optional[str] = None):
+    """List training jobs, newest first"""
+    return {"jobs": job_store.list(limit, status), "total": sum(job_store.counts().values())}
 
 
 @app.get("/jobs/{job_id}")
 def get_job(job_id: str):
     """Get job status"""
-    if job_id not in training_jobs:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job not found: {job_id}")
+    job["queue_position"] = job_store.queue_position(job_id)
+    return job
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, after: int = 0, poll_interval: float = 1.0):
+    """
+    Follow a job as NDJSON: one {"type": "metrics", "seq", ...} line per
+    logged training step and a {"type": "status", ...} line whenever status,
+    progress or message change. Ends once the job is finished; pass the last
+    seen seq as ?after= to resume.
+    """
+    if job_store.get(job_id) is None:
+        raise HTTPException(404, f"Job not found: {job_id}")
+
+    async def follow():
+        seq, last = after, None
+        while True:
+            job = job_store.get(job_id)
+            for record in job_store.metrics(job_id, after=seq):
+                seq = record["seq"]
+                yield json.dumps({"type": "metrics", **record}) + "\n"
+            state = (job["status"], job["progress"], job["message"])
+            if state != last:
+                last = state
+                yield json.dumps({"type": "status", "job_id": job_id, "status": job["status"],
+                                  "progress": job["progress"], "message": job["message"],
+                                  "error": job.get("error")}) + "\n"
+            if job["status"] not in ACTIVE_STATUSES:
+                return
+            await asyncio.sleep(max(poll_interval, 0.2))
+
+    return StreamingResponse(follow(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one (its worker process is terminated)"""
+    status = job_store.request_cancel(job_id)
+    if status is None:
         raise HTTPException(404, f"Job not found: {job_id}")
-    return training_jobs[job_id]
+    if status not in ('cancelled', 'running'):
+        raise HTTPException(400, f"Job {job_id} already {status}")
+    return {"job_id": job_id, "status": status, "message": "Cancelled" if status == 'cancelled' else "Cancelling"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape target: jobs by status plus the latest step metrics of recent jobs"""
+    return PlainTextResponse(prometheus_text(job_store.list(20), job_store.counts()),
+                             media_type="text/plain; version=0.0.4")
 
 
 @app.get("/models")
 def list_models():
-    """List available trained models"""
+    """
+    List available trained models. benchmark holds the headline numbers of
+    the model's benchmark.json (CPU batch 1 / 32 latency, size, peak RSS
+    for fp32 and int8), None for models trained before it was written.
+    """
     models = []
     
     if os.path.exists(MODELS_DIR):
@@ -357,6 +462,7 @@ def list_models():
                 if os.path.exists(config_path):
                     with open(config_path) as f:
                         config = json.load(f)
+                benchmark = load_benchmark(model_path)
                 
                 models.append({
                     "name": name,
@@ -366,42 +472,70 @@ def list_models():
                         os.path.getsize(os.path.join(model_path, f))
                         for f in os.listdir(model_path)
                         if os.path.isfile(os.path.join(model_path, f))
-                    ) / 1024 / 1024
+                    ) / 1024 / 1024,
+                    "benchmark": summary(benchmark) if benchmark else None,
+                    "benchmark_threads": benchmark["threads"] if benchmark else None,
+                    "benchmarked_at": benchmark["created_at"] if benchmark else None,
                 })
     
     return {"models": models}
 
 
+def detect_model_target(model_path: str) -> str:
+    """'ner' for token classification models (label_config.json or *ForTokenClassification), else 'nlu'"""
+    if os.path.exists(os.path.join(model_path, "label_config.json")):
+        return "ner"
+    config_path = os.path.join(model_path, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            architectures = json.load(f).get("architectures") or []
+        if any(a.endswith("ForTokenClassification") for a in architectures):
+            return "ner"
+    return "nlu"
+
+
 @app.post("/deploy/{model_name}")
-async def deploy_model(model_name: str, restart: bool = True):
-    """Deploy a trained model to the NLU service"""
-    
+def deploy_model(model_name: str, target: Optional[str] = None, wait: bool = True):
+    """
+    Hot-swap a trained model into the NLU or NER server through its
+    POST /admin/reload: the server loads and warms the model in the
+    background, swaps it in and drains requests still on the old one.
+    target defaults to what the model looks like (NER vs intent).
+    """
     model_path = os.path.join(MODELS_DIR, model_name)
     
     if not os.path.exists(model_path):
         raise HTTPException(404, f"Model not found: {model_name}")
     
-    # The NLU service reads from /models/indicbert_v5_enhanced (or configured path)
-    # We need to update that symlink or copy the model
+    target = target or detect_model_target(model_path)
+    services = {"nlu": NLU_SERVICE_URL, "ner": NER_SERVICE_URL}
+    if target not in services:
+        raise HTTPException(400, f"Unknown target: {target} (use one of {list(services)})")
     
+    served_path = os.path.join(DEPLOY_MODELS_DIR, model_name)
     try:
-        # For now, we'll call the NLU service to reload
-        # In production, you might use a shared volume or S3
-        
-        response = requests.get(f"{NLU_SERVICE_URL}/healthz", timeout=5)
-        nlu_status = response.json() if response.ok else None
-        
-        return {
-            "status": "success",
-            "message": f"Model {model_name} ready for deployment",
-            "model_path": model_path,
-            "nlu_service_status": nlu_status,
-            "note": "To complete deployment, copy model to NLU container's /models directory and restart"
-        }
-        
-    except Exception as e:
+        response = requests.post(
+            f"{services[target]}/admin/reload",
+            json={"model_path": served_path, "wait": wait},
+            timeout=DEPLOY_TIMEOUT_S if wait else 30,
+        )
+    except requests.RequestException as e:
         logger.error(f"Deployment failed: {e}")
-        raise HTTPException(500, f"Deployment failed: {str(e)}")
+        raise HTTPException(502, f"{target} service unreachable: {e}")
+    
+    if not response.ok:
+        raise HTTPException(502, f"{target} service refused the reload: {response.status_code} {response.text[:200]}")
+    reload = response.json()
+    if reload.get("status") == "failed":
+        raise HTTPException(502, f"{target} service could not load {model_name}: {reload.get('error')}")
+    
+    logger.info(f"Deployed {model_name} to {target} ({reload.get('status')})")
+    return {
+        "status": "success" if reload.get("status") == "completed" else reload.get("status"),
+        "target": target,
+        "model_path": served_path,
+        "reload": reload,
+    }
 
 
 @app.get("/training-data")
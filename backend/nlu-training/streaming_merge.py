@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Streaming Merge - out-of-core merge and dedup of NLU/NER JSONL corpora
+=======================================================================
+Memory stays bounded no matter how many nlu_v* / ner_* files and production
+logs are merged:
+
+1. Parse  - each input file is parsed, validated and normalized (intents /
+            entity labels) line by line in a worker process and spooled to
+            a temp file as "<dedup key hash>\\t<intent | labels>\\t<json>" lines
+2. Dedup  - the main process replays the spools in input order (first
+            occurrence wins, as before) against DiskHashSet, an SQLite table
+            of 16-byte digests, optionally followed by near_dedup
+3. Write  - kept samples go straight to <output>.tmp, renamed on success
+
+Dedup keys: NLU (normalized text, intent), NER normalized text.
+
+CLI:
+    python streaming_merge.py nlu nlu_final_v1.jsonl nlu_v*.jsonl --workers 4
+    python streaming_merge.py ner ner_final_v1.jsonl ner_*.jsonl --near-dup-threshold 0.85
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from near_dedup import NearDupIndex, label_scope
+
+KINDS = ("nlu", "ner")
+MERGE_WORKERS = int(os.environ.get("MERGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for deduplication"""
+    return re.sub(r"\s+", " ", text.lower().strip())
+
+
+def iter_jsonl(filepath: str) -> Iterator[Dict]:
+    """Stream JSON objects from a JSONL file, skipping blank and broken lines"""
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+# ============================================================================
+# ON-DISK HASH SET
+# ============================================================================
+class DiskHashSet:
+    """
+    Set of strings kept on disk as 16-byte blake2b digests in an SQLite
+    table (WITHOUT ROWID primary key = B-tree keyed by the digest). Without
+    a path it uses a temp file that is removed on close.
+    """
+
+    def __init__(self, path: Optional[str] = None, commit_every: int = 50000):
+        self._temp = path is None
+        if self._temp:
+            fd, path = tempfile.mkstemp(prefix="dedup_", suffix=".db")
+            os.close(fd)
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._size = 0
+
+        self.conn = sqlite3.connect(path)
+        # Scratch data: no journal, no fsync
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (h BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._size = self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    @staticmethod
+    def digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def add_digest(self, digest: bytes) -> bool:
+        """Insert; True if the digest was not in the set yet"""
+        added = self.conn.execute("INSERT OR IGNORE INTO seen VALUES (?)", (digest,)).rowcount == 1
+        self._size += added
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.conn.commit()
+            self._pending = 0
+        return added
+
+    def add(self, key: str) -> bool:
+        return self.add_digest(self.digest(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM seen WHERE h = ?", (self.digest(key),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+        if self._temp:
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================================
+# PARSE (worker processes)
+# ============================================================================
+def _parse_file(path: str, spool_path: str, kind: str,
+                normalize_intent: Optional[Callable[[str], str]],
+                normalize_label: Optional[Callable[[str], str]]) -> Dict[str, int]:
+    """Validate + normalize one input file into a spool of '<digest hex>\\t<counted>\\t<json>' lines"""
+    parsed = invalid = 0
+    with open(path, "r", encoding="utf-8") as f, open(spool_path, "w", encoding="utf-8") as out:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sample = json.loads(line)
+            except json.JSONDecodeError:
+                invalid += 1
+                continue
+
+            if kind == "nlu":
+                if "text" not in sample or "intent" not in sample:
+                    invalid += 1
+                    continue
+                sample["text"] = sample["text"].strip()
+                if normalize_intent:
+                    sample["intent"] = normalize_intent(sample["intent"])
+                key = f"{normalize_text(sample['text'])}\x1f{sample['intent']}"
+                counted = sample["intent"]
+            else:
+                if "text" not in sample or "entities" not in sample:
+                    invalid += 1
+                    continue
+                if normalize_label:
+                    for ent in sample["entities"]:
+                        ent["label"] = normalize_label(ent["label"])
+                key = normalize_text(sample["text"])
+                counted = ",".join(ent["label"] for ent in sample["entities"])
+
+            # Counted intent / labels ride along so the dedup pass only decodes JSON for near-dedup
+            out.write("\t".join((DiskHashSet.digest(key).hex(), counted.replace("\t", " "),
+                                 json.dumps(sample, ensure_ascii=False))) + "\n")
+            parsed += 1
+    return {"parsed": parsed, "invalid": invalid}
+
+
+# ============================================================================
+# MERGE
+# ============================================================================
+def merge_stream(files: List[str], output_path: str, kind: str = "nlu",
+                 normalize_intent: Optional[Callable[[str], str]] = None,
+                 normalize_label: Optional[Callable[[str], str]] = None,
+                 workers: int = MERGE_WORKERS, near_dup_threshold: float = 0.0,
+                 near_dup_per_cluster: int = 1, work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Merge JSONL files into output_path with exact (and optionally near)
+    dedup. Normalizers must be module-level functions so they can be sent
+    to worker processes. Missing files are skipped.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    start = time.time()
+    files = [f for f in files if os.path.exists(f)]
+
+    stats: Dict[str, Any] = {
+        "files": {}, "total": 0, "invalid": 0, "unique": 0,
+        "exact_duplicates": 0, "near_duplicates": 0, "counts": {}, "near_dedup": None,
+    }
+    counts: Counter = Counter()
+    near = NearDupIndex(near_dup_threshold, max_per_cluster=near_dup_per_cluster) if near_dup_threshold > 0 else None
+    tmp_output = f"{output_path}.tmp"
+
+    with tempfile.TemporaryDirectory(prefix="merge_", dir=work_dir) as spool_dir, \
+            DiskHashSet(os.path.join(spool_dir, "seen.db")) as seen, \
+            open(tmp_output, "w", encoding="utf-8") as out:
+        spools = [os.path.join(spool_dir, f"{i:05d}.spool") for i in range(len(files))]
+        jobs = [(path, spool, kind, normalize_intent, normalize_label) for path, spool in zip(files, spools)]
+
+        def parsed_in_order() -> Iterator[Tuple[str, str, Dict[str, int]]]:
+            if workers <= 1 or len(files) <= 1:
+                for job in jobs:
+                    yield job[0], job[1], _parse_file(*job)
+                return
+            with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+                futures = [pool.submit(_parse_file, *job) for job in jobs]
+                # Consume in input order while later files are still parsing
+                for job, future in zip(jobs, futures):
+                    yield job[0], job[1], future.result()
+
+        for path, spool, file_stats in parsed_in_order():
+            stats["files"][os.path.basename(path)] = file_stats["parsed"]
+            stats["total"] += file_stats["parsed"]
+            stats["invalid"] += file_stats["invalid"]
+
+            with open(spool, "r", encoding="utf-8") as f:
+                for line in f:
+                    digest_hex, counted, record = line.rstrip("\n").split("\t", 2)
+                    if not seen.add_digest(bytes.fromhex(digest_hex)):
+                        stats["exact_duplicates"] += 1
+                        continue
+                    if near is not None:
+                        sample = json.loads(record)
+                        scope = sample["intent"] if kind == "nlu" else label_scope(sample)
+                        if not near.add(sample["text"], scope):
+                            stats["near_duplicates"] += 1
+                            continue
+                    out.write(record + "\n")
+                    stats["unique"] += 1
+                    if kind == "nlu":
+                        counts[counted] += 1
+                    elif counted:
+                        counts.update(counted.split(","))
+            os.unlink(spool)
+
+    os.replace(tmp_output, output_path)
+    stats["counts"] = dict(counts)
+    stats["near_dedup"] = near.stats() if near is not None else None
+    stats["elapsed_s"] = round(time.time() - start, 2)
+    return stats
+
+
+def main():
+    import argparse
+    from cleanup_and_merge import normalize_entity_label, normalize_intent
+
+    parser = argparse.ArgumentParser(description="Streaming merge + dedup of NLU/NER JSONL files")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("output")
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--workers", type=int, default=MERGE_WORKERS, help="Parser processes")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.0, help="0 disables")
+    parser.add_argument("--work-dir", help="Where spools and the hash set go (default: system temp)")
+    args = parser.parse_args()
+
+    stats = merge_stream(
+        args.inputs, args.output, args.kind,
+        normalize_intent=normalize_intent if args.kind == "nlu" else None,
+        normalize_label=normalize_entity_label if args.kind == "ner" else None,
+        workers=args.workers, near_dup_threshold=args.near_dup_threshold, work_dir=args.work_dir,
+    )
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    rate = stats["total"] / stats["elapsed_s"] if stats["elapsed_s"] else 0
+    print(f"{stats['total']} → {stats['unique']} in {stats['elapsed_s']}s ({rate:,.0f} lines/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Stub OpenAI-compatible LLM server
+==================================
+Stands in for vLLM when testing the orchestrator's batch engine or the
+dataset generator without a GPU. Answers /v1/chat/completions after a
+configurable delay with
+- a rule-based extraction in the format of EXTRACTION_SYSTEM_PROMPT, or
+- for dataset prompts ("Generate N unique ... INTENT: x"), a JSON array of
+  N random chat messages (with some repeats, so dedup has work to do)
+
+Environment:
+    STUB_LATENCY_MS       mean response latency (default 300)
+    STUB_JITTER_MS        uniform +/- jitter (default 100)
+    STUB_FAILURE_RATE     fraction of requests answered 503 (default 0.0)
+    STUB_MAX_CONCURRENT   requests beyond this get 429, like a full queue (default 8)
+
+Usage:
+    python stub_llm_server.py          # port 8002
+    VLLM_URL=http://localhost:8002/v1/chat/completions python batch_engine.py queries.txt
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import os
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("STUB_JITTER_MS", "100"))
+FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0.0"))
+MAX_CONCURRENT = int(os.getenv("STUB_MAX_CONCURRENT", "8"))
+
+QTY_WORDS = {"ek": 1, "do": 2, "teen": 3, "char": 4, "paanch": 5,
+             "one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+
+GEN_WORDS = ["pizza", "biryani", "chahiye", "bhai", "order", "karo", "jaldi", "kitna", "time", "cart",
+             "add", "paneer", "dosa", "bhejo", "kahan", "hai", "mera", "plz", "dikhao", "abhi", "wala"]
+GENERATE_PROMPT = re.compile(r"Generate (\d+) unique.*?INTENT: (\w+)", re.DOTALL)
+
+app = FastAPI(title="Stub LLM")
+state = {"in_flight": 0, "requests": 0, "rejected": 0, "failed": 0}
+
+
+def _tokens(text: str) -> int:
+    # Rough BPE estimate
+    return max(1, len(text) // 4)
+
+
+def _extract(text: str) -> Dict:
+    """Deterministic extraction: "<food> from <store>", "<store> se <food>", QTY before FOOD."""
+    entities: List[Dict] = []
+    cart_items: List[Dict] = []
+    store = None
+    lower = text.lower()
+    food_span = (0, len(text))
+
+    store_after = re.search(r"\bfrom\s+(.+)$", lower)
+    store_before = None if store_after else re.search(r"^(.+?)\s+se\b", lower)
+    match = store_after or store_before
+    if match:
+        store = text[match.start(1):match.end(1)].strip()
+        entities.append({"text": store, "label": "STORE", "start": match.start(1), "end": match.end(1)})
+        food_span = (0, match.start()) if store_after else (match.end(), len(text))
+
+    segment = lower[food_span[0]:food_span[1]]
+    qty_pattern = r"(\d+|\b(?:%s)\b)?\s*([a-z][a-z ]*?)\s*(?=\band\b|\baur\b|,|\+|$)" % "|".join(QTY_WORDS)
+    for m in re.finditer(qty_pattern, segment):
+        food = m.group(2).strip()
+        if not food:
+            continue
+        offset = food_span[0]
+        qty = 1
+        if m.group(1):
+            qty = int(m.group(1)) if m.group(1).isdigit() else QTY_WORDS[m.group(1)]
+            entities.append({"text": text[offset + m.start(1):offset + m.end(1)], "label": "QTY",
+                             "start": offset + m.start(1), "end": offset + m.end(1)})
+        start = offset + m.start(2)
+        entities.append({"text": text[start:start + len(food)], "label": "FOOD", "start": start, "end": start + len(food)})
+        cart_items.append({"food": food, "qty": qty, "store": store})
+
+    intent = "add_to_cart" if cart_items else ("search_store" if store else "search_food")
+    return {"intent": intent, "confidence": 0.9, "entities": entities, "cart_items": cart_items}
+
+
+def _generate(count: int, intent: str) -> List[str]:
+    """Dataset-generation answer: count short messages for the intent"""
+    words = intent.split("_") + GEN_WORDS
+    return [" ".join(random.choices(words, k=random.randint(2, 6))) for _ in range(count)]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    state["requests"] += 1
+    if state["in_flight"] >= MAX_CONCURRENT:
+        state["rejected"] += 1
+        return JSONResponse(status_code=429, content={"error": "queue full"})
+
+    state["in_flight"] += 1
+    try:
+        body = await request.json()
+        await asyncio.sleep(max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000)
+
+        if random.random() < FAILURE_RATE:
+            state["failed"] += 1
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+
+        messages = body.get("messages", [])
+        text = messages[-1]["content"] if messages else ""
+        generate = GENERATE_PROMPT.search(text)
+        if generate:
+            content = json.dumps(_generate(int(generate.group(1)), generate.group(2)), ensure_ascii=False)
+        else:
+            content = json.dumps(_extract(text))
+        prompt_tokens = sum(_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = _tokens(content)
+
+        return {
+            "id": f"stub-{state['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+    finally:
+        state["in_flight"] -= 1
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", **state}
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("STUB_PORT", "8002"))
+    print(f"🧪 Stub LLM on port {port} (latency {LATENCY_MS}ms, failure rate {FAILURE_RATE})")
+    uvicorn.run(app, host="0.0.0.0", port=port)
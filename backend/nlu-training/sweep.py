@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter Sweep - parallel trials with early stopping
+==========================================================
+Runs one training script over a search space, several trials at a time.
+Each trial is a spawned process limited to --threads CPU threads (pinned to
+its own cores where the OS allows it):
+
+    intent  train.py train_model            learning_rate, epochs, batch_size, model
+    lora    train_indicbert_v3_lora.py      lora_r, lora_alpha, lora_dropout,
+                                            learning_rate, epochs, batch_size, max_length
+    ner     train_ner_multimodel.py         model (SUPPORTED_MODELS key or HF name),
+                                            learning_rate, epochs, batch_size
+
+Search space (JSON, inline or a file): a list is a choice, {"low", "high"}
+a uniform range ("log": true for log-uniform, "int": true to round), any
+other value is fixed. A space of lists only runs as a full grid unless
+--trials is given; otherwise --trials random samples.
+
+Early stopping: each trial reports its per-epoch evaluation to the sweep
+process, which answers continue or stop (the trial raises TrialPruned):
+    median  stop when the trial's best so far is below the median of the
+            other trials' best at the same epoch
+    asha    rungs at epochs min_epochs * eta^k; a trial continues past a
+            rung only if it is in the top 1/eta of the trials seen there
+Trials sharing a tokenizer and max length wait until the first of them has
+tokenized, so the others load their datasets from the tokenized cache.
+
+Output (--output):
+    trial-NNN/          model of each completed trial (checkpoints removed)
+    trials.jsonl        one line per finished trial
+    leaderboard.json    completed trials by F1, with accuracy, CPU latency
+                        and size (fp32 and int8, from the benchmark.json the
+                        trainers write) and the Pareto front
+
+Usage:
+    python sweep.py --target lora --data nlu_v8_final.jsonl --output /models/sweeps/lora \\
+        --space '{"lora_r": [8, 16, 32], "lora_alpha": [16, 32, 64]}' --threads 4
+    python sweep.py --target intent --data nlu_v8_final.jsonl --output /models/sweeps/intent \\
+        --space '{"learning_rate": {"low": 1e-5, "high": 1e-4, "log": true}, "epochs": [3, 5, 8]}' --trials 12
+    python sweep.py --target ner --data ner_training_v9_human_realistic.jsonl --output /models/sweeps/ner \\
+        --space '{"model": ["indicbert-v2", "muril", "xlm-roberta"]}' --pruner none
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import logging
+import argparse
+import itertools
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRIALS = 8
+DEFAULT_THREADS = 2
+# Parameters that change the tokenized datasets (and so the cache entry)
+CACHE_PARAMS = ("model", "max_length")
+# train_indicbert_v3_lora.py reads its configuration from the environment
+LORA_ENV = {
+    "lora_r": "LORA_R",
+    "lora_alpha": "LORA_ALPHA",
+    "lora_dropout": "LORA_DROPOUT",
+    "learning_rate": "LEARNING_RATE",
+    "epochs": "NUM_EPOCHS",
+    "batch_size": "BATCH_SIZE",
+    "max_length": "MAX_LENGTH",
+}
+
+
+# ============================================================================
+# TARGETS
+# ============================================================================
+# run(params, data, trial_dir, report) -> {"model_dir", "metrics", "texts"}
+# Imports happen inside the trial process, after the thread limits are set.
+def run_intent(params: Dict[str, Any], data: str, trial_dir: str, report: Callable) -> Dict[str, Any]:
+    import train
+    records = train.load_training_data(data)
+    config = train.train_model(
+        data=records,
+        output_dir=trial_dir,
+        model_name=params.get("model", train.DEFAULT_MODEL),
+        epochs=int(params.get("epochs", train.EPOCHS)),
+        batch_size=int(params.get("batch_size", train.BATCH_SIZE)),
+        learning_rate=float(params.get("learning_rate", train.LEARNING_RATE)),
+        report=report,
+    )
+    results = config["results"]
+    return {
+        "model_dir": trial_dir,
+        "metrics": {"accuracy": results["accuracy"], "f1": results["f1_weighted"],
+                    "f1_macro": results["f1_macro"]},
+        "texts": [d["text"] for d in records],
+    }
+
+
+def run_lora(params: Dict[str, Any], data: str, trial_dir: str, report: Callable) -> Dict[str, Any]:
+    os.environ["TRAINING_DATA"] = data
+    os.environ["OUTPUT_DIR"] = os.path.join(trial_dir, "checkpoints")
+    os.environ["FINAL_MODEL_DIR"] = os.path.join(trial_dir, "model")
+    for name, var in LORA_ENV.items():
+        if name in params:
+            os.environ[var] = str(params[name])
+    import train_indicbert_v3_lora as lora
+    results = lora.main(report=report)
+    return {
+        "model_dir": lora.FINAL_MODEL_DIR,
+        "metrics": {"accuracy": results.get("eval_accuracy"), "f1": results.get("eval_f1_weighted"),
+                    "f1_macro": results.get("eval_f1_macro")},
+        "texts": [d["text"] for d in lora.load_training_data(data)],
+    }
+
+
+def run_ner(params: Dict[str, Any], data: str, trial_dir: str, report: Callable) -> Dict[str, Any]:
+    import train_ner_multimodel as ner
+    train_data, val_data = ner.load_split_data(data)
+    model = params.get("model", "indicbert-v2")
+    result = ner.train_model(
+        model_name=ner.SUPPORTED_MODELS.get(model, model),
+        train_data=train_data,
+        val_data=val_data,
+        output_dir=trial_dir,
+        epochs=int(params.get("epochs", 10)),
+        batch_size=int(params.get("batch_size", 16)),
+        learning_rate=float(params.get("learning_rate", 5e-5)),
+        report=report,
+    )
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return {
+        "model_dir": result["output_dir"],
+        "metrics": {"f1": result["f1"], "precision": result["precision"], "recall": result["recall"]},
+        "texts": [d["text"] for d in val_data],
+    }
+
+
+TARGETS = {
+    # run, metric in the per-epoch eval record, parameters, model head (benchmark fallback)
+    "intent": (run_intent, "f1_weighted", ("learning_rate", "epochs", "batch_size", "model"), "sequence"),
+    "lora": (run_lora, "f1_weighted", tuple(LORA_ENV), "sequence"),
+    "ner": (run_ner, "f1", ("model", "learning_rate", "epochs", "batch_size"), "token"),
+}
+
+
+# ============================================================================
+# SEARCH SPACE
+# ============================================================================
+def load_space(spec: str, target: str) -> Dict[str, Any]:
+    """--space value: inline JSON or a path to a JSON file"""
+    if os.path.exists(spec):
+        with open(spec) as f:
+            space = json.load(f)
+    else:
+        space = json.loads(spec)
+    unknown = set(space) - set(TARGETS[target][2])
+    if unknown:
+        raise ValueError(f"Unknown {target} parameters: {sorted(unknown)} (use {list(TARGETS[target][2])})")
+    return space
+
+
+def _sample(spec: Any, rng: random.Random) -> Any:
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if isinstance(spec, dict):
+        low, high = spec["low"], spec["high"]
+        if spec.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        return int(round(value)) if spec.get("int") else float(f"{value:.3g}")
+    return spec
+
+
+def expand_space(space: Dict[str, Any], trials: Optional[int] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    """Parameters of every trial: the full grid for list-only spaces, else random samples"""
+    if trials is None and all(isinstance(v, list) for v in space.values()):
+        names = list(space)
+        return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+    rng = random.Random(seed)
+    return [{name: _sample(spec, rng) for name, spec in space.items()} for _ in range(trials or DEFAULT_TRIALS)]
+
+
+# ============================================================================
+# EARLY STOPPING
+# ============================================================================
+class MedianStopping:
+    def __init__(self, warmup_epochs: int = 1, min_trials: int = 3):
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.best: Dict[int, Dict[int, float]] = {}  # epoch -> trial -> best value so far
+
+    def should_stop(self, trial: int, epoch: int, value: float) -> bool:
+        earlier = [b[trial] for e, b in self.best.items() if e < epoch and trial in b]
+        best = max([value] + earlier)
+        at_epoch = self.best.setdefault(epoch, {})
+        at_epoch[trial] = best
+        others = sorted(v for t, v in at_epoch.items() if t != trial)
+        if epoch <= self.warmup_epochs or len(others) < self.min_trials:
+            return False
+        mid = len(others) // 2
+        median = others[mid] if len(others) % 2 else (others[mid - 1] + others[mid]) / 2
+        return best < median
+
+
+class ASHA:
+    def __init__(self, min_epochs: int = 1, eta: int = 3):
+        self.min_epochs = min_epochs
+        self.eta = eta
+        self.rungs: Dict[int, Dict[int, float]] = {}  # rung epoch -> trial -> value
+
+    def is_rung(self, epoch: int) -> bool:
+        rung = self.min_epochs
+        while rung < epoch:
+            rung *= self.eta
+        return rung == epoch
+
+    def should_stop(self, trial: int, epoch: int, value: float) -> bool:
+        if not self.is_rung(epoch):
+            return False
+        scores = self.rungs.setdefault(epoch, {})
+        scores[trial] = value
+        # The first trials at a rung always continue (asynchronous promotion)
+        if len(scores) < self.eta:
+            return False
+        keep = max(1, len(scores) // self.eta)
+        return value < sorted(scores.values(), reverse=True)[keep - 1]
+
+
+class NoStopping:
+    def should_stop(self, trial: int, epoch: int, value: float) -> bool:
+        return False
+
+
+def make_pruner(name: str, eta: int = 3, min_epochs: int = 1):
+    if name == "asha":
+        return ASHA(min_epochs=min_epochs, eta=eta)
+    if name == "median":
+        return MedianStopping(warmup_epochs=min_epochs)
+    if name == "none":
+        return NoStopping()
+    raise ValueError(f"Unknown pruner: {name} (use asha, median or none)")
+
+
+# ============================================================================
+# TRIAL PROCESS
+# ============================================================================
+def _remove_checkpoints(trial_dir: str):
+    for root, dirs, _ in os.walk(trial_dir):
+        for name in list(dirs):
+            if name.startswith("checkpoint"):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                dirs.remove(name)
+
+
+def run_trial(target: str, trial: int, params: Dict[str, Any], data: str, trial_dir: str,
+              threads: int, cores: Optional[List[int]], cpu_only: bool, conn):
+    """Entry point of a trial process; talks to the sweep over conn"""
+    # Before anything imports torch / tokenizers
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "BENCHMARK_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    if cpu_only:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    logging.basicConfig(level=logging.INFO, force=True,
+                        format=f"%(asctime)s - [trial {trial:03d}] %(levelname)s - %(message)s")
+
+    import torch
+    from model_benchmark import benchmark_model, load_benchmark, summary
+    from training_progress import TrialPruned
+    torch.set_num_threads(threads)
+
+    run, metric, _, head = TARGETS[target]
+    reported = set()
+
+    def report(progress: Optional[float] = None, message: Optional[str] = None,
+               metrics: Optional[Dict[str, Any]] = None):
+        if not metrics or metrics.get("kind") != "eval":
+            return
+        epoch, value = round(metrics["epoch"]), metrics["eval"].get(metric)
+        # The final trainer.evaluate() repeats the last epoch
+        if value is None or epoch in reported:
+            return
+        reported.add(epoch)
+        conn.send(("eval", epoch, value))
+        if conn.recv() == "stop":
+            raise TrialPruned(f"{metric} {value:.4f} at epoch {epoch}")
+
+    os.makedirs(trial_dir, exist_ok=True)
+    try:
+        result = run(params, data, trial_dir, report)
+        _remove_checkpoints(trial_dir)
+        texts = result.pop("texts")
+        # The trainers benchmark the model they saved; TRAIN_BENCHMARK=0 leaves it to us
+        benchmark = load_benchmark(result["model_dir"]) or benchmark_model(result["model_dir"], texts, head)
+        result["benchmark"] = summary(benchmark)
+        if "error" in result["benchmark"]["fp32"]:
+            raise RuntimeError(f"Benchmark failed: {result['benchmark']['fp32']['error']}")
+        conn.send(("completed", result))
+    except TrialPruned as e:
+        shutil.rmtree(trial_dir, ignore_errors=True)
+        conn.send(("pruned", {"reason": str(e)}))
+    except Exception as e:
+        logging.error(f"Trial failed: {e}\n{traceback.format_exc()}")
+        _remove_checkpoints(trial_dir)
+        conn.send(("failed", {"error": str(e)}))
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+def core_sets(workers: int, threads: int) -> List[Optional[List[int]]]:
+    """Disjoint cores per concurrent trial, or no pinning when there are too few"""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < workers * threads:
+        return [None] * workers
+    return [cores[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def pareto_front(rows: List[Dict[str, Any]]) -> List[int]:
+    """Trials no other trial beats on F1, fp32 batch-1 latency and size at once"""
+    def point(r):
+        fp32 = r["benchmark"]["fp32"]
+        return r["metrics"]["f1"], fp32["batch_1_p50_ms"], fp32["size_mb"]
+
+    front = []
+    for row in rows:
+        f1, ms, mb = point(row)
+        dominated = any(
+            o_f1 >= f1 and o_ms <= ms and o_mb <= mb and (o_f1, o_ms, o_mb) != (f1, ms, mb)
+            for o_f1, o_ms, o_mb in (point(o) for o in rows if o is not row)
+        )
+        if not dominated:
+            front.append(row["trial"])
+    return front
+
+
+def leaderboard(target: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    completed = [r for r in records if r["status"] == "completed" and r["metrics"].get("f1") is not None]
+    completed.sort(key=lambda r: -r["metrics"]["f1"])
+    return {
+        "target": target,
+        "created_at": datetime.now().isoformat(),
+        "trials": len(records),
+        "completed": len(completed),
+        "pruned": sum(r["status"] == "pruned" for r in records),
+        "failed": sum(r["status"] == "failed" for r in records),
+        "pareto": pareto_front(completed),
+        "rows": [
+            {
+                "trial": r["trial"],
+                "params": r["params"],
+                **{k: round(v, 4) for k, v in r["metrics"].items() if v is not None},
+                "p50_ms": r["benchmark"]["fp32"]["batch_1_p50_ms"],
+                "p95_ms": r["benchmark"]["fp32"]["batch_1_p95_ms"],
+                "size_mb": r["benchmark"]["fp32"]["size_mb"],
+                "int8_p50_ms": r["benchmark"].get("int8", {}).get("batch_1_p50_ms"),
+                "int8_size_mb": r["benchmark"].get("int8", {}).get("size_mb"),
+                "epochs": r["epochs"],
+                "duration_s": r["duration_s"],
+                "model_dir": r["model_dir"],
+            }
+            for r in completed
+        ],
+    }
+
+
+def run_sweep(target: str, data: str, output_dir: str, trials: List[Dict[str, Any]], workers: int,
+              threads: int = DEFAULT_THREADS, pruner=None, cpu_only: bool = False) -> Dict[str, Any]:
+    pruner = pruner or NoStopping()
+    ctx = multiprocessing.get_context("spawn")
+    os.makedirs(output_dir, exist_ok=True)
+    free_cores = core_sets(workers, threads)
+    data = os.path.abspath(data)
+
+    def group(params: Dict[str, Any]) -> tuple:
+        return tuple(params.get(name) for name in CACHE_PARAMS)
+
+    pending = list(enumerate(trials))
+    running: Dict[int, Dict[str, Any]] = {}
+    warm = set()
+    records: List[Dict[str, Any]] = []
+
+    def start(trial: int, params: Dict[str, Any]):
+        parent, child = ctx.Pipe()
+        cores = free_cores.pop()
+        process = ctx.Process(
+            target=run_trial, name=f"trial-{trial:03d}",
+            args=(target, trial, params, data, os.path.join(output_dir, f"trial-{trial:03d}"),
+                  threads, cores, cpu_only, child),
+        )
+        process.start()
+        child.close()
+        running[trial] = {"process": process, "conn": parent, "cores": cores, "params": params,
+                          "group": group(params), "started": time.time(), "history": []}
+        logger.info(f"▶️ Trial {trial:03d} started (pid {process.pid}): {params}")
+
+    def finish(trial: int, status: str, info: Dict[str, Any]):
+        state = running.pop(trial)
+        state["process"].join(10)
+        state["conn"].close()
+        free_cores.append(state["cores"])
+        warm.add(state["group"])
+        record = {
+            "trial": trial,
+            "params": state["params"],
+            "status": status,
+            "epochs": state["history"][-1][0] if state["history"] else 0,
+            "history": state["history"],
+            "duration_s": round(time.time() - state["started"], 1),
+            **info,
+        }
+        records.append(record)
+        with open(os.path.join(output_dir, "trials.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        if status == "completed":
+            fp32 = info["benchmark"]["fp32"]
+            summary = f"f1 {info['metrics']['f1']:.4f}, p50 {fp32['batch_1_p50_ms']}ms, {fp32['size_mb']}MB"
+        else:
+            summary = info.get("reason") or info.get("error")
+        logger.info(f"{'✅' if status == 'completed' else '⏹️' if status == 'pruned' else '❌'} "
+                    f"Trial {trial:03d} {status} after {record['duration_s']}s: {summary}")
+
+    while pending or running:
+        # Start trials while there are free workers; a cache group's first trial runs alone until it tokenized
+        for trial, params in list(pending):
+            if len(running) >= workers:
+                break
+            g = group(params)
+            if g in warm or not any(s["group"] == g for s in running.values()):
+                pending.remove((trial, params))
+                start(trial, params)
+
+        wait([s["conn"] for s in running.values()] + [s["process"].sentinel for s in running.values()], timeout=5)
+        for trial, state in list(running.items()):
+            conn = state["conn"]
+            try:
+                while conn.poll():
+                    message = conn.recv()
+                    if message[0] == "eval":
+                        _, epoch, value = message
+                        state["history"].append([epoch, round(value, 4)])
+                        warm.add(state["group"])
+                        conn.send("stop" if pruner.should_stop(trial, epoch, value) else "continue")
+                    else:
+                        finish(trial, message[0], message[1])
+                        break
+            except (EOFError, OSError):
+                pass
+            if trial in running and not state["process"].is_alive():
+                finish(trial, "failed", {"error": f"Trial process exited with code {state['process'].exitcode}"})
+
+    board = leaderboard(target, records)
+    with open(os.path.join(output_dir, "leaderboard.json"), "w") as f:
+        json.dump(board, f, indent=2)
+    return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep with early stopping')
+    parser.add_argument('--target', required=True, choices=list(TARGETS), help='Training script to sweep')
+    parser.add_argument('--data', required=True, help='Training data (JSONL, or an NER shard directory)')
+    parser.add_argument('--output', required=True, help='Sweep directory (trial models, leaderboard)')
+    parser.add_argument('--space', required=True, help='Search space: JSON or a path to a JSON file')
+    parser.add_argument('--trials', type=int, default=None,
+                        help=f'Random samples from the space (default: full grid for list-only spaces, '
+                             f'else {DEFAULT_TRIALS})')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='CPU threads per trial')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Concurrent trials (default: CPU cores / --threads)')
+    parser.add_argument('--pruner', default='asha', choices=['asha', 'median', 'none'])
+    parser.add_argument('--eta', type=int, default=3, help='ASHA reduction factor')
+    parser.add_argument('--min-epochs', type=int, default=1,
+                        help='First ASHA rung / median stopping warm-up, in epochs')
+    parser.add_argument('--cpu', action='store_true', help='Hide GPUs from the trials')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for sampling the space')
+    args = parser.parse_args()
+
+    space = load_space(args.space, args.target)
+    trials = expand_space(space, args.trials, args.seed)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    logger.info(f"🔍 Sweep {args.target}: {len(trials)} trials, {workers} at a time x {args.threads} threads, "
+                f"pruner {args.pruner}")
+
+    board = run_sweep(args.target, args.data, args.output, trials, workers, args.threads,
+                      make_pruner(args.pruner, args.eta, args.min_epochs), args.cpu)
+
+    print("\n" + "=" * 80)
+    print(f"LEADERBOARD - {args.target} ({board['completed']} completed, {board['pruned']} pruned, "
+          f"{board['failed']} failed)")
+    print("=" * 80)
+    print(f"{'trial':>5}  {'f1':>6}  {'acc':>6}  {'p50 ms':>7}  {'int8 ms':>7}  {'MB':>7}  params")
+    for row in board["rows"]:
+        accuracy = f"{row['accuracy']:.4f}" if "accuracy" in row else "-"
+        marker = "*" if row["trial"] in board["pareto"] else " "
+        print(f"{row['trial']:>4}{marker}  {row['f1']:.4f}  {accuracy:>6}  {row['p50_ms']:>7}  "
+              f"{str(row['int8_p50_ms']):>7}  {row['size_mb']:>7}  {json.dumps(row['params'])}")
+    print(f"* Pareto front (F1 vs latency vs size). Leaderboard: {os.path.join(args.output, 'leaderboard.json')}")
+    if not board["rows"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""GET /admin/reload responses as server.deployed_model_name() receives them"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from model_reload import ModelSlot, active_version  # noqa: E402
+
+
+def _over_http(status):
+    return json.loads(json.dumps(status))
+
+
+def test_nlu_service_reports_one_status_per_slot():
+    # nlu-service/main.py: {kind: slot.status() for kind, slot in model_slots.items()}
+    slots = {kind: ModelSlot(kind) for kind in ("intent", "tone", "slots")}
+    slots["intent"].set(object(), version="/models/indicbert_v9")
+    slots["tone"].set(object(), version="/models/tone_v2")
+    status = _over_http({kind: slot.status() for kind, slot in slots.items()})
+
+    assert active_version(status) == "/models/indicbert_v9"
+    assert active_version(status, slot="tone") == "/models/tone_v2"
+    assert active_version(status, slot="slots") is None
+
+
+def test_single_slot_servers_report_a_flat_status():
+    # nlu_server_v3 / nlu-service-v2: slot.status()
+    slot = ModelSlot("intent")
+    slot.set(object(), version="/models/indicbert_v8")
+
+    assert active_version(_over_http(slot.status())) == "/models/indicbert_v8"
+
+
+def test_nothing_loaded():
+    assert active_version(_over_http(ModelSlot("intent").status())) is None
+    assert active_version({}) is None
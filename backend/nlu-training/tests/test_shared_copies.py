@@ -0,0 +1,26 @@
+"""Modules copied into the nlu-service build contexts must stay byte-identical"""
+
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[2]
+
+# source in nlu-training/ -> service directories that carry a copy
+SHARED_COPIES = {
+    "model_reload.py": ["nlu-service", "nlu-service-v2"],
+    "cascade.py": ["nlu-service-v2"],
+    "ngram_classifier.py": ["nlu-service-v2"],
+}
+
+
+@pytest.mark.parametrize("name,service", [
+    (name, service) for name, services in SHARED_COPIES.items() for service in services
+])
+def test_copy_matches_nlu_training(name, service):
+    source = BACKEND / "nlu-training" / name
+    copy = BACKEND / service / name
+    assert copy.read_bytes() == source.read_bytes(), (
+        f"{service}/{name} differs from nlu-training/{name}; copy it over: "
+        f"cp backend/nlu-training/{name} backend/{service}/"
+    )
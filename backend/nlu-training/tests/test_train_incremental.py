@@ -0,0 +1,47 @@
+"""train_incremental's regression-check split against train.py's validation split"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("sklearn")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from train import analyze_data, validation_split  # noqa: E402
+from train_incremental import split_corpus  # noqa: E402
+
+
+def _corpus():
+    data = [{"text": f"{intent} query {i}", "intent": intent}
+            for intent, n in (("order_food", 40), ("track_order", 30), ("greeting", 20), ("cancel", 10))
+            for i in range(n)]
+    return data + [{"text": "rare intent", "intent": "rare"}]  # filtered by analyze_data
+
+
+def _train_py_split(corpus):
+    # train.train_model: analyze_data(data, min_samples=3), then validation_split
+    data, _, _, _ = analyze_data(corpus, min_samples=3)
+    return validation_split(data)
+
+
+def test_split_matches_train_py_without_new_data():
+    corpus = _corpus()
+    assert split_corpus(corpus, []) == _train_py_split(corpus)
+
+
+def test_new_texts_are_removed_after_the_split():
+    corpus = _corpus()
+    train, val = _train_py_split(corpus)
+    new_data = [{"text": d["text"].upper(), "intent": "order_food"} for d in train[:5] + val[:3]]
+    new_texts = {d["text"].lower() for d in new_data}
+
+    old_train, old_val = split_corpus(corpus, new_data)
+
+    # Same split, only the overlapping rows are gone: nothing train.py trained on moves into old_val
+    assert old_train == [d for d in train if d["text"].lower() not in new_texts]
+    assert old_val == [d for d in val if d["text"].lower() not in new_texts]
+    assert len(old_val) == len(val) - 3
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Tokenized Cache - tokenize a training set once, reuse it across runs
+=====================================================================
+Every trainer used to re-tokenize its whole dataset on each run (and on
+every epoch for the per-__getitem__ datasets). This keeps the encoded
+examples on disk, keyed by everything that determines them:
+
+    key = sha256(tokenizer fingerprint, max_length, encoder version,
+                 extra settings such as the label map, data hash)
+
+Each entry is a directory of flat NumPy arrays opened with mmap_mode='r':
+
+    input_ids.npy       int32, all examples concatenated (no padding)
+    attention_mask.npy  uint8, same layout
+    offsets.npy         int64, example i is [offsets[i], offsets[i+1])
+    labels.npy          int64 per example (intent) or int32 per token (NER)
+    meta.json           build time, hits and time saved so far
+
+Examples come back unpadded, so DataCollatorWithPadding /
+DataCollatorForTokenClassification pad each batch to its longest example.
+A cache hit logs how long the original tokenization took vs. the load.
+
+    dataset = load_or_build("intent-train", tokenizer, 128, records,
+                            intent_encoder(tokenizer, 128))
+    logger.info(dataset.summary())
+
+TOKENIZED_CACHE_DIR="" turns the cache off (examples are encoded in memory).
+
+CLI:
+    python tokenized_cache.py list
+    python tokenized_cache.py prune --keep 8
+    python tokenized_cache.py clear
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from torch.utils.data import Dataset as _BaseDataset
+    TORCH_AVAILABLE = True
+except ImportError:
+    _BaseDataset = object
+    TORCH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TOKENIZED_CACHE_DIR = os.environ.get(
+    "TOKENIZED_CACHE_DIR", os.path.expanduser("~/nlu-training/.tokenized_cache")
+)
+TOKENIZED_CACHE_MAX_ENTRIES = int(os.environ.get("TOKENIZED_CACHE_MAX_ENTRIES", "32"))
+
+FORMAT_VERSION = 1
+ENCODE_CHUNK = 1024
+ARRAYS = ("input_ids", "attention_mask", "offsets", "labels")
+
+# encode(records) -> one dict per record ({'input_ids', 'labels'[, 'attention_mask']}) or None to drop it
+Encoder = Callable[[List[Any]], List[Optional[Dict[str, Any]]]]
+
+
+# ============================================================================
+# FINGERPRINTS
+# ============================================================================
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of what decides token ids: vocab / merges / normalizer, special tokens, sides"""
+    h = hashlib.sha256()
+    h.update(type(tokenizer).__name__.encode("utf-8"))
+    h.update(str(getattr(tokenizer, "name_or_path", "")).encode("utf-8"))
+    h.update(str(len(tokenizer)).encode("utf-8"))
+    for attr in ("padding_side", "truncation_side", "special_tokens_map"):
+        h.update(json.dumps(getattr(tokenizer, attr, None), sort_keys=True, default=str).encode("utf-8"))
+
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        h.update(backend.to_str().encode("utf-8"))
+    else:
+        for token, idx in sorted(tokenizer.get_vocab().items()):
+            h.update(f"{token}\t{idx}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def data_fingerprint(records: Iterable[Any]) -> str:
+    """Order-sensitive hash of the records (the split is part of the data)"""
+    h = hashlib.sha256()
+    for record in records:
+        h.update(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def cache_key(tokenizer, max_length: int, records: Sequence[Any], encoder_version: str,
+              extra: Optional[Dict[str, Any]] = None) -> str:
+    parts = {
+        "format": FORMAT_VERSION,
+        "tokenizer": tokenizer_fingerprint(tokenizer),
+        "max_length": max_length,
+        "encoder": encoder_version,
+        "extra": extra or {},
+        "data": data_fingerprint(records),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+# ============================================================================
+# DATASET
+# ============================================================================
+class TokenizedDataset(_BaseDataset):
+    """
+    Map-style dataset over the flat arrays. Items are unpadded lists:
+    {'input_ids', 'attention_mask', 'labels'} with an int label for
+    sequence classification and a per-token list for token classification.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], path: Optional[str] = None):
+        self.input_ids = arrays["input_ids"]
+        self.attention_mask = arrays["attention_mask"]
+        self.offsets = arrays["offsets"]
+        self.labels = arrays["labels"]
+        self.meta = meta
+        self.path = path
+        self.token_labels = meta["label_level"] == "token"
+
+    @classmethod
+    def load(cls, path: str) -> "TokenizedDataset":
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        return cls(arrays, meta, path)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return {
+            "input_ids": self.input_ids[start:end].tolist(),
+            "attention_mask": self.attention_mask[start:end].tolist(),
+            "labels": self.labels[start:end].tolist() if self.token_labels else int(self.labels[idx]),
+        }
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Tokens per example"""
+        return np.diff(self.offsets)
+
+    def summary(self) -> str:
+        meta = self.meta
+        line = (f"{meta['name']}: {len(self)} examples, {meta['tokens']:,} tokens "
+                f"(max_length {meta['max_length']}")
+        if meta.get("dropped"):
+            line += f", {meta['dropped']} dropped by the encoder"
+        line += ")"
+        if meta.get("cache_hit"):
+            return (f"{line} - cache hit, loaded in {meta['load_s']:.2f}s vs {meta['build_s']:.1f}s to tokenize: "
+                    f"saved {meta['saved_s']:.1f}s this run, {meta['saved_total_s']:.1f}s over {meta['hits']} reuses")
+        where = f"cached in {self.path}" if self.path else "cache disabled"
+        return f"{line} - tokenized in {meta['build_s']:.1f}s, {where}"
+
+
+# ============================================================================
+# BUILD / LOAD
+# ============================================================================
+def _encode(records: Sequence[Any], encode: Encoder) -> Dict[str, Any]:
+    input_ids, attention_mask = array("i"), array("B")
+    offsets = array("q", [0])
+    labels = array("q")
+    label_level = None
+    dropped = 0
+
+    for start in range(0, len(records), ENCODE_CHUNK):
+        for example in encode(list(records[start:start + ENCODE_CHUNK])):
+            if example is None:
+                dropped += 1
+                continue
+            ids = example["input_ids"]
+            input_ids.extend(ids)
+            attention_mask.extend(example.get("attention_mask") or [1] * len(ids))
+            offsets.append(len(input_ids))
+
+            label = example["labels"]
+            level = "sequence" if isinstance(label, (int, np.integer)) else "token"
+            if label_level is None:
+                label_level = level
+            elif level != label_level:
+                raise ValueError("encoder mixed per-example and per-token labels")
+            if level == "token":
+                if len(label) != len(ids):
+                    raise ValueError(f"{len(label)} labels for {len(ids)} tokens")
+                labels.extend(label)
+            else:
+                labels.append(int(label))
+
+    arrays = {
+        "input_ids": np.frombuffer(input_ids, dtype=np.int32) if input_ids else np.zeros(0, np.int32),
+        "attention_mask": np.frombuffer(attention_mask, dtype=np.uint8) if attention_mask else np.zeros(0, np.uint8),
+        "offsets": np.frombuffer(offsets, dtype=np.int64),
+        "labels": np.frombuffer(labels, dtype=np.int64) if labels else np.zeros(0, np.int64),
+    }
+    if label_level == "token":
+        arrays["labels"] = arrays["labels"].astype(np.int32)
+    return {"arrays": arrays, "label_level": label_level or "sequence", "dropped": dropped}
+
+
+def _write_meta(path: str, meta: Dict[str, Any]):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def load_or_build(name: str, tokenizer, max_length: int, records: Sequence[Any], encode: Encoder,
+                  encoder_version: str = "v1", extra: Optional[Dict[str, Any]] = None,
+                  cache_dir: Optional[str] = TOKENIZED_CACHE_DIR) -> TokenizedDataset:
+    """
+    Encoded dataset for records, from the cache when an entry with the same
+    key exists. Bump encoder_version when the encode function changes, and
+    pass anything else it depends on (label maps, label sets) in extra.
+    """
+    start = time.time()
+    key = cache_key(tokenizer, max_length, records, encoder_version, extra)
+    path = os.path.join(cache_dir, key) if cache_dir else None
+
+    if path and os.path.exists(os.path.join(path, "meta.json")):
+        dataset = TokenizedDataset.load(path)
+        meta = dataset.meta
+        load_s = time.time() - start
+        saved = max(meta["build_s"] - load_s, 0.0)
+        meta.update(
+            hits=meta.get("hits", 0) + 1,
+            saved_total_s=round(meta.get("saved_total_s", 0.0) + saved, 2),
+            last_used=datetime.now().isoformat(),
+        )
+        try:
+            _write_meta(path, meta)
+        except OSError as e:
+            logger.warning(f"Could not update {path}/meta.json: {e}")
+        # Per-run fields, not persisted
+        meta.update(name=name, cache_hit=True, load_s=round(load_s, 3), saved_s=round(saved, 2))
+        return dataset
+
+    encoded = _encode(records, encode)
+    arrays = encoded["arrays"]
+    meta = {
+        "name": name,
+        "key": key,
+        "format": FORMAT_VERSION,
+        "tokenizer": getattr(tokenizer, "name_or_path", ""),
+        "max_length": max_length,
+        "encoder": encoder_version,
+        "label_level": encoded["label_level"],
+        "examples": len(arrays["offsets"]) - 1,
+        "dropped": encoded["dropped"],
+        "tokens": int(arrays["input_ids"].shape[0]),
+        "build_s": round(time.time() - start, 2),
+        "created_at": datetime.now().isoformat(),
+        "last_used": datetime.now().isoformat(),
+        "hits": 0,
+        "saved_total_s": 0.0,
+    }
+    if not path:
+        return TokenizedDataset(arrays, meta)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for array_name in ARRAYS:
+        np.save(os.path.join(tmp_path, f"{array_name}.npy"), arrays[array_name])
+    _write_meta(tmp_path, meta)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another run built the same entry first; theirs is identical
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    prune(cache_dir, TOKENIZED_CACHE_MAX_ENTRIES, protect=key)
+    return TokenizedDataset.load(path)
+
+
+# ============================================================================
+# ENCODERS
+# ============================================================================
+def intent_encoder(tokenizer, max_length: int) -> Encoder:
+    """Records are (text, label_id) pairs; batched tokenization, no padding"""
+    def encode(records: List[Any]) -> List[Optional[Dict[str, Any]]]:
+        encoding = tokenizer([text for text, _ in records], truncation=True, max_length=max_length)
+        return [
+            {"input_ids": ids, "attention_mask": mask, "labels": int(label)}
+            for ids, mask, (_, label) in zip(encoding["input_ids"], encoding["attention_mask"], records)
+        ]
+    return encode
+
+
+def per_example(fn: Callable[[Any], Optional[Dict[str, Any]]]) -> Encoder:
+    """Encoder from a function that encodes one record"""
+    def encode(records: List[Any]) -> List[Optional[Dict[str, Any]]]:
+        return [fn(record) for record in records]
+    return encode
+
+
+# ============================================================================
+# MAINTENANCE
+# ============================================================================
+def list_entries(cache_dir: str = TOKENIZED_CACHE_DIR) -> List[Dict[str, Any]]:
+    entries = []
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return entries
+    for key in os.listdir(cache_dir):
+        meta_path = os.path.join(cache_dir, key, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["_dir"] = os.path.join(cache_dir, key)
+        meta["_bytes"] = sum(
+            os.path.getsize(os.path.join(meta["_dir"], f"{name}.npy")) for name in ARRAYS
+        )
+        entries.append(meta)
+    return sorted(entries, key=lambda m: m.get("last_used", ""), reverse=True)
+
+
+def prune(cache_dir: str = TOKENIZED_CACHE_DIR, keep: int = TOKENIZED_CACHE_MAX_ENTRIES,
+          protect: Optional[str] = None) -> int:
+    """
+    Drop all but the `keep` most recently used entries; returns how many were removed.
+    The `protect` key (the entry a build is about to load) always survives.
+    """
+    entries = [meta for meta in list_entries(cache_dir) if meta.get("key") != protect]
+    stale = entries[max(keep, 0):]
+    for meta in stale:
+        shutil.rmtree(meta["_dir"], ignore_errors=True)
+    return len(stale)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clean the tokenized dataset cache")
+    parser.add_argument("command", choices=["list", "prune", "clear"])
+    parser.add_argument("--cache-dir", default=TOKENIZED_CACHE_DIR)
+    parser.add_argument("--keep", type=int, default=TOKENIZED_CACHE_MAX_ENTRIES, help="Entries kept by prune")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        entries = list_entries(args.cache_dir)
+        for meta in entries:
+            print(f"{meta['key'][:12]}  {meta['name']:<20} {meta['examples']:>8} ex  "
+                  f"{meta['_bytes'] / 1e6:>7.1f} MB  built {meta['build_s']:>6.1f}s  "
+                  f"hits {meta.get('hits', 0):>3}  saved {meta.get('saved_total_s', 0.0):>7.1f}s  "
+                  f"{meta['tokenizer']}")
+        total_saved = sum(m.get("saved_total_s", 0.0) for m in entries)
+        print(f"{len(entries)} entries in {args.cache_dir}, {total_saved:.1f}s of tokenization saved")
+    elif args.command == "prune":
+        print(f"Removed {prune(args.cache_dir, args.keep)} entries")
+    else:
+        print(f"Removed {prune(args.cache_dir, 0)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ Environment:
     - Runs on Jupiter's RTX 3060 (12GB VRAM)
     - Uses mixed precision (fp16) for speed
     - Saves checkpoints and final model
+    - Benchmarks the final model on CPU (fp32 + int8) into benchmark.json
 """
 
 import os
@@ -21,11 +22,12 @@ import argparse
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, f1_score, classification_report
 from transformers import (
+    AutoConfig,
     AutoTokenizer,
     AutoModelForSequenceClassification,
     TrainingArguments,
@@ -33,9 +35,12 @@ from transformers import (
     DataCollatorWithPadding,
     EarlyStoppingCallback
 )
-from datasets import Dataset
 import numpy as np
 
+from model_benchmark import benchmark_saved_model, summary
+from tokenized_cache import intent_encoder, load_or_build
+from training_progress import ProgressCallback
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -101,6 +106,21 @@ def load_training_data(filepath: str) -> List[Dict]:
     return data
 
 
+def load_label_map(model_dir: str) -> List[str]:
+    """Labels by class id, from label_mapping.json, labels.json or config.json"""
+    mapping_path = os.path.join(model_dir, "label_mapping.json")
+    if os.path.exists(mapping_path):
+        with open(mapping_path) as f:
+            id2label = json.load(f)["id2label"]
+        return [id2label[str(i)] for i in range(len(id2label))]
+    labels_path = os.path.join(model_dir, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path) as f:
+            return json.load(f)
+    config = AutoConfig.from_pretrained(model_dir, trust_remote_code=True)
+    return [config.id2label[i] for i in range(len(config.id2label))]
+
+
 def analyze_data(data: List[Dict], min_samples: int = 3) -> Tuple[List[Dict], Dict[str, int], Dict[int, str], List[str]]:
     """Analyze training data, filter low-sample intents, and create label mappings"""
     # Count intents
@@ -147,6 +167,16 @@ def analyze_data(data: List[Dict], min_samples: int = 3) -> Tuple[List[Dict], Di
     return filtered_data, label2id, id2label, labels
 
 
+def validation_split(data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """15% stratified validation split (seed 42) of analyze_data() output"""
+    return train_test_split(
+        data, 
+        test_size=0.15, 
+        random_state=42, 
+        stratify=[d['intent'] for d in data]
+    )
+
+
 def compute_metrics(eval_pred):
     """Compute accuracy and F1 score"""
     predictions, labels = eval_pred
@@ -169,9 +199,13 @@ def train_model(
     model_name: str = DEFAULT_MODEL,
     epochs: int = EPOCHS,
     batch_size: int = BATCH_SIZE,
-    learning_rate: float = LEARNING_RATE
+    learning_rate: float = LEARNING_RATE,
+    report: Optional[Callable] = None
 ) -> Dict:
-    """Train IndicBERT intent classifier"""
+    """
+    Train IndicBERT intent classifier. report(progress=, message=, metrics=)
+    gets live step metrics (training_progress.ProgressCallback).
+    """
     
     device = setup_device()
     use_fp16 = device.type == "cuda"
@@ -180,38 +214,22 @@ def train_model(
     data, label2id, id2label, labels = analyze_data(data, min_samples=3)
     
     # Split data
-    train_data, val_data = train_test_split(
-        data, 
-        test_size=0.15, 
-        random_state=42, 
-        stratify=[d['intent'] for d in data]
-    )
+    train_data, val_data = validation_split(data)
     logger.info(f"\n📂 Data Split: Train={len(train_data)}, Val={len(val_data)}")
     
     # Load tokenizer
     logger.info(f"\n🔤 Loading tokenizer: {model_name}")
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     
-    # Tokenization function
-    def tokenize_function(examples):
-        return tokenizer(
-            examples['text'],
-            truncation=True,
-            max_length=MAX_LENGTH,
-            padding=False
-        )
+    # Tokenize once per (tokenizer, MAX_LENGTH, split) - retrains on the same data reuse the cache
+    train_records = [(d['text'], label2id[d['intent']]) for d in train_data]
+    val_records = [(d['text'], label2id[d['intent']]) for d in val_data]
+    encode = intent_encoder(tokenizer, MAX_LENGTH)
     
-    # Create datasets
-    train_texts = [d['text'] for d in train_data]
-    train_labels = [label2id[d['intent']] for d in train_data]
-    val_texts = [d['text'] for d in val_data]
-    val_labels = [label2id[d['intent']] for d in val_data]
-    
-    train_dataset = Dataset.from_dict({'text': train_texts, 'label': train_labels})
-    val_dataset = Dataset.from_dict({'text': val_texts, 'label': val_labels})
-    
-    train_dataset = train_dataset.map(tokenize_function, batched=True, remove_columns=['text'])
-    val_dataset = val_dataset.map(tokenize_function, batched=True, remove_columns=['text'])
+    train_dataset = load_or_build("intent-train", tokenizer, MAX_LENGTH, train_records, encode)
+    val_dataset = load_or_build("intent-val", tokenizer, MAX_LENGTH, val_records, encode)
+    logger.info(f"   {train_dataset.summary()}")
+    logger.info(f"   {val_dataset.summary()}")
     
     # Data collator
     data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
@@ -259,6 +277,10 @@ def train_model(
     logger.info(f"   Learning rate: {learning_rate}")
     logger.info(f"   FP16: {use_fp16}")
     
+    callbacks = [EarlyStoppingCallback(early_stopping_patience=2)]
+    if report:
+        callbacks.append(ProgressCallback(report, tokens_per_sample=float(train_dataset.lengths.mean())))
+    
     # Create trainer
     trainer = Trainer(
         model=model,
@@ -268,7 +290,7 @@ def train_model(
         data_collator=data_collator,
         compute_metrics=compute_metrics,
         tokenizer=tokenizer,
-        callbacks=[EarlyStoppingCallback(early_stopping_patience=2)]
+        callbacks=callbacks
     )
     
     # Train
@@ -293,6 +315,9 @@ def train_model(
     with open(f"{output_dir}/labels.json", "w") as f:
         json.dump(labels, f, indent=2)
     
+    # CPU latency, memory and size of the saved model (benchmark.json)
+    benchmark = benchmark_saved_model(output_dir, [d['text'] for d in val_data], head="sequence")
+    
     # Save training config and results
     training_config = {
         "model_name": model_name,
@@ -313,6 +338,7 @@ def train_model(
             "f1_weighted": eval_results['eval_f1_weighted'],
             "train_loss": train_result.training_loss,
         },
+        "benchmark": summary(benchmark) if benchmark else None,
         "trained_at": datetime.now().isoformat(),
         "gpu": torch.cuda.get_device_name(0) if torch.cuda.is_available() else "CPU"
     }
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Incremental Intent Training - warm start from the deployed model
+=================================================================
+A full retrain (train.py, train_nlu_production.py) starts from the base
+IndicBERTv2 checkpoint on the whole merged corpus. When the collector only
+brought in a few hundred new examples, this trains from the active model
+instead:
+
+    model    the deployed intent model, label ids unchanged; intents it
+             does not know yet are appended to the classifier head (old
+             rows copied, new rows freshly initialised)
+    data     the new examples plus a replay sample of the old corpus,
+             up to --replay-per-intent examples of every intent, so the
+             model keeps seeing what it already knows
+    schedule 2 epochs at a lower learning rate (a full retrain: 5)
+
+Regression check: the old corpus is split exactly like train.py (same
+filter, 15%, stratified, seed 42) and the validation part never enters the
+replay. Texts that also occur in the new data are dropped from both parts
+after the split, since the new model trains on them. The deployed and the
+new model are both scored on what is left of the validation part; when
+the new one loses more than --max-regression accuracy the model is still
+saved (for inspection, flagged in training_config.json) but the run fails
+with RegressionCheckFailed, so nothing downstream deploys it. A deployed
+train.py model never trained on that split either.
+
+The output is saved like train.py's (labels.json, training_config.json,
+benchmark.json) plus label_mapping.json, so it can be copied over a
+train_nlu_production.py model directory.
+
+Usage:
+    python train_incremental.py --base /models/indicbert_active \\
+        --data collected_2026_10.jsonl --replay-data nlu_training_data.jsonl \\
+        --output /models/indicbert_incremental
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+from sklearn.model_selection import train_test_split
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    TrainingArguments,
+    Trainer,
+    DataCollatorWithPadding,
+)
+
+from model_benchmark import benchmark_saved_model, summary
+from tokenized_cache import intent_encoder, load_or_build
+from train import (
+    BATCH_SIZE, EPOCHS as FULL_EPOCHS, GRADIENT_ACCUM, MAX_LENGTH, WARMUP_RATIO,
+    analyze_data, compute_metrics, load_label_map, load_training_data, setup_device, validation_split,
+)
+from training_progress import ProgressCallback
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+EPOCHS = 2
+LEARNING_RATE = 2e-5
+REPLAY_PER_INTENT = 50
+MAX_REGRESSION = 0.01  # accuracy on the old validation split
+MIN_NEW_SAMPLES = 20
+
+
+class RegressionCheckFailed(RuntimeError):
+    """The incremental model lost more accuracy on the old intents than allowed"""
+
+
+# ============================================================================
+# DATA
+# ============================================================================
+def split_corpus(corpus: List[Dict], new_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    train.py's filter and validation split of the old corpus, then minus
+    texts in the new data. Filtering first would reshuffle the split.
+    """
+    corpus, _, _, _ = analyze_data(corpus, min_samples=3)
+    old_train, old_val = validation_split(corpus)
+    new_texts = {d['text'].lower() for d in new_data}
+    return ([d for d in old_train if d['text'].lower() not in new_texts],
+            [d for d in old_val if d['text'].lower() not in new_texts])
+
+
+def split_new(new_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """15% of the new examples held out, stratified when every intent fits"""
+    if len(new_data) < MIN_NEW_SAMPLES:
+        return new_data, []
+    counts = defaultdict(int)
+    for d in new_data:
+        counts[d['intent']] += 1
+    stratifiable = min(counts.values()) >= 2 and round(len(new_data) * 0.15) >= len(counts)
+    stratify = [d['intent'] for d in new_data] if stratifiable else None
+    return train_test_split(new_data, test_size=0.15, random_state=42, stratify=stratify)
+
+
+def replay_sample(data: List[Dict], per_intent: int, seed: int = 42) -> List[Dict]:
+    """Up to per_intent examples of every intent"""
+    by_intent = defaultdict(list)
+    for d in data:
+        by_intent[d['intent']].append(d)
+    rng = random.Random(seed)
+    sample = []
+    for intent in sorted(by_intent):
+        items = by_intent[intent]
+        sample.extend(rng.sample(items, min(per_intent, len(items))))
+    return sample
+
+
+def merge_labels(base_labels: List[str], new_data: List[Dict], replay: List[Dict]) -> List[str]:
+    """Deployed labels keep their ids; intents it does not know are appended"""
+    known = set(base_labels)
+    counts = defaultdict(int)
+    for d in new_data + replay:
+        if d['intent'] not in known:
+            counts[d['intent']] += 1
+    added = sorted(counts, key=lambda intent: -counts[intent])
+    return list(base_labels) + added
+
+
+# ============================================================================
+# MODEL
+# ============================================================================
+def classifier_head(model: nn.Module) -> Tuple[nn.Module, str, nn.Linear]:
+    """(parent module, attribute, layer) of the Linear that outputs the class logits"""
+    num_labels = model.config.num_labels
+    for name, module in reversed(list(model.named_modules())):
+        if isinstance(module, nn.Linear) and module.out_features == num_labels:
+            parent_name, _, attr = name.rpartition(".")
+            return (model.get_submodule(parent_name) if parent_name else model), attr, module
+    raise ValueError(f"No Linear layer with {num_labels} outputs in {type(model).__name__}")
+
+
+def expand_classifier(model: nn.Module, labels: List[str]) -> int:
+    """Grow the classifier head to len(labels) outputs; returns the number of rows added"""
+    parent, attr, old = classifier_head(model)
+    added = len(labels) - old.out_features
+    if added > 0:
+        head = nn.Linear(old.in_features, len(labels), bias=old.bias is not None)
+        head.to(device=old.weight.device, dtype=old.weight.dtype)
+        with torch.no_grad():
+            head.weight.normal_(0.0, getattr(model.config, "initializer_range", 0.02))
+            head.weight[:old.out_features] = old.weight
+            if old.bias is not None:
+                # New intents start at the average prior of the known ones
+                head.bias[:old.out_features] = old.bias
+                head.bias[old.out_features:] = old.bias.mean()
+        setattr(parent, attr, head)
+    model.num_labels = len(labels)
+    model.config.id2label = {i: label for i, label in enumerate(labels)}
+    model.config.label2id = {label: i for i, label in enumerate(labels)}
+    return max(added, 0)
+
+
+@torch.inference_mode()
+def predict(model: nn.Module, tokenizer, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+    """Predicted class ids"""
+    model.eval()
+    preds = []
+    for i in range(0, len(texts), batch_size):
+        inputs = tokenizer(list(texts[i:i + batch_size]), padding=True, truncation=True,
+                           max_length=MAX_LENGTH, return_tensors="pt").to(model.device)
+        preds.append(model(**inputs).logits.argmax(dim=-1).cpu().numpy())
+    return np.concatenate(preds) if preds else np.array([], dtype=int)
+
+
+def accuracy(model: nn.Module, tokenizer, data: List[Dict], label2id: Dict[str, int]) -> Optional[float]:
+    if not data:
+        return None
+    gold = np.array([label2id[d['intent']] for d in data])
+    return float((predict(model, tokenizer, [d['text'] for d in data]) == gold).mean())
+
+
+# ============================================================================
+# TRAINING
+# ============================================================================
+def train_incremental(
+    new_data: List[Dict],
+    replay_data: List[Dict],
+    base_model_dir: str,
+    output_dir: str,
+    replay_per_intent: int = REPLAY_PER_INTENT,
+    epochs: int = EPOCHS,
+    batch_size: int = BATCH_SIZE,
+    learning_rate: float = LEARNING_RATE,
+    max_regression: float = MAX_REGRESSION,
+    report: Optional[Callable] = None
+) -> Dict:
+    """
+    Fine-tune the model in base_model_dir on new_data plus a per-intent
+    replay sample of replay_data (the corpus it was trained on). Raises
+    RegressionCheckFailed after saving when the old intents lose more than
+    max_regression accuracy. report as in train.train_model.
+    """
+    started = time.monotonic()
+    device = setup_device()
+    use_fp16 = device.type == "cuda"
+
+    # Labels: the deployed model's, plus new intents with enough examples
+    base_labels = load_label_map(base_model_dir)
+    old_train, old_val = split_corpus(replay_data, new_data)
+    known = set(base_labels)
+    unknown = [d for d in new_data if d['intent'] not in known]
+    if unknown:
+        new_data = [d for d in new_data if d['intent'] in known] + analyze_data(unknown, min_samples=3)[0]
+    if not new_data:
+        raise ValueError("No usable new examples (new intents need at least 3)")
+    new_train, new_val = split_new(new_data)
+    replay = replay_sample(old_train, replay_per_intent)
+
+    labels = merge_labels(base_labels, new_data, replay)
+    label2id = {label: i for i, label in enumerate(labels)}
+    id2label = {i: label for label, i in label2id.items()}
+    added_labels = labels[len(base_labels):]
+
+    train_data = new_train + replay
+    val_data = old_val + new_val
+    old_val_known = [d for d in old_val if d['intent'] in known]
+    if not old_val_known:
+        raise ValueError("The replay corpus has no intents the deployed model knows")
+    logger.info(f"\n📂 Incremental data: {len(new_train)} new + {len(replay)} replay "
+                f"(≤{replay_per_intent} per intent) = {len(train_data)} train; "
+                f"val {len(old_val)} old + {len(new_val)} new")
+    if added_labels:
+        logger.info(f"   New intents: {', '.join(added_labels)}")
+
+    # Deployed model, scored before it changes
+    logger.info(f"\n🧠 Loading deployed model: {base_model_dir}")
+    tokenizer = AutoTokenizer.from_pretrained(base_model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(base_model_dir).to(device)
+    base_accuracy = accuracy(model, tokenizer, old_val_known, label2id)
+    logger.info(f"   Deployed model accuracy on old validation split: {base_accuracy:.4f}")
+
+    added = expand_classifier(model, labels)
+    if added:
+        logger.info(f"   Classifier head: {len(base_labels)} -> {len(labels)} labels")
+    if report:
+        report(progress=12, message=f'Deployed model at {base_accuracy:.2%} on old validation split')
+
+    train_records = [(d['text'], label2id[d['intent']]) for d in train_data]
+    val_records = [(d['text'], label2id[d['intent']]) for d in val_data]
+    encode = intent_encoder(tokenizer, MAX_LENGTH)
+    train_dataset = load_or_build("intent-incremental-train", tokenizer, MAX_LENGTH, train_records, encode)
+    val_dataset = load_or_build("intent-incremental-val", tokenizer, MAX_LENGTH, val_records, encode)
+    logger.info(f"   {train_dataset.summary()}")
+    logger.info(f"   {val_dataset.summary()}")
+
+    training_args = TrainingArguments(
+        output_dir=output_dir,
+        num_train_epochs=epochs,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=batch_size * 2,
+        gradient_accumulation_steps=GRADIENT_ACCUM,
+        learning_rate=learning_rate,
+        weight_decay=0.01,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=1,
+        load_best_model_at_end=True,
+        metric_for_best_model="f1_weighted",
+        greater_is_better=True,
+        logging_steps=10,
+        logging_dir=f"{output_dir}/logs",
+        warmup_ratio=WARMUP_RATIO,
+        seed=42,
+        report_to="none",
+        fp16=use_fp16,
+        dataloader_pin_memory=use_fp16,
+        dataloader_num_workers=4 if use_fp16 else 0,
+    )
+
+    callbacks = []
+    if report:
+        callbacks.append(ProgressCallback(report, tokens_per_sample=float(train_dataset.lengths.mean())))
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=val_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+        compute_metrics=compute_metrics,
+        tokenizer=tokenizer,
+        callbacks=callbacks
+    )
+
+    logger.info(f"\n🏋️ Incremental training: {epochs} epochs, lr {learning_rate}")
+    logger.info("=" * 60)
+    train_result = trainer.train()
+    logger.info("=" * 60)
+
+    eval_results = trainer.evaluate()
+    new_accuracy = accuracy(trainer.model, tokenizer, old_val_known, label2id)
+    new_examples_accuracy = accuracy(trainer.model, tokenizer, new_val, label2id)
+    regression = base_accuracy - new_accuracy
+    passed = regression <= max_regression
+    logger.info(f"\n📈 Old validation split: deployed {base_accuracy:.4f} -> incremental {new_accuracy:.4f} "
+                f"({'OK' if passed else 'REGRESSION'}, max drop {max_regression})")
+    if new_examples_accuracy is not None:
+        logger.info(f"   Held-out new examples: {new_examples_accuracy:.4f}")
+
+    logger.info(f"\n💾 Saving model to {output_dir}")
+    trainer.save_model(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(f"{output_dir}/labels.json", "w") as f:
+        json.dump(labels, f, indent=2)
+    # Read before config.json by nlu_server_v3 - a stale one would win after a copy
+    with open(f"{output_dir}/label_mapping.json", "w") as f:
+        json.dump({"label2id": label2id, "id2label": {str(i): l for i, l in id2label.items()},
+                   "num_labels": len(labels)}, f, indent=2)
+
+    benchmark = benchmark_saved_model(output_dir, [d['text'] for d in val_data], head="sequence")
+
+    base_config_path = os.path.join(base_model_dir, "training_config.json")
+    base_config = {}
+    if os.path.exists(base_config_path):
+        with open(base_config_path) as f:
+            base_config = json.load(f)
+    # What a full retrain would go through: the whole corpus and new data, FULL_EPOCHS times
+    full_cost = (len(old_train) + len(new_train)) * FULL_EPOCHS
+
+    training_config = {
+        "model_name": base_config.get("model_name", base_model_dir),
+        "model_version": f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+        "num_labels": len(labels),
+        "labels": labels,
+        "id2label": id2label,
+        "label2id": label2id,
+        "training_samples": len(train_data),
+        "validation_samples": len(val_data),
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "learning_rate": learning_rate,
+        "fp16": use_fp16,
+        "results": {
+            "accuracy": eval_results['eval_accuracy'],
+            "f1_macro": eval_results['eval_f1_macro'],
+            "f1_weighted": eval_results['eval_f1_weighted'],
+            "train_loss": train_result.training_loss,
+        },
+        "incremental": {
+            "base_model": base_model_dir,
+            "base_model_version": base_config.get("model_version"),
+            "new_samples": len(new_train),
+            "replay_samples": len(replay),
+            "replay_per_intent": replay_per_intent,
+            "added_labels": added_labels,
+            "new_examples_accuracy": new_examples_accuracy,
+            "relative_cost": round(len(train_data) * epochs / full_cost, 3) if full_cost else None,
+            "duration_s": round(time.monotonic() - started, 1),
+            "regression_check": {
+                "validation_samples": len(old_val_known),
+                "base_accuracy": base_accuracy,
+                "accuracy": new_accuracy,
+                "regression": round(regression, 4),
+                "max_regression": max_regression,
+                "passed": passed,
+            },
+        },
+        "benchmark": summary(benchmark) if benchmark else None,
+        "trained_at": datetime.now().isoformat(),
+        "gpu": torch.cuda.get_device_name(0) if torch.cuda.is_available() else "CPU"
+    }
+
+    with open(f"{output_dir}/training_config.json", "w") as f:
+        json.dump(training_config, f, indent=2)
+
+    if not passed:
+        raise RegressionCheckFailed(
+            f"Accuracy on the old validation split dropped {regression:.2%} "
+            f"({base_accuracy:.2%} -> {new_accuracy:.2%}, allowed {max_regression:.2%}); "
+            f"model kept in {output_dir} but not fit to deploy")
+
+    logger.info(f"\n✅ Incremental training complete in {training_config['incremental']['duration_s']}s")
+    return training_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm-start intent training from the deployed model')
+    parser.add_argument('--base', required=True, help='Deployed intent model directory')
+    parser.add_argument('--data', required=True, help='New examples (JSONL with text + intent)')
+    parser.add_argument('--replay-data', required=True, help='Corpus the deployed model was trained on')
+    parser.add_argument('--output', required=True, help='Output directory for model')
+    parser.add_argument('--replay-per-intent', type=int, default=REPLAY_PER_INTENT)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--lr', type=float, default=LEARNING_RATE)
+    parser.add_argument('--max-regression', type=float, default=MAX_REGRESSION,
+                        help='Accuracy the old intents may lose (0.01 = 1 point)')
+    args = parser.parse_args()
+
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    new_data = load_training_data(args.data)
+    replay_data = load_training_data(args.replay_data)
+
+    try:
+        result = train_incremental(new_data, replay_data, args.base, args.output, args.replay_per_intent,
+                                   args.epochs, args.batch_size, args.lr, args.max_regression)
+    except RegressionCheckFailed as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+
+    incremental = result['incremental']
+    check = incremental['regression_check']
+    print("\n" + "=" * 60)
+    print("INCREMENTAL TRAINING SUMMARY")
+    print("=" * 60)
+    print(f"Base: {incremental['base_model']}")
+    print(f"Version: {result['model_version']}")
+    print(f"Intents: {result['num_labels']} (+{len(incremental['added_labels'])})")
+    print(f"Train: {incremental['new_samples']} new + {incremental['replay_samples']} replay, "
+          f"{incremental['relative_cost']:.0%} of a full retrain")
+    print(f"Old intents: {check['base_accuracy']:.2%} -> {check['accuracy']:.2%}")
+    if incremental['new_examples_accuracy'] is not None:
+        print(f"New examples: {incremental['new_examples_accuracy']:.2%}")
+    print(f"Accuracy: {result['results']['accuracy']:.2%}")
+    print(f"Output: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
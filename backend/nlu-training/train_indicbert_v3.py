@@ -27,7 +27,6 @@ from collections import Counter
 from datetime import datetime
 
 import torch
-from torch.utils.data import Dataset
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
@@ -39,6 +38,9 @@ from transformers import (
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, f1_score, classification_report
 
+from model_benchmark import benchmark_saved_model, summary
+from tokenized_cache import intent_encoder, load_or_build
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -90,33 +92,6 @@ def set_seed(seed):
         torch.cuda.manual_seed_all(seed)
 
 
-class IntentDataset(Dataset):
-    """Simple dataset for intent classification."""
-
-    def __init__(self, texts, labels, tokenizer, max_length=64):
-        self.texts = texts
-        self.labels = labels
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-
-    def __len__(self):
-        return len(self.texts)
-
-    def __getitem__(self, idx):
-        encoding = self.tokenizer(
-            self.texts[idx],
-            truncation=True,
-            max_length=self.max_length,
-            padding='max_length',
-            return_tensors='pt',
-        )
-        return {
-            'input_ids': encoding['input_ids'].squeeze(),
-            'attention_mask': encoding['attention_mask'].squeeze(),
-            'labels': torch.tensor(self.labels[idx], dtype=torch.long),
-        }
-
-
 def compute_metrics(eval_pred):
     predictions, labels = eval_pred
     preds = np.argmax(predictions, axis=1)
@@ -250,9 +225,13 @@ def main():
 
     # ---- Create datasets ----
     logger.info('\n[4/7] Creating datasets')
-    train_dataset = IntentDataset(train_texts, train_labels, tokenizer, MAX_LENGTH)
-    val_dataset = IntentDataset(val_texts, val_labels, tokenizer, MAX_LENGTH)
-    test_dataset = IntentDataset(test_texts, test_labels, tokenizer, MAX_LENGTH)
+    # Encoded once per (tokenizer, MAX_LENGTH, split) and reused by later runs
+    encode = intent_encoder(tokenizer, MAX_LENGTH)
+    train_dataset = load_or_build('intent-train', tokenizer, MAX_LENGTH, list(zip(train_texts, train_labels)), encode)
+    val_dataset = load_or_build('intent-val', tokenizer, MAX_LENGTH, list(zip(val_texts, val_labels)), encode)
+    test_dataset = load_or_build('intent-test', tokenizer, MAX_LENGTH, list(zip(test_texts, test_labels)), encode)
+    for dataset in (train_dataset, val_dataset, test_dataset):
+        logger.info(f'  {dataset.summary()}')
 
     # ---- Training setup ----
     logger.info('\n[5/7] Setting up training')
@@ -337,6 +316,9 @@ def main():
     with open(os.path.join(FINAL_MODEL_DIR, 'label_mapping.json'), 'w') as f:
         json.dump({'label2id': label2id, 'id2label': {str(k): v for k, v in id2label.items()}}, f, indent=2)
 
+    # CPU latency, memory and size of the saved model (benchmark.json)
+    benchmark = benchmark_saved_model(FINAL_MODEL_DIR, test_texts, head='sequence')
+
     # Save training metadata
     metadata = {
         'base_model': BASE_MODEL,
@@ -355,6 +337,7 @@ def main():
         'test_f1_weighted': test_results.get('eval_f1_weighted', 0),
         'test_f1_macro': test_results.get('eval_f1_macro', 0),
         'trained_at': datetime.now().isoformat(),
+        'benchmark': summary(benchmark) if benchmark else None,
         'gpu': torch.cuda.get_device_name(0) if torch.cuda.is_available() else 'cpu',
     }
     with open(os.path.join(FINAL_MODEL_DIR, 'training_metadata.json'), 'w') as f:
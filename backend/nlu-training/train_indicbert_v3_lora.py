@@ -26,7 +26,6 @@ from collections import Counter
 from datetime import datetime
 
 import torch
-from torch.utils.data import Dataset
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
@@ -44,6 +43,10 @@ from peft import (
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, f1_score, classification_report
 
+from model_benchmark import benchmark_saved_model, summary
+from tokenized_cache import intent_encoder, load_or_build
+from training_progress import ProgressCallback
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -96,31 +99,6 @@ def set_seed(seed):
         torch.cuda.manual_seed_all(seed)
 
 
-class IntentDataset(Dataset):
-    def __init__(self, texts, labels, tokenizer, max_length=64):
-        self.texts = texts
-        self.labels = labels
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-
-    def __len__(self):
-        return len(self.texts)
-
-    def __getitem__(self, idx):
-        encoding = self.tokenizer(
-            self.texts[idx],
-            truncation=True,
-            max_length=self.max_length,
-            padding='max_length',
-            return_tensors='pt',
-        )
-        return {
-            'input_ids': encoding['input_ids'].squeeze(),
-            'attention_mask': encoding['attention_mask'].squeeze(),
-            'labels': torch.tensor(self.labels[idx], dtype=torch.long),
-        }
-
-
 def compute_metrics(eval_pred):
     predictions, labels = eval_pred
     preds = np.argmax(predictions, axis=1)
@@ -147,7 +125,8 @@ def load_training_data(filepath):
     return data
 
 
-def main():
+def main(report=None):
+    """report(progress=, message=, metrics=) gets live step metrics (sweep.py trials)"""
     set_seed(SEED)
 
     logger.info('=' * 60)
@@ -271,9 +250,13 @@ def main():
 
     # ---- Datasets ----
     logger.info('\n[5/8] Creating datasets')
-    train_dataset = IntentDataset(train_texts, train_labels, tokenizer, MAX_LENGTH)
-    val_dataset = IntentDataset(val_texts, val_labels, tokenizer, MAX_LENGTH)
-    test_dataset = IntentDataset(test_texts, test_labels, tokenizer, MAX_LENGTH)
+    # Encoded once per (tokenizer, MAX_LENGTH, split) and reused by later runs
+    encode = intent_encoder(tokenizer, MAX_LENGTH)
+    train_dataset = load_or_build('intent-train', tokenizer, MAX_LENGTH, list(zip(train_texts, train_labels)), encode)
+    val_dataset = load_or_build('intent-val', tokenizer, MAX_LENGTH, list(zip(val_texts, val_labels)), encode)
+    test_dataset = load_or_build('intent-test', tokenizer, MAX_LENGTH, list(zip(test_texts, test_labels)), encode)
+    for dataset in (train_dataset, val_dataset, test_dataset):
+        logger.info(f'  {dataset.summary()}')
 
     # ---- Training ----
     logger.info('\n[6/8] Setting up training')
@@ -311,6 +294,10 @@ def main():
 
     data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
 
+    callbacks = [EarlyStoppingCallback(early_stopping_patience=EARLY_STOPPING_PATIENCE)]
+    if report:
+        callbacks.append(ProgressCallback(report, tokens_per_sample=float(train_dataset.lengths.mean())))
+
     trainer = Trainer(
         model=model,
         args=training_args,
@@ -318,7 +305,7 @@ def main():
         eval_dataset=val_dataset,
         data_collator=data_collator,
         compute_metrics=compute_metrics,
-        callbacks=[EarlyStoppingCallback(early_stopping_patience=EARLY_STOPPING_PATIENCE)],
+        callbacks=callbacks,
     )
 
     logger.info('\n[7/8] Training started...')
@@ -358,6 +345,9 @@ def main():
             'id2label': {str(k): v for k, v in id2label.items()},
         }, f, indent=2)
 
+    # CPU latency, memory and size of the merged model (benchmark.json)
+    benchmark = benchmark_saved_model(FINAL_MODEL_DIR, test_texts, head='sequence')
+
     # Save training metadata
     metadata = {
         'base_model': BASE_MODEL,
@@ -385,6 +375,7 @@ def main():
         'trainable_params': trainable_params,
         'total_params': total_params,
         'trainable_pct': f'{100*trainable_params/total_params:.2f}%',
+        'benchmark': summary(benchmark) if benchmark else None,
     }
     with open(os.path.join(FINAL_MODEL_DIR, 'training_metadata.json'), 'w') as f:
         json.dump(metadata, f, indent=2)
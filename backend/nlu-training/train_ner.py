@@ -26,7 +26,7 @@ import argparse
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
@@ -34,13 +34,15 @@ from transformers import (
     AutoTokenizer,
     AutoModelForTokenClassification,
     TrainingArguments,
-    Trainer,
-    DataCollatorForTokenClassification,
     EarlyStoppingCallback
 )
-from datasets import Dataset, DatasetDict
 import numpy as np
 
+from model_benchmark import benchmark_saved_model, summary
+from ner_batching import LengthGroupedTrainer, PadToLongestCollator
+from tokenized_cache import TokenizedDataset, load_or_build, per_example
+from training_progress import ProgressCallback
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -200,53 +202,54 @@ def convert_to_bio_tags(
     return tokens, labels
 
 
-def prepare_dataset(
-    data: List[Dict],
-    tokenizer
-) -> Dataset:
-    """Convert raw data to HuggingFace Dataset with BIO tags"""
+def encode_example(item: Dict, tokenizer) -> Optional[Dict[str, List[int]]]:
+    """Token ids + BIO label ids of one example, unpadded (None if it has no tokens)"""
+    text = item['text']
+    entities = item.get('entities', [])
     
-    processed_data = {
-        'input_ids': [],
-        'attention_mask': [],
-        'labels': []
-    }
+    # Get BIO tags
+    tokens, bio_labels = convert_to_bio_tags(text, entities, tokenizer)
     
-    for item in data:
-        text = item['text']
-        entities = item.get('entities', [])
-        
-        # Get BIO tags
-        tokens, bio_labels = convert_to_bio_tags(text, entities, tokenizer)
+    if len(tokens) == 0:
+        return None
         
-        if len(tokens) == 0:
-            continue
-            
-        # Tokenize with special tokens
-        encoding = tokenizer(
-            text,
-            truncation=True,
-            max_length=MAX_LENGTH,
-            padding='max_length',
-            return_tensors=None
-        )
-        
-        # Add special token labels (-100 for ignored)
-        # [CLS] + tokens + [SEP] + padding
-        label_ids = [-100]  # CLS
-        label_ids.extend([LABEL2ID.get(l, 0) for l in bio_labels])
-        label_ids.append(-100)  # SEP
-        
-        # Pad labels
-        while len(label_ids) < MAX_LENGTH:
-            label_ids.append(-100)
-        label_ids = label_ids[:MAX_LENGTH]
-        
-        processed_data['input_ids'].append(encoding['input_ids'])
-        processed_data['attention_mask'].append(encoding['attention_mask'])
-        processed_data['labels'].append(label_ids)
+    # Tokenize with special tokens
+    encoding = tokenizer(
+        text,
+        truncation=True,
+        max_length=MAX_LENGTH,
+        return_tensors=None
+    )
+    input_ids = encoding['input_ids']
+    
+    # Add special token labels (-100 for ignored)
+    # [CLS] + tokens + [SEP]
+    label_ids = [-100]  # CLS
+    label_ids.extend([LABEL2ID.get(l, 0) for l in bio_labels])
+    label_ids.append(-100)  # SEP
+    label_ids = label_ids[:len(input_ids)]
+    label_ids += [-100] * (len(input_ids) - len(label_ids))
     
-    return Dataset.from_dict(processed_data)
+    return {
+        'input_ids': input_ids,
+        'attention_mask': encoding['attention_mask'],
+        'labels': label_ids,
+    }
+
+
+def prepare_dataset(
+    data: List[Dict],
+    tokenizer,
+    name: str = "ner"
+) -> TokenizedDataset:
+    """BIO-tagged dataset, tokenized once and reused from the tokenized cache"""
+    dataset = load_or_build(
+        name, tokenizer, MAX_LENGTH, data,
+        per_example(lambda item: encode_example(item, tokenizer)),
+        extra={'labels': NER_LABELS},
+    )
+    logger.info(f"   {dataset.summary()}")
+    return dataset
 
 
 def compute_metrics(eval_preds):
@@ -281,8 +284,9 @@ def train_ner_model(
     epochs: int = EPOCHS,
     batch_size: int = BATCH_SIZE,
     learning_rate: float = LEARNING_RATE,
+    report: Optional[Callable] = None,
 ) -> Dict:
-    """Train NER model"""
+    """Train NER model; report(progress=, message=, metrics=) gets live step metrics"""
     
     device = setup_device()
     
@@ -309,11 +313,11 @@ def train_ner_model(
     logger.info(f"📊 Dataset split: {len(train_data)} train, {len(val_data)} val")
     
     # Prepare datasets
-    train_dataset = prepare_dataset(train_data, tokenizer)
-    val_dataset = prepare_dataset(val_data, tokenizer)
+    train_dataset = prepare_dataset(train_data, tokenizer, "ner-train")
+    val_dataset = prepare_dataset(val_data, tokenizer, "ner-val")
     
-    # Data collator
-    data_collator = DataCollatorForTokenClassification(tokenizer=tokenizer)
+    # Data collator: pad to the longest example in the batch
+    data_collator = PadToLongestCollator(tokenizer)
     
     # Training arguments
     training_args = TrainingArguments(
@@ -333,11 +337,16 @@ def train_ner_model(
         greater_is_better=True,
         fp16=torch.cuda.is_available(),  # Mixed precision on GPU
         dataloader_num_workers=2,
+        group_by_length=True,  # Batches of similar lengths (LengthGroupedSampler)
         report_to="none",  # Disable wandb
     )
     
+    callbacks = [EarlyStoppingCallback(early_stopping_patience=3)]
+    if report:
+        callbacks.append(ProgressCallback(report, tokens_per_sample=float(train_dataset.lengths.mean())))
+    
     # Trainer
-    trainer = Trainer(
+    trainer = LengthGroupedTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
@@ -345,7 +354,7 @@ def train_ner_model(
         tokenizer=tokenizer,
         data_collator=data_collator,
         compute_metrics=compute_metrics,
-        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)],
+        callbacks=callbacks,
     )
     
     # Train
@@ -379,6 +388,9 @@ def train_ner_model(
         'validation_samples': len(val_data),
     }
     
+    benchmark = benchmark_saved_model(output_dir, [d['text'] for d in val_data], head="token")
+    results['benchmark'] = summary(benchmark) if benchmark else None
+    
     logger.info(f"✅ Training complete! F1: {results['eval_f1']:.4f}")
     return results
 
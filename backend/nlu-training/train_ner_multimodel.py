@@ -9,7 +9,7 @@ import os
 import sys
 import argparse
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 import logging
 
 import torch
@@ -18,13 +18,16 @@ from transformers import (
     AutoTokenizer,
     AutoModelForTokenClassification,
     TrainingArguments,
-    Trainer,
-    DataCollatorForTokenClassification,
     EarlyStoppingCallback,
 )
-from datasets import Dataset
 from seqeval.metrics import classification_report, f1_score, precision_score, recall_score
 
+from model_benchmark import benchmark_saved_model, summary
+from ner_batching import LengthGroupedTrainer, PadToLongestCollator
+from ner_shards import is_shard_dir, iter_split, split_size
+from tokenized_cache import TokenizedDataset, load_or_build, per_example
+from training_progress import ProgressCallback, TrialPruned
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -78,7 +81,6 @@ class NERDataProcessor:
             return_offsets_mapping=True,
             truncation=True,
             max_length=128,
-            padding="max_length",
         )
         
         aligned_labels = []
@@ -127,14 +129,41 @@ def load_training_data(filepath: str) -> List[Dict]:
     return data
 
 
-def create_dataset(data: List[Dict], processor: NERDataProcessor) -> Dataset:
-    """Create HuggingFace Dataset from processed data."""
-    processed = [processor.process_example(ex) for ex in data]
-    return Dataset.from_dict({
-        "input_ids": [p["input_ids"] for p in processed],
-        "attention_mask": [p["attention_mask"] for p in processed],
-        "labels": [p["labels"] for p in processed],
-    })
+def load_split_data(filepath: str, val_split: float = 0.2) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Train/validation data. A shard directory (ner_data_collector.py export-shards)
+    with a val split is used as exported; anything else is shuffled and split here.
+    """
+    if is_shard_dir(filepath) and split_size(filepath, "val"):
+        train_data = list(iter_split(filepath, "train"))
+        val_data = list(iter_split(filepath, "val"))
+        logger.info(f"Loaded {len(train_data)} train / {len(val_data)} val examples from shards in {filepath}")
+        return train_data, val_data
+    
+    if is_shard_dir(filepath):
+        all_data = list(iter_split(filepath, "train"))
+        logger.info(f"Loaded {len(all_data)} training examples from shards in {filepath}")
+    else:
+        all_data = load_training_data(filepath)
+    
+    # Shuffle and split
+    np.random.seed(42)
+    indices = np.random.permutation(len(all_data))
+    split_idx = int(len(all_data) * (1 - val_split))
+    
+    train_data = [all_data[i] for i in indices[:split_idx]]
+    val_data = [all_data[i] for i in indices[split_idx:]]
+    return train_data, val_data
+
+
+def create_dataset(data: List[Dict], processor: NERDataProcessor, name: str = "ner") -> TokenizedDataset:
+    """Tokenized dataset for data, built once and reused from the tokenized cache."""
+    dataset = load_or_build(
+        name, processor.tokenizer, 128, data, per_example(processor.process_example),
+        extra={"label2id": processor.label2id},
+    )
+    logger.info(dataset.summary())
+    return dataset
 
 
 def compute_metrics(eval_pred, id2label: Dict[int, str]):
@@ -172,8 +201,9 @@ def train_model(
     epochs: int = 10,
     batch_size: int = 16,
     learning_rate: float = 5e-5,  # Higher LR for small datasets
+    report: Optional[Callable] = None,
 ) -> Dict:
-    """Train a NER model and return metrics."""
+    """Train a NER model and return metrics; report(progress=, message=, metrics=) gets live step metrics."""
     
     logger.info(f"\n{'='*60}")
     logger.info(f"Training model: {model_name}")
@@ -190,8 +220,8 @@ def train_model(
     processor = NERDataProcessor(tokenizer, ENTITY_LABELS)
     
     # Create datasets
-    train_dataset = create_dataset(train_data, processor)
-    val_dataset = create_dataset(val_data, processor)
+    train_dataset = create_dataset(train_data, processor, "ner-train")
+    val_dataset = create_dataset(val_data, processor, "ner-val")
     
     logger.info(f"Train size: {len(train_dataset)}, Val size: {len(val_dataset)}")
     
@@ -230,18 +260,21 @@ def train_model(
         logging_steps=50,
         warmup_ratio=0.1,
         fp16=torch.cuda.is_available(),
+        group_by_length=True,
         report_to="none",
     )
     
-    # Data collator
-    data_collator = DataCollatorForTokenClassification(tokenizer=tokenizer)
+    # Data collator: pad to the longest example in the batch
+    data_collator = PadToLongestCollator(tokenizer)
     
     # Create trainer with optional early stopping
     callbacks = []
     if epochs <= 10:
         callbacks.append(EarlyStoppingCallback(early_stopping_patience=5))
+    if report:
+        callbacks.append(ProgressCallback(report, tokens_per_sample=float(train_dataset.lengths.mean())))
     
-    trainer = Trainer(
+    trainer = LengthGroupedTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
@@ -285,16 +318,22 @@ def train_model(
         logger.info(f"\nClassification Report for {model_name}:")
         logger.info(f"\n{report}")
         
+        benchmark = benchmark_saved_model(model_output_dir, [d["text"] for d in val_data], head="token")
+        
         return {
             "model": model_name,
             "f1": eval_result["eval_f1"],
             "precision": eval_result["eval_precision"],
             "recall": eval_result["eval_recall"],
             "train_loss": train_result.training_loss,
+            "epochs": trainer.throughput.epochs,
             "output_dir": model_output_dir,
             "report": report,
+            "benchmark": summary(benchmark) if benchmark else None,
         }
         
+    except TrialPruned:
+        raise
     except Exception as e:
         logger.error(f"Training failed for {model_name}: {e}")
         return {"model": model_name, "error": str(e)}
@@ -307,18 +346,14 @@ def compare_models(
     val_split: float = 0.2,
     epochs: int = 10,
 ) -> List[Dict]:
-    """Compare multiple models on the same dataset."""
+    """
+    Compare multiple models on the same dataset, one after another.
+    sweep.py --target ner --space '{"model": [...]}' runs them in parallel
+    and adds CPU latency and size to the comparison.
+    """
     
     # Load and split data
-    all_data = load_training_data(training_file)
-    
-    # Shuffle and split
-    np.random.seed(42)
-    indices = np.random.permutation(len(all_data))
-    split_idx = int(len(all_data) * (1 - val_split))
-    
-    train_data = [all_data[i] for i in indices[:split_idx]]
-    val_data = [all_data[i] for i in indices[split_idx:]]
+    train_data, val_data = load_split_data(training_file, val_split)
     
     logger.info(f"Training set: {len(train_data)}, Validation set: {len(val_data)}")
     
@@ -376,7 +411,7 @@ def main():
     parser.add_argument(
         "--training-file",
         default="ner_training_v5_expanded.jsonl",
-        help="Training data file"
+        help="Training data file, or a shard directory from ner_data_collector.py export-shards"
     )
     parser.add_argument(
         "--output-dir",
@@ -399,12 +434,7 @@ def main():
     
     if args.single_model:
         # Train single model
-        all_data = load_training_data(args.training_file)
-        np.random.seed(42)
-        indices = np.random.permutation(len(all_data))
-        split_idx = int(len(all_data) * 0.8)
-        train_data = [all_data[i] for i in indices[:split_idx]]
-        val_data = [all_data[i] for i in indices[split_idx:]]
+        train_data, val_data = load_split_data(args.training_file)
         
         result = train_model(
             model_name=args.single_model,
@@ -18,6 +18,7 @@ Following NLU_ARCHITECTURE_REDESIGN.md:
 
 import os
 import json
+import math
 import random
 import gc
 import numpy as np
@@ -27,19 +28,22 @@ from datetime import datetime
 from typing import List, Dict, Tuple
 
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import IterableDataset, get_worker_info
 from transformers import (
     AutoTokenizer,
     AutoModelForTokenClassification,
     TrainingArguments,
-    Trainer,
-    DataCollatorForTokenClassification,
     EarlyStoppingCallback,
 )
 from sklearn.model_selection import train_test_split
 from seqeval.metrics import classification_report as seq_classification_report
 from seqeval.metrics import f1_score as seq_f1_score
 
+from ner_shards import ShardStream, is_shard_dir, iter_split, load_manifest, split_size
+from model_benchmark import benchmark_saved_model, summary
+from ner_batching import LengthGroupedTrainer, PadToLongestCollator
+from tokenized_cache import load_or_build, per_example
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -53,9 +57,12 @@ else:
     DEVICE = 'cpu'
     os.environ['CUDA_VISIBLE_DEVICES'] = ''
 
-# Paths
+# Paths (TRAINING_DATA may also be a shard directory from ner_data_collector.py export-shards)
 TRAINING_DATA = os.environ.get('TRAINING_DATA', 
     os.path.expanduser("~/nlu-training/ner_final_v1.jsonl"))
+# Stream the train split shard by shard instead of loading it into memory (shard directories only)
+STREAM_SHARDS = os.environ.get('STREAM_SHARDS', 'false').lower() == 'true'
+SHUFFLE_BUFFER = int(os.environ.get('SHUFFLE_BUFFER', '10000'))
 OUTPUT_DIR = os.environ.get('OUTPUT_DIR',
     os.path.expanduser("~/nlu-training/models/ner_muril_final"))
 FINAL_MODEL_DIR = os.environ.get('FINAL_MODEL_DIR',
@@ -144,65 +151,66 @@ def convert_to_bio(text: str, entities: List[Dict], tokenizer) -> Tuple[List[str
     return tokens, labels
 
 
-class NERDataset(Dataset):
-    def __init__(self, samples: List[Dict], tokenizer, max_length: int, label2id: Dict):
-        self.samples = samples
+def encode_example(sample: Dict, tokenizer, max_length: int, label2id: Dict) -> Dict[str, List[int]]:
+    """Token ids and aligned BIO label ids of one sample, unpadded"""
+    text = sample['text']
+    entities = sample.get('entities', [])
+    
+    # Convert to BIO format
+    tokens, labels = convert_to_bio(text, entities, tokenizer)
+    
+    # Encode
+    encoding = tokenizer(text, max_length=max_length, truncation=True)
+    input_ids = encoding['input_ids']
+    
+    # Convert labels to IDs
+    label_ids = [label2id.get(label, label2id['O']) for label in labels][:len(input_ids)]
+    label_ids += [-100] * (len(input_ids) - len(label_ids))
+    
+    return {
+        'input_ids': input_ids,
+        'attention_mask': encoding['attention_mask'],
+        'labels': label_ids,
+    }
+
+
+class NERStreamingDataset(IterableDataset):
+    """Train split of a shard directory, read one shard at a time through a shuffle buffer"""
+    
+    def __init__(self, path: str, tokenizer, max_length: int, label2id: Dict, split: str = 'train'):
+        self.stream = ShardStream(path, split, shuffle=True, buffer_size=SHUFFLE_BUFFER, seed=SEED)
         self.tokenizer = tokenizer
         self.max_length = max_length
         self.label2id = label2id
     
-    def __len__(self):
-        return len(self.samples)
-    
-    def __getitem__(self, idx):
-        sample = self.samples[idx]
-        text = sample['text']
-        entities = sample.get('entities', [])
-        
-        # Convert to BIO format
-        tokens, labels = convert_to_bio(text, entities, self.tokenizer)
-        
-        # Encode
-        encoding = self.tokenizer(
-            text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-        
-        # Convert labels to IDs
-        label_ids = []
-        for label in labels:
-            label_ids.append(self.label2id.get(label, self.label2id['O']))
-        
-        # Pad labels
-        while len(label_ids) < self.max_length:
-            label_ids.append(-100)  # Ignore in loss
-        label_ids = label_ids[:self.max_length]
-        
-        return {
-            'input_ids': encoding['input_ids'].squeeze(),
-            'attention_mask': encoding['attention_mask'].squeeze(),
-            'labels': torch.tensor(label_ids, dtype=torch.long)
-        }
+    def __iter__(self):
+        # DataLoader workers each take a disjoint subset of the shards
+        worker = get_worker_info()
+        num_shards, shard_index = (worker.num_workers, worker.id) if worker else (1, 0)
+        for sample in self.stream.iterate(num_shards, shard_index):
+            yield encode_example(sample, self.tokenizer, self.max_length, self.label2id)
 
 
-def load_training_data(filepath: str) -> List[Dict]:
-    """Load NER training data"""
-    samples = []
-    entity_counts = Counter()
-    
+def _read_jsonl(filepath: str):
     with open(filepath, 'r', encoding='utf-8') as f:
         for line in f:
             try:
-                data = json.loads(line.strip())
-                if 'text' in data and 'entities' in data:
-                    samples.append(data)
-                    for ent in data['entities']:
-                        entity_counts[ent['label']] += 1
+                yield json.loads(line.strip())
             except:
                 continue
+
+
+def load_training_data(filepath: str, split: str = 'train') -> List[Dict]:
+    """Load NER training data from a JSONL file or one split of a shard directory"""
+    samples = []
+    entity_counts = Counter()
+    
+    records = iter_split(filepath, split) if is_shard_dir(filepath) else _read_jsonl(filepath)
+    for data in records:
+        if 'text' in data and 'entities' in data:
+            samples.append(data)
+            for ent in data['entities']:
+                entity_counts[ent['label']] += 1
     
     print(f"Loaded {len(samples)} samples")
     print("\nEntity distribution:")
@@ -269,13 +277,24 @@ def main():
     print("LOADING DATA")
     print(f"{'='*70}")
     
-    samples = load_training_data(TRAINING_DATA)
-    
-    # Split
-    train_samples, val_samples = train_test_split(
-        samples, test_size=0.15, random_state=SEED
-    )
-    print(f"\nTrain: {len(train_samples)}, Validation: {len(val_samples)}")
+    if is_shard_dir(TRAINING_DATA) and split_size(TRAINING_DATA, 'val'):
+        # The export already holds a hash-based validation split
+        manifest = load_manifest(TRAINING_DATA)
+        print(f"Shard directory: {manifest['_dir']} ({manifest['total_examples']} examples)")
+        val_samples = load_training_data(TRAINING_DATA, 'val')
+        train_samples = None if STREAM_SHARDS else load_training_data(TRAINING_DATA, 'train')
+        num_train = split_size(TRAINING_DATA, 'train')
+    else:
+        if STREAM_SHARDS:
+            print("STREAM_SHARDS needs a shard directory with a val split - loading into memory")
+        samples = load_training_data(TRAINING_DATA)
+        
+        # Split
+        train_samples, val_samples = train_test_split(
+            samples, test_size=0.15, random_state=SEED
+        )
+        num_train = len(train_samples)
+    print(f"\nTrain: {num_train}, Validation: {len(val_samples)}")
     
     # Load tokenizer
     print(f"\n{'='*70}")
@@ -285,9 +304,17 @@ def main():
     
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
     
-    # Create datasets
-    train_dataset = NERDataset(train_samples, tokenizer, MAX_LENGTH, label2id)
-    val_dataset = NERDataset(val_samples, tokenizer, MAX_LENGTH, label2id)
+    # Create datasets (in-memory splits are tokenized once and cached across runs)
+    encode = per_example(lambda sample: encode_example(sample, tokenizer, MAX_LENGTH, label2id))
+    cache_extra = {'label2id': label2id}
+    if train_samples is None:
+        train_dataset = NERStreamingDataset(TRAINING_DATA, tokenizer, MAX_LENGTH, label2id)
+        print(f"Streaming train split (shuffle buffer {SHUFFLE_BUFFER})")
+    else:
+        train_dataset = load_or_build('ner-train', tokenizer, MAX_LENGTH, train_samples, encode, extra=cache_extra)
+        print(train_dataset.summary())
+    val_dataset = load_or_build('ner-val', tokenizer, MAX_LENGTH, val_samples, encode, extra=cache_extra)
+    print(val_dataset.summary())
     
     # Load model
     model = AutoModelForTokenClassification.from_pretrained(
@@ -300,17 +327,28 @@ def main():
     
     print(f"Model loaded with {len(ENTITY_LABELS)} labels")
     
+    # A streamed dataset has no length, so the schedule is driven by steps
+    if train_samples is None:
+        steps_per_epoch = math.ceil(num_train / BATCH_SIZE)
+        schedule = dict(
+            max_steps=steps_per_epoch * EPOCHS,
+            eval_strategy="steps",
+            save_strategy="steps",
+            eval_steps=steps_per_epoch,
+            save_steps=steps_per_epoch,
+        )
+    else:
+        schedule = dict(num_train_epochs=EPOCHS, eval_strategy="epoch", save_strategy="epoch")
+    
     # Training arguments
     training_args = TrainingArguments(
         output_dir=OUTPUT_DIR,
-        num_train_epochs=EPOCHS,
+        **schedule,
         per_device_train_batch_size=BATCH_SIZE,
         per_device_eval_batch_size=BATCH_SIZE * 2,
         learning_rate=LEARNING_RATE,
         warmup_ratio=WARMUP_RATIO,
         weight_decay=WEIGHT_DECAY,
-        eval_strategy="epoch",
-        save_strategy="epoch",
         load_best_model_at_end=True,
         metric_for_best_model="f1",
         greater_is_better=True,
@@ -318,15 +356,16 @@ def main():
         save_total_limit=2,
         fp16=(DEVICE == 'cuda'),
         dataloader_num_workers=0,
+        group_by_length=True,  # LengthGroupedSampler; a streamed train split is padded per batch only
         report_to="none",
         seed=SEED,
     )
     
-    # Data collator
-    data_collator = DataCollatorForTokenClassification(tokenizer=tokenizer)
+    # Data collator: pad to the longest example in the batch
+    data_collator = PadToLongestCollator(tokenizer)
     
     # Trainer
-    trainer = Trainer(
+    trainer = LengthGroupedTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
@@ -360,6 +399,11 @@ def main():
     trainer.save_model(FINAL_MODEL_DIR)
     tokenizer.save_pretrained(FINAL_MODEL_DIR)
     
+    # CPU latency, memory and size of the saved model (benchmark.json)
+    benchmark = benchmark_saved_model(FINAL_MODEL_DIR, [s['text'] for s in val_samples], head="token")
+    if benchmark:
+        print(f"Benchmark: {json.dumps(summary(benchmark))}")
+    
     # Save label mapping
     label_mapping = {
         'label2id': label2id,
@@ -367,8 +411,9 @@ def main():
         'entity_labels': ENTITY_LABELS,
         'model_name': MODEL_NAME,
         'training_date': datetime.now().isoformat(),
-        'training_samples': len(samples),
+        'training_samples': num_train + len(val_samples),
         'f1_score': results['eval_f1'],
+        'benchmark': summary(benchmark) if benchmark else None,
     }
     
     with open(os.path.join(FINAL_MODEL_DIR, 'label_mapping.json'), 'w') as f:
@@ -39,6 +39,8 @@ from transformers import (
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, f1_score, classification_report
 
+from model_benchmark import benchmark_saved_model, summary
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -316,6 +318,11 @@ def main():
     trainer.save_model(FINAL_MODEL_DIR)
     tokenizer.save_pretrained(FINAL_MODEL_DIR)
     
+    # CPU latency, memory and size of the saved model (benchmark.json)
+    benchmark = benchmark_saved_model(FINAL_MODEL_DIR, val_texts, head="sequence")
+    if benchmark:
+        print(f"Benchmark: {json.dumps(summary(benchmark))}")
+    
     # Save label mapping
     label_mapping = {
         'label2id': label2id,
@@ -326,6 +333,7 @@ def main():
         'training_samples': len(texts),
         'accuracy': results['eval_accuracy'],
         'f1_weighted': results['eval_f1_weighted'],
+        'benchmark': summary(benchmark) if benchmark else None,
     }
     
     with open(os.path.join(FINAL_MODEL_DIR, 'label_mapping.json'), 'w') as f:
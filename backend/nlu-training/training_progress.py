@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Training Progress - live metrics from a Trainer run
+===================================================
+ProgressCallback turns every Trainer log (logging_steps, plus each
+evaluation) into a metrics record and hands it to report(), which for
+server jobs is the job_queue worker's report function: the record lands
+in the job store, GET /jobs/{id}/stream follows it as NDJSON and
+GET /metrics exports the latest one as Prometheus gauges.
+
+Record:
+    kind            "train" or "eval"
+    step/max_steps  optimizer steps, epoch
+    loss, learning_rate, grad_norm
+    samples_per_s   over training time only (evaluation excluded)
+    tokens_per_s    samples_per_s x mean tokens per train example
+    eval            latest eval metrics (eval_ prefix dropped)
+    peak_memory_mb  CUDA max allocated, else process max RSS
+    eta_s           remaining steps at the average step time so far
+
+A report function may raise TrialPruned to end the run early (sweep.py
+does for unpromising trials); the exception propagates out of train().
+"""
+
+import time
+import resource
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import torch
+from transformers import TrainerCallback
+
+
+class TrialPruned(Exception):
+    """Raised by a report function to stop a training run early"""
+
+
+def peak_memory_mb() -> float:
+    if torch.cuda.is_available():
+        return round(torch.cuda.max_memory_allocated() / 1024 ** 2, 1)
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class ProgressCallback(TrainerCallback):
+    """
+    report(progress=, message=, metrics=) is called once per Trainer log;
+    job progress is mapped onto progress_range (the runner owns the rest).
+    """
+
+    def __init__(self, report: Callable[..., None], tokens_per_sample: Optional[float] = None,
+                 progress_range: Tuple[float, float] = (10.0, 95.0)):
+        self.report = report
+        self.tokens_per_sample = tokens_per_sample
+        self.progress_range = progress_range
+
+        self.samples_per_step = 1
+        self.train_time = 0.0
+        self.eval_metrics: Dict[str, float] = {}
+        self._step_start: Optional[float] = None
+        self._last_step = 0
+        self._last_train_time = 0.0
+        self._samples_per_s: Optional[float] = None
+        # Eval logs carry no loss / learning rate; keep the last training values
+        self._train_logs: Dict[str, Any] = {}
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.samples_per_step = args.train_batch_size * args.gradient_accumulation_steps * max(args.world_size, 1)
+        self.train_time = 0.0
+        self._last_step = state.global_step
+        self._last_train_time = 0.0
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self._step_start = time.time()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self._step_start is not None:
+            self.train_time += time.time() - self._step_start
+            self._step_start = None
+
+    def on_log(self, args, state, control, logs: Optional[Dict[str, Any]] = None, **kwargs):
+        logs = logs or {}
+        step, max_steps = state.global_step, state.max_steps
+
+        evaluated = {k[len("eval_"):]: v for k, v in logs.items()
+                     if k.startswith("eval_") and isinstance(v, (int, float))}
+        if evaluated:
+            self.eval_metrics = evaluated
+        elif step > self._last_step and self.train_time > self._last_train_time:
+            self._samples_per_s = ((step - self._last_step) * self.samples_per_step
+                                   / (self.train_time - self._last_train_time))
+            self._last_step, self._last_train_time = step, self.train_time
+        if not evaluated and "loss" in logs:
+            self._train_logs = {k: logs.get(k) for k in ("loss", "learning_rate", "grad_norm")}
+
+        eta = None
+        if step and max_steps:
+            eta = round(self.train_time / step * max(max_steps - step, 0), 1)
+        tokens_per_s = None
+        if self._samples_per_s is not None and self.tokens_per_sample:
+            tokens_per_s = round(self._samples_per_s * self.tokens_per_sample, 1)
+
+        record = {
+            "kind": "eval" if evaluated else "train",
+            "time": time.time(),
+            "step": step,
+            "max_steps": max_steps,
+            "epoch": round(state.epoch or 0, 3),
+            "loss": self._train_logs.get("loss"),
+            "learning_rate": self._train_logs.get("learning_rate"),
+            "grad_norm": self._train_logs.get("grad_norm"),
+            "samples_per_s": round(self._samples_per_s, 2) if self._samples_per_s is not None else None,
+            "tokens_per_s": tokens_per_s,
+            "eval": dict(self.eval_metrics),
+            "peak_memory_mb": peak_memory_mb(),
+            "eta_s": eta,
+        }
+
+        low, high = self.progress_range
+        progress = round(low + (high - low) * step / max_steps, 1) if max_steps else None
+        if evaluated:
+            shown = ", ".join(f"{k} {v:.4f}" for k, v in list(evaluated.items())[:3])
+            message = f"Step {step}/{max_steps} - eval {shown}"
+        else:
+            parts = [f"Step {step}/{max_steps}"]
+            if record["loss"] is not None:
+                parts.append(f"loss {record['loss']:.4f}")
+            if record["samples_per_s"] is not None:
+                parts.append(f"{record['samples_per_s']:.1f} samples/s")
+            parts.append(f"ETA {format_eta(eta)}")
+            message = " - ".join(parts)
+        self.report(progress=progress, message=message, metrics=record)
+
+
+# ============================================================================
+# PROMETHEUS
+# ============================================================================
+_GAUGES = (
+    ("step", "step", "Optimizer steps done"),
+    ("max_steps", "max_steps", "Optimizer steps planned"),
+    ("epoch", "epoch", "Epochs done (fractional)"),
+    ("loss", "loss", "Latest training loss"),
+    ("learning_rate", "learning_rate", "Current learning rate"),
+    ("samples_per_second", "samples_per_s", "Training samples per second"),
+    ("tokens_per_second", "tokens_per_s", "Training tokens per second"),
+    ("peak_memory_megabytes", "peak_memory_mb", "Peak CUDA allocation or process RSS"),
+    ("eta_seconds", "eta_s", "Estimated seconds to finish"),
+)
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus_text(jobs: Iterable[Dict[str, Any]], counts: Dict[str, int]) -> str:
+    """Text exposition format: job counts by status plus the latest metrics of each job"""
+    lines: List[str] = [
+        "# HELP nlu_training_jobs Training jobs by status",
+        "# TYPE nlu_training_jobs gauge",
+    ]
+    lines += [f'nlu_training_jobs{{status="{status}"}} {n}' for status, n in counts.items()]
+
+    jobs = list(jobs)
+    series: Dict[str, List[str]] = {name: [] for name, _, _ in _GAUGES}
+    series.update(progress=[], running=[], eval=[])
+    for job in jobs:
+        labels = f'job_id="{_label(job["job_id"])}",type="{_label(job["type"])}"'
+        series["progress"].append(f"nlu_training_job_progress{{{labels}}} {job['progress']}")
+        series["running"].append(f"nlu_training_job_running{{{labels}}} {int(job['status'] == 'running')}")
+        metrics = job.get("metrics") or {}
+        for name, key, _ in _GAUGES:
+            if metrics.get(key) is not None:
+                series[name].append(f"nlu_training_job_{name}{{{labels}}} {metrics[key]}")
+        for metric, value in (metrics.get("eval") or {}).items():
+            series["eval"].append(f'nlu_training_job_eval{{{labels},metric="{_label(metric)}"}} {value}')
+
+    helps = [("progress", "Job progress, 0-100"), ("running", "1 while the job is running")]
+    helps += [(name, text) for name, _, text in _GAUGES]
+    helps.append(("eval", "Latest evaluation metrics"))
+    for name, text in helps:
+        if series[name]:
+            lines += [f"# HELP nlu_training_job_{name} {text}", f"# TYPE nlu_training_job_{name} gauge"]
+            lines += series[name]
+    return "\n".join(lines) + "\n"
@@ -10,14 +10,22 @@ This script:
 4. Adds new samples for underrepresented intents
 5. Outputs cleaned JSONL for training
 
+Input is streamed and written as it is cleaned; the seen-text set used for
+deduplication lives on disk (streaming_merge.DiskHashSet), so memory does
+not grow with the size of the input.
+
 Run: python clean_training_data.py
 """
 
 import json
 import re
 import os
+import sys
 from collections import defaultdict
-from typing import List, Dict, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nlu-training"))
+from streaming_merge import DiskHashSet
 
 # Input/Output paths
 INPUT_FILE = "nlu_training_data.jsonl"
@@ -95,9 +103,8 @@ def clean_text(text: str) -> str:
     
     return text
 
-def load_data(filepath: str) -> List[Dict]:
-    """Load JSONL training data."""
-    samples = []
+def load_data(filepath: str) -> Iterator[Dict]:
+    """Stream JSONL training data."""
     with open(filepath, 'r', encoding='utf-8') as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
@@ -106,16 +113,20 @@ def load_data(filepath: str) -> List[Dict]:
             try:
                 sample = json.loads(line)
                 sample['_line_num'] = line_num
-                samples.append(sample)
+                yield sample
             except json.JSONDecodeError as e:
                 print(f"Warning: Invalid JSON on line {line_num}: {e}")
-    return samples
 
-def clean_and_consolidate(samples: List[Dict]) -> Tuple[List[Dict], Dict]:
-    """Clean samples and consolidate intents."""
+def clean_and_consolidate(samples: Iterable[Dict]) -> Tuple[Iterator[Dict], Dict]:
+    """
+    Clean samples and consolidate intents.
+    
+    Returns a lazy iterator of cleaned samples and the stats dict, which is
+    complete once the iterator has been consumed.
+    """
     
     stats = {
-        "original_count": len(samples),
+        "original_count": 0,
         "removed": {
             "garbage": 0,
             "duplicates": 0,
@@ -128,68 +139,60 @@ def clean_and_consolidate(samples: List[Dict]) -> Tuple[List[Dict], Dict]:
         "garbage_samples": [],
     }
     
-    # Count original distribution
-    for s in samples:
-        stats["by_intent_before"][s.get("intent", "unknown")] += 1
-    
-    cleaned = []
-    seen_texts = set()
-    
-    for sample in samples:
-        text = sample.get("text", "")
-        intent = sample.get("intent", "unknown")
-        
-        # Clean text
-        text = clean_text(text)
-        
-        # Check if intent should be removed
-        if intent in REMOVE_INTENTS:
-            stats["removed"]["removed_intents"] += 1
-            continue
-        
-        # Check for garbage
-        is_bad, reason = is_garbage(text, intent)
-        if is_bad:
-            stats["removed"]["garbage"] += 1
-            if len(stats["garbage_samples"]) < 50:  # Keep sample for review
-                stats["garbage_samples"].append({
-                    "text": text[:100],
+    def cleaned():
+        with DiskHashSet() as seen_texts:
+            for sample in samples:
+                text = sample.get("text", "")
+                intent = sample.get("intent", "unknown")
+                
+                # Count original distribution
+                stats["original_count"] += 1
+                stats["by_intent_before"][intent] += 1
+                
+                # Clean text
+                text = clean_text(text)
+                
+                # Check if intent should be removed
+                if intent in REMOVE_INTENTS:
+                    stats["removed"]["removed_intents"] += 1
+                    continue
+                
+                # Check for garbage
+                is_bad, reason = is_garbage(text, intent)
+                if is_bad:
+                    stats["removed"]["garbage"] += 1
+                    if len(stats["garbage_samples"]) < 50:  # Keep sample for review
+                        stats["garbage_samples"].append({
+                            "text": text[:100],
+                            "intent": intent,
+                            "reason": reason
+                        })
+                    continue
+                
+                # Check for duplicates
+                if not seen_texts.add(text.lower()):
+                    stats["removed"]["duplicates"] += 1
+                    continue
+                
+                # Merge intents
+                if intent in INTENT_MERGE_MAP:
+                    new_intent = INTENT_MERGE_MAP[intent]
+                    stats["merged_intents"][f"{intent} → {new_intent}"] += 1
+                    intent = new_intent
+                
+                # Add cleaned sample
+                stats["by_intent_after"][intent] += 1
+                stats["final_count"] += 1
+                yield {
+                    "text": text,
                     "intent": intent,
-                    "reason": reason
-                })
-            continue
-        
-        # Check for duplicates
-        text_lower = text.lower()
-        if text_lower in seen_texts:
-            stats["removed"]["duplicates"] += 1
-            continue
-        seen_texts.add(text_lower)
-        
-        # Merge intents
-        if intent in INTENT_MERGE_MAP:
-            new_intent = INTENT_MERGE_MAP[intent]
-            stats["merged_intents"][f"{intent} → {new_intent}"] += 1
-            intent = new_intent
-        
-        # Add cleaned sample
-        cleaned.append({
-            "text": text,
-            "intent": intent,
-            **({k: v for k, v in sample.items() if k not in ["text", "intent", "_line_num"]})
-        })
-        stats["by_intent_after"][intent] += 1
+                    **({k: v for k, v in sample.items() if k not in ["text", "intent", "_line_num"]})
+                }
     
-    stats["final_count"] = len(cleaned)
-    return cleaned, stats
+    return cleaned(), stats
 
-def add_synthetic_samples(samples: List[Dict], target_per_intent: int = 50) -> List[Dict]:
-    """Add synthetic samples for underrepresented intents."""
-    
-    # Count current distribution
-    intent_counts = defaultdict(int)
-    for s in samples:
-        intent_counts[s["intent"]] += 1
+def add_synthetic_samples(intent_counts: Dict[str, int], target_per_intent: int = 50) -> List[Dict]:
+    """Synthetic samples for underrepresented intents, given the current distribution."""
     
     # Synthetic samples for critical intents
     SYNTHETIC_SAMPLES = {
@@ -318,26 +321,25 @@ def add_synthetic_samples(samples: List[Dict], target_per_intent: int = 50) -> L
         ],
     }
     
-    added_count = 0
+    added = []
     
     for intent, synthetic_list in SYNTHETIC_SAMPLES.items():
         current_count = intent_counts.get(intent, 0)
         needed = max(0, target_per_intent - current_count)
         
         for text in synthetic_list[:needed]:
-            samples.append({
+            added.append({
                 "text": text,
                 "intent": intent,
                 "source": "synthetic"
             })
-            added_count += 1
     
-    print(f"Added {added_count} synthetic samples")
-    return samples
+    print(f"Added {len(added)} synthetic samples")
+    return added
 
-def save_data(samples: List[Dict], filepath: str):
-    """Save cleaned data as JSONL."""
-    with open(filepath, 'w', encoding='utf-8') as f:
+def save_data(samples: Iterable[Dict], filepath: str, append: bool = False):
+    """Save cleaned data as JSONL (streamed)."""
+    with open(filepath, 'a' if append else 'w', encoding='utf-8') as f:
         for sample in samples:
             # Remove internal fields
             clean_sample = {k: v for k, v in sample.items() if not k.startswith('_')}
@@ -375,27 +377,24 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)
     
-    print(f"Loading {INPUT_FILE}...")
-    samples = load_data(INPUT_FILE)
-    print(f"Loaded {len(samples)} samples")
-    
+    print(f"Streaming {INPUT_FILE} → {OUTPUT_FILE}...")
     print("\nCleaning and consolidating...")
-    cleaned, stats = clean_and_consolidate(samples)
+    cleaned, stats = clean_and_consolidate(load_data(INPUT_FILE))
+    save_data(cleaned, OUTPUT_FILE)
+    print(f"Loaded {stats['original_count']} samples")
     
     print("\nAdding synthetic samples for underrepresented intents...")
-    cleaned = add_synthetic_samples(cleaned, target_per_intent=50)
+    synthetic = add_synthetic_samples(stats["by_intent_after"], target_per_intent=50)
+    save_data(synthetic, OUTPUT_FILE, append=True)
     
     # Update final count
-    stats["final_count"] = len(cleaned)
+    stats["final_count"] += len(synthetic)
     
     # Recount after synthetic
-    stats["by_intent_final"] = defaultdict(int)
-    for s in cleaned:
+    stats["by_intent_final"] = defaultdict(int, stats["by_intent_after"])
+    for s in synthetic:
         stats["by_intent_final"][s["intent"]] += 1
     
-    print(f"\nSaving to {OUTPUT_FILE}...")
-    save_data(cleaned, OUTPUT_FILE)
-    
     # Save stats
     stats_serializable = {
         k: dict(v) if isinstance(v, defaultdict) else v 
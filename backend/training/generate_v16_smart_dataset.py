@@ -24,15 +24,18 @@ DESIGN PRINCIPLES:
    - Menu browsing: "kya available hai"
 """
 
-import requests
 import json
-import time
 import random
+import asyncio
 import os
 import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nlu-training"))
+from dataset_generator import GEN_CONCURRENCY, GenerationEngine
 
 # Configuration
-VLLM_URL = "http://192.168.0.156:8002/v1/chat/completions"
+VLLM_URL = os.environ.get("VLLM_URL", "http://192.168.0.156:8002/v1/chat/completions")
 MODEL_NAME = "Qwen/Qwen2.5-7B-Instruct-AWQ"
 OUTPUT_FILE = "backend/training/synthetic_training_v16_raw.jsonl"
 FINAL_FILE = "backend/training/nlu_v16_smart.jsonl"
@@ -469,9 +472,9 @@ def is_valid_text(text):
 # GENERATION LOGIC
 # ============================================================================
 
-def generate_batch(intent, config, count=20):
-    """Generate training samples for an intent"""
-    
+def build_payload(intent, count=20):
+    """vLLM request for count training samples of an intent"""
+    config = INTENTS[intent]
     language = random.choice(config.get("languages", ["Hinglish"]))
     
     # Build prompt with patterns
@@ -523,40 +526,19 @@ Example: ["message 1", "message 2"]
         "max_tokens": 1000
     }
 
-    try:
-        response = requests.post(VLLM_URL, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        content = data['choices'][0]['message']['content']
-        
-        # Clean markdown
-        content = content.replace("```json", "").replace("```", "").strip()
-        
-        # Extract JSON array
-        match = re.search(r'\[.*\]', content, re.DOTALL)
-        if match:
-            content = match.group()
-        
-        messages = json.loads(content)
-        
-        valid_messages = []
-        for msg in messages:
-            if isinstance(msg, str):
-                clean_msg = msg.strip()
-                
-                if not is_valid_text(clean_msg):
-                    continue
-                
-                normalized = clean_msg.lower().strip()
-                if normalized not in existing_sentences:
-                    valid_messages.append(clean_msg)
-                    existing_sentences.add(normalized)
-        
-        return valid_messages
+    return payload
 
-    except Exception as e:
-        print(f"  Error: {e}")
-        return []
+def accept_message(text, intent):
+    """Keep a generated message? Also records it for later dedup checks."""
+    clean_msg = text.strip()
+    if not is_valid_text(clean_msg):
+        return False
+    
+    normalized = clean_msg.lower().strip()
+    if normalized in existing_sentences:
+        return False
+    existing_sentences.add(normalized)
+    return True
 
 def main():
     print("=" * 60)
@@ -565,64 +547,23 @@ def main():
     print(f"Target: {TARGET_SAMPLES_PER_INTENT} samples per intent")
     print(f"Total intents: {len(INTENTS)}")
     
-    # Load existing if resuming
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    existing_sentences.add(data['text'].lower().strip())
-                except:
-                    pass
-        print(f"Loaded {len(existing_sentences)} existing samples")
-    
-    # Track counts
-    intent_counts = {intent: 0 for intent in INTENTS}
-    
-    # Count existing per intent
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    if data['intent'] in intent_counts:
-                        intent_counts[data['intent']] += 1
-                except:
-                    pass
-    
-    print("\nCurrent counts:", dict(sorted(intent_counts.items())))
-    
-    total_generated = 0
-    
-    with open(OUTPUT_FILE, 'a') as f:
-        for intent, config in INTENTS.items():
-            print(f"\n{'='*50}")
-            print(f"Intent: {intent}")
-            print(f"Current: {intent_counts[intent]}/{TARGET_SAMPLES_PER_INTENT}")
-            
-            attempts = 0
-            max_attempts = 80
-            
-            while intent_counts[intent] < TARGET_SAMPLES_PER_INTENT and attempts < max_attempts:
-                attempts += 1
-                batch = generate_batch(intent, config, count=25)
-                
-                if not batch:
-                    time.sleep(0.5)
-                    continue
-                
-                for text in batch:
-                    if intent_counts[intent] >= TARGET_SAMPLES_PER_INTENT:
-                        break
-                    
-                    entry = {"text": text, "intent": intent}
-                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-                    intent_counts[intent] += 1
-                    total_generated += 1
-                
-                f.flush()
-                print(f"  +{len(batch)} ({intent_counts[intent]}/{TARGET_SAMPLES_PER_INTENT})")
-                time.sleep(0.3)
+    # Concurrent generation, least-filled intent first; resumes from OUTPUT_FILE + checkpoint
+    engine = GenerationEngine(
+        VLLM_URL,
+        build_payload,
+        {intent: TARGET_SAMPLES_PER_INTENT for intent in INTENTS},
+        OUTPUT_FILE,
+        accept_message,
+        concurrency=GEN_CONCURRENCY,
+        batch_size=25,
+        min_batch=25,
+        max_attempts=80,
+    )
+    progress = asyncio.run(engine.run())
+    total_generated = progress["samples"] - engine.resumed_from
+    intent_counts = engine.scheduler.counts
+    if progress["parked"]:
+        print(f"  ⚠️ Stopped early (too many failures/attempts): {progress['parked']}")
 
     print(f"\n{'='*60}")
     print(f"Generation Complete. Total new: {total_generated}")
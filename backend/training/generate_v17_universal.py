@@ -25,20 +25,24 @@ WHY THIS IS BETTER:
 TARGET: 10,000+ unique samples across 18 intents
 """
 
-import requests
 import json
-import time
 import random
+import asyncio
 import os
 import re
-from typing import List, Dict, Any
+import sys
+from typing import Dict, Any
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nlu-training"))
+from dataset_generator import GEN_CONCURRENCY, GenerationEngine
+from near_dedup import NearDupIndex, format_report
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-VLLM_URL = "http://192.168.0.156:8002/v1/chat/completions"
+VLLM_URL = os.environ.get("VLLM_URL", "http://192.168.0.156:8002/v1/chat/completions")
 MODEL_NAME = "Qwen/Qwen2.5-7B-Instruct-AWQ"
 OUTPUT_FILE = "/home/ubuntu/Devs/MangwaleAI/backend/training/synthetic_training_v17_raw.jsonl"
 FINAL_FILE = "/home/ubuntu/Devs/MangwaleAI/backend/training/nlu_v17_universal.jsonl"
@@ -46,6 +50,10 @@ FINAL_FILE = "/home/ubuntu/Devs/MangwaleAI/backend/training/nlu_v17_universal.js
 # Target samples per intent (18 intents × 600 = 10,800 samples)
 TARGET_SAMPLES_PER_INTENT = int(os.environ.get("TARGET_SAMPLES", 600))
 
+# Paraphrases at least this similar to an earlier sample of the same intent are
+# rejected during generation and dropped in the final cleanup (0 disables)
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", 0.85))
+
 # ============================================================================
 # GENERIC PLACEHOLDERS - NLU learns patterns, not specific items
 # ============================================================================
@@ -1165,7 +1173,7 @@ PATTERNS TO LEARN:
 # ============================================================================
 
 existing_sentences = set()
-failed_attempts = defaultdict(int)
+near_duplicates = NearDupIndex(NEAR_DUP_THRESHOLD) if NEAR_DUP_THRESHOLD > 0 else None
 
 def is_valid_text(text: str) -> bool:
     """Validate that text is appropriate for NLU training"""
@@ -1231,9 +1239,9 @@ def normalize_text(text: str) -> str:
 # GENERATION LOGIC
 # ============================================================================
 
-def generate_batch(intent: str, config: dict, count: int = 25) -> List[str]:
-    """Generate training samples for an intent using vLLM"""
-    
+def build_payload(intent: str, count: int = 25) -> Dict[str, Any]:
+    """vLLM request for count training samples of an intent"""
+    config = INTENTS[intent]
     language = random.choice(config.get("languages", ["Hinglish"]))
     
     # Build patterns text
@@ -1290,66 +1298,24 @@ OUTPUT: Return ONLY a JSON array of strings.
         "max_tokens": 1200
     }
 
-    try:
-        response = requests.post(VLLM_URL, json=payload, timeout=45)
-        response.raise_for_status()
-        data = response.json()
-        content = data['choices'][0]['message']['content']
-        
-        # Clean markdown
-        content = content.replace("```json", "").replace("```", "").strip()
-        
-        # Extract JSON array
-        match = re.search(r'\[.*\]', content, re.DOTALL)
-        if match:
-            content = match.group()
-        
-        messages = json.loads(content)
-        
-        valid_messages = []
-        for msg in messages:
-            if isinstance(msg, str):
-                clean_msg = msg.strip()
-                
-                if not is_valid_text(clean_msg):
-                    continue
-                
-                normalized = normalize_text(clean_msg)
-                if len(normalized) < 2:
-                    continue
-                    
-                if normalized not in existing_sentences:
-                    valid_messages.append(clean_msg)
-                    existing_sentences.add(normalized)
-        
-        return valid_messages
-
-    except Exception as e:
-        print(f"  Error: {e}")
-        failed_attempts[intent] += 1
-        return []
+    return payload
 
-def load_existing_data():
-    """Load existing data to resume generation"""
-    intent_counts = defaultdict(int)
+def accept_message(text: str, intent: str) -> bool:
+    """Keep a generated message? Also records it for later dedup checks."""
+    clean_msg = text.strip()
+    if not is_valid_text(clean_msg):
+        return False
     
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    text = data.get('text', '')
-                    intent = data.get('intent', '')
-                    
-                    normalized = normalize_text(text)
-                    existing_sentences.add(normalized)
-                    
-                    if intent in INTENTS:
-                        intent_counts[intent] += 1
-                except:
-                    pass
+    normalized = normalize_text(clean_msg)
+    if len(normalized) < 2:
+        return False
+    if normalized in existing_sentences:
+        return False
+    if near_duplicates and not near_duplicates.add(clean_msg, intent):
+        return False
     
-    return intent_counts
+    existing_sentences.add(normalized)
+    return True
 
 def main():
     print("=" * 70)
@@ -1372,61 +1338,23 @@ def main():
     print("Weighted targets:", dict(sorted(targets.items(), key=lambda x: -x[1])))
     print()
     
-    # Load existing
-    intent_counts = load_existing_data()
-    print(f"Loaded {len(existing_sentences)} existing samples")
-    print("Current counts:", dict(sorted(intent_counts.items())))
-    print()
-    
-    total_generated = 0
-    
-    with open(OUTPUT_FILE, 'a', encoding='utf-8') as f:
-        for intent, config in INTENTS.items():
-            target = targets[intent]
-            current = intent_counts[intent]
-            
-            print(f"\n{'='*60}")
-            print(f"Intent: {intent}")
-            print(f"Progress: {current}/{target} (weight: {config.get('weight', 1.0)})")
-            
-            if current >= target:
-                print(f"  ✅ Already complete!")
-                continue
-            
-            attempts = 0
-            max_attempts = 100
-            consecutive_failures = 0
-            
-            while intent_counts[intent] < target and attempts < max_attempts:
-                attempts += 1
-                
-                needed = target - intent_counts[intent]
-                batch_size = min(30, max(10, needed))
-                
-                batch = generate_batch(intent, config, count=batch_size)
-                
-                if not batch:
-                    consecutive_failures += 1
-                    if consecutive_failures > 5:
-                        print(f"  ⚠️ Too many failures, moving on...")
-                        break
-                    time.sleep(0.5)
-                    continue
-                
-                consecutive_failures = 0
-                
-                for text in batch:
-                    if intent_counts[intent] >= target:
-                        break
-                    
-                    entry = {"text": text, "intent": intent}
-                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-                    intent_counts[intent] += 1
-                    total_generated += 1
-                
-                f.flush()
-                print(f"  +{len(batch)} → {intent_counts[intent]}/{target}")
-                time.sleep(0.2)
+    # Concurrent generation, least-filled intent first; resumes from OUTPUT_FILE + checkpoint
+    engine = GenerationEngine(
+        VLLM_URL,
+        build_payload,
+        targets,
+        OUTPUT_FILE,
+        accept_message,
+        concurrency=GEN_CONCURRENCY,
+        batch_size=30,
+        min_batch=10,
+        max_attempts=100,
+        max_consecutive_failures=5,
+    )
+    progress = asyncio.run(engine.run())
+    total_generated = progress["samples"] - engine.resumed_from
+    if progress["parked"]:
+        print(f"  ⚠️ Stopped early (too many failures/attempts): {progress['parked']}")
 
     print(f"\n{'='*70}")
     print(f"Generation Complete!")
@@ -1438,6 +1366,7 @@ def main():
     
     final_data = []
     seen = set()
+    final_near_dups = NearDupIndex(NEAR_DUP_THRESHOLD) if NEAR_DUP_THRESHOLD > 0 else None
     
     with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
         for line in f:
@@ -1452,12 +1381,20 @@ def main():
                     continue
                 
                 key = f"{normalize_text(text)}_{intent}"
-                if key not in seen:
-                    final_data.append(obj)
-                    seen.add(key)
+                if key in seen:
+                    continue
+                if final_near_dups and not final_near_dups.add(text, intent):
+                    continue
+                final_data.append(obj)
+                seen.add(key)
             except:
                 pass
     
+    if final_near_dups:
+        print(format_report("Near-dedup", final_near_dups.stats()))
+    if near_duplicates:
+        print(f"Near-duplicates rejected during generation: {near_duplicates.near_duplicates}")
+    
     # Shuffle for training
     random.shuffle(final_data)
     
@@ -6,6 +6,13 @@ Models:
 - general: all-MiniLM-L6-v2 (384 dimensions, fast, lightweight)
 - food: jonny9f/food_embeddings (768 dimensions, food-optimized, 99.1% pearson)
 
+Projections:
+- Reduced/quantized vectors fit by sync-mysql-with-vectors.py (--reduce-dim)
+  are loaded from PROJECTIONS_DIR; pass {"projection": "<index>"} so query
+  vectors match the *_reduced index fields. The name resolves to the version
+  the index was built with and is reloaded when a re-sync publishes a new one;
+  the response names the version used.
+
 Port: 3101
 """
 
@@ -13,10 +20,11 @@ from sentence_transformers import SentenceTransformer
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uvicorn
 import logging
 import os
+from vector_projection import ProjectionCache, VectorProjection
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -74,11 +82,25 @@ if LOAD_FOOD_MODEL:
 
 logger.info(f"✅ {len(models)} models loaded successfully")
 
+# Projections are loaded lazily; the cache reloads one when its version changes
+projections = ProjectionCache()
+
+
+def get_projection(name: str) -> Tuple[str, VectorProjection]:
+    """(version, projection) for an index/alias or version name"""
+    if not name.replace("_", "").replace("-", "").isalnum():
+        raise HTTPException(status_code=400, detail=f"Invalid projection name: {name}")
+    try:
+        return projections.get(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Projection not found: {name}")
+
 # Request/Response models
 class EmbedRequest(BaseModel):
     texts: List[str]
     normalize: bool = True
     model_type: Optional[str] = "general"  # "general" or "food"
+    projection: Optional[str] = None  # e.g. "food_items_v4" for *_reduced fields
 
 class EmbedResponse(BaseModel):
     embeddings: List[List[float]]
@@ -86,6 +108,8 @@ class EmbedResponse(BaseModel):
     model: str
     model_type: str
     count: int
+    projection: Optional[str] = None
+    projection_version: Optional[str] = None
 
 class HealthResponse(BaseModel):
     ok: bool
@@ -130,6 +154,17 @@ async def embed_texts(request: EmbedRequest):
             show_progress_bar=False
         )
         
+        # Apply catalog projection (same transform as the indexed *_reduced fields)
+        projection_version = None
+        if request.projection:
+            projection_version, projection = get_projection(request.projection)
+            if projection.input_dim != embeddings.shape[1]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Projection '{request.projection}' expects {projection.input_dim}-dim {model_type} embeddings"
+                )
+            embeddings = projection.apply(embeddings)
+        
         # Convert to list
         embeddings_list = embeddings.tolist()
         
@@ -140,9 +175,13 @@ async def embed_texts(request: EmbedRequest):
             "dimensions": len(embeddings_list[0]) if embeddings_list else 0,
             "model": model_config["name"],
             "model_type": model_type,
-            "count": len(embeddings_list)
+            "count": len(embeddings_list),
+            "projection": request.projection,
+            "projection_version": projection_version
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Embedding error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
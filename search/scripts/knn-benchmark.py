@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""
+k-NN benchmark and HNSW parameter tuner for the food indices.
+
+Builds candidate OpenSearch indices with different k-NN engines and HNSW
+parameters, runs a fixed semantic query set against each of them and reports
+recall@k vs exact brute-force search, p50/p95 latency and index size.
+
+Vectors are copied from an existing vector index (default: food_items_v4 /
+item_vector) so the benchmark measures exactly what production serves.
+Queries are the semantic/food queries from comprehensive_test.py embedded
+with the same food model used by sync-mysql-with-vectors.py.
+
+Reduced/quantized vectors (--projection, or --reduce-dim to fit one here) are
+benchmarked side by side with the full 768-dim vectors. Ground truth is always
+exact search on the full vectors, so recall shows what the reduction costs.
+
+Designed to run against a local single-node OpenSearch container:
+
+    docker run -d --name knn-bench -p 9200:9200 \\
+      -e discovery.type=single-node -e DISABLE_SECURITY_PLUGIN=true \\
+      opensearchproject/opensearch:2.16.0
+
+ef_search: nmslib reads it from the index setting; faiss and lucene take it
+per query (method_parameters), which needs OpenSearch >= 2.16. On older
+servers (the compose files run 2.11 / 2.13) faiss and lucene are measured
+once at their built-in default and the --ef-search sweep only applies to
+nmslib.
+
+Results are rewritten to --output after every measured configuration, and
+a configuration that fails is recorded with its error, so an interrupted
+or partly failing run keeps what it measured.
+
+IMPORTANT: Only indices prefixed with KNN_BENCH_PREFIX are created/deleted.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from vector_projection import VectorProjection
+
+# Configuration
+OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "http://localhost:9200")
+SOURCE_OPENSEARCH_URL = os.getenv("SOURCE_OPENSEARCH_URL", OPENSEARCH_URL)
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "http://localhost:3101")
+
+KNN_BENCH_PREFIX = "knn_bench_"
+SOURCE_INDEX = "food_items_v4"
+VECTOR_FIELD = "item_vector"
+DIMENSION = 768
+BATCH_SIZE = 500
+PQ_TRAIN_TIMEOUT = 600
+# First release with per-query method_parameters (ef_search) for faiss/lucene
+QUERY_EF_SEARCH_VERSION = (2, 16)
+
+# Query set - semantic + food queries from comprehensive_test.py
+SEMANTIC_QUERIES = [
+    "spicy dinner options", "healthy breakfast", "kids toys", "running shoes for men",
+    "birthday gift ideas", "sweet desserts", "cold beverages", "party wear",
+    "home decoration", "cleaning supplies"
+]
+FOOD_QUERIES = ["pizza", "burger", "biryani", "cake", "pasta", "salad", "thali", "coffee", "tea", "sandwich"]
+BENCHMARK_QUERIES = SEMANTIC_QUERIES + FOOD_QUERIES
+
+# Default search space (current production: nmslib, m=16, ef_construction=128)
+DEFAULT_ENGINES = ["nmslib", "faiss", "lucene"]
+DEFAULT_M = [16]
+DEFAULT_EF_CONSTRUCTION = [128]
+DEFAULT_EF_SEARCH = [100]
+
+# Space type per engine. Vectors are L2-normalized before indexing, so
+# innerproduct on faiss ranks identically to cosinesimil.
+SPACE_TYPES = {
+    "nmslib": "cosinesimil",
+    "faiss": "innerproduct",
+    "lucene": "cosinesimil",
+}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile helper that tolerates empty lists"""
+    if not values:
+        return 0.0
+    return float(np.percentile(values, pct))
+
+
+class KNNBenchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.doc_ids: List[str] = []
+        self.doc_vectors: Optional[np.ndarray] = None
+        self.query_texts: List[str] = []
+        self.query_vectors: Optional[np.ndarray] = None
+        self.ground_truth: List[List[str]] = []
+        self.projection: Optional[VectorProjection] = None
+        self.projection_exact_recall: Optional[float] = None
+        self.server_version: Tuple[int, ...] = ()
+        self.results: List[Dict] = []
+
+    # ------------------------------------------------------------------
+    # Data loading
+    # ------------------------------------------------------------------
+    def load_server_version(self):
+        response = requests.get(f"{OPENSEARCH_URL}/", timeout=10)
+        response.raise_for_status()
+        number = response.json().get("version", {}).get("number", "0")
+        self.server_version = tuple(int(p) for p in number.split("-")[0].split(".") if p.isdigit())
+        print(f"🔖 Benchmark cluster: OpenSearch {number}")
+        if self.server_version < QUERY_EF_SEARCH_VERSION:
+            tuned = [e for e in self.args.engines if e != "nmslib"]
+            if tuned:
+                print(f"⚠️  ef_search per query needs OpenSearch >= 2.16: {', '.join(tuned)} "
+                      f"measured at their default ef_search only")
+
+    def load_vectors(self):
+        """Scroll vectors out of the source index"""
+        ids, vectors = [], []
+        response = requests.post(
+            f"{SOURCE_OPENSEARCH_URL}/{self.args.source_index}/_search?scroll=5m",
+            json={
+                "size": BATCH_SIZE,
+                "query": {"exists": {"field": self.args.field}},
+                "_source": [self.args.field]
+            },
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        data = response.json()
+        scroll_id = data.get("_scroll_id")
+        hits = data.get("hits", {}).get("hits", [])
+
+        while hits and len(ids) < self.args.max_docs:
+            for hit in hits:
+                vec = hit.get("_source", {}).get(self.args.field)
+                if vec and len(vec) == DIMENSION and any(vec):
+                    ids.append(hit["_id"])
+                    vectors.append(vec)
+            response = requests.post(
+                f"{SOURCE_OPENSEARCH_URL}/_search/scroll",
+                json={"scroll": "5m", "scroll_id": scroll_id},
+                headers={"Content-Type": "application/json"}
+            )
+            if response.status_code != 200:
+                break
+            data = response.json()
+            scroll_id = data.get("_scroll_id")
+            hits = data.get("hits", {}).get("hits", [])
+
+        if scroll_id:
+            requests.delete(f"{SOURCE_OPENSEARCH_URL}/_search/scroll", json={"scroll_id": scroll_id})
+
+        self.doc_ids = ids[:self.args.max_docs]
+        self.doc_vectors = normalize(np.asarray(vectors[:self.args.max_docs], dtype=np.float32))
+        print(f"📊 Loaded {len(self.doc_ids):,} vectors from {self.args.source_index}.{self.args.field}")
+
+    def load_queries(self):
+        """Embed the benchmark queries with the food model"""
+        self.query_texts = BENCHMARK_QUERIES
+        response = requests.post(
+            f"{EMBEDDING_SERVICE_URL}/embed",
+            json={"texts": self.query_texts, "model_type": "food"},
+            timeout=60
+        )
+        response.raise_for_status()
+        self.query_vectors = normalize(np.asarray(response.json()["embeddings"], dtype=np.float32))
+        print(f"🔍 Embedded {len(self.query_texts)} benchmark queries")
+
+    def compute_ground_truth(self):
+        """Exact brute-force top-k by cosine similarity"""
+        k = self.args.k
+        scores = self.query_vectors @ self.doc_vectors.T
+        top = np.argsort(-scores, axis=1)[:, :k]
+        self.ground_truth = [[self.doc_ids[i] for i in row] for row in top]
+        print(f"✅ Computed exact top-{k} for {len(self.query_texts)} queries")
+
+    def load_projection(self):
+        """Load a saved projection or fit one on the benchmark vectors"""
+        if self.args.projection:
+            self.projection = VectorProjection.load(self.args.projection)
+            label = self.args.projection
+        elif self.args.reduce_dim:
+            self.projection = VectorProjection.fit(
+                self.doc_vectors, self.args.reduce_dim,
+                method=self.args.reduction, quantize=self.args.quantize
+            )
+            label = f"{self.args.reduction}-{self.args.reduce_dim} (fit on benchmark vectors)"
+        else:
+            return
+
+        # Brute-force recall in the reduced space = ceiling for any HNSW on it
+        k = self.args.k
+        docs = self.projection.apply(self.doc_vectors).astype(np.float32)
+        queries = self.projection.apply(self.query_vectors).astype(np.float32)
+        top = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+        recalls = [
+            len({self.doc_ids[i] for i in row} & set(truth)) / k
+            for row, truth in zip(top, self.ground_truth)
+        ]
+        self.projection_exact_recall = round(float(np.mean(recalls)), 4)
+        kind = "byte" if self.projection.quantize else "float"
+        print(f"📉 Projection {label}: {self.projection.output_dim}-dim {kind}, "
+              f"exact recall@{k} vs full 768-dim = {self.projection_exact_recall:.4f}")
+
+    # ------------------------------------------------------------------
+    # Index management
+    # ------------------------------------------------------------------
+    def index_name(self, engine: str, m: int, ef_construction: int, pq_m: Optional[int], variant: str) -> str:
+        name = f"{KNN_BENCH_PREFIX}{engine}_m{m}_efc{ef_construction}"
+        if pq_m:
+            name += f"_pq{pq_m}"
+        if variant != "full":
+            name += f"_{variant}"
+        return name
+
+    def variant_vectors(self, variant: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc vectors, query vectors) for a variant"""
+        if variant == "full":
+            return self.doc_vectors, self.query_vectors
+        return self.projection.apply(self.doc_vectors), self.projection.apply(self.query_vectors)
+
+    def delete_index(self, name: str):
+        if not name.startswith(KNN_BENCH_PREFIX):
+            raise ValueError(f"Refusing to delete non-benchmark index: {name}")
+        requests.delete(f"{OPENSEARCH_URL}/{name}")
+
+    def bulk_load(self, name: str, vectors: np.ndarray):
+        """Bulk index the benchmark vectors into an index"""
+        for i in range(0, len(self.doc_ids), BATCH_SIZE):
+            bulk_body = []
+            for doc_id, vec in zip(self.doc_ids[i:i + BATCH_SIZE], vectors[i:i + BATCH_SIZE]):
+                bulk_body.append(json.dumps({"index": {"_index": name, "_id": doc_id}}))
+                bulk_body.append(json.dumps({self.args.field: vec.tolist()}))
+            response = requests.post(
+                f"{OPENSEARCH_URL}/_bulk",
+                data="\n".join(bulk_body) + "\n",
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=120
+            )
+            response.raise_for_status()
+            if response.json().get("errors"):
+                raise RuntimeError(f"Bulk indexing errors in {name}")
+
+    def train_pq_model(self, m: int, ef_construction: int, pq_m: int) -> str:
+        """Train a faiss HNSW+PQ model on the benchmark vectors"""
+        training_index = f"{KNN_BENCH_PREFIX}pq_training"
+        self.delete_index(training_index)
+        requests.put(
+            f"{OPENSEARCH_URL}/{training_index}",
+            json={
+                "settings": {"number_of_shards": 1, "number_of_replicas": 0},
+                "mappings": {"properties": {self.args.field: {"type": "knn_vector", "dimension": DIMENSION}}}
+            }
+        ).raise_for_status()
+        self.bulk_load(training_index, self.doc_vectors)
+        requests.post(f"{OPENSEARCH_URL}/{training_index}/_refresh")
+
+        model_id = f"{KNN_BENCH_PREFIX}pq_m{m}_efc{ef_construction}_pq{pq_m}"
+        requests.delete(f"{OPENSEARCH_URL}/_plugins/_knn/models/{model_id}")
+        response = requests.post(
+            f"{OPENSEARCH_URL}/_plugins/_knn/models/{model_id}/_train",
+            json={
+                "training_index": training_index,
+                "training_field": self.args.field,
+                "dimension": DIMENSION,
+                "description": "knn-benchmark HNSW+PQ",
+                "method": {
+                    "name": "hnsw",
+                    "engine": "faiss",
+                    "space_type": SPACE_TYPES["faiss"],
+                    "parameters": {
+                        "m": m,
+                        "ef_construction": ef_construction,
+                        "encoder": {"name": "pq", "parameters": {"m": pq_m, "code_size": 8}}
+                    }
+                }
+            }
+        )
+        response.raise_for_status()
+
+        deadline = time.time() + PQ_TRAIN_TIMEOUT
+        while time.time() < deadline:
+            state = requests.get(f"{OPENSEARCH_URL}/_plugins/_knn/models/{model_id}").json().get("state")
+            if state == "created":
+                break
+            if state == "failed":
+                raise RuntimeError(f"PQ model training failed: {model_id}")
+            time.sleep(2)
+        else:
+            raise TimeoutError(f"PQ model training timed out: {model_id}")
+
+        self.delete_index(training_index)
+        return model_id
+
+    def create_index(self, name: str, engine: str, m: int, ef_construction: int, pq_m: Optional[int],
+                     vectors: np.ndarray):
+        """Create a single-shard candidate index and load the vectors"""
+        self.delete_index(name)
+
+        if pq_m:
+            field_mapping = {"type": "knn_vector", "model_id": self.train_pq_model(m, ef_construction, pq_m)}
+        else:
+            field_mapping = {
+                "type": "knn_vector",
+                "dimension": int(vectors.shape[1]),
+                "method": {
+                    "name": "hnsw",
+                    "space_type": SPACE_TYPES[engine],
+                    "engine": engine,
+                    "parameters": {"ef_construction": ef_construction, "m": m}
+                }
+            }
+            if vectors.dtype == np.int8:
+                field_mapping["data_type"] = "byte"
+
+        response = requests.put(
+            f"{OPENSEARCH_URL}/{name}",
+            json={
+                "settings": {
+                    "index": {
+                        "knn": True,
+                        "number_of_shards": 1,
+                        "number_of_replicas": 0,
+                        "refresh_interval": "-1"
+                    }
+                },
+                "mappings": {"properties": {self.args.field: field_mapping}}
+            },
+            headers={"Content-Type": "application/json"}
+        )
+        if response.status_code not in [200, 201]:
+            raise RuntimeError(f"Failed to create {name}: {response.text}")
+
+        start = time.time()
+        self.bulk_load(name, vectors)
+        requests.put(f"{OPENSEARCH_URL}/{name}/_settings", json={"index": {"refresh_interval": "1s"}})
+        requests.post(f"{OPENSEARCH_URL}/{name}/_refresh")
+        # One segment per index so graph count does not skew latency between candidates
+        requests.post(f"{OPENSEARCH_URL}/{name}/_forcemerge?max_num_segments=1", timeout=PQ_TRAIN_TIMEOUT)
+        build_time = time.time() - start
+
+        requests.get(f"{OPENSEARCH_URL}/_plugins/_knn/warmup/{name}")
+        return build_time
+
+    def index_size_bytes(self, name: str) -> int:
+        response = requests.get(f"{OPENSEARCH_URL}/_cat/indices/{name}?format=json&bytes=b")
+        if response.status_code != 200:
+            return 0
+        rows = response.json()
+        return int(rows[0].get("store.size", 0)) if rows else 0
+
+    def graph_memory_kb(self) -> int:
+        """Native k-NN graph memory across nodes (nmslib/faiss only)"""
+        response = requests.get(f"{OPENSEARCH_URL}/_plugins/_knn/stats")
+        if response.status_code != 200:
+            return 0
+        nodes = response.json().get("nodes", {})
+        return sum(int(n.get("graph_memory_usage", 0)) for n in nodes.values())
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def ef_search_values(self, engine: str) -> List[Optional[int]]:
+        """ef_search settings to measure; None = the engine's default (not tunable here)"""
+        if engine == "nmslib" or self.server_version >= QUERY_EF_SEARCH_VERSION:
+            return list(self.args.ef_search)
+        return [None]
+
+    def set_ef_search(self, name: str, engine: str, ef_search: Optional[int]):
+        # Only nmslib reads the index setting; faiss/lucene take method_parameters per query
+        if engine == "nmslib":
+            requests.put(
+                f"{OPENSEARCH_URL}/{name}/_settings",
+                json={"index": {"knn.algo_param.ef_search": ef_search}}
+            ).raise_for_status()
+
+    def search(self, name: str, engine: str, vector: np.ndarray,
+               ef_search: Optional[int]) -> Tuple[List[str], float, int]:
+        k = self.args.k
+        knn_query = {"vector": vector.tolist(), "k": k}
+        if engine != "nmslib" and ef_search is not None:
+            knn_query["method_parameters"] = {"ef_search": ef_search}
+        start = time.perf_counter()
+        response = requests.post(
+            f"{OPENSEARCH_URL}/{name}/_search",
+            json={"size": k, "_source": False, "query": {"knn": {self.args.field: knn_query}}},
+            headers={"Content-Type": "application/json"}
+        )
+        latency_ms = (time.perf_counter() - start) * 1000
+        response.raise_for_status()
+        data = response.json()
+        ids = [hit["_id"] for hit in data.get("hits", {}).get("hits", [])]
+        return ids, latency_ms, data.get("took", 0)
+
+    def run_candidate(self, name: str, engine: str, ef_search: Optional[int], query_vectors: np.ndarray) -> Dict:
+        self.set_ef_search(name, engine, ef_search)
+        k = self.args.k
+
+        # Warm-up pass (not measured)
+        for vec in query_vectors:
+            self.search(name, engine, vec, ef_search)
+
+        recalls, latencies, took = [], [], []
+        for _ in range(self.args.repeat):
+            for vec, truth in zip(query_vectors, self.ground_truth):
+                ids, latency_ms, took_ms = self.search(name, engine, vec, ef_search)
+                recalls.append(len(set(ids) & set(truth)) / k)
+                latencies.append(latency_ms)
+                took.append(took_ms)
+
+        return {
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "latency_p50_ms": round(percentile(latencies, 50), 2),
+            "latency_p95_ms": round(percentile(latencies, 95), 2),
+            "server_took_p50_ms": round(percentile(took, 50), 2),
+            "server_took_p95_ms": round(percentile(took, 95), 2),
+        }
+
+    # ------------------------------------------------------------------
+    # Driver
+    # ------------------------------------------------------------------
+    def candidates(self):
+        pq_options = [None] + (self.args.pq_m or [])
+        variants = ["full"] + (["reduced"] if self.projection else [])
+        for variant, engine, m, ef_construction, pq_m in itertools.product(
+            variants, self.args.engines, self.args.m, self.args.ef_construction, pq_options
+        ):
+            # PQ is only available through faiss trained models on full vectors
+            if pq_m and (engine != "faiss" or variant != "full"):
+                continue
+            # Byte vectors are only supported by the lucene engine
+            if variant == "reduced" and self.projection.quantize and engine != "lucene":
+                continue
+            yield variant, engine, m, ef_construction, pq_m
+
+    def print_report(self):
+        k = self.args.k
+        print("\n" + "=" * 110)
+        print(f"  k-NN BENCHMARK RESULTS ({len(self.doc_ids):,} docs, {len(self.query_texts)} queries, k={k})")
+        print("=" * 110)
+        print(f"{'variant':<8} {'engine':<8} {'m':>4} {'ef_c':>5} {'pq':>4} {'ef_s':>5} "
+              f"{'recall@' + str(k):>10} {'p50 ms':>8} {'p95 ms':>8} {'size MB':>9} {'graph MB':>9} {'build s':>8}")
+        print("-" * 110)
+        measured = [r for r in self.results if "error" not in r]
+        for r in sorted(measured, key=lambda x: (-x["recall_at_k"], x["latency_p95_ms"])):
+            print(f"{r['variant']:<8} {r['engine']:<8} {r['m']:>4} {r['ef_construction']:>5} {r['pq_m'] or '-':>4} {r['ef_search'] or 'def':>5} "
+                  f"{r['recall_at_k']:>10.4f} {r['latency_p50_ms']:>8.2f} {r['latency_p95_ms']:>8.2f} "
+                  f"{r['index_size_bytes'] / 1024 / 1024:>9.1f} {r['graph_memory_kb'] / 1024:>9.1f} {r['build_time_s']:>8.1f}")
+        print("=" * 110)
+        for r in self.results:
+            if "error" in r:
+                print(f"❌ {r['index']} ef_search={r['ef_search']}: {r['error']}")
+
+    def write_results(self):
+        """Rewrite the results file (called after every configuration)"""
+        tmp = f"{self.args.output}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "source_index": self.args.source_index,
+                "field": self.args.field,
+                "server_version": ".".join(map(str, self.server_version)),
+                "docs": len(self.doc_ids),
+                "queries": self.query_texts,
+                "k": self.args.k,
+                "projection": self.projection.metadata() if self.projection else None,
+                "projection_exact_recall": self.projection_exact_recall,
+                "results": self.results
+            }, f, indent=2)
+        os.replace(tmp, self.args.output)
+
+    def run(self):
+        print("=" * 70)
+        print("  Mangwale AI - k-NN Benchmark / HNSW Tuner")
+        print("=" * 70)
+        print(f"📖 Source: {SOURCE_OPENSEARCH_URL}/{self.args.source_index}.{self.args.field}")
+        print(f"📝 Benchmark cluster: {OPENSEARCH_URL}")
+        print(f"🎯 Engines: {', '.join(self.args.engines)} | m: {self.args.m} | "
+              f"ef_construction: {self.args.ef_construction} | ef_search: {self.args.ef_search}")
+        print("=" * 70)
+
+        self.load_server_version()
+        self.load_vectors()
+        if not self.doc_ids:
+            print("❌ No vectors found in source index")
+            return
+        self.load_queries()
+        self.compute_ground_truth()
+        self.load_projection()
+
+        for variant, engine, m, ef_construction, pq_m in self.candidates():
+            name = self.index_name(engine, m, ef_construction, pq_m, variant)
+            doc_vectors, query_vectors = self.variant_vectors(variant)
+            config = {
+                "variant": variant,
+                "dimension": int(doc_vectors.shape[1]),
+                "data_type": "byte" if doc_vectors.dtype == np.int8 else "float",
+                "engine": engine,
+                "m": m,
+                "ef_construction": ef_construction,
+                "pq_m": pq_m,
+                "index": name,
+            }
+            print(f"\n🏗️  Building {name}...")
+            try:
+                graph_before = self.graph_memory_kb()
+                build_time = self.create_index(name, engine, m, ef_construction, pq_m, doc_vectors)
+                size = self.index_size_bytes(name)
+                graph_kb = max(0, self.graph_memory_kb() - graph_before)
+            except Exception as e:
+                print(f"❌ Failed to build {name}: {e}")
+                self.results.append({**config, "ef_search": None, "error": f"build: {e}"})
+                self.write_results()
+                continue
+
+            for ef_search in self.ef_search_values(engine):
+                try:
+                    stats = self.run_candidate(name, engine, ef_search, query_vectors)
+                except Exception as e:
+                    print(f"   ❌ ef_search={ef_search}: {e}")
+                    self.results.append({**config, "ef_search": ef_search, "error": f"search: {e}"})
+                    self.write_results()
+                    continue
+                self.results.append({
+                    **config,
+                    "ef_search": ef_search,
+                    "index_size_bytes": size,
+                    "graph_memory_kb": graph_kb,
+                    "build_time_s": round(build_time, 2),
+                    **stats
+                })
+                self.write_results()
+                print(f"   ef_search={ef_search or 'default'}: recall@{self.args.k}={stats['recall_at_k']:.4f} "
+                      f"p50={stats['latency_p50_ms']:.2f}ms p95={stats['latency_p95_ms']:.2f}ms")
+
+            if not self.args.keep_indices:
+                self.delete_index(name)
+
+        self.print_report()
+        self.write_results()
+        print(f"💾 Results written to {self.args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark k-NN engines and HNSW parameters for the food indices",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Compare engines at production parameters
+  python knn-benchmark.py
+
+  # Recall of 256-dim PCA and byte-quantized vectors vs full 768-dim
+  python knn-benchmark.py --engines lucene --reduce-dim 256
+  python knn-benchmark.py --engines lucene --reduce-dim 256 --quantize
+  python knn-benchmark.py --projection food_items_v4
+
+  # Sweep HNSW parameters on faiss, including PQ
+  python knn-benchmark.py --engines faiss --m 8 16 32 --ef-construction 64 128 256 \\
+      --ef-search 32 64 128 256 --pq-m 16 32
+        """
+    )
+    parser.add_argument("--source-index", default=SOURCE_INDEX, help="Index to copy vectors from")
+    parser.add_argument("--field", default=VECTOR_FIELD,
+                        choices=["item_vector", "store_item_vector", "store_vector"],
+                        help="Vector field to benchmark")
+    parser.add_argument("--max-docs", type=int, default=20000, help="Maximum vectors to copy")
+    parser.add_argument("--engines", nargs="+", default=DEFAULT_ENGINES, choices=DEFAULT_ENGINES)
+    parser.add_argument("--m", nargs="+", type=int, default=DEFAULT_M)
+    parser.add_argument("--ef-construction", nargs="+", type=int, default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument("--ef-search", nargs="+", type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--pq-m", nargs="*", type=int, default=[],
+                        help="Faiss PQ sub-quantizers (must divide 768); enables HNSW+PQ candidates")
+    parser.add_argument("--projection", default=None,
+                        help="Saved projection name (e.g. food_items_v4) to compare against full vectors")
+    parser.add_argument("--reduce-dim", type=int, default=None,
+                        help="Fit a projection with this many dims on the benchmark vectors")
+    parser.add_argument("--reduction", choices=["pca", "matryoshka"], default="pca")
+    parser.add_argument("--quantize", action="store_true", help="Byte-quantize the fitted projection")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query (recall@k)")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured passes over the query set")
+    parser.add_argument("--keep-indices", action="store_true", help="Keep candidate indices after benchmarking")
+    parser.add_argument("--output", default="knn_benchmark_results.json", help="JSON results file")
+
+    args = parser.parse_args()
+
+    for pq_m in args.pq_m:
+        if DIMENSION % pq_m != 0:
+            parser.error(f"--pq-m {pq_m} must divide {DIMENSION}")
+
+    KNNBenchmark(args).run()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -7,6 +7,22 @@ This script:
 3. Creates enriched fields (price_category, popularity_score, etc.)
 4. Indexes to OpenSearch with full data for AI search
 
+Optional reduced/quantized vectors (--reduce-dim, --quantize):
+    A PCA or Matryoshka projection is fit on the catalog embeddings, saved as
+    projections/<TARGET_INDEX>-<timestamp>.{npz,json} and recorded in the index
+    _meta. Once the index is created, projections/<TARGET_INDEX>.current (and
+    <INDEX_ALIAS>.current if the alias points at the index) names that version.
+    Projected vectors are written to item_vector_reduced, store_item_vector_reduced
+    and store_vector_reduced; items whose embedding failed (zero vectors) get
+    none. The embedding service applies the same projection at query time via
+    {"projection": "<TARGET_INDEX>"} and reloads it after a re-sync.
+    The catalog embeddings are spooled to a temporary directory between the
+    fit and indexing, so memory holds only the fit sample.
+
+Local ANN snapshot: with ANN_SNAPSHOT_DIR (or --ann-snapshot-dir) set, the
+sync finishes by building and publishing a new snapshot of the index for
+the in-process ANN fast path (backend/nlu-training/local_ann_index.py build).
+
 IMPORTANT: This script ONLY READS from MySQL. All writes are to OpenSearch only.
 """
 
@@ -15,6 +31,11 @@ import requests
 import json
 import os
 import time
+import copy
+import random
+import subprocess
+import sys
+import tempfile
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 from decimal import Decimal
@@ -22,6 +43,11 @@ from decimal import Decimal
 # Configuration
 OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "http://localhost:9200")
 EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "http://localhost:3101")
+ANN_SNAPSHOT_DIR = os.getenv("ANN_SNAPSHOT_DIR")
+LOCAL_ANN_BUILDER = os.getenv(
+    "LOCAL_ANN_BUILDER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend", "nlu-training", "local_ann_index.py")
+)
 
 # MySQL configuration - local Docker or production
 MYSQL_CONFIG = {
@@ -33,9 +59,12 @@ MYSQL_CONFIG = {
 }
 
 TARGET_INDEX = "food_items_v4"
+INDEX_ALIAS = "food_items"
 MODEL_TYPE = "food"  # 768-dim food embeddings
 BATCH_SIZE = 100
 MAX_EMBEDDING_BATCH = 50
+VECTOR_FIELDS = ["item_vector", "store_item_vector", "store_vector"]
+PROJECTION_FIT_SAMPLE = 50000  # Max vectors used to fit the projection
 
 # Complete index mapping with ALL fields for Mangwale AI
 INDEX_MAPPING = {
@@ -400,12 +429,23 @@ ORDER BY i.id
 
 
 class MangwaleAISync:
-    def __init__(self):
+    def __init__(self, reduce_dim: Optional[int] = None, reduction: str = "pca",
+                 quantize: bool = False, drop_full: bool = False,
+                 ann_snapshot_dir: Optional[str] = ANN_SNAPSHOT_DIR):
         self.processed_count = 0
         self.error_count = 0
         self.start_time = time.time()
         self.conn = None
         
+        # Reduced/quantized vector options
+        self.reduce_dim = reduce_dim
+        self.reduction = reduction
+        self.quantize = quantize
+        self.drop_full = drop_full
+        self.projection = None
+        self.projection_version = None
+        self.ann_snapshot_dir = ann_snapshot_dir
+        
     def connect_mysql(self):
         """Connect to MySQL database"""
         try:
@@ -440,19 +480,85 @@ class MangwaleAISync:
             print(f"⚠️  Index {TARGET_INDEX} exists. Deleting...")
             requests.delete(f"{OPENSEARCH_URL}/{TARGET_INDEX}")
         
+        mapping = self.build_index_mapping()
         response = requests.put(
             f"{OPENSEARCH_URL}/{TARGET_INDEX}",
-            json=INDEX_MAPPING,
+            json=mapping,
             headers={"Content-Type": "application/json"}
         )
         
         if response.status_code in [200, 201]:
             print(f"✅ Created index {TARGET_INDEX} with 768-dim KNN support")
+            if self.projection:
+                kind = "byte" if self.quantize else "float"
+                print(f"✅ Added {self.projection.output_dim}-dim {kind} *_reduced vector fields")
             return True
         else:
             print(f"❌ Failed to create index: {response.text}")
             return False
     
+    def build_index_mapping(self) -> Dict:
+        """INDEX_MAPPING plus reduced vector fields when a projection is active"""
+        if not self.projection:
+            return INDEX_MAPPING
+        
+        mapping = copy.deepcopy(INDEX_MAPPING)
+        properties = mapping["mappings"]["properties"]
+        for field in VECTOR_FIELDS:
+            properties[f"{field}_reduced"] = self.projection.knn_field_mapping()
+            if self.drop_full:
+                del properties[field]
+        mapping["mappings"]["_meta"] = {
+            "vector_projection": {"name": self.projection_version, **self.projection.metadata()}
+        }
+        return mapping
+    
+    def fit_projection(self, sample, seen: int):
+        """Fit the PCA/Matryoshka projection on sampled catalog vectors and save it as a new version"""
+        from vector_projection import VectorProjection
+        
+        self.projection = VectorProjection.fit(
+            sample,
+            self.reduce_dim,
+            method=self.reduction,
+            quantize=self.quantize
+        )
+        self.projection_version = f"{TARGET_INDEX}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        path = self.projection.save(self.projection_version)
+        
+        variance = self.projection.explained_variance
+        variance_str = f", explained variance {variance:.1%}" if variance is not None else ""
+        print(f"✅ Fit {self.reduction} projection 768 -> {self.reduce_dim} on {len(sample):,} of {seen:,} vectors{variance_str}")
+        print(f"💾 Projection saved: {path}")
+    
+    def publish_projection(self):
+        """Point the index name (and the alias, if it serves this index) at the new version"""
+        from vector_projection import publish
+        
+        names = [TARGET_INDEX]
+        if self.alias_serves_target():
+            names.append(INDEX_ALIAS)
+        for name in names:
+            publish(name, self.projection_version)
+        print(f"📌 Projection {self.projection_version} published for {', '.join(names)}")
+    
+    def alias_serves_target(self) -> bool:
+        """Whether INDEX_ALIAS currently points at TARGET_INDEX"""
+        response = requests.get(f"{OPENSEARCH_URL}/_alias/{INDEX_ALIAS}")
+        return response.status_code == 200 and TARGET_INDEX in response.json()
+    
+    def project_vectors(self, vectors: List[List[float]]) -> List[Optional[List[float]]]:
+        """Apply the active projection (ints when quantized); None for zero (failed) vectors"""
+        import numpy as np
+        
+        array = np.asarray(vectors, dtype=np.float32)
+        valid = np.flatnonzero(np.any(array != 0, axis=1))
+        projected: List[Optional[List[float]]] = [None] * len(vectors)
+        if len(valid):
+            for i, vec in zip(valid, self.projection.apply(array[valid]).tolist()):
+                projected[i] = vec
+        return projected
+    
     def get_embeddings(self, texts: List[str], model_type: str = "food") -> Optional[List[List[float]]]:
         """Get embeddings from the embedding service (768-dim for food model)"""
         try:
@@ -935,12 +1041,21 @@ class MangwaleAISync:
         """Bulk index documents with three types of vectors"""
         bulk_body = []
         
-        for doc, item_vec, store_item_vec, store_vec in zip(docs, item_vectors, store_item_vectors, store_vectors):
+        reduced = None
+        if self.projection:
+            reduced = [self.project_vectors(vectors) for vectors in (item_vectors, store_item_vectors, store_vectors)]
+        
+        for i, (doc, item_vec, store_item_vec, store_vec) in enumerate(zip(docs, item_vectors, store_item_vectors, store_vectors)):
             doc_id = doc.get('id')
             bulk_body.append(json.dumps({"index": {"_index": TARGET_INDEX, "_id": doc_id}}))
-            doc["item_vector"] = item_vec
-            doc["store_item_vector"] = store_item_vec
-            doc["store_vector"] = store_vec
+            if not self.drop_full:
+                doc["item_vector"] = item_vec
+                doc["store_item_vector"] = store_item_vec
+                doc["store_vector"] = store_vec
+            if reduced:
+                for field, vectors in zip(VECTOR_FIELDS, reduced):
+                    if vectors[i] is not None:
+                        doc[f"{field}_reduced"] = vectors[i]
             bulk_body.append(json.dumps(doc))
         
         bulk_data = "\n".join(bulk_body) + "\n"
@@ -968,6 +1083,58 @@ class MangwaleAISync:
             print(f"\n❌ Bulk error: {e}")
             self.error_count += len(docs)
     
+    def embed_docs(self, docs: List[Dict]):
+        """Generate item, store+item and store embeddings for a batch of docs"""
+        # Prepare three types of embedding texts
+        item_texts = [self.prepare_embedding_text(doc) for doc in docs]
+        store_item_texts = [self.prepare_store_item_embedding_text(doc) for doc in docs]
+        store_texts = [self.prepare_store_embedding_text(doc) for doc in docs]
+        
+        # Generate embeddings for all three types in sub-batches
+        all_item_vectors = []
+        all_store_item_vectors = []
+        all_store_vectors = []
+        
+        for j in range(0, len(item_texts), MAX_EMBEDDING_BATCH):
+            batch_indices = range(j, min(j + MAX_EMBEDDING_BATCH, len(item_texts)))
+            batch_item_texts = [item_texts[k] for k in batch_indices]
+            batch_store_item_texts = [store_item_texts[k] for k in batch_indices]
+            batch_store_texts = [store_texts[k] for k in batch_indices]
+            
+            # Get item embeddings
+            item_vecs = self.get_embeddings(batch_item_texts, "food")
+            if item_vecs:
+                all_item_vectors.extend(item_vecs)
+            else:
+                all_item_vectors.extend([[0.0] * 768] * len(batch_item_texts))
+            
+            # Get store+item embeddings
+            store_item_vecs = self.get_embeddings(batch_store_item_texts, "food")
+            if store_item_vecs:
+                all_store_item_vectors.extend(store_item_vecs)
+            else:
+                all_store_item_vectors.extend([[0.0] * 768] * len(batch_store_item_texts))
+            
+            # Get store embeddings
+            store_vecs = self.get_embeddings(batch_store_texts, "food")
+            if store_vecs:
+                all_store_vectors.extend(store_vecs)
+            else:
+                all_store_vectors.extend([[0.0] * 768] * len(batch_store_texts))
+        
+        return all_item_vectors, all_store_item_vectors, all_store_vectors
+    
+    def index_batch(self, docs: List[Dict], item_vectors, store_item_vectors, store_vectors, total: int):
+        """Bulk index one batch and print progress"""
+        if len(item_vectors) == len(docs) and len(store_item_vectors) == len(docs) and len(store_vectors) == len(docs):
+            self.bulk_index(docs, item_vectors, store_item_vectors, store_vectors)
+        
+        # Progress
+        elapsed = time.time() - self.start_time
+        rate = self.processed_count / elapsed if elapsed > 0 else 0
+        pct = (self.processed_count / total) * 100
+        print(f"\r⏳ {self.processed_count:,}/{total:,} ({pct:.1f}%) | Rate: {rate:.1f}/s | Errors: {self.error_count}", end="", flush=True)
+    
     def process_items(self, items: List[Dict]):
         """Process all items: transform, generate three types of embeddings, and index"""
         total = len(items)
@@ -978,52 +1145,60 @@ class MangwaleAISync:
             # Transform items
             docs = [self.transform_item(item) for item in batch]
             
-            # Prepare three types of embedding texts
-            item_texts = [self.prepare_embedding_text(doc) for doc in docs]
-            store_item_texts = [self.prepare_store_item_embedding_text(doc) for doc in docs]
-            store_texts = [self.prepare_store_embedding_text(doc) for doc in docs]
-            
-            # Generate embeddings for all three types in sub-batches
-            all_item_vectors = []
-            all_store_item_vectors = []
-            all_store_vectors = []
+            vectors = self.embed_docs(docs)
+            self.index_batch(docs, *vectors, total=total)
+    
+    def process_items_reduced(self, items: List[Dict]) -> bool:
+        """
+        Embed the whole catalog first, fit the projection on it, then create
+        the index (mapping depends on the projection) and index everything.
+        Embedded batches are spooled to disk; only a reservoir sample of
+        PROJECTION_FIT_SAMPLE non-zero vectors stays in memory for the fit.
+        """
+        import numpy as np
+        
+        total = len(items)
+        rng = random.Random(42)
+        sample = np.empty((min(PROJECTION_FIT_SAMPLE, total * len(VECTOR_FIELDS)), 768), dtype=np.float32)
+        seen = 0
+        
+        with tempfile.TemporaryDirectory(prefix="mangwale-sync-") as spool:
+            batch_count = 0
+            for i in range(0, total, BATCH_SIZE):
+                docs = [self.transform_item(item) for item in items[i:i + BATCH_SIZE]]
+                vectors = [np.asarray(v, dtype=np.float32).reshape(-1, 768) for v in self.embed_docs(docs)]
+                for array in vectors:
+                    for vec in array[np.any(array != 0, axis=1)]:
+                        if seen < len(sample):
+                            sample[seen] = vec
+                        else:
+                            j = rng.randint(0, seen)
+                            if j < len(sample):
+                                sample[j] = vec
+                        seen += 1
+                np.savez(os.path.join(spool, f"{batch_count}.npz"), *vectors)
+                with open(os.path.join(spool, f"{batch_count}.json"), "w") as f:
+                    json.dump(docs, f, default=str)
+                batch_count += 1
+                print(f"\r🧠 Embedded {min(i + BATCH_SIZE, total):,}/{total:,}", end="", flush=True)
+            print("")
             
-            for j in range(0, len(item_texts), MAX_EMBEDDING_BATCH):
-                batch_indices = range(j, min(j + MAX_EMBEDDING_BATCH, len(item_texts)))
-                batch_item_texts = [item_texts[k] for k in batch_indices]
-                batch_store_item_texts = [store_item_texts[k] for k in batch_indices]
-                batch_store_texts = [store_texts[k] for k in batch_indices]
-                
-                # Get item embeddings
-                item_vecs = self.get_embeddings(batch_item_texts, "food")
-                if item_vecs:
-                    all_item_vectors.extend(item_vecs)
-                else:
-                    all_item_vectors.extend([[0.0] * 768] * len(batch_item_texts))
-                
-                # Get store+item embeddings
-                store_item_vecs = self.get_embeddings(batch_store_item_texts, "food")
-                if store_item_vecs:
-                    all_store_item_vectors.extend(store_item_vecs)
-                else:
-                    all_store_item_vectors.extend([[0.0] * 768] * len(batch_store_item_texts))
-                
-                # Get store embeddings
-                store_vecs = self.get_embeddings(batch_store_texts, "food")
-                if store_vecs:
-                    all_store_vectors.extend(store_vecs)
-                else:
-                    all_store_vectors.extend([[0.0] * 768] * len(batch_store_texts))
+            if not seen:
+                print("❌ No embeddings to fit the projection on")
+                return False
+            self.fit_projection(sample[:min(seen, len(sample))], seen)
             
-            # Bulk index with all vectors
-            if len(all_item_vectors) == len(docs) and len(all_store_item_vectors) == len(docs) and len(all_store_vectors) == len(docs):
-                self.bulk_index(docs, all_item_vectors, all_store_item_vectors, all_store_vectors)
+            if not self.create_index():
+                return False
+            self.publish_projection()
             
-            # Progress
-            elapsed = time.time() - self.start_time
-            rate = self.processed_count / elapsed if elapsed > 0 else 0
-            pct = (self.processed_count / total) * 100
-            print(f"\r⏳ {self.processed_count:,}/{total:,} ({pct:.1f}%) | Rate: {rate:.1f}/s | Errors: {self.error_count}", end="", flush=True)
+            for n in range(batch_count):
+                with open(os.path.join(spool, f"{n}.json")) as f:
+                    docs = json.load(f)
+                with np.load(os.path.join(spool, f"{n}.npz")) as arrays:
+                    item_vectors, store_item_vectors, store_vectors = (arrays[f"arr_{k}"].tolist() for k in range(3))
+                self.index_batch(docs, item_vectors, store_item_vectors, store_vectors, total=total)
+        return True
     
     def verify(self):
         """Verify the index was created correctly"""
@@ -1050,15 +1225,32 @@ class MangwaleAISync:
                 print(f"   Price Category: {doc.get('price_category')}")
                 print(f"   Cuisine: {doc.get('cuisine_type')}")
         
-        # Check vector
+        # Check vector (only the reduced field exists with --drop-full)
+        vector_field = "item_vector_reduced" if self.drop_full else "item_vector"
         response = requests.post(
             f"{OPENSEARCH_URL}/{TARGET_INDEX}/_search",
-            json={"size": 1, "query": {"exists": {"field": "item_vector"}}, "_source": ["name"]},
+            json={"size": 1, "query": {"exists": {"field": vector_field}}, "_source": ["name"]},
             headers={"Content-Type": "application/json"}
         )
         if response.status_code == 200:
             total = response.json().get("hits", {}).get("total", {}).get("value", 0)
-            print(f"   ✅ Documents with vectors: {total:,}")
+            print(f"   ✅ Documents with {vector_field}: {total:,}")
+    
+    def publish_ann_snapshot(self) -> bool:
+        """Build and publish the local ANN snapshot of the new index"""
+        if self.drop_full:
+            print("⚠️  Local ANN snapshot skipped: it needs the full item_vector field")
+            return False
+        print(f"\n📦 Publishing local ANN snapshot to {self.ann_snapshot_dir}...")
+        result = subprocess.run(
+            [sys.executable, LOCAL_ANN_BUILDER, "build", "--index", TARGET_INDEX,
+             "--snapshot-dir", self.ann_snapshot_dir],
+            env={**os.environ, "OPENSEARCH_URL": OPENSEARCH_URL}
+        )
+        if result.returncode != 0:
+            print(f"❌ Local ANN snapshot failed (exit {result.returncode}); running indexes keep the previous one")
+            return False
+        return True
     
     def run(self):
         """Run the complete sync"""
@@ -1069,9 +1261,17 @@ class MangwaleAISync:
         print(f"📝 OpenSearch: {OPENSEARCH_URL}")
         print(f"🎯 Target Index: {TARGET_INDEX}")
         print(f"🧠 Embedding Model: {MODEL_TYPE} (768-dim)")
+        if self.reduce_dim:
+            kind = "byte" if self.quantize else "float"
+            print(f"📉 Reduced vectors: {self.reduction} -> {self.reduce_dim}-dim {kind}{' (full vectors dropped)' if self.drop_full else ''}")
         print("=" * 70)
         
         # Pre-flight checks
+        # The backend and search-api query item_vector through the alias; dropping it would break them
+        if self.drop_full and self.alias_serves_target():
+            print(f"❌ --drop-full refused: alias {INDEX_ALIAS} points at {TARGET_INDEX}, and its readers query item_vector")
+            return
+        
         if not self.connect_mysql():
             return
         
@@ -1079,7 +1279,8 @@ class MangwaleAISync:
             print("\n💡 Start embedding service: python scripts/embedding-service.py")
             return
         
-        if not self.create_index():
+        # With reduced vectors the index is created after the projection is fit
+        if not self.reduce_dim and not self.create_index():
             return
         
         print("\n📥 Fetching items from MySQL...")
@@ -1090,7 +1291,11 @@ class MangwaleAISync:
             return
         
         print(f"\n🚀 Processing {len(items):,} items with embeddings...\n")
-        self.process_items(items)
+        if self.reduce_dim:
+            if not self.process_items_reduced(items):
+                return
+        else:
+            self.process_items(items)
         
         print("\n\n" + "=" * 70)
         print("  SYNC COMPLETE")
@@ -1102,13 +1307,49 @@ class MangwaleAISync:
         
         self.verify()
         
+        ann_published = bool(self.ann_snapshot_dir) and self.publish_ann_snapshot()
+        
         print("\n" + "=" * 70)
         print("💡 Next steps:")
         print(f"   1. Test semantic search: curl -X POST '{OPENSEARCH_URL}/{TARGET_INDEX}/_search' ...")
-        print(f"   2. Update alias: POST /_aliases {{\"actions\": [{{\"add\": {{\"index\": \"{TARGET_INDEX}\", \"alias\": \"food_items\"}}}}]}}")
+        if self.drop_full:
+            print(f"   2. Do NOT point alias {INDEX_ALIAS} at {TARGET_INDEX}: it has no item_vector, which the backend"
+                  f" and search-api kNN queries need")
+        else:
+            print(f"   2. Update alias: POST /_aliases {{\"actions\": [{{\"add\": {{\"index\": \"{TARGET_INDEX}\", \"alias\": \"{INDEX_ALIAS}\"}}}}]}}")
+        if not ann_published:
+            print(f"   3. Publish local ANN snapshot: python backend/nlu-training/local_ann_index.py build --index {TARGET_INDEX}"
+                  f" (or set ANN_SNAPSHOT_DIR)")
         print("=" * 70)
 
 
 if __name__ == "__main__":
-    sync = MangwaleAISync()
+    import argparse
+    parser = argparse.ArgumentParser(description="Complete MySQL to OpenSearch sync with vectors")
+    parser.add_argument("--reduce-dim", type=int, default=None,
+                        help="Also emit *_reduced vectors with this many dimensions (e.g. 256)")
+    parser.add_argument("--reduction", choices=["pca", "matryoshka"], default="pca",
+                        help="Projection method for --reduce-dim (default: pca)")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Store reduced vectors as byte (int8) vectors")
+    parser.add_argument("--drop-full", action="store_true",
+                        help="Do not index the full 768-dim vector fields. The backend and search-api query"
+                             " item_vector, so the index must not serve the food_items alias (refused if it does)")
+    parser.add_argument("--ann-snapshot-dir", default=ANN_SNAPSHOT_DIR,
+                        help="Publish a local ANN snapshot here after the sync (default: $ANN_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+    
+    if args.quantize and not args.reduce_dim:
+        # Quantize only: identity projection (first 768 of 768 dims)
+        args.reduce_dim, args.reduction = 768, "matryoshka"
+    if args.drop_full and not args.reduce_dim:
+        parser.error("--drop-full requires --reduce-dim or --quantize")
+    
+    sync = MangwaleAISync(
+        reduce_dim=args.reduce_dim,
+        reduction=args.reduction,
+        quantize=args.quantize,
+        drop_full=args.drop_full,
+        ann_snapshot_dir=args.ann_snapshot_dir
+    )
     sync.run()
@@ -0,0 +1,229 @@
+"""
+Vector projection for reduced-dimension / quantized k-NN fields.
+
+A projection maps 768-dim food embeddings to a smaller (and optionally
+byte-quantized) space. It is fit once on the catalog by the sync, saved next
+to the index version it was used for, and loaded by the embedding service so
+query vectors go through exactly the same transform.
+
+Methods:
+- pca: mean-centre, project on the top-N principal components, re-normalize
+- matryoshka: keep the first N dimensions, re-normalize (only meaningful for
+  Matryoshka-trained models)
+
+Files (PROJECTIONS_DIR/<name>.npz + <name>.json):
+    npz  -> mean, components
+    json -> method, input_dim, output_dim, quantize, scale, explained_variance
+
+Every fit is saved under its own version name (<index>-<timestamp>, also
+recorded in the index _meta); <index>.current (and <alias>.current once the
+alias points at it) names the version the index was built with. load() and
+ProjectionCache resolve an index or alias name through that pointer, so a
+re-sync that refits the projection is picked up by name.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROJECTIONS_DIR = os.getenv("PROJECTIONS_DIR", str(Path(__file__).parent / "projections"))
+
+METHODS = ("pca", "matryoshka")
+BYTE_MIN, BYTE_MAX = -128, 127
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorProjection:
+    def __init__(self, method: str, input_dim: int, output_dim: int,
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None,
+                 quantize: bool = False, scale: float = 127.0,
+                 explained_variance: Optional[float] = None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if output_dim > input_dim:
+            raise ValueError(f"output_dim {output_dim} > input_dim {input_dim}")
+        self.method = method
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.mean = mean
+        self.components = components
+        self.quantize = quantize
+        self.scale = scale
+        self.explained_variance = explained_variance
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, output_dim: int, method: str = "pca",
+            quantize: bool = False) -> "VectorProjection":
+        """Fit a projection on catalog vectors (rows = documents)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        input_dim = vectors.shape[1]
+        projection = cls(method, input_dim, output_dim, quantize=quantize)
+
+        if method == "pca":
+            mean = vectors.mean(axis=0)
+            centered = vectors - mean
+            # Right singular vectors = principal axes, already sorted by variance
+            _, s, vt = np.linalg.svd(centered, full_matrices=False)
+            variance = s ** 2
+            projection.mean = mean.astype(np.float32)
+            projection.components = vt[:output_dim].astype(np.float32)
+            projection.explained_variance = float(variance[:output_dim].sum() / variance.sum())
+
+        if quantize:
+            # Scale so the largest catalog component lands on the byte range edge
+            reduced = projection._reduce(vectors)
+            max_abs = float(np.abs(reduced).max()) or 1.0
+            projection.scale = BYTE_MAX / max_abs
+
+        return projection
+
+    def _reduce(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.input_dim:
+            raise ValueError(f"Expected {self.input_dim}-dim vectors, got {vectors.shape[1]}")
+        if self.method == "pca":
+            reduced = (vectors - self.mean) @ self.components.T
+        else:
+            reduced = vectors[:, :self.output_dim]
+        return _normalize(reduced)
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project vectors; returns int8-valued array when quantize is set"""
+        reduced = self._reduce(vectors)
+        if self.quantize:
+            return np.clip(np.rint(reduced * self.scale), BYTE_MIN, BYTE_MAX).astype(np.int8)
+        return reduced
+
+    def metadata(self) -> Dict:
+        return {
+            "method": self.method,
+            "input_dim": self.input_dim,
+            "output_dim": self.output_dim,
+            "quantize": self.quantize,
+            "scale": self.scale,
+            "explained_variance": self.explained_variance,
+        }
+
+    def save(self, name: str, directory: str = PROJECTIONS_DIR) -> Path:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+        np.savez(directory / f"{name}.npz", **arrays)
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(self.metadata(), f, indent=2)
+        return directory / f"{name}.json"
+
+    @classmethod
+    def load(cls, name: str, directory: str = PROJECTIONS_DIR) -> "VectorProjection":
+        """Load a projection by version, or by index/alias name through its pointer"""
+        directory = Path(directory)
+        name = resolve(name, directory)
+        with open(directory / f"{name}.json") as f:
+            meta = json.load(f)
+        mean = components = None
+        npz_path = directory / f"{name}.npz"
+        if npz_path.exists():
+            arrays = np.load(npz_path)
+            if "mean" in arrays:
+                mean, components = arrays["mean"], arrays["components"]
+        return cls(
+            meta["method"], meta["input_dim"], meta["output_dim"],
+            mean=mean, components=components,
+            quantize=meta.get("quantize", False), scale=meta.get("scale", 127.0),
+            explained_variance=meta.get("explained_variance"),
+        )
+
+    def knn_field_mapping(self) -> Dict:
+        """OpenSearch knn_vector mapping for the projected field"""
+        if self.quantize:
+            # Byte vectors are supported by the lucene engine
+            return {
+                "type": "knn_vector",
+                "dimension": self.output_dim,
+                "data_type": "byte",
+                "method": {
+                    "name": "hnsw",
+                    "space_type": "cosinesimil",
+                    "engine": "lucene",
+                    "parameters": {"ef_construction": 128, "m": 16}
+                }
+            }
+        return {
+            "type": "knn_vector",
+            "dimension": self.output_dim,
+            "method": {
+                "name": "hnsw",
+                "space_type": "cosinesimil",
+                "engine": "nmslib",
+                "parameters": {"ef_construction": 128, "m": 16}
+            }
+        }
+
+
+def resolve(name: str, directory: str = PROJECTIONS_DIR) -> str:
+    """Version name for an index/alias pointer; other names are returned as is"""
+    pointer = Path(directory) / f"{name}.current"
+    if pointer.exists():
+        version = pointer.read_text().strip()
+        if version:
+            return version
+    return name
+
+
+def publish(name: str, version: str, directory: str = PROJECTIONS_DIR) -> Path:
+    """Point an index or alias name at a saved projection version (atomic)"""
+    directory = Path(directory)
+    if not (directory / f"{version}.json").exists():
+        raise FileNotFoundError(f"Projection version not found: {version}")
+    pointer = directory / f"{name}.current"
+    tmp = directory / f".{name}.current.tmp"
+    tmp.write_text(version + "\n")
+    os.replace(tmp, pointer)
+    return pointer
+
+
+class ProjectionCache:
+    """Loaded projections by requested name; reloaded when the version or its files change"""
+
+    def __init__(self, directory: str = PROJECTIONS_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[Tuple, VectorProjection]] = {}
+
+    def _stamp(self, version: str) -> Tuple:
+        mtimes = []
+        for suffix in (".json", ".npz"):
+            path = self.directory / f"{version}{suffix}"
+            mtimes.append(path.stat().st_mtime_ns if path.exists() else None)
+        return (version, *mtimes)
+
+    def get(self, name: str) -> Tuple[str, VectorProjection]:
+        """(version, projection); FileNotFoundError when there is none"""
+        version = resolve(name, self.directory)
+        stamp = self._stamp(version)
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached and cached[0] == stamp:
+                return version, cached[1]
+        projection = VectorProjection.load(version, self.directory)
+        logger.info(f"Loaded projection '{name}' -> {version} ({projection.method}, {projection.output_dim} dims)")
+        with self._lock:
+            self._cache[name] = (stamp, projection)
+        return version, projection